@@ -46,6 +46,7 @@ from clp_package_utils.general import (
     dump_shared_container_config,
     generate_docker_compose_container_config,
     get_clp_home,
+    is_archive_compaction_configured,
     is_retention_period_configured,
     validate_db_config,
     validate_mcp_server_config,
@@ -568,9 +569,13 @@ class BaseController(ABC):
         :return: Dictionary of environment variables necessary to launch the component.
         """
         component_name = GARBAGE_COLLECTOR_COMPONENT_NAME
-        if not is_retention_period_configured(self._clp_config):
+        if not (
+            is_retention_period_configured(self._clp_config)
+            or is_archive_compaction_configured(self._clp_config)
+        ):
             logger.info(
-                f"Retention period is not configured, skipping {component_name} creation..."
+                "Neither retention period nor archive compaction is configured, skipping"
+                f" {component_name} creation..."
             )
             return EnvVarsDict(
                 {
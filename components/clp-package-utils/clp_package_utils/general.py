@@ -26,6 +26,7 @@ from clp_py_utils.clp_config import (
     REDIS_COMPONENT_NAME,
     REDUCER_COMPONENT_NAME,
     RESULTS_CACHE_COMPONENT_NAME,
+    StorageEngine,
     StorageType,
     WEBUI_COMPONENT_NAME,
     WorkerConfig,
@@ -331,6 +332,8 @@ def generate_worker_config(clp_config: CLPConfig) -> WorkerConfig:
     worker_config.archive_output = clp_config.archive_output.model_copy(deep=True)
     worker_config.tmp_directory = clp_config.tmp_directory
 
+    worker_config.compression_worker = clp_config.compression_worker.model_copy(deep=True)
+
     worker_config.stream_output = clp_config.stream_output
     worker_config.stream_collection_name = clp_config.results_cache.stream_collection_name
 
@@ -668,6 +671,33 @@ def validate_retention_config(clp_config: CLPConfig) -> None:
         )
 
 
+def validate_archive_compaction_config(clp_config: CLPConfig) -> None:
+    if clp_config.garbage_collector.archive_compaction is None:
+        return
+
+    storage_engine = clp_config.package.storage_engine
+    if StorageEngine.CLP_S != storage_engine:
+        raise ValueError(
+            f"Archive compaction is not supported with storage engine `{storage_engine}`"
+        )
+    storage_type = clp_config.archive_output.storage.type
+    if StorageType.FS != storage_type:
+        raise ValueError(
+            f"Archive compaction is not supported with archive storage `{storage_type}`"
+        )
+    # NOTE: Compacted archives can only be safely deleted once no running query job references
+    # them, and Presto's queries aren't tracked as query jobs.
+    clp_query_engine = clp_config.package.query_engine
+    if QueryEngine.PRESTO == clp_query_engine:
+        raise ValueError(
+            f"Archive compaction is not supported with query_engine `{clp_query_engine}`"
+        )
+
+
+def is_archive_compaction_configured(clp_config: CLPConfig) -> bool:
+    return clp_config.garbage_collector.archive_compaction is not None
+
+
 def is_retention_period_configured(clp_config: CLPConfig) -> bool:
     if clp_config.archive_output.retention_period is not None:
         return True
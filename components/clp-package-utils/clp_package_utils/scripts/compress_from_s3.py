@@ -102,6 +102,19 @@ def _generate_compress_cmd(
     if parsed_args.tags is not None:
         compress_cmd.append("--tags")
         compress_cmd.append(parsed_args.tags)
+    if parsed_args.priority is not None:
+        compress_cmd.append("--priority")
+        compress_cmd.append(str(parsed_args.priority))
+    if parsed_args.continuous:
+        compress_cmd.append("--continuous")
+    if parsed_args.scan_interval is not None:
+        compress_cmd.append("--scan-interval")
+        compress_cmd.append(str(parsed_args.scan_interval))
+    if parsed_args.max_latency is not None:
+        compress_cmd.append("--max-latency")
+        compress_cmd.append(str(parsed_args.max_latency))
+    if parsed_args.unordered_keys:
+        compress_cmd.append("--unordered-keys")
     if parsed_args.no_progress_reporting is True:
         compress_cmd.append("--no-progress-reporting")
 
@@ -188,6 +201,37 @@ def main(argv):
     args_parser.add_argument(
         "-t", "--tags", help="A comma-separated list of tags to apply to the compressed archives."
     )
+    args_parser.add_argument(
+        "--priority",
+        type=int,
+        help="The job's weight when sharing the compression cluster with other jobs.",
+    )
+    args_parser.add_argument(
+        "--continuous",
+        action="store_true",
+        help=(
+            f"With `{S3_KEY_PREFIX_COMPRESSION}`, keep watching the prefix and compress new objects"
+            " as they arrive, until the job is killed."
+        ),
+    )
+    args_parser.add_argument(
+        "--scan-interval",
+        type=float,
+        help="How often (in seconds) to list the prefix for new objects, with `--continuous`.",
+    )
+    args_parser.add_argument(
+        "--max-latency",
+        type=float,
+        help="Max time (in seconds) that new objects wait to be compressed, with `--continuous`.",
+    )
+    args_parser.add_argument(
+        "--unordered-keys",
+        action="store_true",
+        help=(
+            "With `--continuous`, new objects' keys may sort before existing objects' keys, so the"
+            " whole prefix must be listed to find new objects."
+        ),
+    )
     args_parser.add_argument(
         "--no-progress-reporting", action="store_true", help="Disables progress reporting."
     )
@@ -26,8 +26,10 @@ from job_orchestration.scheduler.constants import (
 )
 from job_orchestration.scheduler.job_config import (
     ClpIoConfig,
+    ContinuousIngestionConfig,
     FsInputConfig,
     OutputConfig,
+    S3ContinuousIngestionConfig,
     S3InputConfig,
 )
 
@@ -67,8 +69,8 @@ def handle_job_update(db, db_cursor, job_id, no_progress_reporting):
         )
     else:
         polling_query = (
-            f"SELECT start_time, status, status_msg, uncompressed_size, compressed_size, duration "
-            f"FROM {COMPRESSION_JOBS_TABLE_NAME} WHERE id={job_id}"
+            f"SELECT start_time, status, status_msg, uncompressed_size, compressed_size, duration, "
+            f"duplicate_size FROM {COMPRESSION_JOBS_TABLE_NAME} WHERE id={job_id}"
         )
 
     job_last_uncompressed_size = 0
@@ -89,7 +91,13 @@ def handle_job_update(db, db_cursor, job_id, no_progress_reporting):
             # All tasks in the job is done
             if not no_progress_reporting:
                 logger.info("Compression finished.")
-                print_compression_job_status(job_row)
+                if job_row["compressed_size"] > 0:
+                    print_compression_job_status(job_row)
+                if job_row["duplicate_size"] > 0:
+                    logger.info(
+                        f"Skipped {pretty_size(job_row['duplicate_size'])} of input that was"
+                        " already compressed."
+                    )
             break  # Done
         if CompressionJobStatus.FAILED == job_status:
             # One or more tasks in the job has failed
@@ -132,6 +140,12 @@ def handle_job(sql_adapter: SQL_Adapter, clp_io_config: ClpIoConfig, no_progress
             job_id = db_cursor.lastrowid
             logger.info(f"Compression job {job_id} submitted.")
 
+            if clp_io_config.input.continuous_ingestion is not None:
+                logger.info(
+                    f"Job {job_id} will keep compressing new logs in child jobs until it's killed."
+                )
+                return CompressionJobCompletionStatus.SUCCEEDED
+
             handle_job_update(db, db_cursor, job_id, no_progress_reporting)
         except Exception as ex:
             logger.error(ex)
@@ -152,13 +166,18 @@ def _generate_clp_io_config(
     if input_type == "fs":
         if len(logs_to_compress) == 0:
             raise ValueError("No input paths given.")
-        return FsInputConfig(
+        fs_input_config = FsInputConfig(
             dataset=parsed_args.dataset,
             paths_to_compress=logs_to_compress,
             timestamp_key=parsed_args.timestamp_key,
             path_prefix_to_remove=str(CONTAINER_INPUT_LOGS_ROOT_DIR),
             unstructured=parsed_args.unstructured,
         )
+        if parsed_args.continuous:
+            fs_input_config.continuous_ingestion = _generate_continuous_ingestion_config(
+                ContinuousIngestionConfig(), parsed_args
+            )
+        return fs_input_config
     elif input_type != "s3":
         raise ValueError(f"Unsupported input type: `{input_type}`.")
 
@@ -172,6 +191,11 @@ def _generate_clp_io_config(
     urls = logs_to_compress[1:]
 
     if s3_compress_subcommand == S3_OBJECT_COMPRESSION:
+        if parsed_args.continuous:
+            raise ValueError(
+                f"Continuous ingestion requires `{S3_KEY_PREFIX_COMPRESSION}` rather than"
+                f" `{S3_OBJECT_COMPRESSION}`."
+            )
         region_code, bucket, key_prefix, keys = _parse_and_validate_s3_object_urls(urls)
         return S3InputConfig(
             dataset=parsed_args.dataset,
@@ -189,7 +213,7 @@ def _generate_clp_io_config(
                 f"`{S3_KEY_PREFIX_COMPRESSION}` requires exactly one URL, got {len(urls)}"
             )
         region_code, bucket, key_prefix = parse_s3_url(urls[0])
-        return S3InputConfig(
+        s3_input_config = S3InputConfig(
             dataset=parsed_args.dataset,
             region_code=region_code,
             bucket=bucket,
@@ -199,10 +223,32 @@ def _generate_clp_io_config(
             timestamp_key=parsed_args.timestamp_key,
             unstructured=parsed_args.unstructured,
         )
+        if parsed_args.continuous:
+            s3_input_config.continuous_ingestion = _generate_continuous_ingestion_config(
+                S3ContinuousIngestionConfig(monotonic_keys=not parsed_args.unordered_keys),
+                parsed_args,
+            )
+        return s3_input_config
     else:
         raise ValueError(f"Unsupported S3 compress subcommand: `{s3_compress_subcommand}`.")
 
 
+def _generate_continuous_ingestion_config(
+    continuous_ingestion_config: ContinuousIngestionConfig,
+    parsed_args: argparse.Namespace,
+) -> ContinuousIngestionConfig:
+    """
+    :param continuous_ingestion_config: The config to update with the command line arguments.
+    :param parsed_args:
+    :return: The updated config.
+    """
+    if parsed_args.scan_interval is not None:
+        continuous_ingestion_config.scan_interval = parsed_args.scan_interval
+    if parsed_args.max_latency is not None:
+        continuous_ingestion_config.max_latency = parsed_args.max_latency
+    return continuous_ingestion_config
+
+
 def _get_logs_to_compress(logs_list_path: pathlib.Path) -> list[str]:
     """
     Reads logs or URLs from the input file.
@@ -348,7 +394,48 @@ def main(argv):
     args_parser.add_argument(
         "-t", "--tags", help="A comma-separated list of tags to apply to the compressed archives."
     )
+    args_parser.add_argument(
+        "--priority",
+        type=int,
+        help="The job's weight when sharing the compression cluster with other jobs.",
+    )
+    args_parser.add_argument(
+        "--continuous",
+        action="store_true",
+        help="Keep watching the input and compress new logs as they arrive, until the job is killed.",
+    )
+    args_parser.add_argument(
+        "--scan-interval",
+        type=float,
+        help="How often (in seconds) to scan the input for new logs, with `--continuous`.",
+    )
+    args_parser.add_argument(
+        "--max-latency",
+        type=float,
+        help="Max time (in seconds) that new logs wait to be compressed, with `--continuous`.",
+    )
+    args_parser.add_argument(
+        "--unordered-keys",
+        action="store_true",
+        help=(
+            "With `--continuous` S3 input, new objects' keys may sort before existing objects' keys,"
+            " so the whole prefix must be listed to find new objects."
+        ),
+    )
     parsed_args = args_parser.parse_args(argv[1:])
+    if parsed_args.priority is not None and parsed_args.priority < 1:
+        args_parser.error("--priority must be a positive integer.")
+    for arg_name in ("scan_interval", "max_latency"):
+        arg_value = getattr(parsed_args, arg_name)
+        if arg_value is None:
+            continue
+        option = "--" + arg_name.replace("_", "-")
+        if not parsed_args.continuous:
+            args_parser.error(f"{option} requires --continuous.")
+        if arg_value <= 0:
+            args_parser.error(f"{option} must be positive.")
+    if parsed_args.unordered_keys and not parsed_args.continuous:
+        args_parser.error("--unordered-keys requires --continuous.")
     if parsed_args.verbose:
         logger.setLevel(logging.DEBUG)
     else:
@@ -381,6 +468,8 @@ def main(argv):
         if len(tag_list) > 0:
             clp_output_config.tags = tag_list
     clp_io_config = ClpIoConfig(input=clp_input_config, output=clp_output_config)
+    if parsed_args.priority is not None:
+        clp_io_config.priority = parsed_args.priority
 
     mysql_adapter = SQL_Adapter(clp_config.database)
     return handle_job(
@@ -12,6 +12,7 @@ from clp_package_utils.general import (
     validate_and_load_db_credentials_file,
     validate_and_load_queue_credentials_file,
     validate_and_load_redis_credentials_file,
+    validate_archive_compaction_config,
     validate_logs_input_config,
     validate_output_storage_config,
     validate_retention_config,
@@ -61,6 +62,7 @@ def main(argv):
         validate_logs_input_config(clp_config)
         validate_output_storage_config(clp_config)
         validate_retention_config(clp_config)
+        validate_archive_compaction_config(clp_config)
 
         clp_config.validate_aws_config_dir()
         clp_config.validate_data_dir()
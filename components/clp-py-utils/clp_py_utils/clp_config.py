@@ -46,6 +46,11 @@ QUERY_JOBS_TABLE_NAME = "query_jobs"
 QUERY_TASKS_TABLE_NAME = "query_tasks"
 COMPRESSION_JOBS_TABLE_NAME = "compression_jobs"
 COMPRESSION_TASKS_TABLE_NAME = "compression_tasks"
+COMPRESSION_FILE_GROUPS_TABLE_NAME = "compression_file_groups"
+COMPRESSION_TASK_CHECKPOINTS_TABLE_NAME = "compression_task_checkpoints"
+INGESTION_MANIFEST_TABLE_NAME = "ingestion_manifest"
+S3_INGESTION_MANIFEST_TABLE_NAME = "s3_ingestion_manifest"
+S3_INGESTION_HIGH_WATER_MARKS_TABLE_NAME = "s3_ingestion_high_water_marks"
 
 # Paths
 CONTAINER_CLP_HOME = pathlib.Path("/") / "opt" / "clp"
@@ -85,6 +90,8 @@ DomainStr = NonEmptyStr
 Port = Annotated[int, Field(gt=0, lt=2**16)]
 SerializablePath = Annotated[pathlib.Path, PlainSerializer(serialize_path)]
 ZstdCompressionLevel = Annotated[int, Field(ge=1, le=19)]
+# S3 requires each part of a multipart upload (except the last) to be between 5 MiB and 5 GiB.
+S3MultipartUploadPartSize = Annotated[int, Field(ge=5 * 1024 * 1024, le=5 * 1024 * 1024 * 1024)]
 
 
 class DeploymentType(KebabCaseStrEnum):
@@ -117,6 +124,23 @@ class QueryEngine(KebabCaseStrEnum):
 QueryEngineStr = Annotated[QueryEngine, StrEnumSerializer]
 
 
+class PartitioningStrategy(KebabCaseStrEnum):
+    ROUND_ROBIN = auto()
+    BALANCED = auto()
+    TIME_CLUSTERED = auto()
+
+
+PartitioningStrategyStr = Annotated[PartitioningStrategy, StrEnumSerializer]
+
+
+class FileGroupingStrategy(KebabCaseStrEnum):
+    FILENAME_SIMILARITY = auto()
+    CONTENT_AWARE = auto()
+
+
+FileGroupingStrategyStr = Annotated[FileGroupingStrategy, StrEnumSerializer]
+
+
 class StorageType(LowercaseStrEnum):
     FS = auto()
     S3 = auto()
@@ -251,6 +275,19 @@ class Database(BaseModel):
 
 class CompressionScheduler(BaseModel):
     jobs_poll_delay: PositiveFloat = 0.1  # seconds
+    num_fs_scanning_threads: PositiveInt = 16
+    num_s3_listing_threads: PositiveInt = 16
+    num_job_planning_threads: PositiveInt = 4
+    # Limits on the number of tasks that are submitted but unfinished
+    max_in_flight_tasks: PositiveInt = 256
+    max_in_flight_tasks_per_job: PositiveInt = 64
+    # A running task gets a backup attempt once it has run this many times longer than expected,
+    # based on the throughput of its job's finished tasks (null disables backup attempts)
+    straggler_slowdown_threshold: Optional[PositiveFloat] = 3.0
+    # Max number of attempts at each task (retries resume from the task's last checkpoint)
+    max_task_attempts: PositiveInt = 3
+    # Whether to skip input files whose content was already compressed into the same dataset
+    deduplicate_fs_inputs: bool = False
     logging_level: LoggingLevel = "INFO"
 
 
@@ -269,6 +306,15 @@ class QueryScheduler(BaseModel):
 
 
 class CompressionWorker(BaseModel):
+    # Max temporary space (in bytes) each task uses for converted unstructured text logs (null
+    # converts all of a task's logs before compressing any of them)
+    max_conversion_tmp_space: Optional[PositiveInt] = 4 * 1024 * 1024 * 1024
+    # Max size (in bytes) of input logs compressed between each of a task's checkpoints (null only
+    # checkpoints once the whole task is done)
+    max_checkpoint_interval_size: Optional[PositiveInt] = 1024 * 1024 * 1024
+    # Whether to record each clp-s archive's message counts by time, so that timelines of unfiltered
+    # queries can be computed without searching the archive
+    generate_archive_histograms: bool = False
     logging_level: LoggingLevel = "INFO"
 
 
@@ -452,6 +498,10 @@ class S3Storage(BaseModel):
     type: Literal[StorageType.S3.value] = StorageType.S3.value
     s3_config: S3Config
     staging_directory: SerializablePath
+    max_concurrent_uploads: PositiveInt = 4
+    upload_part_size: S3MultipartUploadPartSize = 64 * 1024 * 1024  # 64 MiB
+    max_concurrent_upload_parts: PositiveInt = 8
+    max_pool_connections: PositiveInt = 32
 
     @field_validator("staging_directory", mode="before")
     @classmethod
@@ -538,6 +588,8 @@ def _set_directory_for_storage_config(
 class ArchiveOutput(BaseModel):
     storage: Union[ArchiveFsStorage, ArchiveS3Storage] = ArchiveFsStorage()
     target_archive_size: PositiveInt = 256 * 1024 * 1024  # 256 MB
+    partitioning_strategy: PartitioningStrategyStr = PartitioningStrategy.ROUND_ROBIN
+    file_grouping_strategy: FileGroupingStrategyStr = FileGroupingStrategy.FILENAME_SIMILARITY
     target_dictionaries_size: PositiveInt = 32 * 1024 * 1024  # 32 MB
     target_encoded_file_size: PositiveInt = 256 * 1024 * 1024  # 256 MB
     target_segment_size: PositiveInt = 256 * 1024 * 1024  # 256 MB
@@ -586,9 +638,22 @@ class McpServer(BaseModel):
     logging_level: LoggingLevel = "INFO"
 
 
+class ArchiveCompaction(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    # Interval (in minutes) at which small archives are compacted
+    interval: PositiveInt = 60
+    # Archives whose uncompressed size is less than this fraction of
+    # `archive_output.target_archive_size` are compacted
+    small_archive_size_ratio: Annotated[float, Field(gt=0, le=1)] = 0.25
+    # Min number of time-adjacent small archives to compact into one archive
+    min_archives_per_compaction: Annotated[int, Field(ge=2)] = 4
+
+
 class GarbageCollector(BaseModel):
     logging_level: LoggingLevel = "INFO"
     sweep_interval: SweepInterval = SweepInterval()
+    archive_compaction: Optional[ArchiveCompaction] = None
 
 
 class Presto(BaseModel):
@@ -831,6 +896,9 @@ class WorkerConfig(BaseModel):
     archive_output: ArchiveOutput = ArchiveOutput()
     tmp_directory: SerializablePath = CLPConfig().tmp_directory
 
+    # Only needed by compression workers.
+    compression_worker: CompressionWorker = CompressionWorker()
+
     # Only needed by query workers.
     stream_output: StreamOutput = StreamOutput()
     stream_collection_name: str = ResultsCache().stream_collection_name
@@ -11,19 +11,27 @@ from clp_py_utils.clp_config import (
 # Constants
 MYSQL_TABLE_NAME_MAX_LEN = 64
 
+ARCHIVE_HISTOGRAMS_TABLE_SUFFIX = "histograms"
+ARCHIVE_KEYS_TABLE_SUFFIX = "archive_keys"
 ARCHIVE_TAGS_TABLE_SUFFIX = "archive_tags"
 ARCHIVES_TABLE_SUFFIX = "archives"
 COLUMN_METADATA_TABLE_SUFFIX = "column_metadata"
 DATASETS_TABLE_SUFFIX = "datasets"
+FILE_FINGERPRINTS_TABLE_SUFFIX = "fingerprints"
 FILES_TABLE_SUFFIX = "files"
+KEYS_TABLE_SUFFIX = "keys"
 TAGS_TABLE_SUFFIX = "tags"
 
 TABLE_SUFFIX_MAX_LEN = max(
+    len(ARCHIVE_HISTOGRAMS_TABLE_SUFFIX),
+    len(ARCHIVE_KEYS_TABLE_SUFFIX),
     len(ARCHIVE_TAGS_TABLE_SUFFIX),
     len(ARCHIVES_TABLE_SUFFIX),
     len(COLUMN_METADATA_TABLE_SUFFIX),
     len(DATASETS_TABLE_SUFFIX),
+    len(FILE_FINGERPRINTS_TABLE_SUFFIX),
     len(FILES_TABLE_SUFFIX),
+    len(KEYS_TABLE_SUFFIX),
     len(TAGS_TABLE_SUFFIX),
 )
 
@@ -77,6 +85,70 @@ def _create_archive_tags_table(
     )
 
 
+def create_archive_histograms_table(
+    db_cursor, table_prefix: str, dataset: str | None, archives_table_name: str
+) -> None:
+    """
+    Creates the table of each archive's message counts by time bucket. It's created along with the
+    other metadata tables, but it's missing from datasets created before it was introduced.
+
+    :param db_cursor:
+    :param table_prefix:
+    :param dataset:
+    :param archives_table_name:
+    """
+    db_cursor.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS `{get_archive_histograms_table_name(table_prefix, dataset)}` (
+            `archive_id` VARCHAR(64) NOT NULL,
+            `bucket_size` BIGINT NOT NULL,
+            `bucket_begin` BIGINT NOT NULL,
+            `num_messages` BIGINT NOT NULL,
+            PRIMARY KEY (`archive_id`, `bucket_begin`),
+            FOREIGN KEY (`archive_id`) REFERENCES `{archives_table_name}` (`id`)
+        )
+        """
+    )
+
+
+def create_archive_keys_tables(
+    db_cursor, table_prefix: str, dataset: str | None, archives_table_name: str
+) -> None:
+    """
+    Creates the tables recording which keys are present in each archive: one assigning an ID to
+    each key, and one with a bitset of the IDs of the keys in each archive. They're created along
+    with the other metadata tables, but they're missing from datasets created before they were
+    introduced.
+
+    NOTE: Key names are compared as bytes, since keys may differ only in case or trailing spaces.
+
+    :param db_cursor:
+    :param table_prefix:
+    :param dataset:
+    :param archives_table_name:
+    """
+    db_cursor.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS `{get_keys_table_name(table_prefix, dataset)}` (
+            `id` INT unsigned NOT NULL AUTO_INCREMENT,
+            `name` VARBINARY(512) NOT NULL,
+            UNIQUE KEY (`name`) USING BTREE,
+            PRIMARY KEY (`id`)
+        )
+        """
+    )
+    db_cursor.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS `{get_archive_keys_table_name(table_prefix, dataset)}` (
+            `archive_id` VARCHAR(64) NOT NULL,
+            `key_ids` MEDIUMBLOB NOT NULL,
+            PRIMARY KEY (`archive_id`),
+            FOREIGN KEY (`archive_id`) REFERENCES `{archives_table_name}` (`id`)
+        )
+        """
+    )
+
+
 def _create_files_table(db_cursor, table_prefix: str, dataset: str | None) -> None:
     db_cursor.execute(
         f"""
@@ -98,6 +170,31 @@ def _create_files_table(db_cursor, table_prefix: str, dataset: str | None) -> No
     )
 
 
+def create_file_fingerprints_table(db_cursor, table_prefix: str, dataset: str | None) -> None:
+    """
+    Creates the table of fingerprints of the files compressed into a dataset. It's created along
+    with the other metadata tables, but it's missing from datasets created before it was introduced.
+
+    :param db_cursor:
+    :param table_prefix:
+    :param dataset:
+    """
+    db_cursor.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS `{get_file_fingerprints_table_name(table_prefix, dataset)}` (
+            `id` BIGINT unsigned NOT NULL AUTO_INCREMENT,
+            `sampled_fingerprint` BINARY(32) NOT NULL,
+            `full_fingerprint` BINARY(32) NULL DEFAULT NULL,
+            `size` BIGINT NOT NULL,
+            `path` VARCHAR(12288) NOT NULL,
+            `job_id` INT NOT NULL,
+            KEY `file_fingerprints_sampled_fingerprint` (`sampled_fingerprint`) USING BTREE,
+            PRIMARY KEY (`id`)
+        ) ROW_FORMAT=DYNAMIC
+        """
+    )
+
+
 def _create_column_metadata_table(db_cursor, table_prefix: str, dataset: str) -> None:
     db_cursor.execute(
         f"""
@@ -217,6 +314,9 @@ def create_metadata_db_tables(db_cursor, table_prefix: str, dataset: str | None
         db_cursor, archive_tags_table_name, archives_table_name, tags_table_name
     )
     _create_files_table(db_cursor, table_prefix, dataset)
+    create_archive_histograms_table(db_cursor, table_prefix, dataset, archives_table_name)
+    create_archive_keys_tables(db_cursor, table_prefix, dataset, archives_table_name)
+    create_file_fingerprints_table(db_cursor, table_prefix, dataset)
 
 
 def delete_archives_from_metadata_db(
@@ -224,7 +324,8 @@ def delete_archives_from_metadata_db(
 ) -> None:
     """
     Deletes archives from the metadata database specified by a list of IDs. It also deletes
-    the associated entries from `files` and `archive_tags` tables that reference these archives.
+    the associated entries from `files`, `archive_tags`, `histograms`, and `archive_keys` tables
+    that reference these archives.
 
     The order of deletion follows the foreign key constraints, ensuring no violations occur during
     the process.
@@ -252,6 +353,22 @@ def delete_archives_from_metadata_db(
         archive_ids,
     )
 
+    db_cursor.execute(
+        f"""
+        DELETE FROM `{get_archive_histograms_table_name(table_prefix, dataset)}`
+        WHERE archive_id in ({ids_list_string})
+        """,
+        archive_ids,
+    )
+
+    db_cursor.execute(
+        f"""
+        DELETE FROM `{get_archive_keys_table_name(table_prefix, dataset)}`
+        WHERE archive_id in ({ids_list_string})
+        """,
+        archive_ids,
+    )
+
     db_cursor.execute(
         f"""
         DELETE FROM `{get_archives_table_name(table_prefix, dataset)}`
@@ -273,8 +390,12 @@ def delete_dataset_from_metadata_db(db_cursor, table_prefix: str, dataset: str)
     # Drop tables in an order such that no foreign key constraint is violated.
     tables_in_removal_order = [
         get_column_metadata_table_name(table_prefix, dataset),
+        get_file_fingerprints_table_name(table_prefix, dataset),
         get_files_table_name(table_prefix, dataset),
         get_archive_tags_table_name(table_prefix, dataset),
+        get_archive_histograms_table_name(table_prefix, dataset),
+        get_archive_keys_table_name(table_prefix, dataset),
+        get_keys_table_name(table_prefix, dataset),
         get_tags_table_name(table_prefix, dataset),
         get_archives_table_name(table_prefix, dataset),
     ]
@@ -292,6 +413,14 @@ def delete_dataset_from_metadata_db(db_cursor, table_prefix: str, dataset: str)
     )
 
 
+def get_archive_histograms_table_name(table_prefix: str, dataset: str | None) -> str:
+    return _get_table_name(table_prefix, ARCHIVE_HISTOGRAMS_TABLE_SUFFIX, dataset)
+
+
+def get_archive_keys_table_name(table_prefix: str, dataset: str | None) -> str:
+    return _get_table_name(table_prefix, ARCHIVE_KEYS_TABLE_SUFFIX, dataset)
+
+
 def get_archive_tags_table_name(table_prefix: str, dataset: str | None) -> str:
     return _get_table_name(table_prefix, ARCHIVE_TAGS_TABLE_SUFFIX, dataset)
 
@@ -308,9 +437,17 @@ def get_datasets_table_name(table_prefix: str) -> str:
     return _get_table_name(table_prefix, DATASETS_TABLE_SUFFIX, None)
 
 
+def get_file_fingerprints_table_name(table_prefix: str, dataset: str | None) -> str:
+    return _get_table_name(table_prefix, FILE_FINGERPRINTS_TABLE_SUFFIX, dataset)
+
+
 def get_files_table_name(table_prefix: str, dataset: str | None) -> str:
     return _get_table_name(table_prefix, FILES_TABLE_SUFFIX, dataset)
 
 
+def get_keys_table_name(table_prefix: str, dataset: str | None) -> str:
+    return _get_table_name(table_prefix, KEYS_TABLE_SUFFIX, dataset)
+
+
 def get_tags_table_name(table_prefix: str, dataset: str | None) -> str:
     return _get_table_name(table_prefix, TAGS_TABLE_SUFFIX, dataset)
@@ -1,13 +1,87 @@
+import datetime
+import hashlib
+import heapq
+import math
+import os
 import pathlib
-from typing import List
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import BinaryIO, Dict, Final, Generator, List, Optional, Tuple
 
 import Levenshtein
 
-from clp_py_utils.core import FileMetadata
+from clp_py_utils.core import FileMetadata, GZIP_FILE_EXTENSIONS, ZSTD_FILE_EXTENSIONS
 
 # Constants
 FILE_GROUPING_MIN_LEVENSHTEIN_RATIO = 0.6
 
+# Number of compressed bytes decompressed from the start of a gzip file to estimate its compression
+# ratio.
+GZIP_COMPRESSION_RATIO_SAMPLE_SIZE: Final[int] = 128 * 1024
+# Maximum number of (path, size, mtime) entries in the uncompressed-size estimate cache.
+UNCOMPRESSED_SIZE_ESTIMATE_CACHE_SIZE_MAX: Final[int] = 100_000
+
+# When packing partitions, groups of files larger than 1/PARTITION_PACKING_GRANULARITY of a
+# partition are split, which bounds how unbalanced the packed partitions can be.
+PARTITION_PACKING_GRANULARITY: Final[int] = 8
+
+# Number of bytes read from the start of a file to compute its content signature.
+CONTENT_SIGNATURE_PROBE_SIZE: Final[int] = 1024
+CONTENT_SIGNATURE_LENGTH_MAX: Final[int] = 64
+PATH_TEMPLATE_LENGTH_MAX: Final[int] = 255
+# Content signatures for files whose content can't be sampled as text
+BINARY_CONTENT_SIGNATURE: Final[str] = "<binary>"
+ZSTD_CONTENT_SIGNATURE: Final[str] = "<zstd>"
+
+# Runs of hexadecimal characters that contain at least one decimal digit (e.g., numbers, dates,
+# hashes, and UUID segments), which are collapsed into a wildcard in path templates.
+_PATH_TEMPLATE_VARIABLE_PATTERN: Final[re.Pattern] = re.compile(r"[0-9A-Fa-f]*[0-9][0-9A-Fa-f]*")
+# Rotation and compression suffixes (e.g., `.*`, `.*.gz`) that are stripped from path templates.
+_PATH_TEMPLATE_SUFFIX_PATTERN: Final[re.Pattern] = re.compile(
+    r"(?:\.\*|"
+    + "|".join(re.escape(ext) for ext in GZIP_FILE_EXTENSIONS + ZSTD_FILE_EXTENSIONS)
+    + r")+$"
+)
+
+# Size of each of the blocks (at the start, middle, and end of a file) hashed into its sampled
+# fingerprint.
+FINGERPRINT_SAMPLE_BLOCK_SIZE: Final[int] = 4096
+# Number of bytes read at a time when computing a file's full fingerprint.
+FINGERPRINT_READ_BLOCK_SIZE: Final[int] = 1024 * 1024
+FINGERPRINT_DIGEST_SIZE: Final[int] = 32
+
+# Number of bytes read from each end of a file to probe the timestamps of its first and last lines.
+TIME_RANGE_PROBE_SIZE: Final[int] = 4096
+
+# Dates in paths, e.g. `2024-01-31`, `2024/01/31`, `20240131`, optionally followed by an hour, e.g.
+# `2024-01-31-13` or `2024-01-31T13`.
+_PATH_DATE_PATTERN: Final[re.Pattern] = re.compile(
+    r"(?<!\d)(\d{4})([-_/.]?)(\d{2})\2(\d{2})(?:[-_/.T ](\d{2})(?!\d))?(?!\d)"
+)
+# ISO 8601-like timestamps, e.g. `2024-01-31 13:45:00` or `2024-01-31T13:45:00`
+_LINE_TIMESTAMP_PATTERN: Final[re.Pattern] = re.compile(
+    rb"(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})"
+)
+
+_GZIP_MAGIC_NUMBER: Final[bytes] = b"\x1f\x8b"
+_GZIP_MEMBER_SIZE_MIN: Final[int] = 18
+_GZIP_ISIZE_MODULUS: Final[int] = 2**32
+# Maximum factor by which the gzip ISIZE-based estimate may differ from the sampled-ratio estimate
+# before the former is considered to describe only the last member of a multi-member file (e.g., one
+# of a few similarly sized members).
+_GZIP_ISIZE_ESTIMATE_TOLERANCE: Final[float] = 1.5
+_GZIP_DECOMPRESSION_CHUNK_SIZE: Final[int] = 1024 * 1024
+_ZSTD_MAGIC_NUMBER: Final[bytes] = b"\x28\xb5\x2f\xfd"
+_ZSTD_SKIPPABLE_FRAME_MAGIC_NUMBER_MASK: Final[int] = 0xFFFFFFF0
+_ZSTD_SKIPPABLE_FRAME_MAGIC_NUMBER: Final[int] = 0x184D2A50
+_ZSTD_FRAME_HEADER_SIZE_MAX: Final[int] = 18
+
+_uncompressed_size_estimates: "OrderedDict[Tuple[str, int, int], Optional[int]]" = OrderedDict()
+_uncompressed_size_estimates_lock = threading.Lock()
+
 
 class FilesPartition:
     def __init__(self):
@@ -91,6 +165,364 @@ def group_files_by_similar_filenames(files: List[FileMetadata]):
     return groups
 
 
+def pack_file_groups_into_partitions(
+    groups, target_partition_size: int, allow_oversized_partitions: bool
+) -> List[FilesPartition]:
+    """
+    Packs the given groups of files (as returned by `group_files_by_similar_filenames`) into
+    partitions of roughly equal total estimated uncompressed size.
+
+    The number of partitions is chosen so that they're either no smaller than
+    `target_partition_size` (if `allow_oversized_partitions` is true) or no larger than it
+    (otherwise). Groups are kept whole unless they're larger than 1/`PARTITION_PACKING_GRANULARITY`
+    of a partition's fair share of the total size, in which case they're split into runs of
+    consecutive files no larger than that. The resulting units are then assigned using the
+    longest-processing-time-first (LPT) heuristic: in decreasing order of size, each unit is added to
+    the partition with the smallest total size. Units that are larger than a fair share on their own
+    (e.g., a single huge file) get a partition to themselves, and the remaining units are balanced
+    across the remaining partitions. To keep the partitions within their bound, fewer partitions are
+    used if any would be smaller than the target (if `allow_oversized_partitions` is true), and a
+    unit that would make every partition larger than the target gets a new partition (otherwise).
+
+    :param groups:
+    :param target_partition_size:
+    :param allow_oversized_partitions:
+    :return: The non-empty partitions.
+    """
+
+    def get_num_partitions(size: int) -> int:
+        if allow_oversized_partitions:
+            return max(1, size // target_partition_size)
+        return max(1, math.ceil(size / target_partition_size))
+
+    total_size = sum(
+        file.estimated_uncompressed_size for group in groups for file in group["files"]
+    )
+    num_partitions = get_num_partitions(total_size)
+    partition_capacity = max(1, math.ceil(total_size / num_partitions))
+
+    # Each unit is a tuple of (size, group ID, files)
+    units: List[Tuple[int, int, List[FileMetadata]]] = []
+    unit_capacity = max(1, partition_capacity // PARTITION_PACKING_GRANULARITY)
+    for group in groups:
+        unit_files: List[FileMetadata] = []
+        unit_size = 0
+        for file in group["files"]:
+            file_size = file.estimated_uncompressed_size
+            if len(unit_files) > 0 and unit_size + file_size > unit_capacity:
+                units.append((unit_size, group["id"], unit_files))
+                unit_files = []
+                unit_size = 0
+            unit_files.append(file)
+            unit_size += file_size
+        if len(unit_files) > 0:
+            units.append((unit_size, group["id"], unit_files))
+    units.sort(key=lambda unit: unit[0], reverse=True)
+
+    num_oversized_units = 0
+    remaining_size = total_size
+    while num_oversized_units < len(units):
+        unit_size = units[num_oversized_units][0]
+        num_partitions = get_num_partitions(remaining_size)
+        if unit_size * num_partitions <= remaining_size:
+            break
+        remaining_size -= unit_size
+        num_oversized_units += 1
+    num_partitions = min(num_partitions, len(units) - num_oversized_units)
+
+    partitions: List[FilesPartition] = []
+    for _, group_id, unit_files in units[:num_oversized_units]:
+        partition = FilesPartition()
+        for file in unit_files:
+            partition.add_file(file, group_id)
+        partitions.append(partition)
+
+    remaining_units = units[num_oversized_units:]
+    if (
+        allow_oversized_partitions
+        and num_oversized_units > 0
+        and remaining_size < target_partition_size
+    ):
+        # The remaining units can't fill a partition on their own, so add them to the smallest
+        # oversized partition instead.
+        partition = partitions[-1]
+        for _, group_id, unit_files in remaining_units:
+            for file in unit_files:
+                partition.add_file(file, group_id)
+        return partitions
+
+    if allow_oversized_partitions:
+        balanced_partitions = _pack_units(remaining_units, num_partitions, None)
+        # LPT only bounds the difference between the partitions' sizes (by the size of a unit), so
+        # a partition may still be smaller than the target; use fewer partitions until none is.
+        while len(balanced_partitions) > 1 and any(
+            partition.get_total_file_size() < target_partition_size
+            for partition in balanced_partitions
+        ):
+            balanced_partitions = _pack_units(remaining_units, len(balanced_partitions) - 1, None)
+    else:
+        balanced_partitions = _pack_units(remaining_units, num_partitions, target_partition_size)
+    partitions.extend(balanced_partitions)
+
+    return partitions
+
+
+def _pack_units(
+    units: List[Tuple[int, int, List[FileMetadata]]],
+    num_partitions: int,
+    partition_size_max: Optional[int],
+) -> List[FilesPartition]:
+    """
+    Assigns units of files (in decreasing order of size) to partitions using the LPT heuristic.
+
+    :param units: A list of (size, group ID, files) tuples, in decreasing order of size.
+    :param num_partitions:
+    :param partition_size_max: If set, a unit that would make even the smallest partition larger
+        than this is added to a new partition instead.
+    :return: The non-empty partitions.
+    """
+    partitions = [FilesPartition() for _ in range(num_partitions)]
+    # Min-heap of (partition size, partition index)
+    partition_sizes = [(0, partition_ix) for partition_ix in range(num_partitions)]
+    for unit_size, group_id, unit_files in units:
+        if len(partition_sizes) > 0 and (
+            partition_size_max is None or partition_sizes[0][0] + unit_size <= partition_size_max
+        ):
+            partition_size, partition_ix = heapq.heappop(partition_sizes)
+        else:
+            partition_size, partition_ix = 0, len(partitions)
+            partitions.append(FilesPartition())
+        partition = partitions[partition_ix]
+        for file in unit_files:
+            partition.add_file(file, group_id)
+        heapq.heappush(partition_sizes, (partition_size + unit_size, partition_ix))
+
+    return [partition for partition in partitions if partition.contains_files()]
+
+
+def group_files_by_path_template(files: List[FileMetadata], probe_files: bool):
+    """
+    Groups files whose names share a template (see `get_path_template`) and whose content shares a
+    format signature (see `get_content_signature`), so that files likely to share dictionaries are
+    compressed together. Files are sorted by (template, signature, name), so grouping takes
+    O(n log n) time. To limit I/O, the content signature is only computed for the first file of each
+    template in each directory.
+
+    :param files:
+    :param probe_files: Whether the files are local files whose content may be sampled.
+    :return: A list of groups, each a dictionary containing the group's "id", "files",
+        "path_template", and "content_signature" (which may be None).
+    """
+    content_signatures: Dict[Tuple[pathlib.Path, str], Optional[str]] = {}
+    keyed_files: List[Tuple[str, str, str, FileMetadata]] = []
+    for file in files:
+        path_template = get_path_template(file.path)
+        content_signature = None
+        if probe_files:
+            signature_key = (file.path.parent, path_template)
+            if signature_key not in content_signatures:
+                content_signatures[signature_key] = get_content_signature(file.path)
+            content_signature = content_signatures[signature_key]
+        keyed_files.append((path_template, content_signature or "", file.path.name, file))
+    keyed_files.sort(key=lambda keyed_file: keyed_file[:3])
+
+    groups = []
+    current_group = None
+    for path_template, content_signature, _, file in keyed_files:
+        if (
+            current_group is None
+            or current_group["path_template"] != path_template
+            or (current_group["content_signature"] or "") != content_signature
+        ):
+            current_group = {
+                "id": len(groups),
+                "files": [],
+                "path_template": path_template,
+                "content_signature": content_signature or None,
+            }
+            groups.append(current_group)
+        current_group["files"].append(file)
+
+    return groups
+
+
+def get_path_template(path: pathlib.Path) -> str:
+    """
+    :param path:
+    :return: The file's name with every variable-looking token (a run of hexadecimal characters
+        containing a decimal digit) replaced with `*`, and any rotation and compression suffixes
+        removed. E.g., `web-10-0-0-12.app.2024-01-31.log.3.gz` becomes `web-*-*-*-*.app.*-*-*.log`.
+    """
+    path_template = _PATH_TEMPLATE_VARIABLE_PATTERN.sub("*", path.name)
+    path_template = _PATH_TEMPLATE_SUFFIX_PATTERN.sub("", path_template) or path_template
+    return path_template[:PATH_TEMPLATE_LENGTH_MAX]
+
+
+def get_content_signature(path: pathlib.Path) -> Optional[str]:
+    """
+    Computes a signature of a file's format from the shape of its first line: runs of letters are
+    replaced with `a`, runs of digits with `0`, and runs of whitespace with a single space, e.g.,
+    `2024-01-31 13:45:00,123 INFO [main] Started` becomes `0-0-0 0:0:0,0 a [a] a`. gzip files are
+    sampled after decompression.
+
+    :param path:
+    :return: The signature, or None if the file can't be read.
+    """
+    try:
+        with open(path, "rb") as f:
+            sample = f.read(CONTENT_SIGNATURE_PROBE_SIZE)
+        if sample.startswith(_GZIP_MAGIC_NUMBER):
+            decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+            sample = decompressor.decompress(sample, CONTENT_SIGNATURE_PROBE_SIZE)
+        elif sample.startswith(_ZSTD_MAGIC_NUMBER):
+            return ZSTD_CONTENT_SIGNATURE
+    except (OSError, zlib.error):
+        return None
+
+    first_line = sample.split(b"\n", 1)[0]
+    if b"\0" in first_line:
+        return BINARY_CONTENT_SIGNATURE
+    shape = re.sub(rb"[0-9]+", b"0", first_line)
+    shape = re.sub(rb"[A-Za-z]+", b"a", shape)
+    shape = re.sub(rb"\s+", b" ", shape).strip()
+    return shape[:CONTENT_SIGNATURE_LENGTH_MAX].decode("ascii", errors="replace")
+
+
+def compute_sampled_fingerprint(path: pathlib.Path, size: int) -> Optional[bytes]:
+    """
+    Computes a fingerprint of a file from its size and the blocks at its start, middle, and end.
+    Files with different sampled fingerprints have different content, but files with the same
+    sampled fingerprint must be compared using `compute_full_fingerprint`.
+
+    :param path:
+    :param size: The file's size.
+    :return: The fingerprint, or None if the file can't be read.
+    """
+    hasher = hashlib.blake2b(size.to_bytes(8, "little"), digest_size=FINGERPRINT_DIGEST_SIZE)
+    block_offsets = {
+        0,
+        max(0, size // 2 - FINGERPRINT_SAMPLE_BLOCK_SIZE // 2),
+        max(0, size - FINGERPRINT_SAMPLE_BLOCK_SIZE),
+    }
+    try:
+        with open(path, "rb") as f:
+            for offset in sorted(block_offsets):
+                f.seek(offset)
+                hasher.update(f.read(FINGERPRINT_SAMPLE_BLOCK_SIZE))
+    except OSError:
+        return None
+    return hasher.digest()
+
+
+def compute_full_fingerprint(path: pathlib.Path) -> Optional[bytes]:
+    """
+    Computes a fingerprint of a file from its entire content.
+
+    :param path:
+    :return: The fingerprint, or None if the file can't be read.
+    """
+    hasher = hashlib.blake2b(digest_size=FINGERPRINT_DIGEST_SIZE)
+    try:
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(FINGERPRINT_READ_BLOCK_SIZE)
+                if not block:
+                    break
+                hasher.update(block)
+    except OSError:
+        return None
+    return hasher.digest()
+
+
+def estimate_time_range(path: pathlib.Path, probe_file: bool) -> Optional[Tuple[float, float]]:
+    """
+    Estimates the range of timestamps of the log events in a file, using the first available of:
+    - a date (and optionally an hour) in the file's path;
+    - the timestamps in the file's first and last lines, for uncompressed local files;
+    - the file's modification time, for local files.
+
+    NOTE: Timestamps without a time zone are interpreted as UTC, so the estimates are only suitable
+    for ordering files relative to each other.
+
+    :param path:
+    :param probe_file: Whether `path` is a local file that may be read.
+    :return: A tuple of (begin, end) timestamps in seconds since the epoch, or None if the range
+        can't be estimated.
+    """
+    time_range = _get_time_range_from_path(path)
+    if time_range is not None or not probe_file:
+        return time_range
+
+    try:
+        if not path.name.endswith(GZIP_FILE_EXTENSIONS + ZSTD_FILE_EXTENSIONS):
+            time_range = _probe_time_range_from_content(path)
+        if time_range is None:
+            mtime = path.stat().st_mtime
+            time_range = (mtime, mtime)
+    except OSError:
+        return None
+
+    return time_range
+
+
+def _get_time_range_from_path(path: pathlib.Path) -> Optional[Tuple[float, float]]:
+    """
+    :param path:
+    :return: The time range covered by the last valid date in `path`, or None if there's no date.
+    """
+    time_range = None
+    for match in _PATH_DATE_PATTERN.finditer(str(path)):
+        year, _, month, day, hour = match.groups()
+        if hour is not None and int(hour) >= 24:
+            # The digits after the date aren't an hour (e.g., `2024-01-31/42.log`)
+            hour = None
+        try:
+            begin = datetime.datetime(
+                int(year), int(month), int(day), int(hour or 0), tzinfo=datetime.timezone.utc
+            )
+        except ValueError:
+            continue
+        if not 1970 <= begin.year <= 2100:
+            continue
+        duration = datetime.timedelta(hours=1) if hour is not None else datetime.timedelta(days=1)
+        time_range = (begin.timestamp(), (begin + duration).timestamp())
+    return time_range
+
+
+def _probe_time_range_from_content(path: pathlib.Path) -> Optional[Tuple[float, float]]:
+    """
+    :param path:
+    :return: The range between the first timestamp near the start of the file and the last timestamp
+        near its end, or None if either can't be found.
+    :raises: Propagates `open`'s and `BinaryIO.read`'s exceptions.
+    """
+    with open(path, "rb") as f:
+        head = f.read(TIME_RANGE_PROBE_SIZE)
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - TIME_RANGE_PROBE_SIZE))
+        tail = f.read(TIME_RANGE_PROBE_SIZE)
+
+    begin = _parse_line_timestamp(_LINE_TIMESTAMP_PATTERN.search(head))
+    end = None
+    for match in _LINE_TIMESTAMP_PATTERN.finditer(tail):
+        end = _parse_line_timestamp(match) or end
+    if begin is None or end is None:
+        return None
+    return min(begin, end), max(begin, end)
+
+
+def _parse_line_timestamp(match: Optional[re.Match]) -> Optional[float]:
+    if match is None:
+        return None
+    try:
+        timestamp = datetime.datetime(
+            *(int(group) for group in match.groups()), tzinfo=datetime.timezone.utc
+        )
+    except ValueError:
+        return None
+    return timestamp.timestamp()
+
+
 def validate_path_and_get_info(required_parent_dir: pathlib.Path, path: pathlib.Path):
     file = None
     empty_directory = None
@@ -122,7 +554,302 @@ def validate_path_and_get_info(required_parent_dir: pathlib.Path, path: pathlib.
         if next(path.iterdir(), None) is None:
             empty_directory = str(path)
     else:
-        file_size = path.stat().st_size
-        file = FileMetadata(path, file_size)
+        file = get_file_metadata(path, path.stat())
 
     return file, empty_directory
+
+
+def get_file_metadata(path: pathlib.Path, stat_result: os.stat_result) -> FileMetadata:
+    """
+    Creates the metadata of a local file, estimating the uncompressed size of gzip and zstd files
+    using `estimate_uncompressed_size`.
+
+    :param path:
+    :param stat_result: The result of `stat`-ing the file.
+    :return: The file's metadata.
+    """
+    file_size = stat_result.st_size
+    estimated_uncompressed_size = None
+    if path.name.endswith(GZIP_FILE_EXTENSIONS + ZSTD_FILE_EXTENSIONS):
+        estimated_uncompressed_size = estimate_uncompressed_size(
+            path, file_size, stat_result.st_mtime_ns
+        )
+    return FileMetadata(path, file_size, estimated_uncompressed_size)
+
+
+def estimate_uncompressed_size(path: pathlib.Path, size: int, mtime_ns: int) -> Optional[int]:
+    """
+    Estimates the uncompressed size of a gzip or zstd file from its content:
+    - For gzip files, the uncompressed size (modulo 2^32) recorded in the trailer (ISIZE) of the
+      last member is cross-checked against the compression ratio of a sample decompressed from the
+      start of the file. The sampled ratio is used for multi-member files, where ISIZE only
+      describes the last member.
+    - For zstd files, the content size recorded in the header of the first frame is used, if present
+      and plausible.
+
+    Estimates are cached per (path, size, mtime), so rescanning unchanged files doesn't reread them.
+
+    :param path:
+    :param size: The file's size.
+    :param mtime_ns: The file's modification time, in nanoseconds.
+    :return: The estimated uncompressed size, or None if the file isn't a gzip or zstd file, or its
+        content doesn't allow an estimate.
+    """
+    cache_key = (str(path), size, mtime_ns)
+    with _uncompressed_size_estimates_lock:
+        if cache_key in _uncompressed_size_estimates:
+            _uncompressed_size_estimates.move_to_end(cache_key)
+            return _uncompressed_size_estimates[cache_key]
+
+    estimate = None
+    try:
+        with open(path, "rb") as f:
+            magic_number = f.read(len(_ZSTD_MAGIC_NUMBER))
+            f.seek(0)
+            if magic_number.startswith(_GZIP_MAGIC_NUMBER):
+                estimate = _estimate_gzip_uncompressed_size(f, size)
+            else:
+                estimate = _estimate_zstd_uncompressed_size(f, size)
+    except (OSError, zlib.error):
+        pass
+
+    with _uncompressed_size_estimates_lock:
+        _uncompressed_size_estimates[cache_key] = estimate
+        if len(_uncompressed_size_estimates) > UNCOMPRESSED_SIZE_ESTIMATE_CACHE_SIZE_MAX:
+            _uncompressed_size_estimates.popitem(last=False)
+
+    return estimate
+
+
+def _estimate_gzip_uncompressed_size(f: BinaryIO, size: int) -> Optional[int]:
+    """
+    :param f: The gzip file, positioned at its start.
+    :param size: The file's size.
+    :return: The estimated uncompressed size, or None if it can't be estimated.
+    :raises: Propagates `zlib.Decompress.decompress`'s exceptions.
+    """
+    if size < _GZIP_MEMBER_SIZE_MIN:
+        return None
+
+    sample = f.read(GZIP_COMPRESSION_RATIO_SAMPLE_SIZE)
+    f.seek(size - 4)
+    isize = int.from_bytes(f.read(4), "little")
+
+    # Decompress the members within the sample, discarding the output.
+    num_uncompressed_bytes = 0
+    num_members_ended = 0
+    remaining_sample = sample
+    while remaining_sample.startswith(_GZIP_MAGIC_NUMBER):
+        decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        data = remaining_sample
+        while len(data) > 0 and not decompressor.eof:
+            num_uncompressed_bytes += len(
+                decompressor.decompress(data, _GZIP_DECOMPRESSION_CHUNK_SIZE)
+            )
+            data = decompressor.unconsumed_tail
+        if not decompressor.eof:
+            # The member extends beyond the sample
+            remaining_sample = b""
+            break
+        num_members_ended += 1
+        remaining_sample = decompressor.unused_data
+    num_compressed_bytes = len(sample) - len(remaining_sample)
+
+    if 0 == num_compressed_bytes:
+        return None
+    if len(sample) == size and num_members_ended > 0:
+        # The entire file was decompressed
+        return num_uncompressed_bytes
+
+    sampled_ratio_estimate = int(size * num_uncompressed_bytes / num_compressed_bytes)
+    if num_members_ended > 0:
+        # Multi-member file, so ISIZE only describes the last member
+        return sampled_ratio_estimate
+
+    # ISIZE is the uncompressed size modulo 2^32, so pick the congruent size that's closest to the
+    # sampled-ratio estimate.
+    num_wraps = max(0, round((sampled_ratio_estimate - isize) / _GZIP_ISIZE_MODULUS))
+    isize_estimate = isize + num_wraps * _GZIP_ISIZE_MODULUS
+    if (
+        isize_estimate * _GZIP_ISIZE_ESTIMATE_TOLERANCE < sampled_ratio_estimate
+        or isize_estimate > sampled_ratio_estimate * _GZIP_ISIZE_ESTIMATE_TOLERANCE
+    ):
+        # The first member spans the sample but isn't the only member
+        return sampled_ratio_estimate
+    return isize_estimate
+
+
+def _estimate_zstd_uncompressed_size(f: BinaryIO, size: int) -> Optional[int]:
+    """
+    :param f: The zstd file, positioned at its start.
+    :param size: The file's size.
+    :return: The content size recorded in the header of the file's first frame, or None if it's
+        absent or smaller than the file (i.e., the file likely contains multiple frames).
+    """
+    # Skip any leading skippable frames
+    frame_offset = 0
+    while True:
+        header = f.read(_ZSTD_FRAME_HEADER_SIZE_MAX)
+        if len(header) < 8:
+            return None
+        magic_number = int.from_bytes(header[:4], "little")
+        if magic_number & _ZSTD_SKIPPABLE_FRAME_MAGIC_NUMBER_MASK != (
+            _ZSTD_SKIPPABLE_FRAME_MAGIC_NUMBER
+        ):
+            break
+        frame_offset += 8 + int.from_bytes(header[4:8], "little")
+        f.seek(frame_offset)
+
+    if not header.startswith(_ZSTD_MAGIC_NUMBER):
+        return None
+
+    frame_header_descriptor = header[4]
+    frame_content_size_flag = frame_header_descriptor >> 6
+    is_single_segment = (frame_header_descriptor >> 5) & 1 == 1
+    dictionary_id_flag = frame_header_descriptor & 0x3
+
+    field_offset = 5
+    if not is_single_segment:
+        # Window descriptor
+        field_offset += 1
+    field_offset += (0, 1, 2, 4)[dictionary_id_flag]
+    frame_content_size_field_size = (1 if is_single_segment else 0, 2, 4, 8)[
+        frame_content_size_flag
+    ]
+    if 0 == frame_content_size_field_size:
+        return None
+
+    frame_content_size_field = header[field_offset : field_offset + frame_content_size_field_size]
+    if len(frame_content_size_field) < frame_content_size_field_size:
+        return None
+    frame_content_size = int.from_bytes(frame_content_size_field, "little")
+    if 2 == frame_content_size_field_size:
+        frame_content_size += 256
+
+    if frame_content_size < size:
+        return None
+    return frame_content_size
+
+
+def iter_files_and_empty_directories(
+    required_parent_dir: pathlib.Path,
+    paths: List[pathlib.Path],
+    invalid_path_messages: List[str],
+    max_concurrency: int,
+) -> Generator[Tuple[Optional[FileMetadata], Optional[str]], None, None]:
+    """
+    Walks the given paths and yields every file and empty directory within them, in the same form as
+    `validate_path_and_get_info`. Directories are scanned concurrently on a thread pool, and entries
+    are yielded as soon as the directory containing them has been scanned.
+
+    Compared to calling `validate_path_and_get_info` on every path within a directory, the walk:
+    - uses `os.scandir` and reuses each `DirEntry`'s cached type and stat information;
+    - only validates and resolves symbolic links, since any other entry within a validated directory
+      is guaranteed to be within `required_parent_dir`.
+
+    NOTE: Like `pathlib.Path.rglob`, the walk doesn't descend into symbolic links to directories.
+
+    :param required_parent_dir:
+    :param paths:
+    :param invalid_path_messages: Returns an error message for each invalid path encountered.
+    :param max_concurrency: The maximum number of directories to scan concurrently.
+    :yield: A tuple of (file, empty_directory), where exactly one element is set.
+    """
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        # Maps each pending directory scan to whether its directory is one of the given `paths`.
+        pending_scans: Dict[Future, bool] = {}
+        try:
+            for path in paths:
+                try:
+                    file, empty_directory = validate_path_and_get_info(required_parent_dir, path)
+                except ValueError as ex:
+                    invalid_path_messages.append(str(ex))
+                    continue
+
+                if file is not None or empty_directory is not None:
+                    yield file, empty_directory
+                    continue
+                if not path.is_dir():
+                    continue
+
+                if not path.is_relative_to(required_parent_dir):
+                    # Match `validate_path_and_get_info`, which resolves paths outside the parent
+                    # dir.
+                    path = path.resolve()
+                pending_scans[executor.submit(_scan_directory, required_parent_dir, path)] = True
+
+            while len(pending_scans) > 0:
+                done, _ = wait(pending_scans.keys(), return_when=FIRST_COMPLETED)
+                for future in done:
+                    is_input_path = pending_scans.pop(future)
+                    directory, has_children, entries, sub_directories, error_messages = (
+                        future.result()
+                    )
+                    invalid_path_messages.extend(error_messages)
+                    for sub_directory in sub_directories:
+                        future = executor.submit(
+                            _scan_directory, required_parent_dir, sub_directory
+                        )
+                        pending_scans[future] = False
+
+                    if not is_input_path and not has_children and len(error_messages) == 0:
+                        yield None, str(directory)
+                    yield from entries
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _scan_directory(required_parent_dir: pathlib.Path, directory: pathlib.Path) -> Tuple[
+    pathlib.Path,
+    bool,
+    List[Tuple[Optional[FileMetadata], Optional[str]]],
+    List[pathlib.Path],
+    List[str],
+]:
+    """
+    Scans the direct children of a directory that's known to be within `required_parent_dir`.
+
+    :param required_parent_dir:
+    :param directory:
+    :return: A tuple containing:
+        - The scanned directory.
+        - Whether the directory has any children, including those (e.g., symbolic links to
+          non-empty directories) that aren't returned.
+        - The (file, empty_directory) tuple of each non-directory child, and each symbolic link
+          to an empty directory.
+        - The child directories, excluding symbolic links.
+        - An error message for each child (or the directory itself) that couldn't be processed.
+    """
+    entries: List[Tuple[Optional[FileMetadata], Optional[str]]] = []
+    sub_directories: List[pathlib.Path] = []
+    error_messages: List[str] = []
+    has_children = False
+
+    try:
+        with os.scandir(directory) as dir_iterator:
+            for dir_entry in dir_iterator:
+                has_children = True
+                entry_path = pathlib.Path(dir_entry.path)
+                try:
+                    if dir_entry.is_symlink():
+                        # The link may point outside the parent dir, so fully validate it.
+                        file, empty_directory = validate_path_and_get_info(
+                            required_parent_dir, entry_path
+                        )
+                        if file is not None or empty_directory is not None:
+                            entries.append((file, empty_directory))
+                    elif dir_entry.is_dir(follow_symlinks=False):
+                        sub_directories.append(entry_path)
+                    else:
+                        file = get_file_metadata(entry_path, dir_entry.stat(follow_symlinks=False))
+                        entries.append((file, None))
+                except FileNotFoundError:
+                    error_messages.append(f'"{entry_path}" does not exist.')
+                except ValueError as ex:
+                    error_messages.append(str(ex))
+                except OSError as ex:
+                    error_messages.append(f'Failed to read "{entry_path}": {ex}')
+    except OSError as ex:
+        error_messages.append(f'Failed to read directory "{directory}": {ex}')
+
+    return directory, has_children, entries, sub_directories, error_messages
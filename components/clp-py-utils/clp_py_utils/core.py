@@ -1,24 +1,45 @@
 import pathlib
+from typing import Final, Optional, Tuple
 
 import yaml
 from yaml.parser import ParserError
 
+GZIP_FILE_EXTENSIONS: Final[Tuple[str, ...]] = (".gz", ".gzip", ".tgz", ".tar.gz")
+ZSTD_FILE_EXTENSIONS: Final[Tuple[str, ...]] = (
+    ".zstd",
+    ".zstandard",
+    ".tar.zstd",
+    ".tar.zstandard",
+)
+
 
 class FileMetadata:
     __slots__ = ("path", "size", "estimated_uncompressed_size")
 
-    def __init__(self, path: pathlib.Path, size: int):
+    def __init__(
+        self,
+        path: pathlib.Path,
+        size: int,
+        estimated_uncompressed_size: Optional[int] = None,
+    ):
+        """
+        :param path:
+        :param size:
+        :param estimated_uncompressed_size: If None, the uncompressed size is guessed from the file
+            extension using a typical compression ratio.
+        """
         self.path = path
         self.size = size
+        if estimated_uncompressed_size is not None:
+            self.estimated_uncompressed_size = estimated_uncompressed_size
+            return
+
         self.estimated_uncompressed_size = size
 
         filename = path.name
-        if any(filename.endswith(extension) for extension in [".gz", ".gzip", ".tgz", ".tar.gz"]):
+        if filename.endswith(GZIP_FILE_EXTENSIONS):
             self.estimated_uncompressed_size *= 13
-        elif any(
-            filename.endswith(extension)
-            for extension in [".zstd", ".zstandard", ".tar.zstd", ".tar.zstandard"]
-        ):
+        elif filename.endswith(ZSTD_FILE_EXTENSIONS):
             self.estimated_uncompressed_size *= 8
 
 
@@ -13,8 +13,12 @@ from clp_py_utils.clp_config import (
     StorageEngine,
 )
 from clp_py_utils.clp_metadata_db_utils import (
+    create_archive_histograms_table,
+    create_archive_keys_tables,
     create_datasets_table,
     create_metadata_db_tables,
+    fetch_existing_datasets,
+    get_archives_table_name,
 )
 from clp_py_utils.core import read_yaml_config_file
 
@@ -63,6 +67,15 @@ def main(argv):
         ) as metadata_db_cursor:
             if StorageEngine.CLP_S == storage_engine:
                 create_datasets_table(metadata_db_cursor, table_prefix)
+                # Add the tables introduced since existing datasets were created
+                for dataset in fetch_existing_datasets(metadata_db_cursor, table_prefix):
+                    archives_table_name = get_archives_table_name(table_prefix, dataset)
+                    create_archive_histograms_table(
+                        metadata_db_cursor, table_prefix, dataset, archives_table_name
+                    )
+                    create_archive_keys_tables(
+                        metadata_db_cursor, table_prefix, dataset, archives_table_name
+                    )
             else:
                 create_metadata_db_tables(metadata_db_cursor, table_prefix)
             metadata_db.commit()
@@ -16,10 +16,15 @@ from sql_adapter import SQL_Adapter
 
 from clp_py_utils.clp_config import (
     CLPConfig,
+    COMPRESSION_FILE_GROUPS_TABLE_NAME,
     COMPRESSION_JOBS_TABLE_NAME,
+    COMPRESSION_TASK_CHECKPOINTS_TABLE_NAME,
     COMPRESSION_TASKS_TABLE_NAME,
+    INGESTION_MANIFEST_TABLE_NAME,
     QUERY_JOBS_TABLE_NAME,
     QUERY_TASKS_TABLE_NAME,
+    S3_INGESTION_HIGH_WATER_MARKS_TABLE_NAME,
+    S3_INGESTION_MANIFEST_TABLE_NAME,
 )
 from clp_py_utils.core import read_yaml_config_file
 
@@ -34,6 +39,33 @@ logging_console_handler.setFormatter(logging_formatter)
 logger.addHandler(logging_console_handler)
 
 
+def _add_column_if_missing(
+    db_cursor, table_name: str, column_name: str, column_definition: str
+) -> None:
+    """
+    Adds a column to an existing table unless the table already has it, so that tables created
+    before the column was introduced are migrated.
+
+    NOTE: This is done by checking `information_schema` since MySQL doesn't support
+    `ADD COLUMN IF NOT EXISTS`.
+    :param db_cursor:
+    :param table_name:
+    :param column_name:
+    :param column_definition: The column's type and attributes.
+    """
+    db_cursor.execute(
+        """
+        SELECT COUNT(*) AS num_columns
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+        """,
+        [table_name, column_name],
+    )
+    if 0 != db_cursor.fetchone()["num_columns"]:
+        return
+    db_cursor.execute(f"ALTER TABLE `{table_name}` ADD COLUMN `{column_name}` {column_definition}")
+
+
 def main(argv):
     args_parser = argparse.ArgumentParser(
         description="Sets up metadata tables for job orchestration."
@@ -69,10 +101,12 @@ def main(argv):
                     `update_time` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP(),
                     `duration` FLOAT NULL DEFAULT NULL,
                     `original_size` BIGINT NOT NULL DEFAULT '0',
+                    `duplicate_size` BIGINT NOT NULL DEFAULT '0',
                     `uncompressed_size` BIGINT NOT NULL DEFAULT '0',
                     `compressed_size` BIGINT NOT NULL DEFAULT '0',
                     `num_tasks` INT NOT NULL DEFAULT '0',
                     `num_tasks_completed` INT NOT NULL DEFAULT '0',
+                    `partition_size_imbalance` FLOAT NULL DEFAULT NULL,
                     `clp_binary_version` INT NULL DEFAULT NULL,
                     `clp_config` VARBINARY(60000) NOT NULL,
                     PRIMARY KEY (`id`) USING BTREE,
@@ -81,6 +115,19 @@ def main(argv):
                 ) ROW_FORMAT=DYNAMIC
                 """
             )
+            # Add the columns introduced since existing deployments created the table
+            _add_column_if_missing(
+                scheduling_db_cursor,
+                COMPRESSION_JOBS_TABLE_NAME,
+                "duplicate_size",
+                "BIGINT NOT NULL DEFAULT '0' AFTER `original_size`",
+            )
+            _add_column_if_missing(
+                scheduling_db_cursor,
+                COMPRESSION_JOBS_TABLE_NAME,
+                "partition_size_imbalance",
+                "FLOAT NULL DEFAULT NULL AFTER `num_tasks_completed`",
+            )
 
             scheduling_db_cursor.execute(
                 f"""
@@ -106,6 +153,97 @@ def main(argv):
                 """
             )
 
+            scheduling_db_cursor.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS `{COMPRESSION_TASK_CHECKPOINTS_TABLE_NAME}` (
+                    `task_id` BIGINT NOT NULL,
+                    `begin_file_ix` INT NOT NULL,
+                    `end_file_ix` INT NOT NULL,
+                    `archive_ids` JSON NOT NULL,
+                    `uncompressed_size` BIGINT NOT NULL,
+                    `compressed_size` BIGINT NOT NULL,
+                    `creation_time` DATETIME(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3),
+                    PRIMARY KEY (`task_id`, `begin_file_ix`),
+                    CONSTRAINT `{COMPRESSION_TASK_CHECKPOINTS_TABLE_NAME}` FOREIGN KEY (`task_id`)
+                    REFERENCES `{COMPRESSION_TASKS_TABLE_NAME}` (`id`)
+                    ON UPDATE NO ACTION ON DELETE CASCADE
+                ) ROW_FORMAT=DYNAMIC
+                """
+            )
+
+            scheduling_db_cursor.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS `{COMPRESSION_FILE_GROUPS_TABLE_NAME}` (
+                    `job_id` INT NOT NULL,
+                    `path_template` VARCHAR(255) NOT NULL,
+                    `content_signature` VARCHAR(64) NOT NULL DEFAULT '',
+                    `num_files` BIGINT NOT NULL,
+                    `original_size` BIGINT NOT NULL,
+                    `uncompressed_size` BIGINT NULL DEFAULT NULL,
+                    `compressed_size` BIGINT NULL DEFAULT NULL,
+                    `duration` FLOAT NULL DEFAULT NULL,
+                    PRIMARY KEY (`job_id`, `path_template`, `content_signature`),
+                    CONSTRAINT `{COMPRESSION_FILE_GROUPS_TABLE_NAME}` FOREIGN KEY (`job_id`)
+                    REFERENCES `{COMPRESSION_JOBS_TABLE_NAME}` (`id`)
+                    ON UPDATE NO ACTION ON DELETE NO ACTION
+                ) ROW_FORMAT=DYNAMIC
+                """
+            )
+
+            scheduling_db_cursor.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS `{INGESTION_MANIFEST_TABLE_NAME}` (
+                    `ingestion_job_id` INT NOT NULL,
+                    `path_hash` BINARY(32) NOT NULL,
+                    `path` TEXT NOT NULL,
+                    `size` BIGINT NOT NULL,
+                    `mtime` DOUBLE NOT NULL,
+                    `inode` BIGINT UNSIGNED NOT NULL,
+                    `compressed_offset` BIGINT NOT NULL,
+                    `submitted_offset` BIGINT NOT NULL,
+                    `pending_job_id` INT NULL DEFAULT NULL,
+                    PRIMARY KEY (`ingestion_job_id`, `path_hash`),
+                    INDEX `pending_job_id` (`pending_job_id`) USING BTREE,
+                    CONSTRAINT `{INGESTION_MANIFEST_TABLE_NAME}` FOREIGN KEY (`ingestion_job_id`)
+                    REFERENCES `{COMPRESSION_JOBS_TABLE_NAME}` (`id`)
+                    ON UPDATE NO ACTION ON DELETE CASCADE
+                ) ROW_FORMAT=DYNAMIC
+                """
+            )
+
+            scheduling_db_cursor.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS `{S3_INGESTION_MANIFEST_TABLE_NAME}` (
+                    `ingestion_job_id` INT NOT NULL,
+                    `key_hash` BINARY(32) NOT NULL,
+                    `key` VARCHAR(1024) NOT NULL,
+                    `etag` VARCHAR(128) NOT NULL,
+                    `size` BIGINT NOT NULL,
+                    `is_compressed` BOOLEAN NOT NULL DEFAULT FALSE,
+                    `pending_job_id` INT NULL DEFAULT NULL,
+                    PRIMARY KEY (`ingestion_job_id`, `key_hash`),
+                    INDEX `pending_job_id` (`pending_job_id`) USING BTREE,
+                    CONSTRAINT `{S3_INGESTION_MANIFEST_TABLE_NAME}` FOREIGN KEY (`ingestion_job_id`)
+                    REFERENCES `{COMPRESSION_JOBS_TABLE_NAME}` (`id`)
+                    ON UPDATE NO ACTION ON DELETE CASCADE
+                ) ROW_FORMAT=DYNAMIC
+                """
+            )
+
+            scheduling_db_cursor.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS `{S3_INGESTION_HIGH_WATER_MARKS_TABLE_NAME}` (
+                    `ingestion_job_id` INT NOT NULL,
+                    `high_water_mark` VARCHAR(1024) NOT NULL,
+                    PRIMARY KEY (`ingestion_job_id`),
+                    CONSTRAINT `{S3_INGESTION_HIGH_WATER_MARKS_TABLE_NAME}`
+                    FOREIGN KEY (`ingestion_job_id`)
+                    REFERENCES `{COMPRESSION_JOBS_TABLE_NAME}` (`id`)
+                    ON UPDATE NO ACTION ON DELETE CASCADE
+                ) ROW_FORMAT=DYNAMIC
+                """
+            )
+
             scheduling_db_cursor.execute(
                 f"""
                 CREATE TABLE IF NOT EXISTS `{QUERY_JOBS_TABLE_NAME}` (
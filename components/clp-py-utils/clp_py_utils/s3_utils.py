@@ -1,10 +1,27 @@
+import bisect
 import os
+import queue
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Final, Generator, List, Optional, Set, Tuple, Union
+from typing import (
+    Any,
+    Dict,
+    Final,
+    Generator,
+    Iterable,
+    List,
+    NoReturn,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 import boto3
 import botocore
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
 from job_orchestration.scheduler.job_config import S3InputConfig
 
@@ -34,6 +51,22 @@ AWS_ENV_VAR_SECRET_ACCESS_KEY: Final[str] = "AWS_SECRET_ACCESS_KEY"
 AWS_ENV_VAR_SESSION_TOKEN: Final[str] = "AWS_SESSION_TOKEN"
 
 S3_OBJECT_DELETION_BATCH_SIZE_MAX: Final[int] = 1000
+S3_OBJECT_SIZE_MAX: Final[int] = 5 * 1024 * 1024 * 1024 * 1024
+S3_MULTIPART_UPLOAD_PART_SIZE_DEFAULT: Final[int] = 64 * 1024 * 1024
+S3_MULTIPART_UPLOAD_CONCURRENCY_DEFAULT: Final[int] = 8
+S3_CLIENT_MAX_POOL_CONNECTIONS_DEFAULT: Final[int] = 32
+S3_LISTING_CONCURRENCY_DEFAULT: Final[int] = 16
+S3_LISTING_PAGE_SIZE_MAX: Final[int] = 1000
+# Maximum number of prefix levels to descend into when splitting a prefix into shards to list.
+S3_LISTING_SHARD_DISCOVERY_DEPTH_MAX: Final[int] = 3
+S3_KEY_DELIMITER: Final[str] = "/"
+
+# Process-wide cache of S3 clients. Clients are thread-safe and expensive to create (each one reloads
+# credentials and endpoint data, and owns its own HTTP connection pool), so they're shared across
+# all callers and threads.
+_S3ClientCacheKey = Tuple[str, str, Optional[str], Optional[Tuple[str, str, Optional[str]]], int]
+_s3_clients: Dict[_S3ClientCacheKey, boto3.client] = {}
+_s3_clients_lock = threading.Lock()
 
 
 def _get_session_credentials(aws_profile: Optional[str] = None) -> Optional[S3Credentials]:
@@ -205,6 +238,54 @@ def _create_s3_client(
     return s3_client
 
 
+def _get_s3_client(
+    region_code: str,
+    s3_auth: AwsAuthentication,
+    max_pool_connections: int = S3_CLIENT_MAX_POOL_CONNECTIONS_DEFAULT,
+) -> boto3.client:
+    """
+    Gets a shared S3 client for the given region and authentication method, creating and caching it
+    if it doesn't exist yet.
+
+    NOTE: Clients whose credentials can expire (e.g., those from an assumed-role profile or an EC2
+    instance role) are backed by botocore's refreshable credentials, so cached clients transparently
+    refresh their credentials before they expire.
+
+    :param region_code:
+    :param s3_auth:
+    :param max_pool_connections: The maximum number of HTTP connections the client keeps in its
+    connection pool. This should be at least the number of threads concurrently using the client.
+    :return: The S3 client.
+    :raise: Propagates `_create_s3_client`'s exceptions.
+    """
+    credentials_key: Optional[Tuple[str, str, Optional[str]]] = None
+    if s3_auth.credentials is not None:
+        credentials = s3_auth.credentials
+        credentials_key = (
+            credentials.access_key_id,
+            credentials.secret_access_key,
+            credentials.session_token,
+        )
+    cache_key = (
+        region_code,
+        str(s3_auth.type),
+        s3_auth.profile,
+        credentials_key,
+        max_pool_connections,
+    )
+
+    with _s3_clients_lock:
+        s3_client = _s3_clients.get(cache_key)
+        if s3_client is None:
+            boto3_config = Config(
+                retries=dict(total_max_attempts=3, mode="adaptive"),
+                max_pool_connections=max_pool_connections,
+            )
+            s3_client = _create_s3_client(region_code, s3_auth, boto3_config)
+            _s3_clients[cache_key] = s3_client
+    return s3_client
+
+
 def parse_s3_url(s3_url: str) -> Tuple[str, str, str]:
     """
     Parses the region_code, bucket, and key_prefix from the given S3 URL.
@@ -262,51 +343,131 @@ def s3_get_object_metadata(s3_input_config: S3InputConfig) -> List[FileMetadata]
 
     :param s3_input_config:
     :return: A list of `FileMetadata` containing the object's metadata on success.
-    :raise: Propagates `_create_s3_client`'s exceptions.
-    :raise: Propagates `_s3_get_object_metadata_from_single_prefix`'s exceptions.
+    :raise: Propagates `s3_iter_object_metadata`'s exceptions.
+    """
+    return list(s3_iter_object_metadata(s3_input_config))
+
+
+def s3_iter_object_metadata(
+    s3_input_config: S3InputConfig, max_concurrency: int = S3_LISTING_CONCURRENCY_DEFAULT
+) -> Generator[FileMetadata, None, None]:
+    """
+    Iterates over the metadata of all objects specified by the given input config.
+
+    If the input config doesn't specify any keys, the key prefix is split into sub-prefixes (shards)
+    using `S3_KEY_DELIMITER`, and the shards are listed concurrently. Objects are yielded as soon as
+    the listing page containing them arrives, so they aren't yielded in lexicographical order.
+
+    NOTE: We reuse FileMetadata to store the metadata of S3 objects where the object's key is stored
+    as `path` in FileMetadata.
+
+    :param s3_input_config:
+    :param max_concurrency: The maximum number of listing or `HeadObject` requests to issue
+        concurrently.
+    :yield: A `FileMetadata` containing the next object's metadata.
+    :raise: Propagates `_get_s3_client`'s exceptions.
+    :raise: Propagates `_iter_s3_objects_sharded`'s exceptions.
     :raise: Propagates `_s3_get_object_metadata_from_keys`'s exceptions.
     """
-    s3_client = _create_s3_client(s3_input_config.region_code, s3_input_config.aws_authentication)
+    s3_client = _get_s3_client(
+        s3_input_config.region_code,
+        s3_input_config.aws_authentication,
+        max(max_concurrency, S3_CLIENT_MAX_POOL_CONNECTIONS_DEFAULT),
+    )
 
     if s3_input_config.keys is None:
-        return _s3_get_object_metadata_from_single_prefix(
-            s3_client, s3_input_config.bucket, s3_input_config.key_prefix
-        )
-
-    return _s3_get_object_metadata_from_keys(
-        s3_client, s3_input_config.bucket, s3_input_config.key_prefix, s3_input_config.keys
+        for object_key, object_size in _iter_s3_objects_sharded(
+            s3_client, s3_input_config.bucket, s3_input_config.key_prefix, max_concurrency
+        ):
+            yield FileMetadata(Path(object_key), object_size)
+        return
+
+    yield from _s3_get_object_metadata_from_keys(
+        s3_client,
+        s3_input_config.bucket,
+        s3_input_config.key_prefix,
+        s3_input_config.keys,
+        max_concurrency,
     )
 
 
-def s3_put(s3_config: S3Config, src_file: Path, dest_path: str) -> None:
+def s3_iter_objects_after(
+    s3_input_config: S3InputConfig, start_after: Optional[str] = None
+) -> Generator[Tuple[str, int, str], None, None]:
+    """
+    Iterates over the objects under the input config's key prefix in lexicographical order of their
+    keys, optionally starting after a given key. Unlike `s3_iter_object_metadata`, the prefix isn't
+    listed in shards, so that the listing can resume from any key.
+
+    NOTE: Any object key that resolves to a directory-like path (i.e., ends with `/`) will be
+    skipped.
+
+    :param s3_input_config:
+    :param start_after: Optional key to start listing after.
+    :yield: The next object, presented as a tuple of the object's key, size, and ETag.
+    :raise: Propagates `_get_s3_client`'s exceptions.
+    :raise: Propagates `boto3.client.get_paginator`'s exceptions.
+    :raise: Propagates `boto3.paginator`'s exceptions.
+    """
+    s3_client = _get_s3_client(s3_input_config.region_code, s3_input_config.aws_authentication)
+    paginator = s3_client.get_paginator("list_objects_v2")
+    paginator_args = {"Bucket": s3_input_config.bucket, "Prefix": s3_input_config.key_prefix}
+    if start_after is not None:
+        paginator_args["StartAfter"] = start_after
+    for page in paginator.paginate(**paginator_args):
+        for obj in page.get("Contents", []):
+            object_key = obj["Key"]
+            if object_key.endswith("/"):
+                continue
+            yield object_key, obj["Size"], obj["ETag"].strip('"')
+
+
+def s3_put(
+    s3_config: S3Config,
+    src_file: Path,
+    dest_path: str,
+    part_size: int = S3_MULTIPART_UPLOAD_PART_SIZE_DEFAULT,
+    max_concurrency: int = S3_MULTIPART_UPLOAD_CONCURRENCY_DEFAULT,
+    max_pool_connections: int = S3_CLIENT_MAX_POOL_CONNECTIONS_DEFAULT,
+) -> None:
     """
-    Uploads a local file to an S3 bucket using AWS's PutObject operation.
+    Uploads a local file to an S3 bucket. Files larger than `part_size` are uploaded using a
+    multipart upload, with up to `max_concurrency` parts being transferred concurrently.
+
+    NOTE: If the file requires more parts than S3 allows for a single object, `part_size` is
+    increased accordingly.
 
     :param s3_config: S3 configuration specifying the upload destination and credentials.
     :param src_file: Local file to upload.
     :param dest_path: The destination path for the uploaded file in the S3 bucket, relative to
     `s3_config.key_prefix` (the file's S3 key will be `s3_config.key_prefix` + `dest_path`).
+    :param part_size: The size (in bytes) of each part of a multipart upload.
+    :param max_concurrency: The maximum number of parts to upload concurrently.
+    :param max_pool_connections: See `_get_s3_client`.
     :raises: ValueError if `src_file` doesn't exist, doesn't resolve to a file or is larger than the
-    S3 PutObject limit.
-    :raises: Propagates `boto3.client`'s exceptions.
-    :raises: Propagates `boto3.client.put_object`'s exceptions.
+    S3 object size limit.
+    :raises: Propagates `_get_s3_client`'s exceptions.
+    :raises: Propagates `boto3.client.upload_file`'s exceptions.
     """
     if not src_file.exists():
         raise ValueError(f"{src_file} doesn't exist")
     if not src_file.is_file():
         raise ValueError(f"{src_file} is not a file")
-    if src_file.stat().st_size > 5 * 1024 * 1024 * 1024:
-        raise ValueError(
-            f"{src_file} is larger than the limit (5GiB) for a single PutObject operation."
-        )
-
-    boto3_config = Config(retries=dict(total_max_attempts=3, mode="adaptive"))
-    s3_client = _create_s3_client(s3_config.region_code, s3_config.aws_authentication, boto3_config)
-
-    with open(src_file, "rb") as file_data:
-        s3_client.put_object(
-            Bucket=s3_config.bucket, Body=file_data, Key=s3_config.key_prefix + dest_path
-        )
+    if src_file.stat().st_size > S3_OBJECT_SIZE_MAX:
+        raise ValueError(f"{src_file} is larger than the limit (5TiB) for a single S3 object.")
+
+    transfer_config = TransferConfig(
+        multipart_threshold=part_size,
+        multipart_chunksize=part_size,
+        max_concurrency=max_concurrency,
+        use_threads=max_concurrency > 1,
+    )
+    s3_client = _get_s3_client(
+        s3_config.region_code, s3_config.aws_authentication, max_pool_connections
+    )
+    s3_client.upload_file(
+        str(src_file), s3_config.bucket, s3_config.key_prefix + dest_path, Config=transfer_config
+    )
 
 
 def s3_delete_by_key_prefix(
@@ -330,8 +491,7 @@ def s3_delete_by_key_prefix(
     if not bool(key_prefix):
         raise ValueError("Key prefix is not specified")
 
-    boto3_config = Config(retries=dict(total_max_attempts=3, mode="adaptive"))
-    s3_client = _create_s3_client(region_code, s3_auth, boto3_config)
+    s3_client = _get_s3_client(region_code, s3_auth)
 
     paginator = s3_client.get_paginator("list_objects_v2")
     for page in paginator.paginate(
@@ -358,11 +518,10 @@ def s3_delete_objects(s3_config: S3Config, object_keys: Set[str]) -> None:
 
     :param s3_config: The S3 config specifying the credentials and the bucket to perform deletion.
     :param object_keys: The set of object keys to delete, relative to `s3_config.key_prefix`.
-    :raises: Propagates `boto3.client`'s exceptions.
+    :raises: Propagates `_get_s3_client`'s exceptions.
     :raises: Propagates `boto3.client.delete_object`'s exceptions.
     """
-    boto3_config = Config(retries=dict(total_max_attempts=3, mode="adaptive"))
-    s3_client = _create_s3_client(s3_config.region_code, s3_config.aws_authentication, boto3_config)
+    s3_client = _get_s3_client(s3_config.region_code, s3_config.aws_authentication)
 
     def _gen_deletion_config(objects_list: List[str]):
         return {"Objects": [{"Key": object_to_delete} for object_to_delete in objects_list]}
@@ -386,35 +545,30 @@ def s3_delete_objects(s3_config: S3Config, object_keys: Set[str]) -> None:
         )
 
 
-def _s3_get_object_metadata_from_single_prefix(
-    s3_client: boto3.client, bucket: str, key_prefix: str
-) -> List[FileMetadata]:
-    """
-    Gets the metadata of all objects under the <`bucket`>/<`key_prefix`>.
-
-    :param s3_client:
-    :param bucket:
-    :param key_prefix:
-    :return: A list of `FileMetadata` containing the object's metadata on success.
-    :raise: Propagates `_iter_s3_objects`'s exceptions.
-    """
-    file_metadata_list: List[FileMetadata] = list()
-    for object_key, object_size in _iter_s3_objects(s3_client, bucket, key_prefix):
-        file_metadata_list.append(FileMetadata(Path(object_key), object_size))
-
-    return file_metadata_list
-
-
 def _s3_get_object_metadata_from_keys(
-    s3_client: boto3.client, bucket: str, key_prefix: str, keys: List[str]
+    s3_client: boto3.client,
+    bucket: str,
+    key_prefix: str,
+    keys: List[str],
+    max_concurrency: int = S3_LISTING_CONCURRENCY_DEFAULT,
 ) -> List[FileMetadata]:
     """
     Gets the metadata of all objects specified in `keys` under the <`bucket`>.
 
+    The keys are resolved using whichever of the following strategies is expected to be cheaper:
+    - Listing all objects between the first and last key and matching them against `keys`, which is
+      efficient when the keys are densely packed within the listing range.
+    - Issuing a `HeadObject` request per key, with up to `max_concurrency` requests in flight, which
+      is efficient when the keys are sparse (e.g., a few keys scattered across a large prefix).
+
+    To choose a strategy, we list a single page after the first key and use the fraction of listed
+    objects that were requested as an estimate of the keys' density in the rest of the range.
+
     :param s3_client:
     :param bucket:
     :param key_prefix:
     :param keys:
+    :param max_concurrency: The maximum number of `HeadObject` requests to issue concurrently.
     :return: A list of `FileMetadata` containing the object's metadata on success.
     :raise: ValueError if `keys` is an empty list.
     :raise: ValueError if any key in `keys` doesn't start with `key_prefix`.
@@ -422,7 +576,9 @@ def _s3_get_object_metadata_from_keys(
     :raise: ValueError if any key in `keys` ends with `/`.
     :raise: ValueError if any key in `keys` doesn't exist in the bucket.
     :raise: Propagates `_s3_get_object_metadata_from_key`'s exceptions.
+    :raise: Propagates `_s3_get_object_metadata_from_keys_concurrently`'s exceptions.
     :raise: Propagates `_iter_s3_objects`'s exceptions.
+    :raise: Propagates `boto3.client.list_objects_v2`'s exceptions.
     """
     # Key validation
     if len(keys) == 0:
@@ -437,16 +593,76 @@ def _s3_get_object_metadata_from_keys(
         if key.endswith("/"):
             raise ValueError(f"Key `{key}` is invalid: S3 object keys must not end with `/`.")
 
-    key_iterator = iter(keys)
-    first_key = next(key_iterator)
+    first_key = keys[0]
     file_metadata_list: List[FileMetadata] = []
     file_metadata_list.append(_s3_get_object_metadata_from_key(s3_client, bucket, first_key))
+    if len(keys) == 1:
+        return file_metadata_list
+
+    # Every key shares the keys' common prefix, so there's no need to list anything outside it.
+    listing_prefix = os.path.commonprefix(keys)
+
+    # Probe the density of the keys by listing a single page.
+    probe_page = s3_client.list_objects_v2(
+        Bucket=bucket, Prefix=listing_prefix, StartAfter=first_key
+    )
+    probe_page_contents = probe_page.get("Contents", [])
+    remaining_keys = keys[1:]
+    if probe_page.get("IsTruncated", False) and len(probe_page_contents) > 0:
+        last_listed_key = probe_page_contents[-1]["Key"]
+        num_probed_keys = bisect.bisect_right(remaining_keys, last_listed_key)
+    else:
+        last_listed_key = None
+        num_probed_keys = len(remaining_keys)
+
+    file_metadata_list.extend(
+        _match_s3_objects_to_keys(
+            _iter_s3_objects_in_page(probe_page), remaining_keys[:num_probed_keys], bucket
+        )
+    )
+    remaining_keys = remaining_keys[num_probed_keys:]
+    if len(remaining_keys) == 0:
+        return file_metadata_list
+
+    # Listing the rest of the range takes roughly `len(remaining_keys) / (density * page_size)`
+    # sequential requests, whereas `HeadObject` requests take `len(remaining_keys) /
+    # max_concurrency` rounds.
+    if num_probed_keys * S3_LISTING_PAGE_SIZE_MAX >= max_concurrency * len(probe_page_contents):
+        file_metadata_list.extend(
+            _match_s3_objects_to_keys(
+                _iter_s3_objects(s3_client, bucket, listing_prefix, last_listed_key),
+                remaining_keys,
+                bucket,
+            )
+        )
+    else:
+        file_metadata_list.extend(
+            _s3_get_object_metadata_from_keys_concurrently(
+                s3_client, bucket, remaining_keys, max_concurrency
+            )
+        )
+    return file_metadata_list
+
 
+def _match_s3_objects_to_keys(
+    objects: Iterable[Tuple[str, int]], keys: List[str], bucket: str
+) -> List[FileMetadata]:
+    """
+    Matches the given keys against a lexicographically ordered sequence of listed objects.
+
+    :param objects: The listed objects, presented as tuples of the object's key and size.
+    :param keys: The sorted keys to match.
+    :param bucket:
+    :return: A list of `FileMetadata` containing the metadata of each object in `keys`.
+    :raise: ValueError if any key in `keys` doesn't exist in `objects`.
+    """
+    file_metadata_list: List[FileMetadata] = []
+    key_iterator = iter(keys)
     next_key = next(key_iterator, None)
     if next_key is None:
         return file_metadata_list
 
-    for object_key, object_size in _iter_s3_objects(s3_client, bucket, key_prefix, first_key):
+    for object_key, object_size in objects:
         # We need to do both < and > checks since they are handled differently. Ideally, we can do
         # it with a single comparison. However, Python doesn't support three-way comparison.
         if object_key < next_key:
@@ -465,6 +681,39 @@ def _s3_get_object_metadata_from_keys(
     while next_key is not None:
         absent_keys.append(next_key)
         next_key = next(key_iterator, None)
+    _raise_absent_keys_error(absent_keys, bucket)
+
+
+def _s3_get_object_metadata_from_keys_concurrently(
+    s3_client: boto3.client, bucket: str, keys: List[str], max_concurrency: int
+) -> List[FileMetadata]:
+    """
+    Gets the metadata of all objects specified in `keys` under the <`bucket`> by issuing
+    `HeadObject` requests concurrently.
+
+    :param s3_client:
+    :param bucket:
+    :param keys:
+    :param max_concurrency: The maximum number of requests to issue concurrently.
+    :return: A list of `FileMetadata` containing the metadata of each object, in the same order as
+    `keys`.
+    :raise: ValueError if any key in `keys` doesn't exist in the bucket.
+    :raise: Propagates `_try_get_s3_object_metadata_from_key`'s exceptions.
+    """
+
+    def get_metadata(key: str) -> Optional[FileMetadata]:
+        return _try_get_s3_object_metadata_from_key(s3_client, bucket, key)
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        results = list(executor.map(get_metadata, keys))
+
+    absent_keys = [key for key, file_metadata in zip(keys, results) if file_metadata is None]
+    if len(absent_keys) > 0:
+        _raise_absent_keys_error(absent_keys, bucket)
+    return results
+
+
+def _raise_absent_keys_error(absent_keys: List[str], bucket: str) -> NoReturn:
     serialized_absent_keys = "\n".join(absent_keys)
     raise ValueError(
         f"Cannot find following keys in the bucket `{bucket}`:\n{serialized_absent_keys}"
@@ -495,6 +744,31 @@ def _s3_get_object_metadata_from_key(
         ) from e
 
 
+def _try_get_s3_object_metadata_from_key(
+    s3_client: boto3.client, bucket: str, key: str
+) -> Optional[FileMetadata]:
+    """
+    Gets the metadata of an object specified by the `key` under the <`bucket`>, if it exists.
+
+    :param s3_client:
+    :param bucket:
+    :param key:
+    :return: A `FileMetadata` containing the object's metadata, or None if the object doesn't exist.
+    :raise: ValueError if the metadata can't be read for any other reason.
+    """
+    try:
+        return FileMetadata(
+            Path(key), s3_client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+        )
+    except botocore.exceptions.ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+            return None
+        raise ValueError(
+            f"Failed to read metadata of the key `{key}` from the bucket `{bucket}`"
+            f" with the error: {e}."
+        ) from e
+
+
 def _iter_s3_objects(
     s3_client: boto3.client, bucket: str, key_prefix: str, start_from: str | None = None
 ) -> Generator[Tuple[str, int], None, None]:
@@ -521,13 +795,149 @@ def _iter_s3_objects(
         paginator_args["StartAfter"] = start_from
     pages = paginator.paginate(**paginator_args)
     for page in pages:
-        contents = page.get("Contents", None)
-        if contents is None:
-            continue
-        for obj in contents:
-            object_key = obj["Key"]
-            if object_key.endswith("/"):
-                # Skip any object that resolves to a directory-like path
+        yield from _iter_s3_objects_in_page(page)
+
+
+def _iter_s3_objects_sharded(
+    s3_client: boto3.client, bucket: str, key_prefix: str, max_concurrency: int
+) -> Generator[Tuple[str, int], None, None]:
+    """
+    Iterates over objects in an S3 bucket under the specified prefix by splitting the prefix into
+    shards and listing the shards concurrently.
+
+    To discover shards, the prefix is listed level by level (using `S3_KEY_DELIMITER`) until there
+    are at least `max_concurrency` sub-prefixes or `S3_LISTING_SHARD_DISCOVERY_DEPTH_MAX` levels have
+    been listed. Objects found directly under a listed level are yielded during discovery.
+
+    NOTE: Any object key that resolves to a directory-like path (i.e., ends with `/`) will be
+    skipped.
+
+    :param s3_client:
+    :param bucket:
+    :param key_prefix:
+    :param max_concurrency:
+    :yield: The next object, presented as a tuple of the object's key and size.
+    :raise: Propagates `_iter_s3_objects`'s exceptions.
+    :raise: Propagates `_iter_s3_objects_at_level`'s exceptions.
+    :raise: Propagates `_iter_s3_objects_concurrently`'s exceptions.
+    """
+    if max_concurrency <= 1:
+        yield from _iter_s3_objects(s3_client, bucket, key_prefix)
+        return
+
+    shard_prefixes = [key_prefix]
+    for _ in range(S3_LISTING_SHARD_DISCOVERY_DEPTH_MAX):
+        if len(shard_prefixes) >= max_concurrency:
+            break
+
+        sub_prefixes: List[str] = []
+        for prefix in shard_prefixes:
+            yield from _iter_s3_objects_at_level(s3_client, bucket, prefix, sub_prefixes)
+        shard_prefixes = sub_prefixes
+        if len(shard_prefixes) == 0:
+            return
+
+    yield from _iter_s3_objects_concurrently(s3_client, bucket, shard_prefixes, max_concurrency)
+
+
+def _iter_s3_objects_at_level(
+    s3_client: boto3.client, bucket: str, key_prefix: str, sub_prefixes: List[str]
+) -> Generator[Tuple[str, int], None, None]:
+    """
+    Iterates over objects directly under the specified prefix (i.e., objects whose key doesn't
+    contain `S3_KEY_DELIMITER` after the prefix), and collects the sub-prefixes that group the
+    remaining objects.
+
+    :param s3_client:
+    :param bucket:
+    :param key_prefix:
+    :param sub_prefixes: Returns the sub-prefixes under `key_prefix`.
+    :yield: The next object, presented as a tuple of the object's key and size.
+    :raise: Propagates `boto3.client.get_paginator`'s exceptions.
+    :raise: Propagates `boto3.paginator`'s exceptions.
+    """
+    paginator = s3_client.get_paginator("list_objects_v2")
+    pages = paginator.paginate(Bucket=bucket, Prefix=key_prefix, Delimiter=S3_KEY_DELIMITER)
+    for page in pages:
+        for common_prefix in page.get("CommonPrefixes", []):
+            sub_prefixes.append(common_prefix["Prefix"])
+        yield from _iter_s3_objects_in_page(page)
+
+
+def _iter_s3_objects_concurrently(
+    s3_client: boto3.client, bucket: str, key_prefixes: List[str], max_concurrency: int
+) -> Generator[Tuple[str, int], None, None]:
+    """
+    Lists all objects under each of the given (non-overlapping) prefixes on a thread pool, yielding
+    objects as soon as the listing page containing them arrives.
+
+    If the caller stops iterating early, any outstanding listings are cancelled.
+
+    :param s3_client:
+    :param bucket:
+    :param key_prefixes:
+    :param max_concurrency:
+    :yield: The next object, presented as a tuple of the object's key and size.
+    :raise: Propagates `boto3.client.get_paginator`'s exceptions.
+    :raise: Propagates `boto3.paginator`'s exceptions.
+    """
+    # Bound the number of buffered pages so that listing can't outpace the consumer indefinitely.
+    pages: queue.Queue = queue.Queue(maxsize=2 * max_concurrency)
+    stop_listing = threading.Event()
+
+    def put(item: Any) -> bool:
+        while not stop_listing.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
                 continue
-            object_size = obj["Size"]
-            yield object_key, object_size
+        return False
+
+    def list_prefix(prefix: str) -> None:
+        try:
+            paginator = s3_client.get_paginator("list_objects_v2")
+            for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+                if not put(list(_iter_s3_objects_in_page(page))):
+                    return
+        except Exception as e:
+            put(e)
+        finally:
+            put(None)
+
+    num_shards_remaining = len(key_prefixes)
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        try:
+            for prefix in key_prefixes:
+                executor.submit(list_prefix, prefix)
+
+            while num_shards_remaining > 0:
+                item = pages.get()
+                if item is None:
+                    num_shards_remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield from item
+        finally:
+            stop_listing.set()
+
+
+def _iter_s3_objects_in_page(page: Dict[str, Any]) -> Generator[Tuple[str, int], None, None]:
+    """
+    Iterates over the objects in a page returned by `list_objects_v2`, skipping any object key that
+    resolves to a directory-like path (i.e., ends with `/`).
+
+    :param page:
+    :yield: The next object, presented as a tuple of the object's key and size.
+    """
+    contents = page.get("Contents", None)
+    if contents is None:
+        return
+    for obj in contents:
+        object_key = obj["Key"]
+        if object_key.endswith("/"):
+            # Skip any object that resolves to a directory-like path
+            continue
+        object_size = obj["Size"]
+        yield object_key, object_size
@@ -0,0 +1 @@
+"""Tests for CLP's Python utilities."""
@@ -0,0 +1,423 @@
+"""Tests for the compression utilities."""
+
+import gzip
+import io
+import pathlib
+import random
+import zlib
+from typing import Any, Dict, List, Optional
+
+import pytest
+from clp_py_utils.compression import (
+    _estimate_gzip_uncompressed_size,
+    _estimate_zstd_uncompressed_size,
+    estimate_time_range,
+    FilesPartition,
+    get_file_metadata,
+    GZIP_COMPRESSION_RATIO_SAMPLE_SIZE,
+    pack_file_groups_into_partitions,
+)
+from clp_py_utils.core import FileMetadata
+
+TARGET_PARTITION_SIZE = 1000
+
+
+def _make_groups(group_file_sizes: List[List[int]]) -> List[Dict[str, Any]]:
+    """
+    :param group_file_sizes: The sizes of the files in each group.
+    :return: The groups, in the form returned by `group_files_by_similar_filenames`.
+    """
+    return [
+        {
+            "id": group_id,
+            "files": [
+                FileMetadata(pathlib.Path(f"/logs/group-{group_id}/{file_ix}.log"), file_size)
+                for file_ix, file_size in enumerate(file_sizes)
+            ],
+        }
+        for group_id, file_sizes in enumerate(group_file_sizes)
+    ]
+
+
+def _make_random_group_file_sizes(seed: int) -> List[List[int]]:
+    """
+    :param seed:
+    :return: The sizes of the files in a few groups, mixing small, medium, and (relative to the
+        target partition size) huge files.
+    """
+    rng = random.Random(seed)
+    group_file_sizes = []
+    for _ in range(rng.randint(1, 6)):
+        file_sizes = []
+        for _ in range(rng.randint(1, 20)):
+            max_file_size = rng.choice([50, 400, 3 * TARGET_PARTITION_SIZE])
+            file_sizes.append(rng.randint(1, max_file_size))
+        group_file_sizes.append(file_sizes)
+    return group_file_sizes
+
+
+def _pop_partitions(partitions: List[FilesPartition]) -> List[Dict[str, Any]]:
+    popped_partitions = []
+    for partition in partitions:
+        files, _, group_ids, _, total_file_size = partition.pop_files()
+        popped_partitions.append(
+            {"files": files, "group_ids": group_ids, "total_file_size": total_file_size}
+        )
+    return popped_partitions
+
+
+def _assert_files_packed_once(
+    group_file_sizes: List[List[int]], partitions: List[Dict[str, Any]]
+) -> None:
+    packed_files = sorted(
+        (group_id, str(file.path))
+        for partition in partitions
+        for file, group_id in zip(partition["files"], partition["group_ids"])
+    )
+    expected_files = sorted(
+        (group["id"], str(file.path))
+        for group in _make_groups(group_file_sizes)
+        for file in group["files"]
+    )
+    assert packed_files == expected_files
+    assert all(len(partition["files"]) > 0 for partition in partitions)
+
+
+class TestPackFileGroupsIntoPartitions:
+    """Tests for packing groups of files into partitions of roughly equal size."""
+
+    @pytest.mark.parametrize("seed", range(200))
+    def test_oversized_partitions_are_at_least_target_size(self, seed: int) -> None:
+        """Without a flush, every partition is at least the target size."""
+        group_file_sizes = _make_random_group_file_sizes(seed)
+        if sum(map(sum, group_file_sizes)) < TARGET_PARTITION_SIZE:
+            group_file_sizes.append([TARGET_PARTITION_SIZE])
+
+        partitions = _pop_partitions(
+            pack_file_groups_into_partitions(
+                _make_groups(group_file_sizes), TARGET_PARTITION_SIZE, True
+            )
+        )
+
+        _assert_files_packed_once(group_file_sizes, partitions)
+        for partition in partitions:
+            assert partition["total_file_size"] >= TARGET_PARTITION_SIZE
+
+    @pytest.mark.parametrize("seed", range(200))
+    def test_flushed_partitions_are_at_most_target_size(self, seed: int) -> None:
+        """With a flush, no partition is larger than the target unless it's a single huge file."""
+        group_file_sizes = _make_random_group_file_sizes(seed)
+
+        partitions = _pop_partitions(
+            pack_file_groups_into_partitions(
+                _make_groups(group_file_sizes), TARGET_PARTITION_SIZE, False
+            )
+        )
+
+        _assert_files_packed_once(group_file_sizes, partitions)
+        for partition in partitions:
+            if partition["total_file_size"] > TARGET_PARTITION_SIZE:
+                assert 1 == len(partition["files"])
+
+    def test_huge_file_gets_its_own_partition(self) -> None:
+        group_file_sizes = [[100] * 10, [5 * TARGET_PARTITION_SIZE]]
+
+        partitions = _pop_partitions(
+            pack_file_groups_into_partitions(
+                _make_groups(group_file_sizes), TARGET_PARTITION_SIZE, False
+            )
+        )
+
+        _assert_files_packed_once(group_file_sizes, partitions)
+        assert sorted(partition["total_file_size"] for partition in partitions) == [
+            TARGET_PARTITION_SIZE,
+            5 * TARGET_PARTITION_SIZE,
+        ]
+
+    def test_equal_files_are_balanced(self) -> None:
+        """Files of equal size are spread evenly."""
+        group_file_sizes = [[100] * 4 for _ in range(10)]
+
+        partitions = _pop_partitions(
+            pack_file_groups_into_partitions(
+                _make_groups(group_file_sizes), TARGET_PARTITION_SIZE, True
+            )
+        )
+
+        _assert_files_packed_once(group_file_sizes, partitions)
+        assert [partition["total_file_size"] for partition in partitions] == [1000] * 4
+
+    def test_small_input(self) -> None:
+        """A flushed input smaller than the target fits in one partition."""
+        group_file_sizes = [[10, 20], [30]]
+
+        partitions = _pop_partitions(
+            pack_file_groups_into_partitions(
+                _make_groups(group_file_sizes), TARGET_PARTITION_SIZE, False
+            )
+        )
+
+        _assert_files_packed_once(group_file_sizes, partitions)
+        assert 1 == len(partitions)
+
+    def test_no_files(self) -> None:
+        assert [] == pack_file_groups_into_partitions([], TARGET_PARTITION_SIZE, False)
+
+
+class TestEstimateTimeRange:
+    """Tests for estimating a file's time range from its path."""
+
+    @pytest.mark.parametrize(
+        "path, expected_time_range",
+        [
+            ("/logs/2024-01-31/app.log", (1706659200, 1706745600)),
+            ("/logs/20240131/app.log", (1706659200, 1706745600)),
+            ("/logs/2024-01-31-13/app.log", (1706706000, 1706709600)),
+            ("/logs/2024-01-31T13.log", (1706706000, 1706709600)),
+            ("/logs/2024-01-31/42.log", (1706659200, 1706745600)),
+            ("/logs/2023-12-01/2024-01-31/app.log", (1706659200, 1706745600)),
+            ("/logs/2024-13-01/app.log", None),
+            ("/logs/app.log", None),
+        ],
+    )
+    def test_date_in_path(self, path: str, expected_time_range) -> None:
+        """The last valid date (and hour, if any) in a path determines the range."""
+        assert estimate_time_range(pathlib.Path(path), False) == expected_time_range
+
+
+def _make_log_text(seed: int, num_lines: int) -> bytes:
+    rng = random.Random(seed)
+    return b"".join(
+        b"2024-01-31 13:%02d:%02d INFO request %d took %d ms\n"
+        % (rng.randint(0, 59), rng.randint(0, 59), rng.randint(0, 10**6), rng.randint(0, 999))
+        for _ in range(num_lines)
+    )
+
+
+# Log text whose gzip encoding extends well beyond the sample used to estimate its ratio
+_LOG_TEXT: bytes = _make_log_text(0, 100_000)
+
+
+def _estimate_gzip(data: bytes) -> Optional[int]:
+    return _estimate_gzip_uncompressed_size(io.BytesIO(data), len(data))
+
+
+def _estimate_zstd(data: bytes) -> Optional[int]:
+    return _estimate_zstd_uncompressed_size(io.BytesIO(data), len(data))
+
+
+class _SparseFile:
+    """A read-only file of the given size, containing the given head and tail with zeros between."""
+
+    def __init__(self, head: bytes, tail: bytes, size: int) -> None:
+        self.__head = head
+        self.__tail = tail
+        self.__size = size
+        self.__pos = 0
+
+    def seek(self, offset: int) -> None:
+        self.__pos = offset
+
+    def read(self, size: int) -> bytes:
+        begin = self.__pos
+        end = min(begin + size, self.__size)
+        data = bytearray(max(0, end - begin))
+        head = self.__head[begin:end]
+        data[: len(head)] = head
+        tail_begin = self.__size - len(self.__tail)
+        if max(begin, tail_begin) < end:
+            data[max(begin, tail_begin) - begin :] = self.__tail[
+                max(begin, tail_begin) - tail_begin :
+            ]
+        self.__pos = end
+        return bytes(data)
+
+
+def _make_zstd_frame(
+    content_size: int,
+    frame_content_size_field_size: int,
+    is_single_segment: bool = True,
+    dictionary_id_field_size: int = 0,
+) -> bytes:
+    """
+    Builds a zstd frame of `content_size` repetitions of a byte, using RLE blocks.
+
+    :param content_size:
+    :param frame_content_size_field_size: The size of the header's content size field (0 if it's
+        absent).
+    :param is_single_segment: Whether the header omits the window descriptor.
+    :param dictionary_id_field_size:
+    :return: The frame.
+    """
+    if is_single_segment:
+        frame_content_size_flag = {1: 0, 2: 1, 4: 2, 8: 3}[frame_content_size_field_size]
+    else:
+        frame_content_size_flag = {0: 0, 2: 1, 4: 2, 8: 3}[frame_content_size_field_size]
+    dictionary_id_flag = {0: 0, 1: 1, 2: 2, 4: 3}[dictionary_id_field_size]
+    frame = bytearray(b"\x28\xb5\x2f\xfd")
+    frame.append(frame_content_size_flag << 6 | int(is_single_segment) << 5 | dictionary_id_flag)
+    if not is_single_segment:
+        # Window descriptor for a 128 KiB window
+        frame.append(7 << 3)
+    if dictionary_id_field_size > 0:
+        frame += (1).to_bytes(dictionary_id_field_size, "little")
+    if frame_content_size_field_size > 0:
+        frame_content_size_field = content_size
+        if 2 == frame_content_size_field_size:
+            frame_content_size_field -= 256
+        frame += frame_content_size_field.to_bytes(frame_content_size_field_size, "little")
+
+    block_size_max = 128 * 1024
+    remaining_size = content_size
+    while True:
+        block_size = min(remaining_size, block_size_max)
+        remaining_size -= block_size
+        is_last_block = 0 == remaining_size
+        # RLE block
+        frame += (block_size << 3 | 1 << 1 | int(is_last_block)).to_bytes(3, "little")
+        frame += b"a"
+        if is_last_block:
+            return bytes(frame)
+
+
+def _make_skippable_frame(size: int) -> bytes:
+    return (0x184D2A5A).to_bytes(4, "little") + size.to_bytes(4, "little") + b"\0" * size
+
+
+class TestEstimateGzipUncompressedSize:
+    """Tests for estimating the uncompressed size of gzip files."""
+
+    def test_small_file(self) -> None:
+        """A file within the sample is decompressed entirely."""
+        assert 1000 == _estimate_gzip(gzip.compress(b"a" * 1000))
+
+    def test_single_member(self) -> None:
+        """A single member's size is read from its trailer."""
+        data = gzip.compress(_LOG_TEXT)
+        assert len(data) > GZIP_COMPRESSION_RATIO_SAMPLE_SIZE
+        assert len(_LOG_TEXT) == _estimate_gzip(data)
+
+    def test_size_larger_than_isize_modulus(self) -> None:
+        """A trailer's size (modulo 2^32) is unwrapped using the sampled ratio."""
+        data = gzip.compress(_LOG_TEXT)
+        ratio = len(_LOG_TEXT) / len(data)
+        file_size = 1_000_000_000
+        uncompressed_size = int(file_size * ratio)
+        assert uncompressed_size > 2**32
+        f = _SparseFile(
+            data[:GZIP_COMPRESSION_RATIO_SAMPLE_SIZE],
+            (uncompressed_size % 2**32).to_bytes(4, "little"),
+            file_size,
+        )
+        assert uncompressed_size == _estimate_gzip_uncompressed_size(f, file_size)
+
+    @pytest.mark.parametrize(
+        "member_sizes",
+        [
+            [len(_LOG_TEXT) // 2] * 2,
+            [len(_LOG_TEXT) // 3] * 3,
+            [len(_LOG_TEXT) // 4] * 4,
+            [len(_LOG_TEXT) - 10, 10],
+            [10, len(_LOG_TEXT) - 10],
+            [100, 200, 300],
+        ],
+    )
+    def test_multi_member(self, member_sizes: List[int]) -> None:
+        """A multi-member file's size is estimated from the sampled ratio."""
+        data = b""
+        offset = 0
+        for member_size in member_sizes:
+            data += gzip.compress(_LOG_TEXT[offset : offset + member_size])
+            offset += member_size
+        assert _estimate_gzip(data) == pytest.approx(offset, rel=0.05)
+
+    def test_truncated_file(self) -> None:
+        """A file that's too small to be gzip-compressed has no estimate."""
+        assert _estimate_gzip(b"\x1f\x8b\x08") is None
+
+    def test_corrupted_file(self) -> None:
+        with pytest.raises(zlib.error):
+            _estimate_gzip(b"\x1f\x8b" + b"\0" * 100)
+
+
+class TestEstimateZstdUncompressedSize:
+    """Tests for estimating the uncompressed size of zstd files."""
+
+    @pytest.mark.parametrize(
+        "content_size, frame_content_size_field_size, is_single_segment",
+        [
+            (200, 1, True),
+            (1000, 2, True),
+            (1000, 2, False),
+            (1_000_000, 4, True),
+            (1_000_000, 4, False),
+            (10_000_000, 8, False),
+        ],
+    )
+    def test_content_size(
+        self, content_size: int, frame_content_size_field_size: int, is_single_segment: bool
+    ) -> None:
+        """The content size in the header is used, whatever its field's size."""
+        for dictionary_id_field_size in (0, 1, 2, 4):
+            data = _make_zstd_frame(
+                content_size,
+                frame_content_size_field_size,
+                is_single_segment,
+                dictionary_id_field_size,
+            )
+            assert content_size == _estimate_zstd(data)
+
+    def test_without_content_size(self) -> None:
+        """A frame without a content size has no estimate."""
+        assert _estimate_zstd(_make_zstd_frame(1000, 0, is_single_segment=False)) is None
+
+    def test_skippable_frames(self) -> None:
+        """Leading skippable frames are skipped."""
+        data = _make_skippable_frame(10) + _make_skippable_frame(0) + _make_zstd_frame(1000, 2)
+        assert 1000 == _estimate_zstd(data)
+
+    def test_multiple_frames(self) -> None:
+        """A first frame that's smaller than the file (so there are more frames) isn't used."""
+        data = _make_zstd_frame(10, 1) + _make_zstd_frame(10_000, 2)
+        assert _estimate_zstd(data) is None
+
+    @pytest.mark.parametrize("data", [b"", b"\x28\xb5\x2f\xfd\xc0", b"not zstd" * 4])
+    def test_invalid_file(self, data: bytes) -> None:
+        assert _estimate_zstd(data) is None
+
+
+class TestGetFileMetadata:
+    """Tests for estimating the uncompressed size of local files."""
+
+    @pytest.mark.parametrize(
+        "filename, data, expected_uncompressed_size",
+        [
+            ("a.log", b"a" * 100, 100),
+            ("a.gz", gzip.compress(b"a" * 1000), 1000),
+            ("a.zstd", _make_zstd_frame(1000, 2), 1000),
+        ],
+    )
+    def test_estimate(
+        self, tmp_path: pathlib.Path, filename: str, data: bytes, expected_uncompressed_size: int
+    ) -> None:
+        path = tmp_path / filename
+        path.write_bytes(data)
+        file = get_file_metadata(path, path.stat())
+        assert len(data) == file.size
+        assert expected_uncompressed_size == file.estimated_uncompressed_size
+
+    @pytest.mark.parametrize(
+        "filename, data, ratio",
+        [
+            ("a.gz", b"not gzip", 13),
+            ("a.gz", b"\x1f\x8b" + b"\0" * 100, 13),
+            ("a.zstd", _make_zstd_frame(1000, 0, is_single_segment=False), 8),
+            ("a.zstd", _make_zstd_frame(10, 1) + _make_zstd_frame(10_000, 2), 8),
+        ],
+    )
+    def test_fallback(self, tmp_path: pathlib.Path, filename: str, data: bytes, ratio: int) -> None:
+        """Without an estimate from the file's content, the size is guessed from its extension."""
+        path = tmp_path / filename
+        path.write_bytes(data)
+        file = get_file_metadata(path, path.stat())
+        assert len(data) * ratio == file.estimated_uncompressed_size
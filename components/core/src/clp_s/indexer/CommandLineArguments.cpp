@@ -1,6 +1,8 @@
 #include "CommandLineArguments.hpp"
 
 #include <iostream>
+#include <string>
+#include <vector>
 
 #include <boost/program_options.hpp>
 #include <spdlog/spdlog.h>
@@ -36,7 +38,7 @@ CommandLineArguments::parse_arguments(int argc, char const** argv) {
     visible_options.add(general_options);
     visible_options.add(output_options);
 
-    std::string archive_path;
+    std::vector<std::string> archive_paths;
     po::options_description positional_options;
     // clang-format off
     positional_options.add_options()(
@@ -44,14 +46,14 @@ CommandLineArguments::parse_arguments(int argc, char const** argv) {
             po::value<std::string>(&m_dataset_name),
             "Name of the dataset for which the column metadata table should be populated"
     )(
-            "archive-path",
-            po::value<std::string>(&archive_path),
-            "Path to an archive"
+            "archive-paths",
+            po::value<std::vector<std::string>>(&archive_paths),
+            "Paths to one or more archives in the dataset"
     );
     // clang-format on
     po::positional_options_description positional_options_description;
     positional_options_description.add("dataset-name", 1);
-    positional_options_description.add("archive-path", 1);
+    positional_options_description.add("archive-paths", -1);
 
     // Aggregate all options
     po::options_description all_options;
@@ -87,10 +89,15 @@ CommandLineArguments::parse_arguments(int argc, char const** argv) {
         if (m_dataset_name.empty()) {
             throw std::invalid_argument("Dataset name not specified or empty.");
         }
-        if (archive_path.empty()) {
-            throw std::invalid_argument("Archive path not specified or empty.");
+        if (archive_paths.empty()) {
+            throw std::invalid_argument("Archive path not specified.");
+        }
+        for (auto const& archive_path : archive_paths) {
+            if (archive_path.empty()) {
+                throw std::invalid_argument("Archive path empty.");
+            }
+            m_archive_paths.emplace_back(get_path_object_for_raw_path(archive_path));
         }
-        m_archive_path = get_path_object_for_raw_path(archive_path);
 
         // Initialize and validate global metadata DB config
         if (clp::GlobalMetadataDBConfig::MetadataDBType::MySQL
@@ -115,7 +122,7 @@ CommandLineArguments::parse_arguments(int argc, char const** argv) {
 }
 
 void CommandLineArguments::print_basic_usage() const {
-    std::cerr << "Usage: " << get_program_name() << " [OPTIONS] DATASET_NAME ARCHIVE_PATH"
-              << std::endl;
+    std::cerr << "Usage: " << get_program_name()
+              << " [OPTIONS] DATASET_NAME ARCHIVE_PATH [ARCHIVE_PATH ...]" << std::endl;
 }
 }  // namespace clp_s::indexer
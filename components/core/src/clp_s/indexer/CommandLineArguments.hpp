@@ -3,6 +3,7 @@
 
 #include <optional>
 #include <string>
+#include <vector>
 
 #include "../../clp/GlobalMetadataDBConfig.hpp"
 #include "../InputConfig.hpp"
@@ -30,7 +31,7 @@ public:
 
     std::string const& get_dataset_name() const { return m_dataset_name; }
 
-    Path const& get_archive_path() const { return m_archive_path; }
+    std::vector<Path> const& get_archive_paths() const { return m_archive_paths; }
 
     std::optional<clp::GlobalMetadataDBConfig> const& get_db_config() const {
         return m_metadata_db_config;
@@ -45,7 +46,7 @@ private:
     // Variables
     std::string m_program_name;
     std::string m_dataset_name;
-    Path m_archive_path;
+    std::vector<Path> m_archive_paths;
 
     std::optional<clp::GlobalMetadataDBConfig> m_metadata_db_config;
     bool m_should_create_table{false};
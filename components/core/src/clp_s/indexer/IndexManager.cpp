@@ -2,6 +2,7 @@
 
 #include <filesystem>
 #include <memory>
+#include <set>
 #include <stack>
 #include <string>
 
@@ -30,6 +31,9 @@ IndexManager::IndexManager(
     }
     m_mysql_index_storage->open();
     m_field_update_callback = [this](std::string& field_name, NodeType field_type) {
+        if (false == m_added_fields.emplace(field_name, field_type).second) {
+            return;
+        }
         m_mysql_index_storage->add_field(field_name, field_type);
     };
     m_should_create_table = should_create_table;
@@ -42,16 +46,24 @@ IndexManager::~IndexManager() {
     }
 }
 
-void IndexManager::update_metadata(std::string const& dataset_name, Path const& archive_path) {
-    m_mysql_index_storage->init(dataset_name, m_should_create_table);
+auto IndexManager::update_metadata(std::string const& dataset_name, Path const& archive_path)
+        -> std::set<std::string> {
+    if (m_initialized_dataset_name != dataset_name) {
+        m_mysql_index_storage->init(dataset_name, m_should_create_table);
+        m_initialized_dataset_name = dataset_name;
+        m_added_fields.clear();
+    }
 
     ArchiveReader archive_reader;
     archive_reader.open(archive_path, NetworkAuthOption{});
 
+    std::set<std::string> archive_keys;
     traverse_schema_tree_and_update_metadata(
             archive_reader.get_schema_tree(),
-            archive_reader.get_timestamp_dictionary()
+            archive_reader.get_timestamp_dictionary(),
+            archive_keys
     );
+    return archive_keys;
 }
 
 std::string IndexManager::escape_key_name(std::string_view const key_name) {
@@ -103,7 +115,8 @@ std::string IndexManager::escape_key_name(std::string_view const key_name) {
 
 void IndexManager::traverse_schema_tree_and_update_metadata(
         std::shared_ptr<SchemaTree> const& schema_tree,
-        std::shared_ptr<TimestampDictionaryReader> const& timestamp_dict
+        std::shared_ptr<TimestampDictionaryReader> const& timestamp_dict,
+        std::set<std::string>& archive_keys
 ) {
     if (nullptr == schema_tree) {
         return;
@@ -130,16 +143,21 @@ void IndexManager::traverse_schema_tree_and_update_metadata(
 
         auto const& node = schema_tree->get_node(node_id);
         auto node_type = node.get_type();
-        // TODO: Add support for structured arrays
-        if (NodeType::StructuredArray == node_type) {
-            continue;
-        }
         auto const& children_ids = node.get_children_ids();
         path_buffer.resize(path_length);
         if (false == path_buffer.empty()) {
             path_buffer += ".";
         }
         path_buffer += escape_key_name(node.get_key_name());
+        // TODO: Add support for structured arrays
+        if (NodeType::StructuredArray == node_type) {
+            // The array stands in for the keys within it
+            archive_keys.emplace(path_buffer);
+            continue;
+        }
+        if (children_ids.empty()) {
+            archive_keys.emplace(path_buffer);
+        }
         if (children_ids.empty() && NodeType::Object != node_type && NodeType::Unknown != node_type)
         {
             // Always index authoritative timestamp as `NodeType::DateString`
@@ -4,6 +4,9 @@
 #include <functional>
 #include <memory>
 #include <optional>
+#include <set>
+#include <string>
+#include <utility>
 
 #include "../../clp/GlobalMetadataDBConfig.hpp"
 #include "../ArchiveReader.hpp"
@@ -23,6 +26,9 @@ namespace clp_s::indexer {
  * Multiple archives related to the same topic can form a table that can be queried using a SQL
  * query engine. When indexing, a table name must be specified. This table is then used by the SQL
  * engine to resolve column metadata.
+ *
+ * Indexing an archive also returns the set of keys present in the archive, which includes the leaf
+ * nodes of every type and the roots of structured arrays (whose subtrees aren't indexed).
  */
 class IndexManager {
 public:
@@ -54,11 +60,16 @@ public:
 
     // Methods
     /**
-     * Updates the metadata for a given archive
+     * Updates the metadata for a given archive. When indexing multiple archives of the same
+     * dataset, the same `IndexManager` should be used so that the table is only initialized once
+     * and fields shared between archives are only added once.
      * @param dataset_name
      * @param archive_path
+     * @return The full paths of the keys present in the archive, escaped in the same way as the
+     * indexed field names.
      */
-    void update_metadata(std::string const& dataset_name, Path const& archive_path);
+    auto update_metadata(std::string const& dataset_name, Path const& archive_path)
+            -> std::set<std::string>;
 
 private:
     /**
@@ -72,15 +83,20 @@ private:
      * Traverses the schema tree and updates the metadata
      * @param schema_tree
      * @param timestamp_dict
+     * @param archive_keys Returns the full paths of the keys present in the archive.
      */
     void traverse_schema_tree_and_update_metadata(
             std::shared_ptr<SchemaTree> const& schema_tree,
-            std::shared_ptr<TimestampDictionaryReader> const& timestamp_dict
+            std::shared_ptr<TimestampDictionaryReader> const& timestamp_dict,
+            std::set<std::string>& archive_keys
     );
 
     OutputType m_output_type{OutputType::Database};
     std::shared_ptr<MySQLIndexStorage> m_mysql_index_storage;
     bool m_should_create_table{false};
+    std::optional<std::string> m_initialized_dataset_name;
+    // Fields already added for `m_initialized_dataset_name`
+    std::set<std::pair<std::string, NodeType>> m_added_fields;
     std::function<void(std::string&, NodeType)> m_field_update_callback;
 };
 }  // namespace clp_s::indexer
@@ -1,6 +1,9 @@
+#include <cstddef>
 #include <exception>
 #include <filesystem>
+#include <iostream>
 
+#include <nlohmann/json.hpp>
 #include <spdlog/sinks/stdout_sinks.h>
 #include <spdlog/spdlog.h>
 
@@ -30,18 +33,36 @@ int main(int argc, char const* argv[]) {
             break;
     }
 
+    // Print the result for each archive as a JSON line on stdout, so that callers can tell which
+    // archives failed
+    size_t num_failed_archives{0};
     try {
         clp_s::indexer::IndexManager index_manager(
                 command_line_arguments.get_db_config(),
                 command_line_arguments.should_create_table()
         );
-        index_manager.update_metadata(
-                command_line_arguments.get_dataset_name(),
-                command_line_arguments.get_archive_path()
-        );
+        for (auto const& archive_path : command_line_arguments.get_archive_paths()) {
+            nlohmann::json result{{"path", archive_path.path}, {"success", true}};
+            try {
+                result["keys"] = index_manager.update_metadata(
+                        command_line_arguments.get_dataset_name(),
+                        archive_path
+                );
+            } catch (std::exception& e) {
+                SPDLOG_ERROR(
+                        "Failed to update metadata for archive {}: {}",
+                        archive_path.path,
+                        e.what()
+                );
+                result["success"] = false;
+                result["error"] = e.what();
+                ++num_failed_archives;
+            }
+            std::cout << result.dump() << std::endl;
+        }
     } catch (std::exception& e) {
         SPDLOG_ERROR("Failed to update metadata: {}", e.what());
         return 1;
     }
-    return 0;
+    return 0 == num_failed_archives ? 0 : 1;
 }
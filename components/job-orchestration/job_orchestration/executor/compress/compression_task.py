@@ -1,19 +1,24 @@
 import datetime
+import functools
 import json
 import os
 import pathlib
+import queue
 import shutil
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import closing
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, Final, List, Optional, Set, Tuple
 
 from clp_py_utils.clp_config import (
     CLP_DB_PASS_ENV_VAR_NAME,
     CLP_DB_USER_ENV_VAR_NAME,
     COMPRESSION_JOBS_TABLE_NAME,
+    COMPRESSION_TASK_CHECKPOINTS_TABLE_NAME,
     COMPRESSION_TASKS_TABLE_NAME,
     Database,
-    S3Config,
+    S3Storage,
     StorageEngine,
     StorageType,
     WorkerConfig,
@@ -27,6 +32,7 @@ from clp_py_utils.core import read_yaml_config_file
 from clp_py_utils.s3_utils import (
     generate_s3_virtual_hosted_style_url,
     get_credential_env_vars,
+    s3_delete_objects,
     s3_put,
 )
 from clp_py_utils.sql_adapter import SQL_Adapter
@@ -39,6 +45,26 @@ from job_orchestration.scheduler.job_config import (
     S3InputConfig,
 )
 from job_orchestration.scheduler.task_result import CompressionTaskResult
+from job_orchestration.utils.archive_histogram_utils import (
+    compute_archive_histogram,
+    insert_archive_histogram,
+)
+from job_orchestration.utils.archive_keys_utils import (
+    get_key_id_bitmask,
+    insert_archive_keys,
+    MAX_KEY_NAME_LEN,
+    register_keys,
+)
+
+# Max number of archives to index in one indexer invocation
+ARCHIVE_INDEXING_MAX_BATCH_SIZE: Final[int] = 8
+
+# Number of bytes copied at a time when copying the byte range of a partially compressed file
+FILE_RANGE_COPY_BLOCK_SIZE: Final[int] = 1024 * 1024
+
+# Max number of converted chunks of unstructured text logs that exist at once: one being compressed
+# and one being converted
+MAX_NUM_CONVERTED_CHUNKS: Final[int] = 2
 
 
 def update_compression_task_metadata(db_cursor, task_id, kv):
@@ -170,14 +196,586 @@ def _generate_s3_logs_list(
             file.write("\n")
 
 
+def _materialize_file_ranges(
+    clp_config: ClpIoConfig, paths_to_compress: PathsToCompress, output_dir: pathlib.Path
+) -> Tuple[ClpIoConfig, PathsToCompress]:
+    """
+    Copies the byte range of each partially compressed file into `output_dir`, at the file's path
+    relative to the input's `path_prefix_to_remove`, since the compressors can only compress whole
+    files.
+    :param clp_config:
+    :param paths_to_compress:
+    :param output_dir:
+    :return: A tuple of the config and the paths to compress, rewritten to refer to the copies.
+    :raises: ValueError if a file is shorter than the end of its range.
+    :raises: Propagates `open`'s and `pathlib.Path.mkdir`'s exceptions.
+    """
+    input_config = clp_config.input
+    path_prefix_to_remove = (
+        pathlib.Path(input_config.path_prefix_to_remove)
+        if input_config.path_prefix_to_remove
+        else None
+    )
+    file_paths = []
+    for path_str in paths_to_compress.file_paths:
+        path = pathlib.Path(path_str)
+        if path_prefix_to_remove is not None and path.is_relative_to(path_prefix_to_remove):
+            copy_path = output_dir / path.relative_to(path_prefix_to_remove)
+        else:
+            copy_path = output_dir / path.relative_to(path.anchor)
+        copy_path.parent.mkdir(parents=True, exist_ok=True)
+
+        begin, end = input_config.file_ranges.get(path_str, (0, path.stat().st_size))
+        with open(path, "rb") as src_file, open(copy_path, "wb") as dst_file:
+            src_file.seek(begin)
+            num_bytes_remaining = end - begin
+            while num_bytes_remaining > 0:
+                block = src_file.read(min(num_bytes_remaining, FILE_RANGE_COPY_BLOCK_SIZE))
+                if 0 == len(block):
+                    raise ValueError(f"'{path}' is shorter than the end of its range ({end}).")
+                dst_file.write(block)
+                num_bytes_remaining -= len(block)
+        file_paths.append(str(copy_path))
+
+    clp_config = clp_config.model_copy(
+        update={
+            "input": input_config.model_copy(
+                update={"path_prefix_to_remove": str(output_dir), "file_ranges": None}
+            )
+        }
+    )
+    paths_to_compress = paths_to_compress.model_copy(update={"file_paths": file_paths})
+    return clp_config, paths_to_compress
+
+
 def _upload_archive_to_s3(
-    s3_config: S3Config,
+    s3_storage: S3Storage,
     archive_src_path: pathlib.Path,
     archive_id: str,
     dataset: Optional[str],
 ):
     dest_path = f"{dataset}/{archive_id}" if dataset is not None else archive_id
-    s3_put(s3_config, archive_src_path, dest_path)
+    s3_put(
+        s3_storage.s3_config,
+        archive_src_path,
+        dest_path,
+        part_size=s3_storage.upload_part_size,
+        max_concurrency=s3_storage.max_concurrent_upload_parts,
+        max_pool_connections=s3_storage.max_pool_connections,
+    )
+
+
+class InputChunk:
+    """
+    A range of consecutive inputs of a task, compressed by one compressor invocation and committed
+    by one checkpoint.
+    """
+
+    def __init__(
+        self, begin_file_ix: int, end_file_ix: int, paths_to_compress: PathsToCompress
+    ) -> None:
+        """
+        :param begin_file_ix: The index of the chunk's first input in the task's inputs.
+        :param end_file_ix: The index after the chunk's last input in the task's inputs.
+        :param paths_to_compress: The chunk's inputs.
+        """
+        self.begin_file_ix = begin_file_ix
+        self.end_file_ix = end_file_ix
+        self.paths_to_compress = paths_to_compress
+
+
+def _split_into_chunks(
+    paths_to_compress: PathsToCompress,
+    checkpointed_file_ranges: List[Tuple[int, int]],
+    max_chunk_size: Optional[int],
+) -> List[InputChunk]:
+    """
+    Splits the inputs that haven't been checkpointed into chunks of consecutive inputs, each with a
+    total size of at most `max_chunk_size`, unless a chunk contains a single input that's larger.
+    :param paths_to_compress:
+    :param checkpointed_file_ranges: The [begin, end) index ranges of checkpointed inputs.
+    :param max_chunk_size: The max chunk size, or None for no limit.
+    :return: The chunks.
+    """
+    num_files = len(paths_to_compress.file_paths)
+    if 0 == num_files:
+        # The task only has empty directories
+        if len(checkpointed_file_ranges) > 0:
+            return []
+        return [InputChunk(0, 0, paths_to_compress)]
+
+    is_checkpointed = [False] * num_files
+    for begin_file_ix, end_file_ix in checkpointed_file_ranges:
+        for file_ix in range(begin_file_ix, min(end_file_ix, num_files)):
+            is_checkpointed[file_ix] = True
+
+    chunks: List[InputChunk] = []
+    chunk: Optional[InputChunk] = None
+    chunk_size = 0
+    for file_ix, (file_path, group_id, st_size) in enumerate(
+        zip(paths_to_compress.file_paths, paths_to_compress.group_ids, paths_to_compress.st_sizes)
+    ):
+        if is_checkpointed[file_ix]:
+            chunk = None
+            continue
+        if (
+            chunk is not None
+            and max_chunk_size is not None
+            and chunk_size + st_size > max_chunk_size
+        ):
+            chunk = None
+        if chunk is None:
+            chunk = InputChunk(
+                file_ix, file_ix, PathsToCompress(file_paths=[], group_ids=[], st_sizes=[])
+            )
+            chunk_size = 0
+            if 0 == file_ix:
+                chunk.paths_to_compress.empty_directories = paths_to_compress.empty_directories
+            chunks.append(chunk)
+        chunk.paths_to_compress.file_paths.append(file_path)
+        chunk.paths_to_compress.group_ids.append(group_id)
+        chunk.paths_to_compress.st_sizes.append(st_size)
+        chunk.end_file_ix = file_ix + 1
+        chunk_size += st_size
+    return chunks
+
+
+class ChunkedLogConverter:
+    """
+    Converts chunks of unstructured text logs on a background thread, one `log-converter` process
+    per chunk, so that compressing a converted chunk can overlap with converting the next one.
+
+    Each converted chunk is written to its own temporary directory. At most
+    `MAX_NUM_CONVERTED_CHUNKS` of these exist at once, so the converter waits for the caller to
+    `release_chunk` before converting more chunks than that.
+    """
+
+    def __init__(
+        self,
+        chunks: List[InputChunk],
+        tmp_path_prefix: pathlib.Path,
+        generate_inputs_list: Callable[[pathlib.Path, PathsToCompress], None],
+        clp_home: pathlib.Path,
+        clp_config: ClpIoConfig,
+        stderr_log_file,
+        logger,
+    ) -> None:
+        """
+        :param chunks:
+        :param tmp_path_prefix: The prefix of each chunk's temporary paths.
+        :param generate_inputs_list: Writes a chunk's inputs list for `log-converter`.
+        :param clp_home:
+        :param clp_config:
+        :param stderr_log_file: File to which `log-converter`'s stderr should be written.
+        :param logger:
+        """
+        self._chunks = chunks
+        self._tmp_path_prefix = tmp_path_prefix
+        self._generate_inputs_list = generate_inputs_list
+        self._clp_home = clp_home
+        self._clp_config = clp_config
+        self._stderr_log_file = stderr_log_file
+        self._logger = logger
+
+        self._free_chunk_slots = threading.Semaphore(MAX_NUM_CONVERTED_CHUNKS)
+        # Converted chunks and their directories, followed by None once conversion ends
+        self._converted_chunks: queue.Queue[Optional[Tuple[InputChunk, pathlib.Path]]] = (
+            queue.Queue()
+        )
+        # Guards `_stopped` and `_proc`
+        self._lock = threading.Lock()
+        self._stopped = False
+        self._proc: Optional[subprocess.Popen] = None
+        self._error_message: Optional[str] = None
+        self._thread = threading.Thread(target=self._convert_chunks, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def get_next_chunk(self) -> Optional[Tuple[InputChunk, pathlib.Path]]:
+        """
+        Waits for the next chunk to be converted.
+        :return: A tuple of the chunk and the directory containing its converted logs, or None if
+            there are no more chunks (including when conversion failed or was stopped).
+        """
+        converted_chunk = self._converted_chunks.get()
+        if converted_chunk is None:
+            # Let any other waiters see the end of the queue too
+            self._converted_chunks.put(None)
+            return None
+        with self._lock:
+            if self._stopped:
+                shutil.rmtree(converted_chunk[1], ignore_errors=True)
+                return None
+        return converted_chunk
+
+    def release_chunk(self, output_dir: pathlib.Path) -> None:
+        """
+        Deletes a converted chunk, allowing the next chunk to be converted.
+        :param output_dir:
+        """
+        shutil.rmtree(output_dir, ignore_errors=True)
+        self._free_chunk_slots.release()
+
+    def stop(self) -> None:
+        """
+        Stops converting chunks, terminating any running `log-converter` process.
+        """
+        with self._lock:
+            self._stopped = True
+            if self._proc is not None:
+                self._proc.terminate()
+        self._free_chunk_slots.release()
+
+    def wait(self) -> Optional[str]:
+        """
+        Stops the converter, waits for it to exit, and deletes any unreleased chunks.
+        :return: An error message if converting any chunk failed, or None otherwise.
+        """
+        self.stop()
+        self._thread.join()
+        while True:
+            converted_chunk = self._converted_chunks.get()
+            if converted_chunk is None:
+                break
+            shutil.rmtree(converted_chunk[1], ignore_errors=True)
+        return self._error_message
+
+    def _convert_chunks(self) -> None:
+        try:
+            for chunk_idx, chunk in enumerate(self._chunks):
+                self._free_chunk_slots.acquire()
+                if not self._convert_chunk(chunk_idx, chunk):
+                    break
+        except Exception as err:
+            self._logger.exception("Failed to convert unstructured log text.")
+            self._error_message = f"Failed to convert unstructured log text: {err}"
+        finally:
+            self._converted_chunks.put(None)
+
+    def _convert_chunk(self, chunk_idx: int, chunk: InputChunk) -> bool:
+        """
+        :param chunk_idx:
+        :param chunk:
+        :return: Whether to continue converting chunks.
+        """
+        output_dir = pathlib.Path(f"{self._tmp_path_prefix}-converted-tmp-{chunk_idx}")
+        inputs_list_path = pathlib.Path(f"{self._tmp_path_prefix}-log-paths-{chunk_idx}.txt")
+        self._generate_inputs_list(inputs_list_path, chunk.paths_to_compress)
+        output_dir.mkdir()
+
+        conversion_cmd, conversion_env = _make_log_converter_command_and_env(
+            clp_home=self._clp_home, conversion_output_dir=output_dir, clp_config=self._clp_config
+        )
+        conversion_cmd.append("--inputs-from")
+        conversion_cmd.append(str(inputs_list_path))
+        try:
+            with self._lock:
+                if self._stopped:
+                    return False
+                self._logger.debug("Execute log-converter with command: %s", conversion_cmd)
+                self._proc = subprocess.Popen(
+                    conversion_cmd,
+                    stdout=subprocess.DEVNULL,
+                    stderr=self._stderr_log_file,
+                    env=conversion_env,
+                )
+            return_code = self._proc.wait()
+            with self._lock:
+                self._proc = None
+                if self._stopped:
+                    return False
+            if 0 != return_code:
+                self._error_message = (
+                    f"Failed to convert unstructured log text, return_code={return_code}"
+                )
+                self._logger.error(self._error_message)
+                return False
+            self._converted_chunks.put((chunk, output_dir))
+            output_dir = None
+            return True
+        finally:
+            inputs_list_path.unlink(missing_ok=True)
+            if output_dir is not None:
+                shutil.rmtree(output_dir, ignore_errors=True)
+
+
+class ArchivePostProcessor:
+    """
+    Post-processes each archive the compressor finishes on a bounded background pipeline, so that
+    the compressor's output keeps being consumed (and compression keeps going) while earlier
+    archives are being post-processed. Each archive goes through the following stages, each with
+    its own thread pool:
+
+    1. Index: clp-s archives are indexed by one indexer process at a time. Each process indexes
+       every archive that finished since the previous process started (up to
+       `ARCHIVE_INDEXING_MAX_BATCH_SIZE`), so that the cost of starting the indexer and connecting
+       to the database is shared by all archives in the batch. The indexer also reports the keys
+       present in each archive. If enabled, the indexed archives' histograms (message counts by
+       time) are then computed one archive at a time.
+    2. Upload: if archives are stored on S3, each archive is uploaded (with up to
+       `max_concurrent_uploads` concurrent uploads) and then deleted from the staging directory.
+
+    The archives' metadata is published when they're checkpointed (see `_checkpoint_chunk`) or,
+    for clp, when the task is committed (see `_commit_task`).
+
+    At most as many archives as the stages can process concurrently are in the pipeline at once;
+    `add_archive` blocks until there's room, which stops the compressor once its output pipe fills
+    up. After the first failure, any remaining archives skip the pipeline, and `on_failure` is
+    called (e.g., to stop the compressor).
+    """
+
+    def __init__(
+        self,
+        archive_output_dir: pathlib.Path,
+        dataset: Optional[str],
+        index_cmd_prefix: Optional[List[str]],
+        index_env: Optional[Dict[str, str]],
+        histogram_clp_home: Optional[pathlib.Path],
+        s3_storage: Optional[S3Storage],
+        stderr_log_file,
+        on_failure: Callable[[], None],
+        logger,
+    ) -> None:
+        """
+        :param archive_output_dir:
+        :param dataset:
+        :param index_cmd_prefix: The indexer command, without the archive paths, or None if archives
+            shouldn't be indexed.
+        :param index_env: The indexer's environment variables.
+        :param histogram_clp_home: The CLP home directory if the histograms of indexed archives
+            should be computed, or None otherwise.
+        :param s3_storage: The S3 storage to upload archives to, or None if archives are stored on
+            the local filesystem.
+        :param stderr_log_file: File to which the indexer's (and clp-s's) stderr should be written.
+        :param on_failure: Called once, when post-processing an archive first fails.
+        :param logger:
+        """
+        self._archive_output_dir = archive_output_dir
+        self._dataset = dataset
+        self._index_cmd_prefix = index_cmd_prefix
+        self._index_env = index_env
+        self._histogram_clp_home = histogram_clp_home
+        self._s3_storage = s3_storage
+        self._stderr_log_file = stderr_log_file
+        self._on_failure = on_failure
+        self._logger = logger
+
+        max_pending_archives = 1
+        self._index_executor: Optional[ThreadPoolExecutor] = None
+        self._archives_to_index_lock = threading.Lock()
+        self._archive_ids_to_index: List[str] = []
+        if index_cmd_prefix is not None:
+            # NOTE: The executor must have a single thread so that batches are indexed in order.
+            self._index_executor = ThreadPoolExecutor(max_workers=1)
+            max_pending_archives += ARCHIVE_INDEXING_MAX_BATCH_SIZE
+        self._upload_executor: Optional[ThreadPoolExecutor] = None
+        if s3_storage is not None:
+            self._upload_executor = ThreadPoolExecutor(
+                max_workers=s3_storage.max_concurrent_uploads
+            )
+            max_pending_archives += s3_storage.max_concurrent_uploads
+        self._pending_archive_slots = threading.BoundedSemaphore(max_pending_archives)
+        self._unfinished_archives_cv = threading.Condition()
+        self._num_unfinished_archives = 0
+
+        self._archives: List[Dict[str, Any]] = []
+        self._histograms_lock = threading.Lock()
+        self._histograms: Dict[str, Dict[int, int]] = {}
+        self._keys_lock = threading.Lock()
+        self._keys: Dict[str, List[str]] = {}
+        self._error_lock = threading.Lock()
+        self._error_message: Optional[str] = None
+
+    def add_archive(self, archive_stats: Dict[str, Any]) -> None:
+        """
+        Schedules a finished archive for post-processing, blocking until there's room in the
+        pipeline.
+        :param archive_stats: The archive's stats, as printed by the compressor.
+        """
+        self._archives.append(archive_stats)
+        self._pending_archive_slots.acquire()
+        with self._unfinished_archives_cv:
+            self._num_unfinished_archives += 1
+        if self._index_executor is not None:
+            with self._archives_to_index_lock:
+                self._archive_ids_to_index.append(archive_stats["id"])
+            # Archives queued while the indexer is busy are indexed together by the first of these
+            # calls to run; the rest find nothing left to index.
+            self._index_executor.submit(self._index_queued_archives)
+        else:
+            self._upload_archive(archive_stats["id"])
+
+    def flush(self) -> Optional[str]:
+        """
+        Waits for the archives scheduled so far to be post-processed, while still accepting more.
+        :return: An error message if post-processing any archive failed, or None otherwise.
+        """
+        with self._unfinished_archives_cv:
+            self._unfinished_archives_cv.wait_for(lambda: 0 == self._num_unfinished_archives)
+        return self._error_message
+
+    def wait(self) -> Optional[str]:
+        """
+        Waits for all scheduled archives to be post-processed.
+        :return: An error message if post-processing any archive failed, or None otherwise.
+        """
+        # NOTE: The index stage hands off to the upload stage, so it must be shut down first.
+        if self._index_executor is not None:
+            self._index_executor.shutdown(wait=True)
+        if self._upload_executor is not None:
+            self._upload_executor.shutdown(wait=True)
+        return self._error_message
+
+    def get_archives(self) -> List[Dict[str, Any]]:
+        """
+        :return: The stats of every archive that was added, whether or not it was post-processed
+            successfully.
+        """
+        return self._archives
+
+    def get_histogram(self, archive_id: str) -> Optional[Dict[int, int]]:
+        """
+        :param archive_id:
+        :return: The archive's histogram, or None if it wasn't computed.
+        """
+        with self._histograms_lock:
+            return self._histograms.get(archive_id)
+
+    def get_keys(self, archive_id: str) -> Optional[List[str]]:
+        """
+        :param archive_id:
+        :return: The names of the keys present in the archive (as escaped by the indexer), or None
+            if the indexer didn't report them.
+        """
+        with self._keys_lock:
+            return self._keys.get(archive_id)
+
+    def _index_queued_archives(self) -> None:
+        while True:
+            with self._archives_to_index_lock:
+                archive_ids = self._archive_ids_to_index[:ARCHIVE_INDEXING_MAX_BATCH_SIZE]
+                del self._archive_ids_to_index[:ARCHIVE_INDEXING_MAX_BATCH_SIZE]
+            if 0 == len(archive_ids):
+                return
+            if self._error_message is None:
+                self._index_archives(archive_ids)
+            if self._histogram_clp_home is not None:
+                for archive_id in archive_ids:
+                    if self._error_message is None:
+                        self._compute_histogram(archive_id)
+            for archive_id in archive_ids:
+                self._upload_archive(archive_id)
+
+    def _index_archives(self, archive_ids: List[str]) -> None:
+        """
+        Indexes the given archives in one indexer invocation, failing with a message that names
+        every archive that couldn't be indexed.
+        :param archive_ids:
+        """
+        archive_ids_by_path = {
+            str(self._archive_output_dir / archive_id): archive_id for archive_id in archive_ids
+        }
+        try:
+            proc = subprocess.run(
+                [*self._index_cmd_prefix, *archive_ids_by_path.keys()],
+                stdout=subprocess.PIPE,
+                stderr=self._stderr_log_file,
+                env=self._index_env,
+            )
+        except Exception as err:
+            self._logger.exception(f"Failed to run indexer on archives {archive_ids}.")
+            self._fail(f"Failed to index archives {archive_ids}: {err}")
+            return
+
+        # The indexer prints one JSON result per archive it attempted
+        errors_by_archive_id: Dict[str, str] = {}
+        indexed_archive_ids: Set[str] = set()
+        for line in proc.stdout.decode("utf-8", errors="replace").splitlines():
+            try:
+                result = json.loads(line)
+                archive_id = archive_ids_by_path[result["path"]]
+            except (ValueError, KeyError, TypeError):
+                continue
+            if result.get("success", False):
+                indexed_archive_ids.add(archive_id)
+                keys = result.get("keys")
+                if isinstance(keys, list):
+                    with self._keys_lock:
+                        self._keys[archive_id] = keys
+            else:
+                errors_by_archive_id[archive_id] = result.get("error", "unknown error")
+        if 0 != proc.returncode:
+            for archive_id in archive_ids:
+                if archive_id not in indexed_archive_ids and archive_id not in errors_by_archive_id:
+                    errors_by_archive_id[archive_id] = (
+                        f"indexer exited with return code {proc.returncode}"
+                    )
+
+        if 0 == len(errors_by_archive_id):
+            self._logger.info(f"Indexed {len(archive_ids)} archive(s).")
+            return
+        for archive_id, error in errors_by_archive_id.items():
+            self._logger.error(f"Failed to index archive {archive_id}: {error}")
+        self._fail(
+            "Failed to index archives: "
+            + "; ".join(
+                f"{archive_id}: {error}" for archive_id, error in errors_by_archive_id.items()
+            )
+        )
+
+    def _compute_histogram(self, archive_id: str) -> None:
+        """
+        Computes an archive's histogram. Since histograms are only an optimization, an archive
+        whose histogram can't be computed is still published (and is searched instead).
+        :param archive_id:
+        """
+        try:
+            histogram = compute_archive_histogram(
+                self._histogram_clp_home,
+                self._archive_output_dir,
+                archive_id,
+                self._stderr_log_file,
+            )
+        except Exception:
+            self._logger.exception(f"Failed to compute histogram of archive {archive_id}.")
+            return
+        with self._histograms_lock:
+            self._histograms[archive_id] = histogram
+
+    def _upload_archive(self, archive_id: str) -> None:
+        if self._upload_executor is None:
+            self._finish_archive()
+            return
+        self._upload_executor.submit(self._upload_archive_to_s3, archive_id)
+
+    def _upload_archive_to_s3(self, archive_id: str) -> None:
+        archive_path = self._archive_output_dir / archive_id
+        try:
+            if self._error_message is None:
+                self._logger.info(f"Uploading archive {archive_id} to S3...")
+                try:
+                    _upload_archive_to_s3(self._s3_storage, archive_path, archive_id, self._dataset)
+                    self._logger.info(f"Finished uploading archive {archive_id} to S3.")
+                except Exception as err:
+                    self._logger.exception(f"Failed to upload archive {archive_id}")
+                    self._fail(str(err))
+        finally:
+            archive_path.unlink(missing_ok=True)
+            self._finish_archive()
+
+    def _finish_archive(self) -> None:
+        self._pending_archive_slots.release()
+        with self._unfinished_archives_cv:
+            self._num_unfinished_archives -= 1
+            self._unfinished_archives_cv.notify_all()
+
+    def _fail(self, error_message: str) -> None:
+        with self._error_lock:
+            if self._error_message is not None:
+                return
+            self._error_message = error_message
+        self._on_failure()
 
 
 def _get_db_connection_args_for_clp_cmd(
@@ -340,6 +938,38 @@ def _make_log_converter_command_and_env(
     return conversion_cmd, conversion_env_vars
 
 
+def _post_process_archives_until_exit(
+    proc: subprocess.Popen, archive_post_processor: ArchivePostProcessor
+) -> int:
+    """
+    Hands each archive the given compression process finishes to the post-processor, until the
+    process exits.
+    :param proc:
+    :param archive_post_processor:
+    :return: The process's return code.
+    """
+    last_archive_stats = None
+    last_line_decoded = False
+    while not last_line_decoded:
+        stats: Optional[Dict[str, Any]] = None
+
+        line = proc.stdout.readline()
+        if not line:
+            last_line_decoded = True
+        else:
+            stats = json.loads(line.decode("utf-8"))
+
+        if last_archive_stats is not None and (
+            None is stats or stats["id"] != last_archive_stats["id"]
+        ):
+            # We've started a new archive so the previous archive is complete
+            archive_post_processor.add_archive(last_archive_stats)
+
+        last_archive_stats = stats
+
+    return proc.wait()
+
+
 def run_clp(
     worker_config: WorkerConfig,
     clp_config: ClpIoConfig,
@@ -376,7 +1006,7 @@ def run_clp(
     archive_output_dir = worker_config.archive_output.get_directory()
 
     # Get S3 config
-    s3_config: S3Config
+    s3_storage: S3Storage
     enable_s3_write = False
     storage_type = worker_config.archive_output.storage.type
     if StorageType.S3 == storage_type:
@@ -385,7 +1015,7 @@ def run_clp(
             logger.error(error_msg)
             return False, {"error_message": error_msg}
 
-        s3_config = worker_config.archive_output.storage.s3_config
+        s3_storage = worker_config.archive_output.storage
         enable_s3_write = True
 
     dataset = clp_config.input.dataset
@@ -410,188 +1040,490 @@ def run_clp(
 
     # Generate list of logs to compress
     input_type = clp_config.input.type
-    logs_list_path = tmp_dir / f"{instance_id_str}-log-paths.txt"
+    generate_logs_list: Callable[[pathlib.Path, PathsToCompress], None]
     if InputType.FS == input_type:
-        _generate_fs_logs_list(logs_list_path, paths_to_compress)
+        generate_logs_list = _generate_fs_logs_list
     elif InputType.S3 == input_type:
-        _generate_s3_logs_list(logs_list_path, paths_to_compress, clp_config.input)
+        generate_logs_list = functools.partial(
+            _generate_s3_logs_list, s3_input_config=clp_config.input
+        )
     else:
         error_msg = f"Unsupported input type: {input_type}."
         logger.error(error_msg)
         return False, {"error_message": error_msg}
 
-    conversion_cmd = None
-    converted_inputs_dir = None
-    if StorageEngine.CLP_S == clp_storage_engine and clp_config.input.unstructured:
-        converted_inputs_dir = tmp_dir / f"{instance_id_str}-converted-tmp"
-        converted_inputs_dir.mkdir()
-        conversion_cmd, conversion_env = _make_log_converter_command_and_env(
-            clp_home=clp_home, conversion_output_dir=converted_inputs_dir, clp_config=clp_config
+    # clp-s archives are published in checkpoints, each covering a chunk of the task's inputs, so
+    # that a retry of the task only compresses the inputs that no earlier attempt checkpointed.
+    # clp publishes its archives itself, so its tasks are compressed in one chunk.
+    table_prefix = clp_metadata_db_connection_config["table_prefix"]
+    is_checkpointing_enabled = StorageEngine.CLP_S == clp_storage_engine
+    is_conversion_needed = (
+        StorageEngine.CLP_S == clp_storage_engine and clp_config.input.unstructured
+    )
+    if is_checkpointing_enabled:
+        max_chunk_size = worker_config.compression_worker.max_checkpoint_interval_size
+        # Unstructured text logs are converted in chunks so that the converted copy of at most
+        # `MAX_NUM_CONVERTED_CHUNKS` chunks exists at once. Since the converted logs are roughly the
+        # size of the original logs, each chunk's size is estimated using the original logs' sizes.
+        max_conversion_tmp_space = worker_config.compression_worker.max_conversion_tmp_space
+        if is_conversion_needed and max_conversion_tmp_space is not None:
+            max_conversion_chunk_size = max(max_conversion_tmp_space // MAX_NUM_CONVERTED_CHUNKS, 1)
+            if max_chunk_size is None or max_conversion_chunk_size < max_chunk_size:
+                max_chunk_size = max_conversion_chunk_size
+        checkpoints = _get_checkpoints(sql_adapter, task_id)
+        chunks = _split_into_chunks(
+            paths_to_compress,
+            [(row["begin_file_ix"], row["end_file_ix"]) for row in checkpoints],
+            max_chunk_size,
         )
-        conversion_cmd.append("--inputs-from")
-        conversion_cmd.append(str(logs_list_path))
-        compression_cmd.append(str(converted_inputs_dir))
+        if len(checkpoints) > 0:
+            logger.info(
+                f"Resuming from {len(checkpoints)} checkpoint(s); {len(chunks)} chunk(s) of inputs"
+                " remain."
+            )
     else:
-        compression_cmd.append("--files-from")
-        compression_cmd.append(str(logs_list_path))
-
-    def cleanup_temporary_files():
-        if logs_list_path is not None:
-            logs_list_path.unlink()
-        if converted_inputs_dir is not None:
-            shutil.rmtree(converted_inputs_dir)
+        chunks = [InputChunk(0, len(paths_to_compress.file_paths), paths_to_compress)]
 
     # Open stderr log file
     stderr_log_path = logs_dir / f"{instance_id_str}-stderr.log"
     stderr_log_file = open(stderr_log_path, "w")
 
-    conversion_return_code = 0
-    if conversion_cmd is not None:
-        logger.debug("Execute log-converter with command: %s", conversion_cmd)
-        conversion_proc = subprocess.Popen(
-            conversion_cmd, stdout=subprocess.DEVNULL, stderr=stderr_log_file, env=conversion_env
+    log_converter = None
+    if is_conversion_needed:
+        log_converter = ChunkedLogConverter(
+            chunks=chunks,
+            tmp_path_prefix=tmp_dir / instance_id_str,
+            generate_inputs_list=generate_logs_list,
+            clp_home=clp_home,
+            clp_config=clp_config,
+            stderr_log_file=stderr_log_file,
+            logger=logger,
         )
-        conversion_return_code = conversion_proc.wait()
 
-    if conversion_return_code != 0:
-        cleanup_temporary_files()
-        logger.error(
-            f"Failed to convert unstructured log text, return_code={conversion_return_code}"
-        )
-        worker_output = {
-            "total_uncompressed_size": 0,
-            "total_compressed_size": 0,
-            "error_message": f"Check logs in {stderr_log_path}",
-        }
-        stderr_log_file.close()
-        return CompressionTaskStatus.FAILED, worker_output
+    index_cmd_prefix = None
+    index_env = None
+    if StorageEngine.CLP_S == clp_storage_engine:
+        index_cmd_prefix = [
+            str(clp_home / "bin" / "indexer"),
+            *_get_db_connection_args_for_clp_cmd(clp_metadata_db_connection_config),
+            dataset,
+        ]
+
+        # Set environment variables for database credentials
+        index_env = dict(os.environ)
+        index_env.update(_get_db_connection_env_vars_for_clp_cmd(clp_metadata_db_connection_config))
+
+    compression_procs: List[subprocess.Popen] = []
+
+    def stop_compression():
+        if log_converter is not None:
+            log_converter.stop()
+        for compression_proc in compression_procs:
+            compression_proc.terminate()
+
+    # NOTE: If post-processing fails, it's possible a compression process finishes before we call
+    # `terminate` on it, in which case the process will still return success.
+    archive_post_processor = ArchivePostProcessor(
+        archive_output_dir=archive_output_dir,
+        dataset=dataset,
+        index_cmd_prefix=index_cmd_prefix,
+        index_env=index_env,
+        histogram_clp_home=(
+            clp_home
+            if StorageEngine.CLP_S == clp_storage_engine
+            and worker_config.compression_worker.generate_archive_histograms
+            else None
+        ),
+        s3_storage=s3_storage if enable_s3_write else None,
+        stderr_log_file=stderr_log_file,
+        on_failure=stop_compression,
+        logger=logger,
+    )
 
     # Start compression
     logger.debug("Compressing...")
-    compression_successful = False
-    proc = subprocess.Popen(
-        compression_cmd, stdout=subprocess.PIPE, stderr=stderr_log_file, env=compression_env
-    )
-
-    # Compute the total amount of data compressed
-    last_archive_stats = None
-    last_line_decoded = False
-    total_uncompressed_size = 0
-    total_compressed_size = 0
-
-    # Handle job metadata update and S3 write if enabled
-    s3_error = None
-    while not last_line_decoded:
-        stats: Optional[Dict[str, Any]] = None
-
-        line = proc.stdout.readline()
-        if not line:
-            last_line_decoded = True
+    if log_converter is not None:
+        log_converter.start()
+    return_code = 0
+    post_processing_error = None
+    checkpoint_error = None
+    checkpointed_archive_ids: Set[str] = set()
+    for chunk_ix in range(len(chunks)):
+        if log_converter is not None:
+            converted_chunk = log_converter.get_next_chunk()
+            if converted_chunk is None:
+                break
+            chunk, converted_chunk_dir = converted_chunk
+            chunk_compression_cmd = [*compression_cmd, str(converted_chunk_dir)]
         else:
-            stats = json.loads(line.decode("utf-8"))
-
-        if last_archive_stats is not None and (
-            None is stats or stats["id"] != last_archive_stats["id"]
-        ):
-            archive_id = last_archive_stats["id"]
-            archive_path = archive_output_dir / archive_id
-            if enable_s3_write:
-                if s3_error is None:
-                    logger.info(f"Uploading archive {archive_id} to S3...")
-                    try:
-                        _upload_archive_to_s3(s3_config, archive_path, archive_id, dataset)
-                        logger.info(f"Finished uploading archive {archive_id} to S3.")
-                    except Exception as err:
-                        logger.exception(f"Failed to upload archive {archive_id}")
-                        s3_error = str(err)
-                        # NOTE: It's possible `proc` finishes before we call `terminate` on it, in
-                        # which case the process will still return success.
-                        proc.terminate()
-
-            if s3_error is None:
-                # We've started a new archive so add the previous archive's last reported size to
-                # the total
-                total_uncompressed_size += last_archive_stats["uncompressed_size"]
-                total_compressed_size += last_archive_stats["size"]
-                with closing(sql_adapter.create_connection(True)) as db_conn, closing(
-                    db_conn.cursor(dictionary=True)
-                ) as db_cursor:
-                    table_prefix = clp_metadata_db_connection_config["table_prefix"]
-                    if StorageEngine.CLP_S == clp_storage_engine:
-                        update_archive_metadata(
-                            db_cursor, table_prefix, dataset, last_archive_stats
-                        )
-                    update_job_metadata_and_tags(
-                        db_cursor,
-                        job_id,
-                        table_prefix,
-                        dataset,
-                        tag_ids,
-                        last_archive_stats,
-                    )
-                    db_conn.commit()
-
-                if StorageEngine.CLP_S == clp_storage_engine:
-                    indexer_cmd = [
-                        str(clp_home / "bin" / "indexer"),
-                        *_get_db_connection_args_for_clp_cmd(clp_metadata_db_connection_config),
-                        dataset,
-                        archive_path,
-                    ]
-
-                    # Set environment variables for database credentials
-                    indexer_env = dict(os.environ)
-                    indexer_env.update(
-                        _get_db_connection_env_vars_for_clp_cmd(clp_metadata_db_connection_config)
-                    )
-
-                    try:
-                        subprocess.run(
-                            indexer_cmd,
-                            stdout=subprocess.DEVNULL,
-                            stderr=stderr_log_file,
-                            check=True,
-                            env=indexer_env,
-                        )
-                    except subprocess.CalledProcessError:
-                        logger.exception("Failed to index archive.")
-
-            if enable_s3_write:
-                archive_path.unlink()
-
-        last_archive_stats = stats
-
-    # Wait for compression to finish
-    return_code = proc.wait()
+            chunk = chunks[chunk_ix]
+            logs_list_path = tmp_dir / f"{instance_id_str}-log-paths-{chunk_ix}.txt"
+            generate_logs_list(logs_list_path, chunk.paths_to_compress)
+            chunk_compression_cmd = [*compression_cmd, "--files-from", str(logs_list_path)]
+
+        num_archives_before_chunk = len(archive_post_processor.get_archives())
+        compression_procs.append(
+            subprocess.Popen(
+                chunk_compression_cmd,
+                stdout=subprocess.PIPE,
+                stderr=stderr_log_file,
+                env=compression_env,
+            )
+        )
+        return_code = _post_process_archives_until_exit(
+            compression_procs[-1], archive_post_processor
+        )
+        if log_converter is not None:
+            log_converter.release_chunk(converted_chunk_dir)
+        else:
+            logs_list_path.unlink()
+        if 0 != return_code:
+            break
+
+        if is_checkpointing_enabled:
+            post_processing_error = archive_post_processor.flush()
+            if post_processing_error is not None:
+                break
+            chunk_archives = archive_post_processor.get_archives()[num_archives_before_chunk:]
+            try:
+                is_checkpointed = _checkpoint_chunk(
+                    sql_adapter,
+                    table_prefix,
+                    dataset,
+                    job_id,
+                    task_id,
+                    tag_ids,
+                    chunk,
+                    chunk_archives,
+                    archive_post_processor,
+                )
+            except Exception as err:
+                logger.exception("Failed to checkpoint archives.")
+                checkpoint_error = f"Failed to checkpoint archives: {err}"
+                break
+            if is_checkpointed:
+                checkpointed_archive_ids.update(archive["id"] for archive in chunk_archives)
+            else:
+                # Another attempt at the task already checkpointed some of these inputs, so this
+                # chunk's archives are discarded below.
+                logger.info(
+                    f"Inputs [{chunk.begin_file_ix}, {chunk.end_file_ix}) were already"
+                    " checkpointed by another attempt."
+                )
+
+    conversion_error = None
+    if log_converter is not None:
+        conversion_error = log_converter.wait()
+
+    # Wait for post-processing to finish
+    post_processing_error = archive_post_processor.wait()
 
+    compression_successful = False
     if 0 != return_code:
         logger.error(f"Failed to compress, return_code={str(return_code)}")
     else:
         compression_successful = True
-        cleanup_temporary_files()
 
     logger.debug("Compressed.")
 
     # Close stderr log file
     stderr_log_file.close()
 
-    worker_output = {
-        "total_uncompressed_size": total_uncompressed_size,
-        "total_compressed_size": total_compressed_size,
-    }
+    archive_stats_list = archive_post_processor.get_archives()
+    error_msgs = []
+    if conversion_error is not None:
+        error_msgs.append(conversion_error)
+    if compression_successful is False or conversion_error is not None:
+        error_msgs.append(f"See logs {stderr_log_path}")
+    if post_processing_error is not None:
+        error_msgs.append(post_processing_error)
+    if checkpoint_error is not None:
+        error_msgs.append(checkpoint_error)
+    if is_checkpointing_enabled:
+        uncheckpointed_archive_ids = [
+            archive_stats["id"]
+            for archive_stats in archive_stats_list
+            if archive_stats["id"] not in checkpointed_archive_ids
+        ]
+        if len(uncheckpointed_archive_ids) > 0:
+            logger.info(f"Discarding {len(uncheckpointed_archive_ids)} uncheckpointed archive(s).")
+            try:
+                _discard_archives(worker_config, dataset, uncheckpointed_archive_ids)
+            except Exception:
+                logger.exception("Failed to discard uncheckpointed archives.")
+
+        # The task's stats cover every attempt's checkpoints
+        checkpoints = _get_checkpoints(sql_adapter, task_id)
+        worker_output = {
+            "total_uncompressed_size": sum(row["uncompressed_size"] for row in checkpoints),
+            "total_compressed_size": sum(row["compressed_size"] for row in checkpoints),
+            # Checkpointed archives are already published
+            "archives": [],
+        }
+        if 0 == len(error_msgs):
+            uncheckpointed_chunks = _split_into_chunks(
+                paths_to_compress,
+                [(row["begin_file_ix"], row["end_file_ix"]) for row in checkpoints],
+                None,
+            )
+            if len(uncheckpointed_chunks) > 0:
+                error_msgs.append(
+                    "Some inputs weren't checkpointed since they overlapped another attempt's"
+                    " checkpoints."
+                )
+    else:
+        # NOTE: The archives' metadata is only published when the task is committed (see
+        # `_commit_task`).
+        worker_output = {
+            "total_uncompressed_size": sum(
+                archive_stats["uncompressed_size"] for archive_stats in archive_stats_list
+            ),
+            "total_compressed_size": sum(
+                archive_stats["size"] for archive_stats in archive_stats_list
+            ),
+            "archives": archive_stats_list,
+        }
 
-    if compression_successful and s3_error is None:
+    if 0 == len(error_msgs):
         return CompressionTaskStatus.SUCCEEDED, worker_output
     else:
-        error_msgs = []
-        if compression_successful is False:
-            error_msgs.append(f"See logs {stderr_log_path}")
-        if s3_error is not None:
-            error_msgs.append(s3_error)
         worker_output["error_message"] = "\n".join(error_msgs)
         return CompressionTaskStatus.FAILED, worker_output
 
 
+def _get_checkpoints(sql_adapter: SQL_Adapter, task_id: int) -> List[Dict[str, Any]]:
+    """
+    :param sql_adapter:
+    :param task_id:
+    :return: The checkpoints committed by every attempt at the given task.
+    :raises: Propagates `db_cursor.execute`'s exceptions.
+    """
+    with closing(sql_adapter.create_connection(True)) as db_conn, closing(
+        db_conn.cursor(dictionary=True)
+    ) as db_cursor:
+        db_cursor.execute(
+            f"""
+            SELECT begin_file_ix, end_file_ix, uncompressed_size, compressed_size
+            FROM {COMPRESSION_TASK_CHECKPOINTS_TABLE_NAME}
+            WHERE task_id = %s
+            """,
+            [task_id],
+        )
+        return list(db_cursor.fetchall())
+
+
+def _checkpoint_chunk(
+    sql_adapter: SQL_Adapter,
+    table_prefix: str,
+    dataset: Optional[str],
+    job_id: int,
+    task_id: int,
+    tag_ids: list[int],
+    chunk: InputChunk,
+    archives: List[Dict[str, Any]],
+    archive_post_processor: ArchivePostProcessor,
+) -> bool:
+    """
+    Atomically publishes the metadata of the archives compressed from a chunk of a task's inputs and
+    records a checkpoint of which inputs went into them.
+
+    Since several attempts at a task may run at once (see `_commit_task`), the task's row is locked
+    so that no two attempts checkpoint the same inputs.
+    :param sql_adapter:
+    :param table_prefix:
+    :param dataset:
+    :param job_id:
+    :param task_id:
+    :param tag_ids:
+    :param chunk:
+    :param archives: The stats of the archives compressed from the chunk.
+    :param archive_post_processor: The post-processor of the archives, for their histograms and
+        keys.
+    :return: Whether the chunk was checkpointed, i.e., whether no other attempt at the task has
+        finished the task or checkpointed any of the chunk's inputs.
+    :raises: Propagates `db_cursor.execute`'s exceptions.
+    """
+    with closing(sql_adapter.create_connection(True)) as db_conn, closing(
+        db_conn.cursor(dictionary=True)
+    ) as db_cursor:
+        # The keys are registered before locking the task's row, since that's done in separate
+        # transactions.
+        keys_by_archive_id: Dict[str, List[str]] = {}
+        for archive_stats in archives:
+            keys = archive_post_processor.get_keys(archive_stats["id"])
+            # NOTE: An archive whose keys aren't recorded is never skipped by searches, so it's
+            # safe to leave out an archive with a key that's too long to record.
+            if keys is not None and all(
+                len(key.encode("utf-8")) <= MAX_KEY_NAME_LEN for key in keys
+            ):
+                keys_by_archive_id[archive_stats["id"]] = keys
+        key_ids = register_keys(
+            db_conn,
+            db_cursor,
+            table_prefix,
+            dataset,
+            (key for keys in keys_by_archive_id.values() for key in keys),
+        )
+
+        db_cursor.execute(
+            f"SELECT status FROM {COMPRESSION_TASKS_TABLE_NAME} WHERE id = %s FOR UPDATE",
+            [task_id],
+        )
+        if CompressionTaskStatus.SUCCEEDED == db_cursor.fetchone()["status"]:
+            db_conn.rollback()
+            return False
+
+        db_cursor.execute(
+            f"""
+            SELECT COUNT(*) AS num_checkpoints
+            FROM {COMPRESSION_TASK_CHECKPOINTS_TABLE_NAME}
+            WHERE task_id = %s AND (
+                (begin_file_ix < %s AND end_file_ix > %s) OR begin_file_ix = %s
+            )
+            """,
+            [task_id, chunk.end_file_ix, chunk.begin_file_ix, chunk.begin_file_ix],
+        )
+        if db_cursor.fetchone()["num_checkpoints"] > 0:
+            db_conn.rollback()
+            return False
+
+        db_cursor.execute(
+            f"""
+            INSERT INTO {COMPRESSION_TASK_CHECKPOINTS_TABLE_NAME} (
+                task_id, begin_file_ix, end_file_ix, archive_ids, uncompressed_size,
+                compressed_size
+            )
+            VALUES (%s, %s, %s, %s, %s, %s)
+            """,
+            [
+                task_id,
+                chunk.begin_file_ix,
+                chunk.end_file_ix,
+                json.dumps([archive_stats["id"] for archive_stats in archives]),
+                sum(archive_stats["uncompressed_size"] for archive_stats in archives),
+                sum(archive_stats["size"] for archive_stats in archives),
+            ],
+        )
+        for archive_stats in archives:
+            update_archive_metadata(db_cursor, table_prefix, dataset, archive_stats)
+            histogram = archive_post_processor.get_histogram(archive_stats["id"])
+            if histogram is not None:
+                insert_archive_histogram(
+                    db_cursor, table_prefix, dataset, archive_stats["id"], histogram
+                )
+            keys = keys_by_archive_id.get(archive_stats["id"])
+            if keys is not None:
+                insert_archive_keys(
+                    db_cursor,
+                    table_prefix,
+                    dataset,
+                    archive_stats["id"],
+                    get_key_id_bitmask(key_ids[key] for key in keys),
+                )
+            update_job_metadata_and_tags(
+                db_cursor, job_id, table_prefix, dataset, tag_ids, archive_stats
+            )
+        db_conn.commit()
+    return True
+
+
+def _commit_task(
+    db_cursor,
+    storage_engine: StorageEngine,
+    table_prefix: str,
+    dataset: Optional[str],
+    job_id: int,
+    task_id: int,
+    tag_ids: list[int],
+    task_status: CompressionTaskStatus,
+    start_time: datetime.datetime,
+    duration: float,
+    worker_output: Dict[str, Any],
+) -> bool:
+    """
+    Records the result of an attempt at a task unless another attempt at the task has already
+    succeeded, in which case the result is dropped.
+
+    Since the scheduler may run a backup attempt of a slow task, retry a failed task, and a task may
+    be redelivered, the task's row is updated conditionally so that exactly one successful attempt
+    completes the task. For clp-s, each attempt has already published its archives when it
+    checkpointed them (see `_checkpoint_chunk`), so archives aren't published here.
+
+    NOTE: The caller must commit the transaction.
+    :param db_cursor:
+    :param storage_engine:
+    :param table_prefix:
+    :param dataset:
+    :param job_id:
+    :param task_id:
+    :param tag_ids:
+    :param task_status:
+    :param start_time:
+    :param duration:
+    :param worker_output:
+    :return: Whether this attempt's result was recorded.
+    """
+    db_cursor.execute(
+        f"""
+        UPDATE {COMPRESSION_TASKS_TABLE_NAME}
+        SET status = %s, start_time = %s, partition_uncompressed_size = %s,
+            partition_compressed_size = %s, duration = %s
+        WHERE id = %s AND status <> %s
+        """,
+        [
+            task_status,
+            start_time,
+            worker_output["total_uncompressed_size"],
+            worker_output["total_compressed_size"],
+            duration,
+            task_id,
+            CompressionTaskStatus.SUCCEEDED,
+        ],
+    )
+    if 0 == db_cursor.rowcount:
+        # Another attempt at the task already succeeded
+        return False
+
+    # NOTE: clp writes its archives' metadata itself, so for clp, only the tags and job statistics
+    # are updated here.
+    if StorageEngine.CLP == storage_engine:
+        for archive_stats in worker_output.get("archives", []):
+            update_job_metadata_and_tags(
+                db_cursor, job_id, table_prefix, dataset, tag_ids, archive_stats
+            )
+    if CompressionTaskStatus.SUCCEEDED == task_status:
+        increment_compression_job_metadata(db_cursor, job_id, dict(num_tasks_completed=1))
+
+    return True
+
+
+def _discard_archives(
+    worker_config: WorkerConfig, dataset: Optional[str], archive_ids: List[str]
+) -> None:
+    """
+    Deletes clp-s archives that were never checkpointed.
+    :param worker_config:
+    :param dataset:
+    :param archive_ids:
+    :raises: Propagates `s3_delete_objects`'s exceptions.
+    """
+    storage = worker_config.archive_output.storage
+    if StorageType.S3 == storage.type:
+        s3_delete_objects(
+            storage.s3_config,
+            {
+                f"{dataset}/{archive_id}" if dataset is not None else archive_id
+                for archive_id in archive_ids
+            },
+        )
+    else:
+        archives_dir = worker_config.archive_output.get_directory()
+        if dataset is not None:
+            archives_dir = archives_dir / dataset
+        for archive_id in archive_ids:
+            shutil.rmtree(archives_dir / archive_id, ignore_errors=True)
+
+
 def compression_entry_point(
     job_id: int,
     task_id: int,
@@ -630,38 +1562,76 @@ def compression_entry_point(
 
     start_time = datetime.datetime.now()
     logger.info(f"[job_id={job_id} task_id={task_id}] COMPRESSION STARTED.")
-    compression_task_status, worker_output = run_clp(
-        worker_config,
-        clp_io_config,
-        clp_home,
-        logs_dir,
-        job_id,
-        task_id,
-        tag_ids,
-        paths_to_compress,
-        sql_adapter,
-        clp_metadata_db_connection_config,
-        logger,
-    )
+    with closing(sql_adapter.create_connection(True)) as db_conn, closing(
+        db_conn.cursor(dictionary=True)
+    ) as db_cursor:
+        # Record when the task's first attempt started so that the scheduler can detect stragglers
+        db_cursor.execute(
+            f"""
+            UPDATE {COMPRESSION_TASKS_TABLE_NAME}
+            SET start_time = %s
+            WHERE id = %s AND start_time IS NULL
+            """,
+            [start_time, task_id],
+        )
+        db_conn.commit()
+
+    compression_task_status = None
+    file_ranges_dir = None
+    if InputType.FS == clp_io_config.input.type and clp_io_config.input.file_ranges is not None:
+        file_ranges_dir = (
+            worker_config.tmp_directory / f"compression-job-{job_id}-task-{task_id}-ranges"
+        )
+        try:
+            clp_io_config, paths_to_compress = _materialize_file_ranges(
+                clp_io_config, paths_to_compress, file_ranges_dir
+            )
+        except (OSError, ValueError) as ex:
+            error_msg = f"Failed to copy the byte ranges of partially compressed files: {ex}"
+            logger.exception(error_msg)
+            compression_task_status = CompressionTaskStatus.FAILED
+            worker_output = {
+                "total_uncompressed_size": 0,
+                "total_compressed_size": 0,
+                "error_message": error_msg,
+            }
+    if compression_task_status is None:
+        compression_task_status, worker_output = run_clp(
+            worker_config,
+            clp_io_config,
+            clp_home,
+            logs_dir,
+            job_id,
+            task_id,
+            tag_ids,
+            paths_to_compress,
+            sql_adapter,
+            clp_metadata_db_connection_config,
+            logger,
+        )
+    if file_ranges_dir is not None:
+        shutil.rmtree(file_ranges_dir, ignore_errors=True)
     duration = (datetime.datetime.now() - start_time).total_seconds()
     logger.info(f"[job_id={job_id} task_id={task_id}] COMPRESSION COMPLETED.")
 
+    storage_engine = worker_config.package.storage_engine
+    dataset = clp_io_config.input.dataset
     with closing(sql_adapter.create_connection(True)) as db_conn, closing(
         db_conn.cursor(dictionary=True)
     ) as db_cursor:
-        update_compression_task_metadata(
+        _commit_task(
             db_cursor,
+            storage_engine,
+            clp_metadata_db_connection_config["table_prefix"],
+            dataset,
+            job_id,
             task_id,
-            dict(
-                start_time=start_time,
-                status=compression_task_status,
-                partition_uncompressed_size=worker_output["total_uncompressed_size"],
-                partition_compressed_size=worker_output["total_compressed_size"],
-                duration=duration,
-            ),
+            tag_ids,
+            compression_task_status,
+            start_time,
+            duration,
+            worker_output,
         )
-        if CompressionTaskStatus.SUCCEEDED == compression_task_status:
-            increment_compression_job_metadata(db_cursor, job_id, dict(num_tasks_completed=1))
         db_conn.commit()
 
     compression_task_result = CompressionTaskResult(
@@ -1,14 +1,16 @@
 import datetime
 import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from celery.app.task import Task
 from celery.utils.log import get_task_logger
 from clp_py_utils.clp_config import (
     Database,
-    S3Config,
+    S3Storage,
     StorageEngine,
     StorageType,
     WorkerConfig,
@@ -17,6 +19,7 @@ from clp_py_utils.clp_logging import set_logging_level
 from clp_py_utils.s3_utils import (
     generate_s3_virtual_hosted_style_url,
     get_credential_env_vars,
+    s3_delete_objects,
     s3_put,
 )
 from clp_py_utils.sql_adapter import SQL_Adapter
@@ -34,6 +37,106 @@ from job_orchestration.scheduler.scheduler_data import QueryTaskStatus
 logger = get_task_logger(__name__)
 
 
+class StreamUploader:
+    """
+    Uploads stream files to S3 on a bounded thread pool as soon as the extraction process reports
+    them, so that uploads overlap with the rest of the extraction.
+
+    Each stream file is deleted once its upload attempt finishes. After the first failure, any
+    remaining streams are deleted without being uploaded since further uploads would unnecessarily
+    slow down the task and generate a lot of extraneous output.
+
+    If the extraction fails, the streams that were already uploaded should be deleted using
+    `delete_uploaded_streams`, since the extraction's results are incomplete.
+    """
+
+    def __init__(self, s3_storage: S3Storage) -> None:
+        self._s3_storage: S3Storage = s3_storage
+        self._executor = ThreadPoolExecutor(max_workers=s3_storage.max_concurrent_uploads)
+        self._upload_failed = threading.Event()
+        self._uploaded_stream_names_lock = threading.Lock()
+        self._uploaded_stream_names: Set[str] = set()
+
+    def handle_stream_stats_line(self, line: str) -> None:
+        """
+        Parses a stream's stats as printed by the extraction process and schedules the stream for
+        upload.
+        :param line:
+        """
+        if "" == line.strip():
+            return
+
+        try:
+            stream_stats = json.loads(line)
+        except json.decoder.JSONDecodeError:
+            logger.exception(f"`{line}` cannot be decoded as JSON")
+            self._upload_failed.set()
+            return
+
+        stream_path_str = stream_stats.get("path")
+        if stream_path_str is None:
+            logger.error(f"`path` is not a valid key in `{line}`")
+            self._upload_failed.set()
+            return
+
+        self._executor.submit(self._upload_stream, Path(stream_path_str))
+
+    def abort(self) -> None:
+        """
+        Prevents any stream that hasn't started uploading from being uploaded.
+        """
+        self._upload_failed.set()
+
+    def wait(self) -> bool:
+        """
+        Waits for all scheduled uploads to finish.
+        :return: Whether all streams were uploaded successfully.
+        """
+        self._executor.shutdown(wait=True)
+        return not self._upload_failed.is_set()
+
+    def delete_uploaded_streams(self) -> None:
+        """
+        Deletes every stream that was uploaded. Must only be called after `wait`.
+        """
+        if 0 == len(self._uploaded_stream_names):
+            return
+
+        logger.info(f"Deleting {len(self._uploaded_stream_names)} uploaded stream(s) from S3...")
+        try:
+            s3_delete_objects(self._s3_storage.s3_config, self._uploaded_stream_names)
+        except Exception as err:
+            logger.error(f"Failed to delete uploaded streams {self._uploaded_stream_names}: {err}")
+            return
+        self._uploaded_stream_names.clear()
+        logger.info("Finished deleting uploaded streams.")
+
+    def _upload_stream(self, stream_path: Path) -> None:
+        try:
+            if self._upload_failed.is_set():
+                return
+
+            stream_name = stream_path.name
+            logger.info(f"Uploading stream {stream_name} to S3...")
+            try:
+                s3_put(
+                    self._s3_storage.s3_config,
+                    stream_path,
+                    stream_name,
+                    part_size=self._s3_storage.upload_part_size,
+                    max_concurrency=self._s3_storage.max_concurrent_upload_parts,
+                    max_pool_connections=self._s3_storage.max_pool_connections,
+                )
+                with self._uploaded_stream_names_lock:
+                    self._uploaded_stream_names.add(stream_name)
+                logger.info(f"Finished uploading stream {stream_name} to S3.")
+            except Exception as err:
+                logger.error(f"Failed to upload stream {stream_name}: {err}")
+                self._upload_failed.set()
+        finally:
+            stream_path.unlink(missing_ok=True)
+
+
 def _make_clp_command_and_env_vars(
     clp_home: Path,
     worker_config: WorkerConfig,
@@ -216,11 +319,10 @@ def extract_stream(
     clp_home = Path(os.getenv("CLP_HOME"))
 
     # Get S3 config
-    s3_config: S3Config
+    stream_uploader: Optional[StreamUploader] = None
     enable_s3_upload = False
     storage_config = worker_config.stream_output.storage
     if StorageType.S3 == storage_config.type:
-        s3_config = storage_config.s3_config
         enable_s3_upload = True
 
     task_command, core_clp_env_vars = _make_command_and_env_vars(
@@ -239,7 +341,13 @@ def extract_stream(
             start_time=start_time,
         )
 
-    task_results, task_stdout_str = run_query_task(
+    stdout_line_handler = None
+    if enable_s3_upload:
+        logger.info(f"Uploading streams to S3 as they're extracted...")
+        stream_uploader = StreamUploader(storage_config)
+        stdout_line_handler = stream_uploader.handle_stream_stats_line
+
+    task_results, _ = run_query_task(
         sql_adapter=sql_adapter,
         logger=logger,
         clp_logs_dir=clp_logs_dir,
@@ -249,48 +357,20 @@ def extract_stream(
         job_id=job_id,
         task_id=task_id,
         start_time=start_time,
+        stdout_line_handler=stdout_line_handler,
     )
 
-    if enable_s3_upload and QueryTaskStatus.SUCCEEDED == task_results.status:
-        logger.info(f"Uploading streams to S3...")
+    if stream_uploader is not None:
+        if QueryTaskStatus.SUCCEEDED != task_results.status:
+            stream_uploader.abort()
 
-        upload_error = False
-        for line in task_stdout_str.splitlines():
-            try:
-                stream_stats = json.loads(line)
-            except json.decoder.JSONDecodeError:
-                logger.exception(f"`{line}` cannot be decoded as JSON")
-                upload_error = True
-                continue
-
-            stream_path_str = stream_stats.get("path")
-            if stream_path_str is None:
-                logger.error(f"`path` is not a valid key in `{line}`")
-                upload_error = True
-                continue
-
-            stream_path = Path(stream_path_str)
-
-            # If we've had a single upload error, we don't want to try uploading any other streams
-            # since that may unnecessarily slow down the task and generate a lot of extraneous
-            # output.
-            if not upload_error:
-                stream_name = stream_path.name
-                logger.info(f"Uploading stream {stream_name} to S3...")
-
-                try:
-                    s3_put(s3_config, stream_path, stream_name)
-                    logger.info(f"Finished uploading stream {stream_name} to S3.")
-                except Exception as err:
-                    logger.error(f"Failed to upload stream {stream_name}: {err}")
-                    upload_error = True
-
-            stream_path.unlink()
-
-        if upload_error:
+        if stream_uploader.wait():
+            logger.info(f"Finished uploading streams.")
+        elif QueryTaskStatus.SUCCEEDED == task_results.status:
             task_results.status = QueryTaskStatus.FAILED
             task_results.error_log_path = str(os.getenv("CLP_WORKER_LOG_PATH"))
-        else:
-            logger.info(f"Finished uploading streams.")
+
+        if QueryTaskStatus.SUCCEEDED != task_results.status:
+            stream_uploader.delete_uploaded_streams()
 
     return task_results.model_dump()
@@ -6,7 +6,7 @@ import sys
 from contextlib import closing
 from logging import Logger
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from clp_py_utils.clp_config import QUERY_TASKS_TABLE_NAME
 from clp_py_utils.sql_adapter import SQL_Adapter
@@ -49,7 +49,26 @@ def run_query_task(
     job_id: str,
     task_id: int,
     start_time: datetime.datetime,
+    stdout_line_handler: Optional[Callable[[str], None]] = None,
 ) -> Tuple[QueryTaskResult, str]:
+    """
+    Runs the given task command and updates the task's metadata in the database accordingly.
+
+    :param sql_adapter:
+    :param logger:
+    :param clp_logs_dir:
+    :param task_command:
+    :param env_vars:
+    :param task_name:
+    :param job_id:
+    :param task_id:
+    :param start_time:
+    :param stdout_line_handler: If set, the task's stdout is consumed line by line as it's printed,
+        and each decoded line is passed to this callback instead of being buffered.
+    :return: A tuple containing:
+        - The task's result.
+        - The task's stdout, or an empty string if `stdout_line_handler` is set.
+    """
     clo_log_path = get_task_log_file_path(clp_logs_dir, job_id, task_id)
     clo_log_file = open(clo_log_path, "w")
 
@@ -84,9 +103,16 @@ def run_query_task(
     signal.signal(signal.SIGTERM, sigterm_handler)
 
     logger.info(f"Waiting for {task_name} to finish")
-    # `communicate` is equivalent to `wait` in this case, but avoids deadlocks when piping to
-    # stdout/stderr.
-    stdout_data, _ = task_proc.communicate()
+    if stdout_line_handler is None:
+        # `communicate` is equivalent to `wait` in this case, but avoids deadlocks when piping to
+        # stdout/stderr.
+        stdout_data, _ = task_proc.communicate()
+    else:
+        # stderr is redirected to a file, so draining stdout until EOF can't deadlock.
+        for line in task_proc.stdout:
+            stdout_line_handler(line.decode("utf-8"))
+        task_proc.wait()
+        stdout_data = b""
     return_code = task_proc.returncode
     if 0 != return_code:
         task_status = QueryTaskStatus.FAILED
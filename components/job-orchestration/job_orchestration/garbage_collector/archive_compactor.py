@@ -0,0 +1,594 @@
+import asyncio
+import json
+import os
+import pathlib
+import shutil
+import subprocess
+import time
+from contextlib import closing
+from typing import Any, Dict, List, Optional, Set
+
+import brotli
+import msgpack
+from clp_py_utils.clp_config import (
+    ArchiveCompaction,
+    ArchiveOutput,
+    CLPConfig,
+    COMPRESSION_JOBS_TABLE_NAME,
+    StorageEngine,
+    StorageType,
+)
+from clp_py_utils.clp_logging import get_logger
+from clp_py_utils.clp_metadata_db_utils import (
+    delete_archives_from_metadata_db,
+    fetch_existing_datasets,
+    get_archive_tags_table_name,
+    get_archives_table_name,
+)
+from clp_py_utils.sql_adapter import SQL_Adapter
+from job_orchestration.garbage_collector.constants import ARCHIVE_COMPACTOR_NAME, MIN_TO_SECONDS
+from job_orchestration.garbage_collector.utils import (
+    configure_logger,
+    DeletionCandidatesBuffer,
+    execute_deletion,
+    get_oldest_running_query_job_creation_time,
+)
+from job_orchestration.scheduler.constants import CompressionJobStatus
+from job_orchestration.scheduler.job_config import ClpIoConfig
+from job_orchestration.utils.archive_histogram_utils import (
+    compute_archive_histogram,
+    insert_archive_histogram,
+)
+from job_orchestration.utils.archive_keys_utils import (
+    get_archive_key_bitmasks,
+    insert_archive_keys,
+)
+
+logger = get_logger(ARCHIVE_COMPACTOR_NAME)
+
+
+class _TimestampKeyTracker:
+    """
+    Tracks the timestamp key each dataset's archives were compressed with, since recompressing an
+    archive requires the same timestamp key. The keys are read from the configs of the compression
+    jobs that have started, and only the jobs that started since the last update are read.
+    """
+
+    def __init__(self) -> None:
+        self.__last_job_id = 0
+        self.__timestamp_keys: Dict[str, Set[Optional[str]]] = {}
+
+    def update(self, db_cursor) -> None:
+        """
+        Reads the timestamp keys of the compression jobs that started since the last update.
+        :param db_cursor:
+        """
+        db_cursor.execute(
+            f"""
+            SELECT id, clp_config
+            FROM {COMPRESSION_JOBS_TABLE_NAME}
+            WHERE id > %s AND status != {CompressionJobStatus.PENDING}
+            ORDER BY id ASC
+            """,
+            [self.__last_job_id],
+        )
+        for row in db_cursor.fetchall():
+            clp_io_config = ClpIoConfig.model_validate(
+                msgpack.unpackb(brotli.decompress(row["clp_config"]))
+            )
+            input_config = clp_io_config.input
+            timestamp_key = "timestamp" if input_config.unstructured else input_config.timestamp_key
+            if input_config.dataset is not None:
+                self.__timestamp_keys.setdefault(input_config.dataset, set()).add(timestamp_key)
+            self.__last_job_id = row["id"]
+
+    def get_timestamp_key(self, dataset: str) -> Optional[str]:
+        """
+        :param dataset:
+        :return: The timestamp key the dataset's archives were compressed with.
+        :raises ValueError: If the dataset's archives weren't all compressed with the same key.
+        """
+        timestamp_keys = self.__timestamp_keys.get(dataset, {None})
+        if 1 != len(timestamp_keys):
+            raise ValueError(f"Dataset `{dataset}` was compressed with multiple timestamp keys.")
+        return next(iter(timestamp_keys))
+
+
+def _group_small_archives(
+    db_cursor,
+    archives_table: str,
+    target_archive_size: int,
+    compaction_config: ArchiveCompaction,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Groups time-adjacent small archives such that each group's total uncompressed size is at most
+    `target_archive_size`.
+    :param db_cursor:
+    :param archives_table:
+    :param target_archive_size:
+    :param compaction_config:
+    :return: The groups with at least `compaction_config.min_archives_per_compaction` archives.
+    """
+    db_cursor.execute(
+        f"""
+        SELECT id, uncompressed_size
+        FROM `{archives_table}`
+        WHERE uncompressed_size < %s
+        ORDER BY begin_timestamp ASC, end_timestamp ASC
+        """,
+        [int(target_archive_size * compaction_config.small_archive_size_ratio)],
+    )
+
+    groups: List[List[Dict[str, Any]]] = []
+    group: List[Dict[str, Any]] = []
+    group_size = 0
+    for archive in db_cursor.fetchall():
+        if group_size + archive["uncompressed_size"] > target_archive_size:
+            groups.append(group)
+            group = []
+            group_size = 0
+        group.append(archive)
+        group_size += archive["uncompressed_size"]
+    groups.append(group)
+
+    return [
+        group for group in groups if len(group) >= compaction_config.min_archives_per_compaction
+    ]
+
+
+def _recompress_archives(
+    clp_home: pathlib.Path,
+    archive_output_config: ArchiveOutput,
+    archives_dir: pathlib.Path,
+    work_dir: pathlib.Path,
+    archive_ids: List[str],
+    timestamp_key: Optional[str],
+    stderr_log_file,
+) -> List[Dict[str, Any]]:
+    """
+    Decompresses the given archives and compresses their content into new archives in the same
+    directory.
+    :param clp_home:
+    :param archive_output_config:
+    :param archives_dir:
+    :param work_dir: Directory for the decompressed content, which is deleted afterwards.
+    :param archive_ids:
+    :param timestamp_key:
+    :param stderr_log_file:
+    :return: The stats of each new archive.
+    :raises RuntimeError: If decompression or compression fails.
+    """
+    clp_s_path = str(clp_home / "bin" / "clp-s")
+    decompressed_dir = work_dir / "decompressed"
+    inputs_list_path = work_dir / "inputs.txt"
+    new_archives: Dict[str, Dict[str, Any]] = {}
+    try:
+        # Remove any content left behind by an earlier compaction that was interrupted
+        shutil.rmtree(work_dir, ignore_errors=True)
+        decompressed_dir.mkdir(parents=True)
+
+        for archive_id in archive_ids:
+            # fmt: off
+            decompression_cmd = [
+                clp_s_path,
+                "x", str(archives_dir), str(decompressed_dir / archive_id),
+                "--archive-id", archive_id,
+            ]
+            # fmt: on
+            proc = subprocess.run(decompression_cmd, stderr=stderr_log_file)
+            if 0 != proc.returncode:
+                raise RuntimeError(
+                    f"Failed to decompress archive {archive_id} (return code {proc.returncode})."
+                )
+
+        with open(inputs_list_path, "w") as inputs_list_file:
+            for path in sorted(decompressed_dir.rglob("*")):
+                if path.is_file():
+                    inputs_list_file.write(f"{path}\n")
+
+        # fmt: off
+        compression_cmd = [
+            clp_s_path,
+            "c", str(archives_dir),
+            "--files-from", str(inputs_list_path),
+            "--print-archive-stats",
+            "--target-encoded-size",
+            str(
+                archive_output_config.target_segment_size
+                + archive_output_config.target_dictionaries_size
+            ),
+            "--compression-level", str(archive_output_config.compression_level),
+        ]
+        # fmt: on
+        if timestamp_key is not None:
+            compression_cmd.append("--timestamp-key")
+            compression_cmd.append(timestamp_key)
+        proc = subprocess.run(compression_cmd, stdout=subprocess.PIPE, stderr=stderr_log_file)
+        for line in proc.stdout.decode("utf-8").splitlines():
+            archive_stats = json.loads(line)
+            new_archives[archive_stats["id"]] = archive_stats
+        if 0 != proc.returncode:
+            raise RuntimeError(f"Failed to compress archives (return code {proc.returncode}).")
+    except Exception:
+        for archive_id in new_archives:
+            shutil.rmtree(archives_dir / archive_id, ignore_errors=True)
+        raise
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return list(new_archives.values())
+
+
+def _swap_archives_metadata(
+    db_conn,
+    db_cursor,
+    table_prefix: str,
+    dataset: str,
+    old_archive_ids: List[str],
+    new_archives: List[Dict[str, Any]],
+    new_histograms: Dict[str, Dict[int, int]],
+) -> bool:
+    """
+    Replaces the metadata of the old archives with that of the new archives (which inherit all the
+    old archives' tags) in one transaction.
+
+    If the keys of every old archive were recorded, each new archive is recorded as having the keys
+    of all the old archives, which is a superset of its actual keys and so never causes it to be
+    skipped by a search that could match it.
+    :param db_conn:
+    :param db_cursor:
+    :param table_prefix:
+    :param dataset:
+    :param old_archive_ids:
+    :param new_archives: The stats of each new archive.
+    :param new_histograms: A map from each new archive to its histogram, if it was computed.
+    :return: Whether the metadata was swapped, which it isn't if any old archive was deleted (e.g.,
+        by the archive garbage collector) during compaction.
+    """
+    archives_table = get_archives_table_name(table_prefix, dataset)
+    archive_tags_table = get_archive_tags_table_name(table_prefix, dataset)
+    ids_list_string = ", ".join(["%s"] * len(old_archive_ids))
+
+    db_conn.commit()
+    db_cursor.execute(
+        f"SELECT id FROM `{archives_table}` WHERE id IN ({ids_list_string}) FOR UPDATE",
+        old_archive_ids,
+    )
+    if len(db_cursor.fetchall()) != len(old_archive_ids):
+        db_conn.rollback()
+        return False
+
+    db_cursor.execute(
+        f"""
+        SELECT DISTINCT tag_id FROM `{archive_tags_table}`
+        WHERE archive_id IN ({ids_list_string})
+        """,
+        old_archive_ids,
+    )
+    tag_ids = [row["tag_id"] for row in db_cursor.fetchall()]
+
+    old_key_id_bitmasks = get_archive_key_bitmasks(
+        db_cursor, table_prefix, dataset, old_archive_ids
+    )
+
+    db_cursor.executemany(
+        f"""
+        INSERT INTO `{archives_table}`
+        (id, begin_timestamp, end_timestamp, uncompressed_size, size, creator_id, creation_ix)
+        VALUES (%s, %s, %s, %s, %s, '', 0)
+        """,
+        [
+            (
+                archive["id"],
+                archive["begin_timestamp"],
+                archive["end_timestamp"],
+                archive["uncompressed_size"],
+                archive["size"],
+            )
+            for archive in new_archives
+        ],
+    )
+    if len(tag_ids) > 0:
+        db_cursor.executemany(
+            f"INSERT INTO `{archive_tags_table}` (archive_id, tag_id) VALUES (%s, %s)",
+            [(archive["id"], tag_id) for archive in new_archives for tag_id in tag_ids],
+        )
+    for archive_id, histogram in new_histograms.items():
+        insert_archive_histogram(db_cursor, table_prefix, dataset, archive_id, histogram)
+    if len(old_key_id_bitmasks) == len(old_archive_ids):
+        key_id_bitmask = 0
+        for old_key_id_bitmask in old_key_id_bitmasks.values():
+            key_id_bitmask |= old_key_id_bitmask
+        for archive in new_archives:
+            insert_archive_keys(db_cursor, table_prefix, dataset, archive["id"], key_id_bitmask)
+    delete_archives_from_metadata_db(db_cursor, old_archive_ids, table_prefix, dataset)
+    db_conn.commit()
+    return True
+
+
+def _compact_dataset(
+    clp_config: CLPConfig,
+    clp_home: pathlib.Path,
+    db_conn,
+    db_cursor,
+    table_prefix: str,
+    dataset: str,
+    timestamp_key: Optional[str],
+    retired_archives: Dict[str, float],
+    candidates_buffer: DeletionCandidatesBuffer,
+    stderr_log_file,
+) -> None:
+    """
+    Compacts each group of the dataset's small archives into new archives, and retires the old
+    archives.
+    :param clp_config:
+    :param clp_home:
+    :param db_conn:
+    :param db_cursor:
+    :param table_prefix:
+    :param dataset:
+    :param timestamp_key:
+    :param retired_archives: A map from each retired archive to the epoch when it was retired.
+    :param candidates_buffer: The buffer that persists the retired archives.
+    :param stderr_log_file:
+    """
+    archive_output_config = clp_config.archive_output
+    archives_dir = archive_output_config.get_directory() / dataset
+    groups = _group_small_archives(
+        db_cursor,
+        get_archives_table_name(table_prefix, dataset),
+        archive_output_config.target_archive_size,
+        clp_config.garbage_collector.archive_compaction,
+    )
+    db_conn.commit()
+
+    for group in groups:
+        old_archive_ids = [archive["id"] for archive in group]
+        try:
+            new_archives = _recompress_archives(
+                clp_home,
+                archive_output_config,
+                archives_dir,
+                clp_config.tmp_directory / f"{ARCHIVE_COMPACTOR_NAME}-{dataset}",
+                old_archive_ids,
+                timestamp_key,
+                stderr_log_file,
+            )
+        except Exception:
+            logger.exception(f"Failed to compact archives {old_archive_ids} of `{dataset}`.")
+            continue
+
+        new_histograms: Dict[str, Dict[int, int]] = {}
+        if clp_config.compression_worker.generate_archive_histograms:
+            for archive in new_archives:
+                try:
+                    new_histograms[archive["id"]] = compute_archive_histogram(
+                        clp_home, archives_dir, archive["id"], stderr_log_file
+                    )
+                except Exception:
+                    logger.exception(f"Failed to compute histogram of archive {archive['id']}.")
+
+        # NOTE: The old archives are persisted as deletion candidates before their metadata is
+        # swapped, so that they're still deleted if the compactor stops right after the swap
+        # commits. If the compactor stops before the swap commits, the candidates are dropped on
+        # restart since the archives are still in the metadata DB (see `_recover_retired_archives`).
+        old_candidates = [f"{dataset}/{archive_id}" for archive_id in old_archive_ids]
+        for candidate in old_candidates:
+            candidates_buffer.add_candidate(candidate)
+        candidates_buffer.persist_new_candidates()
+
+        is_swapped = False
+        try:
+            is_swapped = _swap_archives_metadata(
+                db_conn,
+                db_cursor,
+                table_prefix,
+                dataset,
+                old_archive_ids,
+                new_archives,
+                new_histograms,
+            )
+        finally:
+            if not is_swapped:
+                candidates_buffer.remove_candidates(old_candidates)
+        if not is_swapped:
+            logger.info(f"Archives of `{dataset}` were deleted during compaction; skipping them.")
+            execute_deletion(
+                archive_output_config, {f"{dataset}/{archive['id']}" for archive in new_archives}
+            )
+            continue
+
+        retirement_epoch = time.time()
+        for candidate in old_candidates:
+            retired_archives[candidate] = retirement_epoch
+        logger.info(
+            f"Compacted {len(old_archive_ids)} archive(s) of `{dataset}` into"
+            f" {[archive['id'] for archive in new_archives]}."
+        )
+
+
+def _delete_retired_archives(
+    db_conn,
+    db_cursor,
+    archive_output_config: ArchiveOutput,
+    retired_archives: Dict[str, float],
+    candidates_buffer: DeletionCandidatesBuffer,
+) -> None:
+    """
+    Deletes the retired archives that no running query job could be searching, i.e., those retired
+    before the oldest running query job was created (see `_get_archive_safe_expiry_epoch`).
+    :param db_conn:
+    :param db_cursor:
+    :param archive_output_config:
+    :param retired_archives: A map from each retired archive to the epoch when it was retired.
+    :param candidates_buffer: The buffer that persists the retired archives.
+    """
+    safe_retirement_epoch = time.time()
+    job_creation_time = get_oldest_running_query_job_creation_time(db_cursor, safe_retirement_epoch)
+    db_conn.commit()
+    if job_creation_time is not None:
+        logger.debug(f"Discovered running query job created at {job_creation_time}.")
+        safe_retirement_epoch = job_creation_time.timestamp()
+
+    candidates_to_delete = {
+        candidate
+        for candidate, retirement_epoch in retired_archives.items()
+        if retirement_epoch < safe_retirement_epoch
+    }
+    if 0 == len(candidates_to_delete):
+        return
+
+    execute_deletion(archive_output_config, candidates_to_delete)
+    candidates_buffer.remove_candidates(candidates_to_delete)
+    for candidate in candidates_to_delete:
+        del retired_archives[candidate]
+    logger.info(
+        f"Deleted {len(candidates_to_delete)} compacted archive(s): {sorted(candidates_to_delete)}"
+    )
+
+
+def _recover_retired_archives(
+    clp_config: CLPConfig, candidates_buffer: DeletionCandidatesBuffer
+) -> Dict[str, float]:
+    """
+    Recovers the archives that were retired before a restart, dropping any persisted candidate
+    whose archive is still in the metadata DB (i.e., whose metadata swap never committed).
+    :param clp_config:
+    :param candidates_buffer: The buffer that persists the retired archives.
+    :return: A map from each retired archive to the epoch when it was retired, which is the current
+        epoch since the original retirement epochs aren't persisted.
+    """
+    candidates = candidates_buffer.get_candidates()
+    if 0 == len(candidates):
+        return {}
+
+    archive_ids_by_dataset: Dict[str, List[str]] = {}
+    for candidate in candidates:
+        dataset, archive_id = candidate.split("/", 1)
+        archive_ids_by_dataset.setdefault(dataset, []).append(archive_id)
+
+    database_config = clp_config.database
+    table_prefix = database_config.get_clp_connection_params_and_type()["table_prefix"]
+    sql_adapter = SQL_Adapter(database_config)
+    live_candidates: Set[str] = set()
+    with closing(sql_adapter.create_connection(True)) as db_conn, closing(
+        db_conn.cursor(dictionary=True)
+    ) as db_cursor:
+        existing_datasets = fetch_existing_datasets(db_cursor, table_prefix)
+        for dataset, archive_ids in archive_ids_by_dataset.items():
+            if dataset not in existing_datasets:
+                continue
+            db_cursor.execute(
+                f"""
+                SELECT id FROM `{get_archives_table_name(table_prefix, dataset)}`
+                WHERE id IN ({", ".join(["%s"] * len(archive_ids))})
+                """,
+                archive_ids,
+            )
+            live_candidates.update(f"{dataset}/{row['id']}" for row in db_cursor.fetchall())
+        db_conn.commit()
+
+    if len(live_candidates) > 0:
+        logger.info(
+            f"Dropping {len(live_candidates)} deletion candidate(s) whose archives weren't"
+            f" replaced: {sorted(live_candidates)}"
+        )
+        candidates_buffer.remove_candidates(live_candidates)
+
+    recovery_epoch = time.time()
+    return {candidate: recovery_epoch for candidate in candidates_buffer.get_candidates()}
+
+
+def _compact_small_archives(
+    clp_config: CLPConfig,
+    clp_home: pathlib.Path,
+    timestamp_key_tracker: _TimestampKeyTracker,
+    retired_archives: Dict[str, float],
+    candidates_buffer: DeletionCandidatesBuffer,
+    stderr_log_path: pathlib.Path,
+) -> None:
+    database_config = clp_config.database
+    table_prefix = database_config.get_clp_connection_params_and_type()["table_prefix"]
+    sql_adapter = SQL_Adapter(database_config)
+    with closing(sql_adapter.create_connection(True)) as db_conn, closing(
+        db_conn.cursor(dictionary=True)
+    ) as db_cursor, open(stderr_log_path, "a") as stderr_log_file:
+        _delete_retired_archives(
+            db_conn, db_cursor, clp_config.archive_output, retired_archives, candidates_buffer
+        )
+
+        timestamp_key_tracker.update(db_cursor)
+        datasets = fetch_existing_datasets(db_cursor, table_prefix)
+        db_conn.commit()
+        for dataset in datasets:
+            try:
+                timestamp_key = timestamp_key_tracker.get_timestamp_key(dataset)
+            except ValueError as err:
+                logger.debug(f"Skipping compaction of dataset `{dataset}`: {err}")
+                continue
+
+            logger.debug(f"Running compaction on dataset `{dataset}`")
+            _compact_dataset(
+                clp_config,
+                clp_home,
+                db_conn,
+                db_cursor,
+                table_prefix,
+                dataset,
+                timestamp_key,
+                retired_archives,
+                candidates_buffer,
+                stderr_log_file,
+            )
+
+        _delete_retired_archives(
+            db_conn, db_cursor, clp_config.archive_output, retired_archives, candidates_buffer
+        )
+
+
+async def archive_compactor(
+    clp_config: CLPConfig, log_directory: pathlib.Path, logging_level: str
+) -> None:
+    configure_logger(logger, logging_level, log_directory, ARCHIVE_COMPACTOR_NAME)
+
+    storage_engine = clp_config.package.storage_engine
+    if StorageEngine.CLP_S != storage_engine:
+        raise ValueError(
+            f"Archive compaction is not supported with storage engine {storage_engine}"
+        )
+    storage_type = clp_config.archive_output.storage.type
+    if StorageType.FS != storage_type:
+        raise ValueError(f"Archive compaction is not supported with storage type {storage_type}")
+
+    clp_home = pathlib.Path(os.getenv("CLP_HOME"))
+    compaction_interval_secs = (
+        clp_config.garbage_collector.archive_compaction.interval * MIN_TO_SECONDS
+    )
+    recovery_file = clp_config.logs_directory / f"{ARCHIVE_COMPACTOR_NAME}.tmp"
+    stderr_log_path = log_directory / f"{ARCHIVE_COMPACTOR_NAME}-clp-s.log"
+
+    candidates_buffer = DeletionCandidatesBuffer(recovery_file)
+    timestamp_key_tracker = _TimestampKeyTracker()
+
+    logger.info(f"{ARCHIVE_COMPACTOR_NAME} started.")
+    try:
+        # Archives retired before a restart are treated as if they were just retired
+        retired_archives = await asyncio.to_thread(
+            _recover_retired_archives, clp_config, candidates_buffer
+        )
+        while True:
+            # Compaction runs subprocesses for a long time, so it runs in a thread to avoid
+            # blocking the other garbage collectors
+            await asyncio.to_thread(
+                _compact_small_archives,
+                clp_config,
+                clp_home,
+                timestamp_key_tracker,
+                retired_archives,
+                candidates_buffer,
+                stderr_log_path,
+            )
+            await asyncio.sleep(compaction_interval_secs)
+    except Exception:
+        logger.exception(f"{ARCHIVE_COMPACTOR_NAME} exited with failure.")
+        raise
@@ -8,7 +8,6 @@ from clp_py_utils.clp_config import (
     ArchiveOutput,
     CLPConfig,
     Database,
-    QUERY_JOBS_TABLE_NAME,
     StorageEngine,
 )
 from clp_py_utils.clp_logging import get_logger
@@ -27,9 +26,9 @@ from job_orchestration.garbage_collector.utils import (
     configure_logger,
     DeletionCandidatesBuffer,
     execute_deletion,
+    get_oldest_running_query_job_creation_time,
     validate_storage_type,
 )
-from job_orchestration.scheduler.constants import QueryJobStatus
 
 logger = get_logger(ARCHIVE_GARBAGE_COLLECTOR_NAME)
 
@@ -121,21 +120,8 @@ def _get_archive_safe_expiry_epoch(
     current_epoch_secs = time.time()
     archive_expiry_epoch: int
 
-    db_cursor.execute(
-        f"""
-        SELECT id, creation_time
-        FROM `{QUERY_JOBS_TABLE_NAME}`
-        WHERE {QUERY_JOBS_TABLE_NAME}.status = {QueryJobStatus.RUNNING}
-        AND {QUERY_JOBS_TABLE_NAME}.creation_time < FROM_UNIXTIME(%s)
-        ORDER BY creation_time ASC
-        LIMIT 1
-        """,
-        [current_epoch_secs],
-    )
-
-    row = db_cursor.fetchone()
-    if row is not None:
-        job_creation_time = row.get("creation_time")
+    job_creation_time = get_oldest_running_query_job_creation_time(db_cursor, current_epoch_secs)
+    if job_creation_time is not None:
         archive_expiry_epoch = int(job_creation_time.timestamp()) - retention_period_secs
         logger.debug(f"Discovered running query job created at {job_creation_time}.")
         logger.debug(f"Using adjusted archive_expiry_epoch=`{archive_expiry_epoch}`.")
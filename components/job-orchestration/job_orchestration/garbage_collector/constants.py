@@ -3,5 +3,6 @@ from typing_extensions import Final
 MIN_TO_SECONDS: Final[int] = 60
 SECOND_TO_MILLISECOND: Final[int] = 1000
 
+ARCHIVE_COMPACTOR_NAME: Final[str] = "archive-compactor"
 ARCHIVE_GARBAGE_COLLECTOR_NAME: Final[str] = "archive-garbage-collector"
 SEARCH_RESULT_GARBAGE_COLLECTOR_NAME: Final[str] = "search-result-garbage-collector"
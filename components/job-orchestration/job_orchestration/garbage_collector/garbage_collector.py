@@ -13,8 +13,10 @@ from clp_py_utils.clp_config import (
 )
 from clp_py_utils.clp_logging import get_logger
 from clp_py_utils.core import read_yaml_config_file
+from job_orchestration.garbage_collector.archive_compactor import archive_compactor
 from job_orchestration.garbage_collector.archive_garbage_collector import archive_garbage_collector
 from job_orchestration.garbage_collector.constants import (
+    ARCHIVE_COMPACTOR_NAME,
     ARCHIVE_GARBAGE_COLLECTOR_NAME,
     SEARCH_RESULT_GARBAGE_COLLECTOR_NAME,
 )
@@ -75,6 +77,22 @@ async def main(argv: List[str]) -> int:
             )
         )
 
+    if clp_config.garbage_collector.archive_compaction is None:
+        logger.info(
+            f"Archive compaction is not configured, skip creating {ARCHIVE_COMPACTOR_NAME}."
+        )
+    else:
+        logger.info(
+            f"Creating {ARCHIVE_COMPACTOR_NAME} with interval ="
+            f" {clp_config.garbage_collector.archive_compaction.interval} minutes"
+        )
+        gc_tasks.append(
+            asyncio.create_task(
+                archive_compactor(clp_config, logs_directory, logging_level),
+                name=ARCHIVE_COMPACTOR_NAME,
+            )
+        )
+
     # Poll and report any task that finished unexpectedly
     while len(gc_tasks) != 0:
         done, _ = await asyncio.wait(gc_tasks, return_when=asyncio.FIRST_COMPLETED)
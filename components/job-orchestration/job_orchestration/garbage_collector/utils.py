@@ -4,18 +4,20 @@ import pathlib
 import shutil
 import time
 from datetime import datetime, timezone
-from typing import List, Set
+from typing import Iterable, List, Optional, Set
 
 from bson import ObjectId
 from clp_py_utils.clp_config import (
     ArchiveOutput,
     FsStorage,
+    QUERY_JOBS_TABLE_NAME,
     StorageEngine,
     StorageType,
 )
 from clp_py_utils.clp_logging import get_logging_formatter, set_logging_level
 from clp_py_utils.s3_utils import s3_delete_objects
 from job_orchestration.garbage_collector.constants import MIN_TO_SECONDS
+from job_orchestration.scheduler.constants import QueryJobStatus
 
 
 def configure_logger(
@@ -51,6 +53,33 @@ def get_expiry_epoch_secs(retention_minutes: int) -> int:
     return int(time.time() - retention_minutes * MIN_TO_SECONDS)
 
 
+def get_oldest_running_query_job_creation_time(
+    db_cursor, current_epoch_secs: float
+) -> Optional[datetime]:
+    """
+    :param db_cursor:
+    :param current_epoch_secs:
+    :return: The creation time of the oldest query job that's running and was created before
+        `current_epoch_secs`, or None if there's no such job.
+    """
+    db_cursor.execute(
+        f"""
+        SELECT id, creation_time
+        FROM `{QUERY_JOBS_TABLE_NAME}`
+        WHERE {QUERY_JOBS_TABLE_NAME}.status = {QueryJobStatus.RUNNING}
+        AND {QUERY_JOBS_TABLE_NAME}.creation_time < FROM_UNIXTIME(%s)
+        ORDER BY creation_time ASC
+        LIMIT 1
+        """,
+        [current_epoch_secs],
+    )
+
+    row = db_cursor.fetchone()
+    if row is None:
+        return None
+    return row.get("creation_time")
+
+
 def get_oid_with_expiry_time(expiry_epoch_secs: int) -> ObjectId:
     return ObjectId.from_datetime(datetime.fromtimestamp(expiry_epoch_secs, tz=timezone.utc))
 
@@ -138,6 +167,27 @@ class DeletionCandidatesBuffer:
 
         self._candidates_to_persist.clear()
 
+    def remove_candidates(self, candidates: Iterable[str]) -> None:
+        """
+        Removes the given candidates from the buffer (e.g., after they've been processed), and
+        rewrites the recovery file with the remaining persisted candidates.
+
+        :param candidates:
+        """
+        self._candidates.difference_update(candidates)
+        if 0 == len(self._candidates):
+            self.clear()
+            return
+
+        self._candidates_to_persist = [
+            candidate for candidate in self._candidates_to_persist if candidate in self._candidates
+        ]
+        candidates_to_persist = set(self._candidates_to_persist)
+        with open(self._recovery_file_path, "w") as f:
+            for candidate in self._candidates:
+                if candidate not in candidates_to_persist:
+                    f.write(f"{candidate}\n")
+
     def clear(self):
         """
         Clears the in-memory buffer of candidates and removes the recovery file.
@@ -1,39 +1,57 @@
 import argparse
+import asyncio
 import datetime
+import functools
+import json
 import logging
 import os
 import signal
+import statistics
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import closing
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Set
+from typing import Any, Callable, Dict, Final, List, Optional, Set, Tuple
 
 import brotli
 import msgpack
 from clp_package_utils.general import CONTAINER_INPUT_LOGS_ROOT_DIR
 from clp_py_utils.clp_config import (
+    ArchiveOutput,
     CLPConfig,
+    COMPRESSION_FILE_GROUPS_TABLE_NAME,
     COMPRESSION_JOBS_TABLE_NAME,
     COMPRESSION_SCHEDULER_COMPONENT_NAME,
+    COMPRESSION_TASK_CHECKPOINTS_TABLE_NAME,
     COMPRESSION_TASKS_TABLE_NAME,
     StorageEngine,
 )
 from clp_py_utils.clp_logging import get_logger, get_logging_formatter, set_logging_level
 from clp_py_utils.clp_metadata_db_utils import (
     add_dataset,
+    delete_archives_from_metadata_db,
     fetch_existing_datasets,
     get_tags_table_name,
 )
-from clp_py_utils.compression import validate_path_and_get_info
-from clp_py_utils.core import read_yaml_config_file
-from clp_py_utils.s3_utils import s3_get_object_metadata
+from clp_py_utils.compression import iter_files_and_empty_directories
+from clp_py_utils.core import FileMetadata, read_yaml_config_file
+from clp_py_utils.s3_utils import s3_iter_object_metadata
 from clp_py_utils.sql_adapter import SQL_Adapter
 from pydantic import ValidationError
 
+from job_orchestration.garbage_collector.utils import execute_deletion
+from job_orchestration.scheduler.compress.continuous_ingestion import (
+    ContinuousIngestionJob,
+    FsContinuousIngestionJob,
+    is_continuous_ingestion_job,
+    resume_continuous_ingestion_jobs,
+    S3ContinuousIngestionJob,
+)
+from job_orchestration.scheduler.compress.deduplication import InputDeduplicator
 from job_orchestration.scheduler.compress.partition import PathsToCompressBuffer
+from job_orchestration.scheduler.compress.task_dispatcher import TaskDispatcher
 from job_orchestration.scheduler.compress.task_manager.celery_task_manager import CeleryTaskManager
-from job_orchestration.scheduler.compress.task_manager.task_manager import TaskManager
 from job_orchestration.scheduler.constants import (
     CompressionJobStatus,
     CompressionTaskStatus,
@@ -43,20 +61,40 @@ from job_orchestration.scheduler.job_config import (
     ClpIoConfig,
     FsInputConfig,
     InputType,
+    PathsToCompress,
     S3InputConfig,
 )
 from job_orchestration.scheduler.scheduler_data import (
     CompressionJob,
 )
+from job_orchestration.scheduler.task_result import CompressionTaskResult
 from job_orchestration.scheduler.utils import kill_hanging_jobs
 
 # Setup logging
 logger = get_logger("compression_scheduler")
 
+# Limits on the rows inserted by a single multi-row INSERT into the compression tasks table, to
+# stay well within the database's `max_allowed_packet`.
+COMPRESSION_TASKS_INSERT_BATCH_SIZE_MAX: Final[int] = 1000
+COMPRESSION_TASKS_INSERT_BATCH_BYTES_MAX: Final[int] = 8 * 1024 * 1024
+
+# A job's tasks are only checked for stragglers once it has no more tasks to dispatch and at least
+# this fraction of its tasks have succeeded, and at most once per interval.
+STRAGGLER_DETECTION_MIN_SUCCEEDED_TASKS_RATIO: Final[float] = 0.5
+STRAGGLER_DETECTION_INTERVAL: Final[float] = 10  # seconds
+# Tasks that have run for less than this are never considered stragglers
+STRAGGLER_RUNTIME_MIN: Final[float] = 60  # seconds
+
 scheduled_jobs = {}
 
 received_sigterm = False
 
+# IDs of jobs that have been fetched but are still being scheduled (i.e., split into tasks)
+jobs_being_scheduled: Set[int] = set()
+
+# IDs of continuous ingestion jobs whose input is being watched
+continuous_ingestion_jobs: Set[int] = set()
+
 
 def sigterm_handler(signal_number, frame):
     global received_sigterm
@@ -106,55 +144,53 @@ def update_compression_job_metadata(db_cursor, job_id, kv):
 
 
 def _process_fs_input_paths(
-    fs_input_conf: FsInputConfig, paths_to_compress_buffer: PathsToCompressBuffer
+    fs_input_conf: FsInputConfig,
+    paths_to_compress_buffer: PathsToCompressBuffer,
+    num_scanning_threads: int,
+    deduplicator: Optional[InputDeduplicator],
 ) -> List[str]:
     """
     Iterates through all paths in `fs_input_conf`, validates them, and adds metadata for each valid
-    path to `paths_to_compress_buffer` as long as an invalid path hasn't yet been encountered.
+    path to `paths_to_compress_buffer` as long as an invalid path hasn't yet been encountered. Files
+    with a byte range in `fs_input_conf.file_ranges` are sized by their range.
     :param fs_input_conf:
     :param paths_to_compress_buffer:
+    :param num_scanning_threads: The maximum number of directories to scan concurrently.
+    :param deduplicator: If set, whole files are only added if they aren't duplicates.
     :return: List of error messages about invalid paths.
+    :raises: Propagates `InputDeduplicator`'s exceptions.
     """
 
-    paths_ok = True
     invalid_path_messages: List[str] = []
-
-    for path_idx, path in enumerate(fs_input_conf.paths_to_compress, start=1):
-        path = Path(path)
-
-        try:
-            file, empty_directory = validate_path_and_get_info(CONTAINER_INPUT_LOGS_ROOT_DIR, path)
-        except ValueError as ex:
-            paths_ok = False
-            error_msg = str(ex)
-            logger.error(error_msg)
-            invalid_path_messages.append(error_msg)
+    file_ranges = fs_input_conf.file_ranges
+
+    for file, empty_directory in iter_files_and_empty_directories(
+        CONTAINER_INPUT_LOGS_ROOT_DIR,
+        [Path(path) for path in fs_input_conf.paths_to_compress],
+        invalid_path_messages,
+        num_scanning_threads,
+    ):
+        if len(invalid_path_messages) > 0:
             continue
 
-        if paths_ok:
-            if file:
+        if file:
+            if file_ranges is not None and str(file.path) in file_ranges:
+                begin, end = file_ranges[str(file.path)]
+                paths_to_compress_buffer.add_file(FileMetadata(file.path, end - begin))
+            elif deduplicator is not None:
+                for unique_file in deduplicator.add_file(file):
+                    paths_to_compress_buffer.add_file(unique_file)
+            else:
                 paths_to_compress_buffer.add_file(file)
-            elif empty_directory:
-                paths_to_compress_buffer.add_empty_directory(empty_directory)
+        elif empty_directory:
+            paths_to_compress_buffer.add_empty_directory(empty_directory)
 
-        if path.is_dir():
-            for internal_path in path.rglob("*"):
-                try:
-                    file, empty_directory = validate_path_and_get_info(
-                        CONTAINER_INPUT_LOGS_ROOT_DIR, internal_path
-                    )
-                except ValueError as ex:
-                    paths_ok = False
-                    error_msg = str(ex)
-                    logger.error(error_msg)
-                    invalid_path_messages.append(error_msg)
-                    continue
-
-                if paths_ok:
-                    if file:
-                        paths_to_compress_buffer.add_file(file)
-                    elif empty_directory:
-                        paths_to_compress_buffer.add_empty_directory(empty_directory)
+    if deduplicator is not None and 0 == len(invalid_path_messages):
+        for unique_file in deduplicator.flush():
+            paths_to_compress_buffer.add_file(unique_file)
+
+    for error_msg in invalid_path_messages:
+        logger.error(error_msg)
 
     return invalid_path_messages
 
@@ -162,22 +198,25 @@ def _process_fs_input_paths(
 def _process_s3_input(
     s3_input_config: S3InputConfig,
     paths_to_compress_buffer: PathsToCompressBuffer,
+    num_listing_threads: int,
 ) -> None:
     """
     Iterates through all objects under the <bucket>/<key_prefix> specified by s3_input_config,
-    and adds their metadata to paths_to_compress_buffer.
+    and adds their metadata to paths_to_compress_buffer as they're listed.
     :param s3_input_config:
     :param paths_to_compress_buffer:
+    :param num_listing_threads: Maximum number of S3 listing requests to issue concurrently.
     :raises: RuntimeError if input URL doesn't resolve to any objects.
-    :raises: Propagates `s3_get_object_metadata`'s exceptions.
+    :raises: Propagates `s3_iter_object_metadata`'s exceptions.
     """
 
-    object_metadata_list = s3_get_object_metadata(s3_input_config)
-    if len(object_metadata_list) == 0:
-        raise RuntimeError("Input URL doesn't resolve to any object")
-
-    for object_metadata in object_metadata_list:
+    num_objects = 0
+    for object_metadata in s3_iter_object_metadata(s3_input_config, num_listing_threads):
         paths_to_compress_buffer.add_file(object_metadata)
+        num_objects += 1
+
+    if num_objects == 0:
+        raise RuntimeError("Input URL doesn't resolve to any object")
 
 
 def _write_user_failure_log(
@@ -221,43 +260,45 @@ def _write_user_failure_log(
     return relative_log_path
 
 
-def search_and_schedule_new_tasks(
+def fetch_and_prepare_new_jobs(
     clp_config: CLPConfig,
     db_conn,
     db_cursor,
     clp_metadata_db_connection_config: Dict[str, Any],
-    task_manager: TaskManager,
-):
+    job_ids_to_skip: Set[int],
+) -> List[Tuple[int, ClpIoConfig]]:
     """
-    For all jobs with PENDING status, splits the job into tasks and schedules them.
+    Fetches all jobs with PENDING status, except those in `job_ids_to_skip`, and creates any
+    datasets they require.
     :param clp_config:
     :param db_conn:
     :param db_cursor:
     :param clp_metadata_db_connection_config:
-    :param task_manager:
+    :param job_ids_to_skip: IDs of jobs that are already being scheduled.
+    :return: A list of (job ID, job config) tuples.
     """
-    global scheduled_jobs
-
     existing_datasets: Set[str] = set()
     if StorageEngine.CLP_S == clp_config.package.storage_engine:
         existing_datasets = fetch_existing_datasets(
             db_cursor, clp_metadata_db_connection_config["table_prefix"]
         )
 
-    logger.debug("Search and schedule new tasks")
+    logger.debug("Search for new jobs")
 
     # Poll for new compression jobs
     jobs = fetch_new_jobs(db_cursor)
     db_conn.commit()
+    new_jobs: List[Tuple[int, ClpIoConfig]] = []
     for job_row in jobs:
         job_id = job_row["id"]
+        if job_id in job_ids_to_skip:
+            continue
         clp_io_config = ClpIoConfig.model_validate(
             msgpack.unpackb(brotli.decompress(job_row["clp_config"]))
         )
-        input_config = clp_io_config.input
 
         table_prefix = clp_metadata_db_connection_config["table_prefix"]
-        dataset = input_config.dataset
+        dataset = clp_io_config.input.dataset
 
         if dataset is not None and dataset not in existing_datasets:
             add_dataset(
@@ -271,17 +312,159 @@ def search_and_schedule_new_tasks(
             # NOTE: This assumes we never delete a dataset when compression jobs are being scheduled
             existing_datasets.add(dataset)
 
-        paths_to_compress_buffer = PathsToCompressBuffer(
-            maintain_file_ordering=False,
-            empty_directories_allowed=True,
-            scheduling_job_id=job_id,
-            clp_io_config=clp_io_config,
-            clp_metadata_db_connection_config=clp_metadata_db_connection_config,
+        new_jobs.append((job_id, clp_io_config))
+
+    return new_jobs
+
+
+def schedule_job(
+    clp_config: CLPConfig,
+    sql_adapter: SQL_Adapter,
+    clp_metadata_db_connection_config: Dict[str, Any],
+    task_dispatcher: TaskDispatcher,
+    job_id: int,
+    clp_io_config: ClpIoConfig,
+) -> Optional[CompressionJob]:
+    """
+    Splits a PENDING job into tasks and submits them as they're planned. Since planning can take a
+    long time (e.g., to walk a large filesystem tree or list a large S3 prefix), this is meant to
+    run on a worker thread, so it uses its own database connection.
+    :param clp_config:
+    :param sql_adapter:
+    :param clp_metadata_db_connection_config:
+    :param task_dispatcher:
+    :param job_id:
+    :param clp_io_config:
+    :return: The scheduled job (which may have failed during scheduling; see `_fail_job_planning`),
+        or None if the job finished (or failed) during scheduling.
+    """
+    with closing(sql_adapter.create_connection(True)) as db_conn, closing(
+        db_conn.cursor(dictionary=True)
+    ) as db_cursor:
+        try:
+            return _schedule_job(
+                clp_config,
+                db_conn,
+                db_cursor,
+                clp_metadata_db_connection_config,
+                task_dispatcher,
+                job_id,
+                clp_io_config,
+            )
+        except Exception as err:
+            logger.exception(f"Failed to schedule job {job_id}.")
+            update_compression_job_metadata(
+                db_cursor,
+                job_id,
+                {
+                    "status": CompressionJobStatus.FAILED,
+                    "status_msg": f"Scheduling failure: {err}"[:512],
+                },
+            )
+            db_conn.commit()
+            return None
+
+
+def _schedule_job(
+    clp_config: CLPConfig,
+    db_conn,
+    db_cursor,
+    clp_metadata_db_connection_config: Dict[str, Any],
+    task_dispatcher: TaskDispatcher,
+    job_id: int,
+    clp_io_config: ClpIoConfig,
+) -> Optional[CompressionJob]:
+    """
+    See `schedule_job`.
+    :param clp_config:
+    :param db_conn:
+    :param db_cursor:
+    :param clp_metadata_db_connection_config:
+    :param task_dispatcher:
+    :param job_id:
+    :param clp_io_config:
+    :return: The scheduled job (which may have failed during scheduling; see `_fail_job_planning`),
+        or None if the job finished (or failed) during scheduling.
+    """
+    input_config = clp_io_config.input
+    table_prefix = clp_metadata_db_connection_config["table_prefix"]
+    dataset = input_config.dataset
+
+    tag_ids = []
+    if clp_io_config.output.tags:
+        tags_table_name = get_tags_table_name(table_prefix, dataset)
+        db_cursor.executemany(
+            f"INSERT IGNORE INTO {tags_table_name} (tag_name) VALUES (%s)",
+            [(tag,) for tag in clp_io_config.output.tags],
         )
+        db_conn.commit()
+        db_cursor.execute(
+            f"SELECT tag_id FROM {tags_table_name} WHERE tag_name IN (%s)"
+            % ", ".join(["%s"] * len(clp_io_config.output.tags)),
+            clp_io_config.output.tags,
+        )
+        tag_ids = [tags["tag_id"] for tags in db_cursor.fetchall()]
+        db_conn.commit()
 
+    # For clp-s, tasks are queued for dispatch as soon as they're planned, so the job starts running
+    # before all its input has been processed. If processing the input then fails, the job is only
+    # failed once its dispatched tasks finish, so that their archives can be discarded (see
+    # `_fail_job_planning`). clp publishes its archives' metadata itself, so its archives can't be
+    # discarded; instead, its tasks are only queued once all the input has been processed.
+    start_time = datetime.datetime.now()
+    update_compression_job_metadata(
+        db_cursor,
+        job_id,
+        {
+            "status": CompressionJobStatus.RUNNING,
+            "start_time": start_time,
+        },
+    )
+    db_conn.commit()
+    job = CompressionJob(
+        id=job_id, start_time=start_time, priority=clp_io_config.priority, dataset=dataset
+    )
+    deferred_tasks: Optional[List[Dict[str, Any]]] = None
+    if StorageEngine.CLP_S != clp_config.package.storage_engine:
+        deferred_tasks = []
+
+    paths_to_compress_buffer = PathsToCompressBuffer(
+        maintain_file_ordering=False,
+        empty_directories_allowed=True,
+        scheduling_job_id=job_id,
+        clp_io_config=clp_io_config,
+        clp_metadata_db_connection_config=clp_metadata_db_connection_config,
+        partitions_handler=functools.partial(
+            _queue_compression_tasks,
+            db_conn,
+            db_cursor,
+            task_dispatcher,
+            job,
+            clp_io_config.priority,
+            tag_ids,
+            deferred_tasks,
+        ),
+    )
+
+    try:
         input_type = input_config.type
         if input_type == InputType.FS.value:
-            invalid_path_messages = _process_fs_input_paths(input_config, paths_to_compress_buffer)
+            deduplicator = None
+            if clp_config.compression_scheduler.deduplicate_fs_inputs:
+                deduplicator = InputDeduplicator(
+                    db_conn,
+                    db_cursor,
+                    table_prefix,
+                    dataset,
+                    job_id,
+                    clp_config.compression_scheduler.num_fs_scanning_threads,
+                )
+            invalid_path_messages = _process_fs_input_paths(
+                input_config,
+                paths_to_compress_buffer,
+                clp_config.compression_scheduler.num_fs_scanning_threads,
+                deduplicator,
+            )
             if len(invalid_path_messages) > 0:
                 user_log_relative_path = _write_user_failure_log(
                     title="Failed input paths log.",
@@ -299,113 +482,542 @@ def search_and_schedule_new_tasks(
                     f" See the error log at '{user_log_relative_path}' inside your configured logs"
                     " directory (`logs_directory`) for more details."
                 )
+                return _fail_job_planning(db_conn, db_cursor, task_dispatcher, job, error_msg)
 
+            if deduplicator is not None and deduplicator.num_duplicate_files > 0:
+                logger.info(
+                    f"Job {job_id} skipped {deduplicator.num_duplicate_files} duplicate input"
+                    f" files ({deduplicator.duplicate_size} bytes)."
+                )
                 update_compression_job_metadata(
-                    db_cursor,
-                    job_id,
-                    {
-                        "status": CompressionJobStatus.FAILED,
-                        "status_msg": error_msg,
-                    },
+                    db_cursor, job_id, {"duplicate_size": deduplicator.duplicate_size}
                 )
                 db_conn.commit()
-                continue
         elif input_type == InputType.S3.value:
             try:
-                _process_s3_input(input_config, paths_to_compress_buffer)
+                _process_s3_input(
+                    input_config,
+                    paths_to_compress_buffer,
+                    clp_config.compression_scheduler.num_s3_listing_threads,
+                )
             except Exception as err:
                 logger.exception("Failed to process S3 input")
-                update_compression_job_metadata(
-                    db_cursor,
-                    job_id,
-                    {
-                        "status": CompressionJobStatus.FAILED,
-                        "status_msg": f"S3 Failure: {err}",
-                    },
+                return _fail_job_planning(
+                    db_conn, db_cursor, task_dispatcher, job, f"S3 Failure: {err}"
                 )
-                db_conn.commit()
-                continue
         else:
             logger.error(f"Unsupported input type {input_type}")
-            update_compression_job_metadata(
-                db_cursor,
-                job_id,
-                {
-                    "status": CompressionJobStatus.FAILED,
-                    "status_msg": f"Unsupported input type: {input_type}",
-                },
+            return _fail_job_planning(
+                db_conn, db_cursor, task_dispatcher, job, f"Unsupported input type: {input_type}"
             )
-            db_conn.commit()
-            continue
 
         paths_to_compress_buffer.flush()
-        tasks = paths_to_compress_buffer.get_tasks()
-        partition_info = paths_to_compress_buffer.get_partition_info()
+    except Exception as err:
+        logger.exception(f"Failed to schedule job {job_id}.")
+        return _fail_job_planning(
+            db_conn, db_cursor, task_dispatcher, job, f"Scheduling failure: {err}"
+        )
+
+    if deferred_tasks is not None and len(deferred_tasks) > 0:
+        task_dispatcher.add_tasks(job, clp_io_config.priority, deferred_tasks)
+
+    update_compression_job_metadata(
+        db_cursor,
+        job_id,
+        {
+            "num_tasks": paths_to_compress_buffer.num_tasks,
+            "partition_size_imbalance": paths_to_compress_buffer.get_partition_size_imbalance(),
+        },
+    )
+    db_conn.commit()
 
-        # Update job metadata
-        start_time = datetime.datetime.now()
+    if 0 == paths_to_compress_buffer.num_tasks:
+        logger.info(f"Job {job_id} has no paths to compress.")
         update_compression_job_metadata(
             db_cursor,
             job_id,
-            {
-                "num_tasks": paths_to_compress_buffer.num_tasks,
-                "status": CompressionJobStatus.RUNNING,
-                "start_time": start_time,
-            },
+            {"status": CompressionJobStatus.SUCCEEDED, "duration": 0.0},
         )
         db_conn.commit()
+        return None
+
+    return job
+
 
-        tag_ids = []
-        if clp_io_config.output.tags:
-            tags_table_name = get_tags_table_name(table_prefix, dataset)
-            db_cursor.executemany(
-                f"INSERT IGNORE INTO {tags_table_name} (tag_name) VALUES (%s)",
-                [(tag,) for tag in clp_io_config.output.tags],
+def _fail_job_planning(
+    db_conn,
+    db_cursor,
+    task_dispatcher: TaskDispatcher,
+    job: CompressionJob,
+    error_msg: str,
+) -> Optional[CompressionJob]:
+    """
+    Fails a job whose planning failed. Any of the job's tasks that are still queued are dropped. If
+    none of its tasks were queued, the job is marked as failed right away. Otherwise, some may have
+    been dispatched, so the job is returned (to be polled) with its `planning_error` set, so that it
+    fails once those tasks finish (see `poll_running_jobs`).
+    :param db_conn:
+    :param db_cursor:
+    :param task_dispatcher:
+    :param job:
+    :param error_msg:
+    :return: The job if some of its tasks were queued, or None otherwise.
+    """
+    task_dispatcher.drop_queued_tasks(job.id)
+    # NOTE: `task_arguments` is set once the job's first tasks are queued.
+    if job.task_arguments is not None:
+        logger.error(
+            f"Planning job {job.id} failed after some of its tasks were queued; failing the job"
+            " once its dispatched tasks finish."
+        )
+        job.planning_error = error_msg[:512]
+        return job
+
+    # NOTE: For the clp storage engine, tasks are inserted before they're queued (see
+    # `_queue_compression_tasks`), so the job may have PENDING tasks that will never run.
+    _fail_pending_tasks(db_cursor, job.id)
+    update_compression_job_metadata(
+        db_cursor,
+        job.id,
+        {
+            "status": CompressionJobStatus.FAILED,
+            "status_msg": error_msg[:512],
+        },
+    )
+    db_conn.commit()
+    return None
+
+
+def _fail_pending_tasks(db_cursor, job_id: int) -> None:
+    """
+    Marks a failed job's PENDING tasks (i.e., those that were never dispatched) as failed.
+    NOTE: The caller must commit the transaction.
+    :param db_cursor:
+    :param job_id:
+    """
+    db_cursor.execute(
+        f"""
+        UPDATE {COMPRESSION_TASKS_TABLE_NAME}
+        SET status = %s
+        WHERE job_id = %s AND status = %s
+        """,
+        [CompressionTaskStatus.FAILED, job_id, CompressionTaskStatus.PENDING],
+    )
+
+
+def _queue_compression_tasks(
+    db_conn,
+    db_cursor,
+    task_dispatcher: TaskDispatcher,
+    job: CompressionJob,
+    priority: int,
+    tag_ids: List[int],
+    deferred_tasks: Optional[List[Dict[str, Any]]],
+    tasks: List[Dict[str, Any]],
+    partition_info: List[Dict[str, Any]],
+):
+    """
+    Inserts a PENDING row for each of a job's newly planned tasks and queues the tasks for dispatch.
+    :param db_conn:
+    :param db_cursor:
+    :param task_dispatcher:
+    :param job: The job the tasks belong to.
+    :param priority: The job's priority.
+    :param tag_ids:
+    :param deferred_tasks: If set, the tasks are appended to this list instead of being queued.
+    :param tasks:
+    :param partition_info:
+    """
+    task_ids = _insert_pending_compression_tasks(db_conn, db_cursor, job.id, partition_info)
+    for task, task_id, task_partition_info in zip(tasks, task_ids, partition_info):
+        task["task_id"] = task_id
+        task["tag_ids"] = tag_ids
+        if "file_groups" in task_partition_info:
+            job.task_file_groups[task_id] = task_partition_info["file_groups"]
+    if deferred_tasks is not None:
+        deferred_tasks.extend(tasks)
+        return
+
+    if job.task_arguments is None and len(tasks) > 0:
+        job.task_arguments = {
+            key: value
+            for key, value in tasks[0].items()
+            if key not in ("task_id", "paths_to_compress_json")
+        }
+
+    task_dispatcher.add_tasks(job, priority, tasks)
+    logger.debug(f"Queued {len(tasks)} task(s) for job {job.id}.")
+
+
+def _insert_pending_compression_tasks(
+    db_conn, db_cursor, job_id: int, partition_info: List[Dict[str, Any]]
+) -> List[int]:
+    """
+    Inserts a row with PENDING status for each of a job's partitions, using as few multi-row INSERTs
+    as the batch limits allow, and commits them in a single transaction.
+    :param db_conn:
+    :param db_cursor:
+    :param job_id:
+    :param partition_info:
+    :return: The ID of each inserted row, in the same order as `partition_info`.
+    :raises RuntimeError: If the IDs of a batch's rows can't be read back.
+    """
+    task_ids: List[int] = []
+    batch_start_idx = 0
+    while batch_start_idx < len(partition_info):
+        batch_end_idx = batch_start_idx
+        batch_num_bytes = 0
+        while (
+            batch_end_idx < len(partition_info)
+            and batch_end_idx - batch_start_idx < COMPRESSION_TASKS_INSERT_BATCH_SIZE_MAX
+        ):
+            row_num_bytes = len(partition_info[batch_end_idx]["clp_paths_to_compress"])
+            if (
+                batch_end_idx > batch_start_idx
+                and batch_num_bytes + row_num_bytes > COMPRESSION_TASKS_INSERT_BATCH_BYTES_MAX
+            ):
+                break
+            batch_num_bytes += row_num_bytes
+            batch_end_idx += 1
+
+        batch = partition_info[batch_start_idx:batch_end_idx]
+        values = []
+        for task_partition_info in batch:
+            values.extend(
+                (
+                    job_id,
+                    task_partition_info["partition_original_size"],
+                    task_partition_info["clp_paths_to_compress"],
+                    CompressionTaskStatus.PENDING,
+                )
             )
-            db_conn.commit()
-            db_cursor.execute(
-                f"SELECT tag_id FROM {tags_table_name} WHERE tag_name IN (%s)"
-                % ", ".join(["%s"] * len(clp_io_config.output.tags)),
-                clp_io_config.output.tags,
+        db_cursor.execute(
+            f"""
+            INSERT INTO {COMPRESSION_TASKS_TABLE_NAME}
+            (job_id, partition_original_size, clp_paths_to_compress, status)
+            VALUES {", ".join(["(%s, %s, %s, %s)"] * len(batch))}
+            """,
+            values,
+        )
+
+        # NOTE: `lastrowid` is the ID of the batch's first row, but the IDs of the other rows can't
+        # be derived from it, since they're only guaranteed to be increasing (e.g., they're spaced
+        # by `auto_increment_increment`, and may not be consecutive depending on
+        # `innodb_autoinc_lock_mode`). So the IDs are read back instead; the job's rows with an ID of
+        # at least `lastrowid` are exactly the batch's rows (since only this transaction inserts the
+        # job's tasks), in the order they were inserted.
+        db_cursor.execute(
+            f"""
+            SELECT id FROM {COMPRESSION_TASKS_TABLE_NAME}
+            WHERE job_id = %s AND id >= %s
+            ORDER BY id
+            """,
+            (job_id, db_cursor.lastrowid),
+        )
+        batch_task_ids = [row["id"] for row in db_cursor.fetchall()]
+        if len(batch_task_ids) != len(batch):
+            raise RuntimeError(
+                f"Expected {len(batch)} inserted tasks for job {job_id}, but found"
+                f" {len(batch_task_ids)}."
             )
-            tag_ids = [tags["tag_id"] for tags in db_cursor.fetchall()]
-            db_conn.commit()
+        task_ids.extend(batch_task_ids)
+        batch_start_idx = batch_end_idx
+    db_conn.commit()
+
+    return task_ids
 
-        for task_idx, task in enumerate(tasks):
-            db_cursor.execute(
-                f"""
-                INSERT INTO {COMPRESSION_TASKS_TABLE_NAME}
-                (job_id, partition_original_size, clp_paths_to_compress)
-                VALUES({str(job_id)}, {partition_info[task_idx]["partition_original_size"]}, %s)
-                """,
-                (partition_info[task_idx]["clp_paths_to_compress"],),
+
+def _record_file_group_stats(db_cursor, job: CompressionJob):
+    """
+    Records the compression statistics of each file group in the given job. Since a task's archives
+    can contain several groups, each task's uncompressed size, compressed size, and duration are
+    attributed to its groups in proportion to their original sizes.
+    :param db_cursor:
+    :param job:
+    """
+    db_cursor.execute(
+        f"""
+        SELECT id, partition_uncompressed_size, partition_compressed_size, duration
+        FROM {COMPRESSION_TASKS_TABLE_NAME}
+        WHERE job_id = %s
+        """,
+        (job.id,),
+    )
+    task_stats = {row["id"]: row for row in db_cursor.fetchall()}
+
+    group_stats: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for task_id, file_groups in job.task_file_groups.items():
+        task_row = task_stats.get(task_id)
+        task_original_size = sum(original_size for _, original_size in file_groups.values())
+        for group_key, (num_files, original_size) in file_groups.items():
+            stats = group_stats.setdefault(
+                group_key,
+                {
+                    "num_files": 0,
+                    "original_size": 0,
+                    "uncompressed_size": None,
+                    "compressed_size": None,
+                    "duration": None,
+                },
             )
-            db_conn.commit()
-            task["task_id"] = db_cursor.lastrowid
-            task["tag_ids"] = tag_ids
-        result_handle = task_manager.submit(tasks)
+            stats["num_files"] += num_files
+            stats["original_size"] += original_size
+            if (
+                task_row is None
+                or task_row["partition_compressed_size"] is None
+                or 0 == task_original_size
+            ):
+                # The task failed or didn't report its output size
+                continue
 
-        job = CompressionJob(id=job_id, start_time=start_time, result_handle=result_handle)
+            share = original_size / task_original_size
+            for stat_name, task_stat in (
+                ("uncompressed_size", task_row["partition_uncompressed_size"]),
+                ("compressed_size", task_row["partition_compressed_size"]),
+                ("duration", task_row["duration"]),
+            ):
+                stats[stat_name] = (stats[stat_name] or 0) + (task_stat or 0) * share
+
+    rows = [
+        (
+            job.id,
+            path_template,
+            content_signature,
+            stats["num_files"],
+            stats["original_size"],
+            None if stats["uncompressed_size"] is None else int(stats["uncompressed_size"]),
+            None if stats["compressed_size"] is None else int(stats["compressed_size"]),
+            stats["duration"],
+        )
+        for (path_template, content_signature), stats in group_stats.items()
+    ]
+    for batch_start_idx in range(0, len(rows), COMPRESSION_TASKS_INSERT_BATCH_SIZE_MAX):
+        batch = rows[batch_start_idx : batch_start_idx + COMPRESSION_TASKS_INSERT_BATCH_SIZE_MAX]
         db_cursor.execute(
             f"""
-            UPDATE {COMPRESSION_TASKS_TABLE_NAME}
-            SET status='{CompressionTaskStatus.RUNNING}' WHERE job_id={job_id}
-            """
+            INSERT INTO {COMPRESSION_FILE_GROUPS_TABLE_NAME}
+            (job_id, path_template, content_signature, num_files, original_size,
+            uncompressed_size, compressed_size, duration)
+            VALUES {", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s)"] * len(batch))}
+            """,
+            [value for row in batch for value in row],
         )
-        db_conn.commit()
 
-        scheduled_jobs[job_id] = job
+
+def dispatch_queued_tasks(task_dispatcher: TaskDispatcher, db_conn, db_cursor):
+    """
+    Dispatches as many queued tasks as the in-flight task limits allow and marks them as RUNNING.
+    :param task_dispatcher:
+    :param db_conn:
+    :param db_cursor:
+    """
+    task_ids = task_dispatcher.dispatch()
+    if 0 == len(task_ids):
+        return
+
+    # NOTE: A task may finish (and update its own status) before this update, so only PENDING tasks
+    # are updated.
+    db_cursor.execute(
+        f"""
+        UPDATE {COMPRESSION_TASKS_TABLE_NAME}
+        SET status = %s
+        WHERE status = %s AND id IN ({", ".join(["%s"] * len(task_ids))})
+        """,
+        [CompressionTaskStatus.RUNNING, CompressionTaskStatus.PENDING, *task_ids],
+    )
+    db_conn.commit()
+    logger.debug(f"Dispatched {len(task_ids)} task(s).")
+
+
+def launch_backup_attempts(
+    task_dispatcher: TaskDispatcher, db_conn, db_cursor, slowdown_threshold: float
+):
+    """
+    Launches a backup attempt of each straggling task, i.e., each task that has run
+    `slowdown_threshold` times longer than expected, based on the median throughput of its job's
+    succeeded tasks.
+    :param task_dispatcher:
+    :param db_conn:
+    :param db_cursor:
+    :param slowdown_threshold:
+    """
+    now = datetime.datetime.now()
+    for job_id, job in list(scheduled_jobs.items()):
+        if (
+            job.result_handle is None
+            or job.planning_error is not None
+            or task_dispatcher.has_queued_tasks(job_id)
+        ):
+            continue
+        if (
+            job.last_straggler_check_time is not None
+            and (now - job.last_straggler_check_time).total_seconds() < STRAGGLER_DETECTION_INTERVAL
+        ):
+            continue
+        job.last_straggler_check_time = now
+
+        try:
+            _launch_backup_attempts_for_job(db_cursor, job, slowdown_threshold, now)
+        except Exception:
+            logger.exception(f"Failed to launch backup attempts for job {job_id}.")
+    db_conn.commit()
+
+
+def _launch_backup_attempts_for_job(
+    db_cursor, job: CompressionJob, slowdown_threshold: float, now: datetime.datetime
+):
+    """
+    See `launch_backup_attempts`.
+    :param db_cursor:
+    :param job:
+    :param slowdown_threshold:
+    :param now:
+    """
+    db_cursor.execute(
+        f"""
+        SELECT id, status, partition_original_size, start_time, duration
+        FROM {COMPRESSION_TASKS_TABLE_NAME}
+        WHERE job_id = %s
+        """,
+        [job.id],
+    )
+    tasks = db_cursor.fetchall()
+    throughputs = [
+        task["partition_original_size"] / task["duration"]
+        for task in tasks
+        if CompressionTaskStatus.SUCCEEDED == task["status"] and task["duration"] > 0
+    ]
+    if 0 == len(throughputs) or (
+        len(throughputs) < len(tasks) * STRAGGLER_DETECTION_MIN_SUCCEEDED_TASKS_RATIO
+    ):
+        return
+    expected_throughput = statistics.median(throughputs)
+
+    for task in tasks:
+        task_id = task["id"]
+        if (
+            CompressionTaskStatus.RUNNING != task["status"]
+            or task["start_time"] is None
+            or task_id in job.backup_task_ids
+        ):
+            continue
+        runtime = (now - task["start_time"]).total_seconds()
+        expected_runtime = task["partition_original_size"] / expected_throughput
+        if runtime < max(STRAGGLER_RUNTIME_MIN, slowdown_threshold * expected_runtime):
+            continue
+
+        task_params = _get_task_params(db_cursor, job, task_id)
+        if not job.result_handle.add_backup_task(task_params):
+            logger.debug(f"Backup attempts aren't supported for job {job.id}.")
+            return
+        job.backup_task_ids.add(task_id)
+        logger.info(
+            f"Launched a backup attempt of compression task job-{job.id}-task-{task_id}, which"
+            f" has run for {runtime:.0f} second(s) but was expected to take"
+            f" {expected_runtime:.0f}."
+        )
+
+
+def _get_task_params(db_cursor, job: CompressionJob, task_id: int) -> Dict[str, Any]:
+    """
+    Rebuilds the parameters a task was submitted with.
+    :param db_cursor:
+    :param job:
+    :param task_id:
+    :return: The task's parameters.
+    """
+    db_cursor.execute(
+        f"SELECT clp_paths_to_compress FROM {COMPRESSION_TASKS_TABLE_NAME} WHERE id = %s",
+        [task_id],
+    )
+    paths_to_compress = PathsToCompress.model_validate(
+        msgpack.unpackb(brotli.decompress(db_cursor.fetchone()["clp_paths_to_compress"]))
+    )
+    task_params = dict(job.task_arguments)
+    task_params["task_id"] = task_id
+    task_params["paths_to_compress_json"] = paths_to_compress.model_dump_json(exclude_none=True)
+    return task_params
+
+
+def _retry_tasks(
+    db_cursor,
+    task_dispatcher: TaskDispatcher,
+    job: CompressionJob,
+    failed_task_results: List[CompressionTaskResult],
+    max_task_attempts: int,
+):
+    """
+    Queues another attempt at each of the given failed tasks. Each attempt resumes from the task's
+    last checkpoint, so only the inputs that weren't committed by earlier attempts are compressed
+    again.
+    :param db_cursor:
+    :param task_dispatcher:
+    :param job:
+    :param failed_task_results:
+    :param max_task_attempts:
+    """
+    task_ids = [task_result.task_id for task_result in failed_task_results]
+    tasks = [_get_task_params(db_cursor, job, task_id) for task_id in task_ids]
+    db_cursor.execute(
+        f"""
+        UPDATE {COMPRESSION_TASKS_TABLE_NAME}
+        SET status = %s, start_time = NULL
+        WHERE id IN ({", ".join(["%s"] * len(task_ids))})
+        """,
+        [CompressionTaskStatus.PENDING, *task_ids],
+    )
+
+    for task_result in failed_task_results:
+        task_id = task_result.task_id
+        num_attempts = job.num_task_attempts.get(task_id, 1) + 1
+        job.num_task_attempts[task_id] = num_attempts
+        # Allow the new attempt to get its own backup attempt
+        job.backup_task_ids.discard(task_id)
+        logger.warning(
+            f"Compression task job-{job.id}-task-{task_id} failed with error:"
+            f" {task_result.error_message}. Retrying (attempt {num_attempts} of"
+            f" {max_task_attempts})."
+        )
+    task_dispatcher.add_tasks(job, job.priority, tasks)
 
 
-def poll_running_jobs(logs_directory: Path, db_conn, db_cursor):
+def poll_running_jobs(
+    logs_directory: Path,
+    archive_output: ArchiveOutput,
+    table_prefix: str,
+    task_dispatcher: TaskDispatcher,
+    db_conn,
+    db_cursor,
+    max_task_attempts: int,
+):
     """
-    Poll for running jobs and update their status.
+    Poll for running jobs and update their status. Failed tasks are retried until they've been
+    attempted `max_task_attempts` times. Jobs whose planning failed are failed once their dispatched
+    tasks finish, and their archives are discarded.
     """
     global scheduled_jobs
 
     logger.debug("Poll running jobs")
-    jobs_to_delete = []
-    for job_id, job in scheduled_jobs.items():
+    # NOTE: Jobs are added to `scheduled_jobs` by the event loop while this runs on a worker thread,
+    # so we iterate over a snapshot.
+    for job_id, job in list(scheduled_jobs.items()):
+        if job.planning_error is not None:
+            if job.result_handle is not None:
+                try:
+                    if job.result_handle.get_result() is None:
+                        # Some of the job's dispatched tasks are still running
+                        continue
+                except Exception as e:
+                    logger.error(f"Error while getting results for job {job_id}: {e}")
+            _fail_job_with_planning_error(
+                archive_output, table_prefix, task_dispatcher, db_conn, db_cursor, job
+            )
+            continue
+
+        if job.result_handle is None or task_dispatcher.has_queued_tasks(job_id):
+            # Some of the job's tasks haven't been dispatched yet
+            continue
+
         job_success = True
         duration = 0.0
         error_messages: List[str] = []
@@ -415,9 +1027,26 @@ def poll_running_jobs(logs_directory: Path, db_conn, db_cursor):
             if returned_results is None:
                 continue
 
+            # A retried task has a result for each attempt, of which only the last one counts
+            task_results: Dict[int, CompressionTaskResult] = {
+                task_result.task_id: task_result for task_result in returned_results
+            }
+            failed_task_results_to_retry = [
+                task_result
+                for task_result in task_results.values()
+                if CompressionTaskStatus.SUCCEEDED != task_result.status
+                and job.num_task_attempts.get(task_result.task_id, 1) < max_task_attempts
+            ]
+            if len(failed_task_results_to_retry) > 0:
+                _retry_tasks(
+                    db_cursor, task_dispatcher, job, failed_task_results_to_retry, max_task_attempts
+                )
+                db_conn.commit()
+                continue
+
             duration = (datetime.datetime.now() - job.start_time).total_seconds()
             # Check for finished jobs
-            for task_result in returned_results:
+            for task_result in task_results.values():
                 if task_result.status == CompressionTaskStatus.SUCCEEDED:
                     logger.info(
                         f"Compression task job-{job_id}-task-{task_result.task_id} completed in"
@@ -437,6 +1066,12 @@ def poll_running_jobs(logs_directory: Path, db_conn, db_cursor):
             logger.error(f"Error while getting results for job {job_id}: {e}")
             job_success = False
 
+        if len(job.task_file_groups) > 0:
+            try:
+                _record_file_group_stats(db_cursor, job)
+            except Exception:
+                logger.exception(f"Failed to record file group statistics for job {job_id}.")
+
         if job_success:
             logger.info(f"Job {job_id} succeeded.")
             update_compression_job_metadata(
@@ -477,17 +1112,314 @@ def poll_running_jobs(logs_directory: Path, db_conn, db_cursor):
             )
         db_conn.commit()
 
-        jobs_to_delete.append(job_id)
+        scheduled_jobs.pop(job_id)
+        task_dispatcher.remove_job(job_id)
+
+
+def _fail_job_with_planning_error(
+    archive_output: ArchiveOutput,
+    table_prefix: str,
+    task_dispatcher: TaskDispatcher,
+    db_conn,
+    db_cursor,
+    job: CompressionJob,
+):
+    """
+    Fails a job whose planning failed after some of its tasks were dispatched, once they've
+    finished, discarding the clp-s archives its tasks published so that the failed job leaves no
+    searchable data behind.
+    :param archive_output:
+    :param table_prefix:
+    :param task_dispatcher:
+    :param db_conn:
+    :param db_cursor:
+    :param job:
+    """
+    global scheduled_jobs
+
+    try:
+        _discard_job_archives(archive_output, table_prefix, db_conn, db_cursor, job)
+    except Exception:
+        logger.exception(f"Failed to discard the archives of job {job.id}.")
+
+    logger.error(f"Job {job.id} failed: {job.planning_error}")
+    # The tasks that were dropped from the dispatcher's queue are still PENDING
+    _fail_pending_tasks(db_cursor, job.id)
+    update_compression_job_metadata(
+        db_cursor,
+        job.id,
+        dict(
+            status=CompressionJobStatus.FAILED,
+            status_msg=job.planning_error,
+            duration=(datetime.datetime.now() - job.start_time).total_seconds(),
+        ),
+    )
+    db_conn.commit()
+
+    scheduled_jobs.pop(job.id)
+    task_dispatcher.remove_job(job.id)
+
+
+def _discard_job_archives(
+    archive_output: ArchiveOutput, table_prefix: str, db_conn, db_cursor, job: CompressionJob
+):
+    """
+    Deletes the metadata and then the content of every archive that the job's tasks checkpointed.
+    :param archive_output:
+    :param table_prefix:
+    :param db_conn:
+    :param db_cursor:
+    :param job:
+    """
+    db_cursor.execute(
+        f"""
+        SELECT c.archive_ids
+        FROM {COMPRESSION_TASK_CHECKPOINTS_TABLE_NAME} c
+        JOIN {COMPRESSION_TASKS_TABLE_NAME} t ON c.task_id = t.id
+        WHERE t.job_id = %s
+        """,
+        [job.id],
+    )
+    archive_ids = [
+        archive_id for row in db_cursor.fetchall() for archive_id in json.loads(row["archive_ids"])
+    ]
+    db_conn.commit()
+    if 0 == len(archive_ids):
+        return
+
+    delete_archives_from_metadata_db(db_cursor, archive_ids, table_prefix, job.dataset)
+    db_conn.commit()
+    execute_deletion(
+        archive_output,
+        {
+            f"{job.dataset}/{archive_id}" if job.dataset is not None else archive_id
+            for archive_id in archive_ids
+        },
+    )
+    logger.info(f"Discarded {len(archive_ids)} archive(s) of job {job.id}.")
+
+
+async def handle_new_jobs(
+    clp_config: CLPConfig,
+    sql_adapter: SQL_Adapter,
+    clp_metadata_db_connection_config: Dict[str, Any],
+    task_dispatcher: TaskDispatcher,
+    planning_executor: ThreadPoolExecutor,
+) -> None:
+    """
+    Continuously fetches new jobs and schedules each on `planning_executor`, so that a job with a
+    large input doesn't delay other jobs from starting, or delay polling for running jobs.
+    Continuous ingestion jobs aren't scheduled; instead, each gets a task that watches its input.
+    Stops fetching new jobs once SIGTERM is received.
+    :param clp_config:
+    :param sql_adapter:
+    :param clp_metadata_db_connection_config:
+    :param task_dispatcher:
+    :param planning_executor:
+    """
+    global jobs_being_scheduled
+    global continuous_ingestion_jobs
+
+    # Keep references to the scheduling tasks so they aren't garbage collected before they finish
+    scheduling_tasks: Set[asyncio.Task] = set()
+    with closing(sql_adapter.create_connection(True)) as db_conn, closing(
+        db_conn.cursor(dictionary=True)
+    ) as db_cursor:
+        while True:
+            if not received_sigterm:
+                new_jobs = await asyncio.to_thread(
+                    fetch_and_prepare_new_jobs,
+                    clp_config,
+                    db_conn,
+                    db_cursor,
+                    clp_metadata_db_connection_config,
+                    jobs_being_scheduled | continuous_ingestion_jobs,
+                )
+                for job_id, clp_io_config in new_jobs:
+                    if is_continuous_ingestion_job(clp_io_config):
+                        continuous_ingestion_jobs.add(job_id)
+                        ingestion_task = asyncio.create_task(
+                            _run_continuous_ingestion_job(
+                                clp_config, sql_adapter, job_id, clp_io_config
+                            )
+                        )
+                        scheduling_tasks.add(ingestion_task)
+                        ingestion_task.add_done_callback(scheduling_tasks.discard)
+                        continue
+
+                    jobs_being_scheduled.add(job_id)
+                    scheduling_task = asyncio.create_task(
+                        _schedule_job_on_executor(
+                            planning_executor,
+                            functools.partial(
+                                schedule_job,
+                                clp_config,
+                                sql_adapter,
+                                clp_metadata_db_connection_config,
+                                task_dispatcher,
+                                job_id,
+                                clp_io_config,
+                            ),
+                            task_dispatcher,
+                            job_id,
+                        )
+                    )
+                    scheduling_tasks.add(scheduling_task)
+                    scheduling_task.add_done_callback(scheduling_tasks.discard)
+            await asyncio.sleep(clp_config.compression_scheduler.jobs_poll_delay)
 
-    for job_id in jobs_to_delete:
-        del scheduled_jobs[job_id]
 
-    if received_sigterm and 0 == len(scheduled_jobs):
-        logger.info("Recieved SIGTERM and there're no more running jobs. Exiting.")
-        sys.exit(0)
+async def _schedule_job_on_executor(
+    planning_executor: ThreadPoolExecutor,
+    scheduling_func: Callable[[], Optional[CompressionJob]],
+    task_dispatcher: TaskDispatcher,
+    job_id: int,
+) -> None:
+    """
+    Runs `scheduling_func` on `planning_executor` and, if it returns a job, adds the job to the set
+    of jobs to poll. Otherwise, drops any of the job's tasks that are still queued.
+    :param planning_executor:
+    :param scheduling_func:
+    :param task_dispatcher:
+    :param job_id:
+    """
+    global scheduled_jobs
+    global jobs_being_scheduled
+
+    try:
+        job = await asyncio.get_running_loop().run_in_executor(planning_executor, scheduling_func)
+        if job is not None:
+            scheduled_jobs[job_id] = job
+        else:
+            task_dispatcher.remove_job(job_id)
+    except Exception:
+        logger.exception(f"Failed to schedule job {job_id}.")
+        task_dispatcher.remove_job(job_id)
+    finally:
+        # NOTE: The job must be added to `scheduled_jobs` before it's removed from
+        # `jobs_being_scheduled` so that `handle_running_jobs` always sees it in one of them.
+        jobs_being_scheduled.discard(job_id)
+
+
+async def _run_continuous_ingestion_job(
+    clp_config: CLPConfig,
+    sql_adapter: SQL_Adapter,
+    job_id: int,
+    clp_io_config: ClpIoConfig,
+) -> None:
+    """
+    Marks a continuous ingestion job as RUNNING and scans its input every scan interval until the job
+    is no longer RUNNING (e.g., it's killed) or SIGTERM is received. The job is marked as FAILED if
+    scanning fails.
+    :param clp_config:
+    :param sql_adapter:
+    :param job_id:
+    :param clp_io_config:
+    """
+    global continuous_ingestion_jobs
+
+    ingestion_job: ContinuousIngestionJob
+    if InputType.FS == clp_io_config.input.type:
+        ingestion_job = FsContinuousIngestionJob(
+            job_id, clp_io_config, clp_config.compression_scheduler.num_fs_scanning_threads
+        )
+    else:
+        ingestion_job = S3ContinuousIngestionJob(job_id, clp_io_config)
+    scan_interval = clp_io_config.input.continuous_ingestion.scan_interval
+    try:
+        with closing(sql_adapter.create_connection(True)) as db_conn, closing(
+            db_conn.cursor(dictionary=True)
+        ) as db_cursor:
+            await asyncio.to_thread(ingestion_job.start, db_conn, db_cursor)
+            logger.info(f"Started continuous ingestion job {job_id}.")
+            next_scan_time = time.monotonic()
+            while not received_sigterm:
+                if time.monotonic() >= next_scan_time:
+                    next_scan_time = time.monotonic() + scan_interval
+                    is_running = await asyncio.to_thread(ingestion_job.scan, db_conn, db_cursor)
+                    if not is_running:
+                        logger.info(f"Stopped continuous ingestion job {job_id}.")
+                        return
+                await asyncio.sleep(clp_config.compression_scheduler.jobs_poll_delay)
+    except Exception as err:
+        logger.exception(f"Continuous ingestion job {job_id} failed.")
+        with closing(sql_adapter.create_connection(True)) as db_conn, closing(
+            db_conn.cursor(dictionary=True)
+        ) as db_cursor:
+            update_compression_job_metadata(
+                db_cursor,
+                job_id,
+                {
+                    "status": CompressionJobStatus.FAILED,
+                    "status_msg": f"Continuous ingestion failure: {err}"[:512],
+                },
+            )
+            db_conn.commit()
+    finally:
+        continuous_ingestion_jobs.discard(job_id)
 
 
-def main(argv):
+async def handle_running_jobs(
+    logs_directory: Path,
+    archive_output: ArchiveOutput,
+    sql_adapter: SQL_Adapter,
+    task_dispatcher: TaskDispatcher,
+    jobs_poll_delay: float,
+    straggler_slowdown_threshold: Optional[float],
+    max_task_attempts: int,
+) -> None:
+    """
+    Continuously dispatches queued tasks, launches backup attempts of straggling tasks, polls running
+    jobs, and updates their status. Returns once SIGTERM has been received and there are no more
+    jobs being scheduled, running, or watching their input.
+    :param logs_directory:
+    :param archive_output:
+    :param sql_adapter:
+    :param task_dispatcher:
+    :param jobs_poll_delay:
+    :param straggler_slowdown_threshold: See `launch_backup_attempts`. None disables backup attempts.
+    :param max_task_attempts: See `poll_running_jobs`.
+    """
+    table_prefix = sql_adapter.database_config.get_clp_connection_params_and_type(True)[
+        "table_prefix"
+    ]
+    with closing(sql_adapter.create_connection(True)) as db_conn, closing(
+        db_conn.cursor(dictionary=True)
+    ) as db_cursor:
+        while True:
+            # NOTE: Dispatching, launching backup attempts, and polling all use the jobs' result
+            # handles, so they must run sequentially.
+            await asyncio.to_thread(dispatch_queued_tasks, task_dispatcher, db_conn, db_cursor)
+            if straggler_slowdown_threshold is not None:
+                await asyncio.to_thread(
+                    launch_backup_attempts,
+                    task_dispatcher,
+                    db_conn,
+                    db_cursor,
+                    straggler_slowdown_threshold,
+                )
+            await asyncio.to_thread(
+                poll_running_jobs,
+                logs_directory,
+                archive_output,
+                table_prefix,
+                task_dispatcher,
+                db_conn,
+                db_cursor,
+                max_task_attempts,
+            )
+            if (
+                received_sigterm
+                and 0 == len(jobs_being_scheduled)
+                and 0 == len(scheduled_jobs)
+                and 0 == len(continuous_ingestion_jobs)
+            ):
+                logger.info("Recieved SIGTERM and there're no more running jobs. Exiting.")
+                return
+            await asyncio.sleep(jobs_poll_delay)
+
+
+async def main(argv: List[str]) -> int:
     args_parser = argparse.ArgumentParser()
     args_parser.add_argument("--config", "-c", required=True, help="CLP configuration file.")
     args = args_parser.parse_args(argv[1:])
@@ -520,7 +1452,19 @@ def main(argv):
     logger.info(f"Starting {COMPRESSION_SCHEDULER_COMPONENT_NAME}")
     sql_adapter = SQL_Adapter(clp_config.database)
 
-    task_manager = CeleryTaskManager()
+    task_dispatcher = TaskDispatcher(
+        CeleryTaskManager(),
+        clp_config.compression_scheduler.max_in_flight_tasks,
+        clp_config.compression_scheduler.max_in_flight_tasks_per_job,
+    )
+
+    try:
+        resumed_job_ids = resume_continuous_ingestion_jobs(sql_adapter)
+        if len(resumed_job_ids) > 0:
+            logger.info(f"Resuming {len(resumed_job_ids)} continuous ingestion jobs.")
+    except Exception:
+        logger.exception("Failed to resume continuous ingestion jobs.")
+        return -1
 
     try:
         killed_jobs = kill_hanging_jobs(sql_adapter, SchedulerType.COMPRESSION)
@@ -530,33 +1474,65 @@ def main(argv):
         logger.exception("Failed to kill hanging compression jobs.")
         return -1
 
-    with closing(sql_adapter.create_connection(True)) as db_conn, closing(
-        db_conn.cursor(dictionary=True)
-    ) as db_cursor:
-        clp_metadata_db_connection_config = (
-            sql_adapter.database_config.get_clp_connection_params_and_type(True)
+    clp_metadata_db_connection_config = (
+        sql_adapter.database_config.get_clp_connection_params_and_type(True)
+    )
+    # NOTE: clp publishes its archives' metadata while compressing, so backup attempts and retries
+    # (which rely on archives being published only when they're checkpointed) are only used for
+    # clp-s.
+    straggler_slowdown_threshold = None
+    max_task_attempts = 1
+    if StorageEngine.CLP_S == clp_config.package.storage_engine:
+        straggler_slowdown_threshold = clp_config.compression_scheduler.straggler_slowdown_threshold
+        max_task_attempts = clp_config.compression_scheduler.max_task_attempts
+    with ThreadPoolExecutor(
+        max_workers=clp_config.compression_scheduler.num_job_planning_threads
+    ) as planning_executor:
+        new_jobs_handler = asyncio.create_task(
+            handle_new_jobs(
+                clp_config,
+                sql_adapter,
+                clp_metadata_db_connection_config,
+                task_dispatcher,
+                planning_executor,
+            )
         )
-
-        # Start Job Processing Loop
-        while True:
+        running_jobs_handler = asyncio.create_task(
+            handle_running_jobs(
+                clp_config.logs_directory,
+                clp_config.archive_output,
+                sql_adapter,
+                task_dispatcher,
+                clp_config.compression_scheduler.jobs_poll_delay,
+                straggler_slowdown_threshold,
+                max_task_attempts,
+            )
+        )
+        try:
+            done, pending = await asyncio.wait(
+                [new_jobs_handler, running_jobs_handler], return_when=asyncio.FIRST_COMPLETED
+            )
+        except asyncio.CancelledError:
+            logger.info("Forcefully shutting down")
+            return -1
+        for handler in pending:
+            handler.cancel()
+
+        if new_jobs_handler in done:
+            logger.error("new_jobs_handler completed unexpectedly.")
             try:
-                if not received_sigterm:
-                    search_and_schedule_new_tasks(
-                        clp_config,
-                        db_conn,
-                        db_cursor,
-                        clp_metadata_db_connection_config,
-                        task_manager,
-                    )
-                poll_running_jobs(clp_config.logs_directory, db_conn, db_cursor)
-                time.sleep(clp_config.compression_scheduler.jobs_poll_delay)
-            except KeyboardInterrupt:
-                logger.info("Forcefully shutting down")
-                return -1
+                new_jobs_handler.result()
             except Exception:
-                logger.exception(f"Error in scheduling.")
-                return -1
+                logger.exception("new_jobs_handler failed.")
+            return -1
+        try:
+            running_jobs_handler.result()
+        except Exception:
+            logger.exception("running_jobs_handler failed.")
+            return -1
+
+    return 0
 
 
 if "__main__" == __name__:
-    sys.exit(main(sys.argv))
+    sys.exit(asyncio.run(main(sys.argv)))
@@ -0,0 +1,694 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import pathlib
+import time
+from abc import ABC, abstractmethod
+from contextlib import closing
+from typing import Any, Callable, Dict, Final, List, Optional, Tuple, TypeVar
+
+import brotli
+import msgpack
+from clp_package_utils.general import CONTAINER_INPUT_LOGS_ROOT_DIR
+from clp_py_utils.clp_config import (
+    COMPRESSION_JOBS_TABLE_NAME,
+    INGESTION_MANIFEST_TABLE_NAME,
+    S3_INGESTION_HIGH_WATER_MARKS_TABLE_NAME,
+    S3_INGESTION_MANIFEST_TABLE_NAME,
+)
+from clp_py_utils.clp_logging import get_logger
+from clp_py_utils.compression import iter_files_and_empty_directories
+from clp_py_utils.core import GZIP_FILE_EXTENSIONS, ZSTD_FILE_EXTENSIONS
+from clp_py_utils.s3_utils import s3_iter_objects_after
+from clp_py_utils.sql_adapter import SQL_Adapter
+
+from job_orchestration.scheduler.constants import CompressionJobStatus
+from job_orchestration.scheduler.job_config import ClpIoConfig
+
+logger = get_logger("compression_scheduler")
+
+# Max number of files (or objects) in each child job
+CHILD_JOB_MAX_NUM_FILES: Final[int] = 1000
+# Max size of a job's compressed config (the size of the jobs table's `clp_config` column)
+JOB_CONFIG_SIZE_MAX: Final[int] = 60000
+# Number of bytes read at a time when searching backwards for the end of a file's last complete line
+LAST_LINE_SEARCH_BLOCK_SIZE: Final[int] = 64 * 1024
+
+_InputT = TypeVar("_InputT")
+
+
+def is_continuous_ingestion_job(clp_io_config: ClpIoConfig) -> bool:
+    return clp_io_config.input.continuous_ingestion is not None
+
+
+def resume_continuous_ingestion_jobs(sql_adapter: SQL_Adapter) -> List[int]:
+    """
+    Resets RUNNING continuous ingestion jobs to PENDING so that they're resumed rather than killed
+    as hanging jobs. Their child jobs are left as-is.
+    :param sql_adapter:
+    :return: The IDs of the reset jobs.
+    """
+    with closing(sql_adapter.create_connection(True)) as db_conn, closing(
+        db_conn.cursor(dictionary=True)
+    ) as db_cursor:
+        db_cursor.execute(
+            f"""
+            SELECT id, clp_config
+            FROM {COMPRESSION_JOBS_TABLE_NAME}
+            WHERE status = {CompressionJobStatus.RUNNING}
+            """
+        )
+        job_ids = [
+            row["id"]
+            for row in db_cursor.fetchall()
+            if is_continuous_ingestion_job(
+                ClpIoConfig.model_validate(msgpack.unpackb(brotli.decompress(row["clp_config"])))
+            )
+        ]
+        if len(job_ids) > 0:
+            db_cursor.execute(
+                f"""
+                UPDATE {COMPRESSION_JOBS_TABLE_NAME}
+                SET status = {CompressionJobStatus.PENDING}
+                WHERE id IN ({", ".join(["%s"] * len(job_ids))})
+                """,
+                job_ids,
+            )
+        db_conn.commit()
+        return job_ids
+
+
+class ContinuousIngestionJob(ABC):
+    """
+    Base class for jobs that watch their input and compress its new logs in child jobs, which are
+    ordinary compression jobs. Each scan settles the child jobs that have finished, and then finds
+    the input's new logs and submits them once there's enough of them to fill an archive, or once
+    the oldest of them has waited `max_latency`.
+    """
+
+    def __init__(self, job_id: int, clp_io_config: ClpIoConfig) -> None:
+        self._job_id = job_id
+        self._clp_io_config = clp_io_config
+        self._config = clp_io_config.input.continuous_ingestion
+        # When the oldest unsubmitted logs were found, if any
+        self.__pending_since: Optional[float] = None
+
+    def start(self, db_conn, db_cursor) -> None:
+        db_cursor.execute(
+            f"""
+            UPDATE {COMPRESSION_JOBS_TABLE_NAME}
+            SET status = {CompressionJobStatus.RUNNING}, start_time = CURRENT_TIMESTAMP(3),
+                update_time = CURRENT_TIMESTAMP()
+            WHERE id = %s AND status = {CompressionJobStatus.PENDING}
+            """,
+            (self._job_id,),
+        )
+        db_conn.commit()
+
+    def scan(self, db_conn, db_cursor) -> bool:
+        """
+        Settles the job's finished child jobs, scans the job's input, and submits its new logs if
+        it's time to.
+        :param db_conn:
+        :param db_cursor:
+        :return: Whether the job is still running.
+        """
+        db_cursor.execute(
+            f"SELECT status FROM {COMPRESSION_JOBS_TABLE_NAME} WHERE id = %s", (self._job_id,)
+        )
+        rows = db_cursor.fetchall()
+        if 0 == len(rows) or CompressionJobStatus.RUNNING != rows[0]["status"]:
+            db_conn.commit()
+            return False
+
+        self._settle_child_jobs(db_cursor)
+        db_conn.commit()
+
+        self._scan(db_cursor)
+        db_conn.commit()
+        return True
+
+    @abstractmethod
+    def _scan(self, db_cursor) -> None:
+        """
+        Scans the job's input and submits its new logs if `_is_time_to_submit`.
+        NOTE: The caller must commit the transaction.
+        :param db_cursor:
+        """
+        pass
+
+    @abstractmethod
+    def _settle_child_jobs(self, db_cursor) -> None:
+        """
+        Updates the job's state for each of its child jobs that has finished, so that the child
+        job's logs are considered compressed (on success) or are submitted again (otherwise).
+        :param db_cursor:
+        """
+        pass
+
+    def _is_time_to_submit(self, num_pending_bytes: int) -> bool:
+        """
+        :param num_pending_bytes: The size of the input's unsubmitted logs.
+        :return: Whether the input's unsubmitted logs should be submitted now.
+        """
+        now = time.time()
+        if 0 == num_pending_bytes:
+            self.__pending_since = None
+            return False
+        if self.__pending_since is None:
+            self.__pending_since = now
+        if (
+            num_pending_bytes < self._clp_io_config.output.target_archive_size
+            and now - self.__pending_since < self._config.max_latency
+        ):
+            return False
+
+        self.__pending_since = None
+        return True
+
+    def _submit_child_jobs(
+        self,
+        db_cursor,
+        inputs: List[_InputT],
+        get_input_config_update: Callable[[List[_InputT]], Dict[str, Any]],
+        record_child_job: Callable[[List[_InputT], int], None],
+    ) -> int:
+        """
+        Submits child jobs to compress the given inputs, with up to `CHILD_JOB_MAX_NUM_FILES` inputs
+        in each child job, or fewer if their config doesn't fit in the jobs table.
+        :param db_cursor:
+        :param inputs:
+        :param get_input_config_update: A function that returns the fields to update in the job's
+            input config to make a child job's input config for the given inputs.
+        :param record_child_job: A function that records that the given inputs were submitted in the
+            child job with the given ID.
+        :return: The number of child jobs submitted.
+        """
+        num_child_jobs = 0
+        batches = [
+            inputs[batch_begin : batch_begin + CHILD_JOB_MAX_NUM_FILES]
+            for batch_begin in range(0, len(inputs), CHILD_JOB_MAX_NUM_FILES)
+        ]
+        while len(batches) > 0:
+            batch = batches.pop()
+            input_config = self._clp_io_config.input.model_copy(
+                update={"continuous_ingestion": None, **get_input_config_update(batch)}
+            )
+            child_clp_io_config = self._clp_io_config.model_copy(update={"input": input_config})
+            compressed_clp_io_config = brotli.compress(
+                msgpack.packb(child_clp_io_config.model_dump(exclude_none=True)), quality=4
+            )
+            if len(compressed_clp_io_config) > JOB_CONFIG_SIZE_MAX and len(batch) > 1:
+                half_batch_size = len(batch) // 2
+                batches.append(batch[:half_batch_size])
+                batches.append(batch[half_batch_size:])
+                continue
+
+            db_cursor.execute(
+                f"INSERT INTO {COMPRESSION_JOBS_TABLE_NAME} (clp_config) VALUES (%s)",
+                (compressed_clp_io_config,),
+            )
+            record_child_job(batch, db_cursor.lastrowid)
+            num_child_jobs += 1
+
+        return num_child_jobs
+
+    def _record_submission(self, db_cursor, num_bytes: int, num_inputs: int, num_child_jobs: int):
+        db_cursor.execute(
+            f"""
+            UPDATE {COMPRESSION_JOBS_TABLE_NAME}
+            SET original_size = original_size + %s, update_time = CURRENT_TIMESTAMP()
+            WHERE id = %s
+            """,
+            (num_bytes, self._job_id),
+        )
+        logger.info(
+            f"Continuous ingestion job {self._job_id}: submitted {num_bytes} bytes from"
+            f" {num_inputs} input(s) in {num_child_jobs} child job(s)."
+        )
+
+
+class _FileRange:
+    def __init__(self, path: str, stat: os.stat_result, begin: int, end: int) -> None:
+        self.path: str = path
+        self.stat: os.stat_result = stat
+        self.begin: int = begin
+        self.end: int = end
+
+    def is_whole_file(self) -> bool:
+        return 0 == self.begin and self.stat.st_size == self.end
+
+
+class FsContinuousIngestionJob(ContinuousIngestionJob):
+    """
+    Watches the paths of a continuous ingestion job: new files are compressed whole, and files that
+    have grown since they were last compressed have their appended bytes compressed. What has been
+    compressed is tracked in a manifest table that records each file's size, mtime, inode, and the
+    offset up to which it's been compressed, so:
+
+    - a file that's replaced or truncated (i.e., its inode changes or it shrinks below its
+      compressed offset) is compressed again from the start;
+    - a file that's renamed (e.g., rotated) within the scanned paths keeps its compressed offset.
+
+    Files that are still being written are only compressed up to the end of their last complete
+    line, and compressed files (e.g., `.gz`) are only compressed once they stop changing, since they
+    can't be split.
+
+    While a file's logs are in a child job that hasn't finished, the file isn't submitted again;
+    when the child job finishes, the file's compressed offset either advances (on success) or stays
+    put (otherwise) so that the logs are submitted again.
+
+    NOTE: Files that are compressed whole are read when their child job runs, so if such a file is
+    appended to after it's submitted, the appended bytes may be compressed twice.
+    """
+
+    def __init__(self, job_id: int, clp_io_config: ClpIoConfig, num_scanning_threads: int) -> None:
+        """
+        :param job_id:
+        :param clp_io_config:
+        :param num_scanning_threads: The maximum number of directories to scan concurrently.
+        """
+        super().__init__(job_id, clp_io_config)
+        self.__num_scanning_threads = num_scanning_threads
+
+    def _scan(self, db_cursor) -> None:
+        db_cursor.execute(
+            f"""
+            SELECT path, size, mtime, inode, compressed_offset, submitted_offset, pending_job_id
+            FROM {INGESTION_MANIFEST_TABLE_NAME}
+            WHERE ingestion_job_id = %s
+            """,
+            (self._job_id,),
+        )
+        manifest: Dict[str, Dict[str, Any]] = {row["path"]: row for row in db_cursor.fetchall()}
+
+        scanned_files, is_scan_complete = self._scan_files()
+
+        # Manifest entries whose file no longer exists at their path, indexed by the file's inode so
+        # that renamed files can be matched with their entries.
+        stale_entries_by_inode: Dict[int, Dict[str, Any]] = {}
+        for path, entry in manifest.items():
+            stat = scanned_files.get(path)
+            if stat is None or stat.st_ino != entry["inode"]:
+                stale_entries_by_inode[entry["inode"]] = entry
+
+        now = time.time()
+        file_ranges: List[_FileRange] = []
+        # Entries to move from their old path to a new path
+        renamed_entries: List[Tuple[Dict[str, Any], str, os.stat_result]] = []
+        for path, stat in scanned_files.items():
+            entry = manifest.get(path)
+            if entry is not None and entry["pending_job_id"] is not None:
+                # Wait until the file's pending child job finishes
+                continue
+            if entry is not None and entry["inode"] != stat.st_ino:
+                entry = None
+            if entry is None:
+                entry = stale_entries_by_inode.pop(stat.st_ino, None)
+                if entry is not None:
+                    if entry["pending_job_id"] is not None:
+                        continue
+                    renamed_entries.append((entry, path, stat))
+
+            begin = 0
+            if entry is not None and stat.st_size >= entry["compressed_offset"]:
+                begin = entry["compressed_offset"]
+            end = self._get_end_offset(path, stat, begin, now)
+            if end > begin:
+                file_ranges.append(_FileRange(path, stat, begin, end))
+
+        # Move renamed files' entries to their new paths
+        if len(renamed_entries) > 0:
+            db_cursor.executemany(
+                f"""
+                DELETE FROM {INGESTION_MANIFEST_TABLE_NAME}
+                WHERE ingestion_job_id = %s AND path_hash = %s
+                """,
+                [(self._job_id, _hash_key(entry["path"])) for entry, _, _ in renamed_entries],
+            )
+            self._upsert_manifest_entries(
+                db_cursor,
+                [
+                    (
+                        path,
+                        stat,
+                        entry["compressed_offset"],
+                        entry["compressed_offset"],
+                        None,
+                    )
+                    for entry, path, stat in renamed_entries
+                ],
+            )
+
+        # Forget files that no longer exist, unless the scan failed to see some paths
+        if is_scan_complete:
+            deleted_entries = [
+                entry
+                for entry in stale_entries_by_inode.values()
+                if entry["pending_job_id"] is None and entry["path"] not in scanned_files
+            ]
+            if len(deleted_entries) > 0:
+                db_cursor.executemany(
+                    f"""
+                    DELETE FROM {INGESTION_MANIFEST_TABLE_NAME}
+                    WHERE ingestion_job_id = %s AND path_hash = %s
+                    """,
+                    [(self._job_id, _hash_key(entry["path"])) for entry in deleted_entries],
+                )
+
+        num_pending_bytes = sum(file_range.end - file_range.begin for file_range in file_ranges)
+        if not self._is_time_to_submit(num_pending_bytes):
+            return
+
+        def record_child_job(child_job_file_ranges: List[_FileRange], child_job_id: int) -> None:
+            self._upsert_manifest_entries(
+                db_cursor,
+                [
+                    (
+                        file_range.path,
+                        file_range.stat,
+                        file_range.begin,
+                        file_range.end,
+                        child_job_id,
+                    )
+                    for file_range in child_job_file_ranges
+                ],
+            )
+
+        # Whole files and partial files are submitted in separate child jobs so that only the
+        # latter need to be copied by the workers (see `FsInputConfig.file_ranges`).
+        num_child_jobs = self._submit_child_jobs(
+            db_cursor,
+            [file_range for file_range in file_ranges if file_range.is_whole_file()],
+            lambda batch: {"paths_to_compress": [file_range.path for file_range in batch]},
+            record_child_job,
+        )
+        num_child_jobs += self._submit_child_jobs(
+            db_cursor,
+            [file_range for file_range in file_ranges if not file_range.is_whole_file()],
+            lambda batch: {
+                "paths_to_compress": [file_range.path for file_range in batch],
+                "file_ranges": {
+                    file_range.path: (file_range.begin, file_range.end) for file_range in batch
+                },
+            },
+            record_child_job,
+        )
+        self._record_submission(db_cursor, num_pending_bytes, len(file_ranges), num_child_jobs)
+
+    def _settle_child_jobs(self, db_cursor) -> None:
+        db_cursor.execute(
+            f"""
+            UPDATE {INGESTION_MANIFEST_TABLE_NAME} m
+            JOIN {COMPRESSION_JOBS_TABLE_NAME} j ON m.pending_job_id = j.id
+            SET m.compressed_offset = m.submitted_offset, m.pending_job_id = NULL
+            WHERE m.ingestion_job_id = %s AND j.status = {CompressionJobStatus.SUCCEEDED}
+            """,
+            (self._job_id,),
+        )
+        db_cursor.execute(
+            f"""
+            UPDATE {INGESTION_MANIFEST_TABLE_NAME} m
+            JOIN {COMPRESSION_JOBS_TABLE_NAME} j ON m.pending_job_id = j.id
+            SET m.submitted_offset = m.compressed_offset, m.pending_job_id = NULL
+            WHERE m.ingestion_job_id = %s
+            AND j.status IN ({CompressionJobStatus.FAILED}, {CompressionJobStatus.KILLED})
+            """,
+            (self._job_id,),
+        )
+
+    def _scan_files(self) -> Tuple[Dict[str, os.stat_result], bool]:
+        """
+        :return: A tuple of:
+            - the stat result of every file within the job's paths, indexed by path;
+            - whether every path could be scanned.
+        """
+        invalid_path_messages: List[str] = []
+        scanned_files: Dict[str, os.stat_result] = {}
+        for file, _ in iter_files_and_empty_directories(
+            CONTAINER_INPUT_LOGS_ROOT_DIR,
+            [pathlib.Path(path) for path in self._clp_io_config.input.paths_to_compress],
+            invalid_path_messages,
+            self.__num_scanning_threads,
+        ):
+            if file is None:
+                continue
+            path = str(file.path)
+            try:
+                scanned_files[path] = os.stat(path)
+            except OSError as ex:
+                invalid_path_messages.append(f"Failed to stat '{path}': {ex}")
+
+        # Paths may appear and disappear while the job runs, so invalid paths aren't fatal
+        for error_msg in invalid_path_messages:
+            logger.warning(f"Continuous ingestion job {self._job_id}: {error_msg}")
+
+        return scanned_files, 0 == len(invalid_path_messages)
+
+    def _get_end_offset(self, path: str, stat: os.stat_result, begin: int, now: float) -> int:
+        """
+        :param path:
+        :param stat:
+        :param begin: The offset up to which the file has already been compressed.
+        :param now:
+        :return: The offset up to which the file can currently be compressed.
+        """
+        size = stat.st_size
+        if size <= begin:
+            return begin
+
+        is_quiet = now - stat.st_mtime >= self._config.scan_interval
+        if path.endswith(GZIP_FILE_EXTENSIONS + ZSTD_FILE_EXTENSIONS):
+            return size if 0 == begin and is_quiet else begin
+        if is_quiet:
+            return size
+        return _find_end_of_last_line(path, begin, size)
+
+    def _upsert_manifest_entries(
+        self,
+        db_cursor,
+        entries: List[Tuple[str, os.stat_result, int, int, Optional[int]]],
+    ) -> None:
+        """
+        :param db_cursor:
+        :param entries: A list of (path, stat result, compressed offset, submitted offset, pending
+            child job ID) tuples.
+        """
+        db_cursor.executemany(
+            f"""
+            INSERT INTO {INGESTION_MANIFEST_TABLE_NAME} (
+                ingestion_job_id, path_hash, path, size, mtime, inode, compressed_offset,
+                submitted_offset, pending_job_id
+            )
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                path = VALUES(path),
+                size = VALUES(size),
+                mtime = VALUES(mtime),
+                inode = VALUES(inode),
+                compressed_offset = VALUES(compressed_offset),
+                submitted_offset = VALUES(submitted_offset),
+                pending_job_id = VALUES(pending_job_id)
+            """,
+            [
+                (
+                    self._job_id,
+                    _hash_key(path),
+                    path,
+                    stat.st_size,
+                    stat.st_mtime,
+                    stat.st_ino,
+                    compressed_offset,
+                    submitted_offset,
+                    pending_job_id,
+                )
+                for path, stat, compressed_offset, submitted_offset, pending_job_id in entries
+            ],
+        )
+
+
+class S3ContinuousIngestionJob(ContinuousIngestionJob):
+    """
+    Watches the key prefix of a continuous ingestion job and compresses its new objects.
+
+    If the prefix's keys are monotonic (see `S3ContinuousIngestionConfig.monotonic_keys`), the job
+    persists a high-water mark (the greatest key it has submitted) and each scan only lists the
+    objects after it, so the cost of a scan is proportional to the number of new objects. Otherwise,
+    each scan lists the whole prefix, and objects whose key and ETag aren't in the job's manifest
+    are new (so an overwritten object is compressed again).
+
+    Submitted objects are tracked in the manifest until their child job finishes: on success, they
+    are marked as compressed (or, with monotonic keys, forgotten, since they're covered by the
+    high-water mark); otherwise, they're submitted again.
+    """
+
+    def _scan(self, db_cursor) -> None:
+        monotonic_keys = self._config.monotonic_keys
+        db_cursor.execute(
+            f"""
+            SELECT `key`, etag, size, is_compressed, pending_job_id
+            FROM {S3_INGESTION_MANIFEST_TABLE_NAME}
+            WHERE ingestion_job_id = %s
+            """,
+            (self._job_id,),
+        )
+        manifest: Dict[str, Dict[str, Any]] = {row["key"]: row for row in db_cursor.fetchall()}
+
+        # Objects to submit, as (key, size, ETag) tuples indexed by key, starting with those whose
+        # child job failed
+        new_objects: Dict[str, Tuple[str, int, str]] = {
+            key: (key, entry["size"], entry["etag"])
+            for key, entry in manifest.items()
+            if not entry["is_compressed"] and entry["pending_job_id"] is None
+        }
+        high_water_mark = None
+        if monotonic_keys:
+            db_cursor.execute(
+                f"""
+                SELECT high_water_mark
+                FROM {S3_INGESTION_HIGH_WATER_MARKS_TABLE_NAME}
+                WHERE ingestion_job_id = %s
+                """,
+                (self._job_id,),
+            )
+            rows = db_cursor.fetchall()
+            if len(rows) > 0:
+                high_water_mark = rows[0]["high_water_mark"]
+
+            new_high_water_mark = high_water_mark
+            for key, size, etag in s3_iter_objects_after(
+                self._clp_io_config.input, high_water_mark
+            ):
+                new_objects[key] = (key, size, etag)
+                new_high_water_mark = key
+        else:
+            listed_keys = set()
+            for key, size, etag in s3_iter_objects_after(self._clp_io_config.input):
+                listed_keys.add(key)
+                entry = manifest.get(key)
+                if entry is None or (entry["pending_job_id"] is None and entry["etag"] != etag):
+                    new_objects[key] = (key, size, etag)
+
+            # Forget objects that no longer exist
+            deleted_keys = [
+                key
+                for key, entry in manifest.items()
+                if key not in listed_keys and entry["pending_job_id"] is None
+            ]
+            if len(deleted_keys) > 0:
+                db_cursor.executemany(
+                    f"""
+                    DELETE FROM {S3_INGESTION_MANIFEST_TABLE_NAME}
+                    WHERE ingestion_job_id = %s AND key_hash = %s
+                    """,
+                    [(self._job_id, _hash_key(key)) for key in deleted_keys],
+                )
+                for key in deleted_keys:
+                    new_objects.pop(key, None)
+
+        num_pending_bytes = sum(size for _, size, _ in new_objects.values())
+        if not self._is_time_to_submit(num_pending_bytes):
+            return
+
+        def record_child_job(objects: List[Tuple[str, int, str]], child_job_id: int) -> None:
+            db_cursor.executemany(
+                f"""
+                INSERT INTO {S3_INGESTION_MANIFEST_TABLE_NAME} (
+                    ingestion_job_id, key_hash, `key`, etag, size, is_compressed, pending_job_id
+                )
+                VALUES (%s, %s, %s, %s, %s, FALSE, %s)
+                ON DUPLICATE KEY UPDATE
+                    etag = VALUES(etag),
+                    size = VALUES(size),
+                    is_compressed = FALSE,
+                    pending_job_id = VALUES(pending_job_id)
+                """,
+                [
+                    (self._job_id, _hash_key(key), key, etag, size, child_job_id)
+                    for key, size, etag in objects
+                ],
+            )
+
+        objects = sorted(new_objects.values())
+        num_child_jobs = self._submit_child_jobs(
+            db_cursor,
+            objects,
+            lambda batch: {"keys": [key for key, _, _ in batch]},
+            record_child_job,
+        )
+        if monotonic_keys and new_high_water_mark != high_water_mark:
+            db_cursor.execute(
+                f"""
+                INSERT INTO {S3_INGESTION_HIGH_WATER_MARKS_TABLE_NAME} (
+                    ingestion_job_id, high_water_mark
+                )
+                VALUES (%s, %s)
+                ON DUPLICATE KEY UPDATE high_water_mark = VALUES(high_water_mark)
+                """,
+                (self._job_id, new_high_water_mark),
+            )
+        self._record_submission(db_cursor, num_pending_bytes, len(objects), num_child_jobs)
+
+    def _settle_child_jobs(self, db_cursor) -> None:
+        if self._config.monotonic_keys:
+            db_cursor.execute(
+                f"""
+                DELETE m FROM {S3_INGESTION_MANIFEST_TABLE_NAME} m
+                JOIN {COMPRESSION_JOBS_TABLE_NAME} j ON m.pending_job_id = j.id
+                WHERE m.ingestion_job_id = %s AND j.status = {CompressionJobStatus.SUCCEEDED}
+                """,
+                (self._job_id,),
+            )
+        else:
+            db_cursor.execute(
+                f"""
+                UPDATE {S3_INGESTION_MANIFEST_TABLE_NAME} m
+                JOIN {COMPRESSION_JOBS_TABLE_NAME} j ON m.pending_job_id = j.id
+                SET m.is_compressed = TRUE, m.pending_job_id = NULL
+                WHERE m.ingestion_job_id = %s AND j.status = {CompressionJobStatus.SUCCEEDED}
+                """,
+                (self._job_id,),
+            )
+        db_cursor.execute(
+            f"""
+            UPDATE {S3_INGESTION_MANIFEST_TABLE_NAME} m
+            JOIN {COMPRESSION_JOBS_TABLE_NAME} j ON m.pending_job_id = j.id
+            SET m.pending_job_id = NULL
+            WHERE m.ingestion_job_id = %s
+            AND j.status IN ({CompressionJobStatus.FAILED}, {CompressionJobStatus.KILLED})
+            """,
+            (self._job_id,),
+        )
+
+
+def _hash_key(key: str) -> bytes:
+    """
+    :param key: A file's path or an object's key.
+    :return: The key's hash, which identifies it in the job's manifest.
+    """
+    return hashlib.sha256(os.fsencode(key)).digest()
+
+
+def _find_end_of_last_line(path: str, begin: int, end: int) -> int:
+    """
+    :param path:
+    :param begin:
+    :param end:
+    :return: The offset just past the last newline in the file's [begin, end) range, or `begin` if
+        there's no newline in the range (or the file can't be read).
+    """
+    try:
+        with open(path, "rb") as f:
+            block_end = end
+            while block_end > begin:
+                block_begin = max(begin, block_end - LAST_LINE_SEARCH_BLOCK_SIZE)
+                f.seek(block_begin)
+                block = f.read(block_end - block_begin)
+                newline_ix = block.rfind(b"\n")
+                if newline_ix >= 0:
+                    return block_begin + newline_ix + 1
+                block_end = block_begin
+    except OSError:
+        pass
+    return begin
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import collections
+import pathlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Final, List, Optional, Set
+
+from clp_py_utils.clp_config import COMPRESSION_JOBS_TABLE_NAME
+from clp_py_utils.clp_metadata_db_utils import (
+    create_file_fingerprints_table,
+    get_file_fingerprints_table_name,
+)
+from clp_py_utils.compression import compute_full_fingerprint, compute_sampled_fingerprint
+from clp_py_utils.core import FileMetadata
+
+from job_orchestration.scheduler.constants import CompressionJobStatus
+
+# Number of files whose fingerprints are looked up (and recorded) at a time
+DEDUPLICATION_BATCH_SIZE: Final[int] = 1000
+
+
+class InputDeduplicator:
+    """
+    Filters out a compression job's input files whose content matches a file that was compressed
+    into the same dataset, either by a succeeded job or earlier in the same job.
+
+    Files are matched by a sampled fingerprint (their size and a few blocks of their content), and
+    files with matching sampled fingerprints are then compared by a fingerprint of their full
+    content. Both fingerprints are computed (and stored) when a file is first seen, so a file is
+    only ever compared against the content that was actually compressed, even if the compressed
+    file has since been modified in place. A stored file without a full fingerprint (e.g., one that
+    couldn't be read) is never considered a duplicate of a new file.
+
+    Files are buffered and processed in batches, so callers must `flush` the deduplicator once
+    they've added all their files.
+    """
+
+    def __init__(
+        self,
+        db_conn,
+        db_cursor,
+        table_prefix: str,
+        dataset: Optional[str],
+        job_id: int,
+        num_hashing_threads: int,
+    ) -> None:
+        """
+        :param db_conn:
+        :param db_cursor:
+        :param table_prefix:
+        :param dataset:
+        :param job_id:
+        :param num_hashing_threads: The maximum number of files to fingerprint concurrently.
+        :raises: Propagates `create_file_fingerprints_table`'s exceptions.
+        """
+        self.__db_conn = db_conn
+        self.__db_cursor = db_cursor
+        self.__fingerprints_table_name = get_file_fingerprints_table_name(table_prefix, dataset)
+        self.__job_id = job_id
+        self.__num_hashing_threads = num_hashing_threads
+
+        self.__files: List[FileMetadata] = []
+
+        self.num_duplicate_files: int = 0
+        self.duplicate_size: int = 0
+
+        create_file_fingerprints_table(db_cursor, table_prefix, dataset)
+        db_conn.commit()
+
+    def add_file(self, file: FileMetadata) -> List[FileMetadata]:
+        """
+        Buffers a file, processing the buffered files if there are enough of them.
+        :param file:
+        :return: The buffered files that aren't duplicates, if they were processed.
+        :raises: Propagates `flush`'s exceptions.
+        """
+        self.__files.append(file)
+        if len(self.__files) < DEDUPLICATION_BATCH_SIZE:
+            return []
+        return self.flush()
+
+    def flush(self) -> List[FileMetadata]:
+        """
+        Processes the buffered files, recording the fingerprints of those that aren't duplicates.
+        :return: The buffered files that aren't duplicates.
+        :raises: Propagates the DB cursor's exceptions.
+        """
+        files = self.__files
+        self.__files = []
+        if 0 == len(files):
+            return []
+
+        with ThreadPoolExecutor(max_workers=self.__num_hashing_threads) as executor:
+            sampled_fingerprints = list(
+                executor.map(lambda f: compute_sampled_fingerprint(f.path, f.size), files)
+            )
+
+            # NOTE: Every readable file's full fingerprint is computed (rather than only those whose
+            # sampled fingerprint matches another's), since it must be stored for comparison with
+            # files in later jobs and the file's content may have changed by then.
+            paths_to_fingerprint = [
+                file.path
+                for file, fingerprint in zip(files, sampled_fingerprints)
+                if fingerprint is not None
+            ]
+            full_fingerprints: Dict[pathlib.Path, Optional[bytes]] = dict(
+                zip(
+                    paths_to_fingerprint,
+                    executor.map(compute_full_fingerprint, paths_to_fingerprint),
+                )
+            )
+
+        stored_files = self.__get_stored_files(
+            list({fingerprint for fingerprint in sampled_fingerprints if fingerprint is not None})
+        )
+
+        # The full fingerprints of the compressed files that share each sampled fingerprint
+        known_full_fingerprints: Dict[bytes, Set[bytes]] = collections.defaultdict(set)
+        for fingerprint, stored_files_with_fingerprint in stored_files.items():
+            for stored_file in stored_files_with_fingerprint:
+                if stored_file["full_fingerprint"] is not None:
+                    known_full_fingerprints[fingerprint].add(bytes(stored_file["full_fingerprint"]))
+
+        unique_files: List[FileMetadata] = []
+        new_fingerprint_rows = []
+        for file, fingerprint in zip(files, sampled_fingerprints):
+            if fingerprint is None:
+                # The file can't be read, so leave it to the compression task to report
+                unique_files.append(file)
+                continue
+
+            full_fingerprint = full_fingerprints.get(file.path)
+            if full_fingerprint is not None:
+                if full_fingerprint in known_full_fingerprints[fingerprint]:
+                    self.num_duplicate_files += 1
+                    self.duplicate_size += file.size
+                    continue
+                known_full_fingerprints[fingerprint].add(full_fingerprint)
+
+            unique_files.append(file)
+            new_fingerprint_rows.append(
+                (fingerprint, full_fingerprint, file.size, str(file.path), self.__job_id)
+            )
+
+        if len(new_fingerprint_rows) > 0:
+            self.__db_cursor.executemany(
+                f"""
+                INSERT INTO {self.__fingerprints_table_name}
+                (sampled_fingerprint, full_fingerprint, size, path, job_id)
+                VALUES (%s, %s, %s, %s, %s)
+                """,
+                new_fingerprint_rows,
+            )
+        self.__db_conn.commit()
+
+        return unique_files
+
+    def __get_stored_files(self, sampled_fingerprints: List[bytes]) -> Dict[bytes, List[Dict]]:
+        """
+        :param sampled_fingerprints:
+        :return: A map from each of the given sampled fingerprints to the stored rows of the files
+            with that fingerprint that were compressed by a succeeded job or by this job.
+        :raises: Propagates the DB cursor's exceptions.
+        """
+        stored_files: Dict[bytes, List[Dict]] = {}
+        if 0 == len(sampled_fingerprints):
+            return stored_files
+
+        self.__db_cursor.execute(
+            f"""
+            SELECT f.sampled_fingerprint, f.full_fingerprint
+            FROM {self.__fingerprints_table_name} f
+            JOIN {COMPRESSION_JOBS_TABLE_NAME} j ON f.job_id = j.id
+            WHERE f.sampled_fingerprint IN ({", ".join(["%s"] * len(sampled_fingerprints))})
+            AND (j.status = {CompressionJobStatus.SUCCEEDED} OR j.id = %s)
+            """,
+            sampled_fingerprints + [self.__job_id],
+        )
+        for row in self.__db_cursor.fetchall():
+            stored_files.setdefault(bytes(row["sampled_fingerprint"]), []).append(row)
+        self.__db_conn.commit()
+        return stored_files
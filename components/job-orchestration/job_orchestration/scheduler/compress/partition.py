@@ -1,16 +1,28 @@
 import copy
 import pathlib
-from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Final, List, Optional, Tuple
 
 import brotli
 import msgpack
+from clp_py_utils.clp_config import FileGroupingStrategy, PartitioningStrategy
 from clp_py_utils.compression import (
+    estimate_time_range,
     FilesPartition,
+    group_files_by_path_template,
     group_files_by_similar_filenames,
+    pack_file_groups_into_partitions,
 )
 from clp_py_utils.core import FileMetadata
 
-from job_orchestration.scheduler.job_config import ClpIoConfig, PathsToCompress
+from job_orchestration.scheduler.job_config import ClpIoConfig, InputType, PathsToCompress
+
+# With the time-clustered partitioning strategy, the amount of data to buffer (as a multiple of the
+# target archive size) before partitioning, so that files can be ordered by time across several
+# archives.
+TIME_CLUSTERED_BUFFER_SIZE_MULTIPLE: Final[int] = 8
+# Maximum number of files whose time ranges are estimated concurrently.
+TIME_RANGE_ESTIMATION_CONCURRENCY: Final[int] = 16
 
 
 class PathsToCompressBuffer:
@@ -21,10 +33,22 @@ class PathsToCompressBuffer:
         scheduling_job_id: int,
         clp_io_config: ClpIoConfig,
         clp_metadata_db_connection_config: dict,
+        partitions_handler: Callable[[List[Dict[str, Any]], List[Dict[str, Any]]], None],
     ):
+        """
+        :param maintain_file_ordering:
+        :param empty_directories_allowed:
+        :param scheduling_job_id:
+        :param clp_io_config:
+        :param clp_metadata_db_connection_config:
+        :param partitions_handler: Called with the tasks and partition info of each batch of
+            partitions as soon as they're produced, so that they can be submitted for compression
+            while the remaining input is still being buffered.
+        """
         self.__files: List[FileMetadata] = []
         self.__tasks: List[Dict[str, Any]] = []
         self.__partition_info: List[Dict[str, Any]] = []
+        self.__partitions_handler = partitions_handler
         self.__maintain_file_ordering: bool = maintain_file_ordering
         if empty_directories_allowed:
             self.__empty_directories: Optional[List[str]] = []
@@ -33,6 +57,27 @@ class PathsToCompressBuffer:
         self.__total_file_size: int = 0
         self.__target_archive_size: int = clp_io_config.output.target_archive_size
         self.__file_size_to_trigger_compression: int = clp_io_config.output.target_archive_size * 2
+        self.__partitioning_strategy: PartitioningStrategy = (
+            clp_io_config.output.partitioning_strategy
+        )
+        if PartitioningStrategy.TIME_CLUSTERED == self.__partitioning_strategy:
+            self.__file_size_to_trigger_compression = (
+                self.__target_archive_size * TIME_CLUSTERED_BUFFER_SIZE_MULTIPLE
+            )
+        # Estimated time range of each buffered file, for the time-clustered partitioning strategy
+        self.__file_time_ranges: Dict[FileMetadata, Optional[Tuple[float, float]]] = {}
+        self.__are_files_local: bool = InputType.FS == clp_io_config.input.type
+        self.__file_grouping_strategy: FileGroupingStrategy = (
+            clp_io_config.output.file_grouping_strategy
+        )
+        # (path template, content signature) of each group ID returned by the latest call to
+        # `__group_files`, for the content-aware file grouping strategy
+        self.__group_keys: Dict[int, Tuple[str, str]] = {}
+
+        # Statistics about the estimated uncompressed size of the partitions containing files
+        self.__num_file_partitions: int = 0
+        self.__total_file_partition_size: int = 0
+        self.__max_file_partition_size: int = 0
 
         self.num_tasks = 0
         self.__task_arguments = {
@@ -44,12 +89,6 @@ class PathsToCompressBuffer:
             "clp_metadata_db_connection_config": clp_metadata_db_connection_config,
         }
 
-    def get_tasks(self):
-        return self.__tasks
-
-    def get_partition_info(self):
-        return self.__partition_info
-
     def add_file(self, file: FileMetadata):
         self.__files.append(file)
         self.__total_file_size += file.estimated_uncompressed_size
@@ -65,6 +104,17 @@ class PathsToCompressBuffer:
     def flush(self):
         self.__partition_and_compress(True)
 
+    def get_partition_size_imbalance(self) -> Optional[float]:
+        """
+        :return: The ratio between the largest partition's estimated uncompressed size and the mean
+            across all partitions containing files (1.0 means perfectly balanced), or None if no
+            partition contains files of non-zero size.
+        """
+        if 0 == self.__total_file_partition_size:
+            return None
+        mean_partition_size = self.__total_file_partition_size / self.__num_file_partitions
+        return self.__max_file_partition_size / mean_partition_size
+
     def contains_paths(self):
         return len(self.__files) > 0 or (
             self.__empty_directories and len(self.__empty_directories) > 0
@@ -80,14 +130,21 @@ class PathsToCompressBuffer:
             paths_to_compress.empty_directories = self.__empty_directories
             self.__empty_directories = []
 
-        self.__partition_info.append(
-            {
-                "partition_original_size": str(sum(st_sizes)),
-                "clp_paths_to_compress": brotli.compress(
-                    msgpack.packb(paths_to_compress.model_dump(exclude_none=True)), quality=4
-                ),
-            }
-        )
+        partition_info = {
+            "partition_original_size": str(sum(st_sizes)),
+            "clp_paths_to_compress": brotli.compress(
+                msgpack.packb(paths_to_compress.model_dump(exclude_none=True)), quality=4
+            ),
+        }
+        if FileGroupingStrategy.CONTENT_AWARE == self.__file_grouping_strategy:
+            # Number of files and original size of each group in the partition
+            file_groups: Dict[Tuple[str, str], List[int]] = {}
+            for group_id, st_size in zip(group_ids, st_sizes):
+                file_group = file_groups.setdefault(self.__group_keys[group_id], [0, 0])
+                file_group[0] += 1
+                file_group[1] += st_size
+            partition_info["file_groups"] = file_groups
+        self.__partition_info.append(partition_info)
 
         task_arguments = self.__task_arguments.copy()
         task_arguments["paths_to_compress_json"] = paths_to_compress.model_dump_json(
@@ -96,12 +153,19 @@ class PathsToCompressBuffer:
         self.__tasks.append(copy.deepcopy(task_arguments))
         self.num_tasks += 1
 
+        if len(files) > 0:
+            self.__num_file_partitions += 1
+            self.__total_file_partition_size += partition_total_file_size
+            self.__max_file_partition_size = max(
+                self.__max_file_partition_size, partition_total_file_size
+            )
+
         return partition_total_file_size
 
     def add_files(self, target_num_archives: int, target_archive_size: int, files):
         target_num_archives = min(len(files), target_num_archives)
 
-        groups = group_files_by_similar_filenames(files)
+        groups = self.__group_files(files)
         next_file_ix_per_group = [0 for _ in range(len(groups))]
 
         partitions = [FilesPartition() for _ in range(target_num_archives)]
@@ -138,8 +202,34 @@ class PathsToCompressBuffer:
         # Compress partitions
         for partition in partitions:
             self.__submit_partition_for_compression(partition)
+        self.__hand_off_partitions()
+
+    def __group_files(self, files: List[FileMetadata]):
+        if FileGroupingStrategy.CONTENT_AWARE != self.__file_grouping_strategy:
+            return group_files_by_similar_filenames(files)
+
+        groups = group_files_by_path_template(files, self.__are_files_local)
+        self.__group_keys = {
+            group["id"]: (group["path_template"], group["content_signature"] or "")
+            for group in groups
+        }
+        return groups
+
+    def __hand_off_partitions(self):
+        if len(self.__tasks) == 0:
+            return
+
+        tasks = self.__tasks
+        partition_info = self.__partition_info
+        self.__tasks = []
+        self.__partition_info = []
+        self.__partitions_handler(tasks, partition_info)
 
     def __partition_and_compress(self, flush_buffer: bool):
+        self.__partition(flush_buffer)
+        self.__hand_off_partitions()
+
+    def __partition(self, flush_buffer: bool):
         if not flush_buffer and self.__total_file_size < self.__target_archive_size:
             # Not enough data for a full partition and we don't need to exhaust the buffer
             return
@@ -177,8 +267,12 @@ class PathsToCompressBuffer:
                     group_ix += 1
                 self.__total_file_size -= self.__submit_partition_for_compression(partition)
                 self.__files = []
+        elif PartitioningStrategy.BALANCED == self.__partitioning_strategy:
+            self.__partition_balanced(flush_buffer)
+        elif PartitioningStrategy.TIME_CLUSTERED == self.__partitioning_strategy:
+            self.__partition_time_clustered(flush_buffer)
         else:
-            groups = group_files_by_similar_filenames(self.__files)
+            groups = self.__group_files(self.__files)
             next_file_ix_per_group = [0 for _ in range(len(groups))]
 
             group_ix = 0
@@ -227,3 +321,82 @@ class PathsToCompressBuffer:
             if flush_buffer and self.contains_paths():
                 self.__total_file_size -= self.__submit_partition_for_compression(partition)
                 self.__files = []
+
+    def __partition_balanced(self, flush_buffer: bool):
+        # Split all buffered files into partitions of roughly equal size: no smaller than the
+        # target archive size unless the buffer is being flushed, in which case no larger.
+        groups = self.__group_files(self.__files)
+        partitions = pack_file_groups_into_partitions(
+            groups, self.__target_archive_size, not flush_buffer
+        )
+        if 0 == len(partitions):
+            # Only empty directories remain
+            partitions.append(FilesPartition())
+
+        for partition in partitions:
+            self.__total_file_size -= self.__submit_partition_for_compression(partition)
+        self.__files = []
+
+    def __partition_time_clustered(self, flush_buffer: bool):
+        files_to_estimate = [file for file in self.__files if file not in self.__file_time_ranges]
+        with ThreadPoolExecutor(max_workers=TIME_RANGE_ESTIMATION_CONCURRENCY) as executor:
+            time_ranges = executor.map(
+                lambda file: estimate_time_range(file.path, self.__are_files_local),
+                files_to_estimate,
+            )
+            for file, time_range in zip(files_to_estimate, time_ranges):
+                self.__file_time_ranges[file] = time_range
+
+        files_with_time_range = [
+            file for file in self.__files if self.__file_time_ranges[file] is not None
+        ]
+        files_with_time_range.sort(key=lambda file: self.__file_time_ranges[file])
+        files_without_time_range = [
+            file for file in self.__files if self.__file_time_ranges[file] is None
+        ]
+
+        # Split the time-ordered files into runs of consecutive files, each filling a partition
+        remaining_files: List[FileMetadata] = []
+        run_files: List[FileMetadata] = []
+        run_size = 0
+        for file in files_with_time_range:
+            run_files.append(file)
+            run_size += file.estimated_uncompressed_size
+            if run_size >= self.__target_archive_size:
+                self.__submit_files_for_compression(run_files)
+                run_files = []
+                run_size = 0
+        if flush_buffer and len(run_files) > 0:
+            self.__submit_files_for_compression(run_files)
+        else:
+            remaining_files.extend(run_files)
+
+        # Pack files without a time range separately, so they don't widen the time-clustered
+        # partitions' ranges.
+        untimed_files_size = sum(
+            file.estimated_uncompressed_size for file in files_without_time_range
+        )
+        if len(files_without_time_range) > 0 and (
+            flush_buffer or untimed_files_size >= self.__target_archive_size
+        ):
+            groups = self.__group_files(files_without_time_range)
+            for partition in pack_file_groups_into_partitions(
+                groups, self.__target_archive_size, not flush_buffer
+            ):
+                self.__total_file_size -= self.__submit_partition_for_compression(partition)
+        else:
+            remaining_files.extend(files_without_time_range)
+
+        # Compress any remaining empty directories
+        self.__files = remaining_files
+        if flush_buffer and self.contains_paths():
+            self.__submit_partition_for_compression(FilesPartition())
+
+        self.__file_time_ranges = {file: self.__file_time_ranges[file] for file in remaining_files}
+
+    def __submit_files_for_compression(self, files: List[FileMetadata]):
+        partition = FilesPartition()
+        for group in self.__group_files(files):
+            for file in group["files"]:
+                partition.add_file(file, group["id"])
+        self.__total_file_size -= self.__submit_partition_for_compression(partition)
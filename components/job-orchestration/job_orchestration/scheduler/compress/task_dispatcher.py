@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import collections
+import threading
+from typing import Any, Deque, Dict, List, Tuple
+
+from job_orchestration.scheduler.compress.task_manager.task_manager import TaskManager
+from job_orchestration.scheduler.scheduler_data import CompressionJob
+
+
+class _JobQueue:
+    def __init__(self, job: CompressionJob, weight: int) -> None:
+        self.job: CompressionJob = job
+        self.weight: int = weight
+        self.queued_tasks: Deque[Dict[str, Any]] = collections.deque()
+        self.num_in_flight_tasks: int = 0
+        # The number of slots the job has been given in its current turn
+        self.num_slots_used_in_turn: int = 0
+
+
+class TaskDispatcher:
+    """
+    Queues the tasks of compression jobs and submits them to a `TaskManager` such that:
+
+    - at most `max_in_flight_tasks` tasks (across all jobs) are submitted but unfinished;
+    - at most `max_in_flight_tasks_per_job` tasks of any single job are submitted but unfinished;
+    - free slots are shared between jobs with queued tasks by weighted round-robin, where each job
+      gets up to `weight` slots per turn. A turn that's cut short by a lack of free slots continues
+      in the next dispatch, so jobs get slots in proportion to their weights even when only a few
+      slots free up at a time.
+
+    This way, a job with a large backlog of tasks can't delay a small job's tasks until the backlog
+    drains.
+
+    All methods are thread-safe, but `dispatch` must only be called from one thread at a time, and
+    not while any other thread is using the jobs' result handles.
+    """
+
+    def __init__(
+        self,
+        task_manager: TaskManager,
+        max_in_flight_tasks: int,
+        max_in_flight_tasks_per_job: int,
+    ) -> None:
+        self.__task_manager = task_manager
+        self.__max_in_flight_tasks = max_in_flight_tasks
+        self.__max_in_flight_tasks_per_job = max_in_flight_tasks_per_job
+
+        # Guards `__job_queues`, and the `queued_tasks` of every job queue
+        self.__lock = threading.Lock()
+        # Ordered by when each job should next be served
+        self.__job_queues: collections.OrderedDict[int, _JobQueue] = collections.OrderedDict()
+
+    def add_tasks(self, job: CompressionJob, weight: int, tasks: List[Dict[str, Any]]) -> None:
+        """
+        Queues tasks for the given job.
+        :param job:
+        :param weight: The job's share of free slots relative to other jobs.
+        :param tasks: The parameters of each task.
+        """
+        with self.__lock:
+            job_queue = self.__job_queues.get(job.id)
+            if job_queue is None:
+                job_queue = _JobQueue(job, weight)
+                self.__job_queues[job.id] = job_queue
+            job_queue.queued_tasks.extend(tasks)
+
+    def has_queued_tasks(self, job_id: int) -> bool:
+        """
+        :param job_id:
+        :return: Whether any of the job's tasks are waiting to be submitted.
+        """
+        with self.__lock:
+            job_queue = self.__job_queues.get(job_id)
+            return job_queue is not None and len(job_queue.queued_tasks) > 0
+
+    def drop_queued_tasks(self, job_id: int) -> None:
+        """
+        Drops any of the given job's tasks that are still queued, while still counting its in-flight
+        tasks towards the limits until the job is removed.
+        :param job_id:
+        """
+        with self.__lock:
+            job_queue = self.__job_queues.get(job_id)
+            if job_queue is not None:
+                job_queue.queued_tasks.clear()
+
+    def remove_job(self, job_id: int) -> None:
+        """
+        Stops tracking the given job, dropping any of its tasks that are still queued.
+        :param job_id:
+        """
+        with self.__lock:
+            self.__job_queues.pop(job_id, None)
+
+    def dispatch(self) -> List[int]:
+        """
+        Submits as many queued tasks as the in-flight limits allow.
+        :return: The IDs of the tasks that were submitted.
+        :raises: Propagates `TaskManager`'s exceptions.
+        """
+        with self.__lock:
+            job_queues = list(self.__job_queues.values())
+
+        # Refresh the number of in-flight tasks, outside the lock since it may query the task
+        # manager's backend
+        num_in_flight_tasks = 0
+        for job_queue in job_queues:
+            result_handle = job_queue.job.result_handle
+            if result_handle is not None:
+                job_queue.num_in_flight_tasks = result_handle.get_num_unfinished_tasks()
+            num_in_flight_tasks += job_queue.num_in_flight_tasks
+
+        num_free_slots = self.__max_in_flight_tasks - num_in_flight_tasks
+        tasks_to_submit: Dict[int, Tuple[CompressionJob, List[Dict[str, Any]]]] = {}
+        with self.__lock:
+            # Weighted round-robin: the job at the front of the queue gets up to `weight` of the free
+            # slots before its turn ends and it moves to the back, until either the slots run out or
+            # no job can use them.
+            num_consecutive_idle_jobs = 0
+            while num_free_slots > 0 and num_consecutive_idle_jobs < len(self.__job_queues):
+                job_id, job_queue = next(iter(self.__job_queues.items()))
+                num_tasks = min(
+                    job_queue.weight - job_queue.num_slots_used_in_turn,
+                    self.__max_in_flight_tasks_per_job - job_queue.num_in_flight_tasks,
+                    len(job_queue.queued_tasks),
+                    num_free_slots,
+                )
+                if num_tasks > 0:
+                    _, job_tasks = tasks_to_submit.setdefault(job_id, (job_queue.job, []))
+                    for _ in range(num_tasks):
+                        job_tasks.append(job_queue.queued_tasks.popleft())
+                    job_queue.num_in_flight_tasks += num_tasks
+                    job_queue.num_slots_used_in_turn += num_tasks
+                    num_free_slots -= num_tasks
+                    num_consecutive_idle_jobs = 0
+                else:
+                    num_consecutive_idle_jobs += 1
+
+                if (
+                    0 == num_free_slots
+                    and job_queue.num_slots_used_in_turn < job_queue.weight
+                    and job_queue.num_in_flight_tasks < self.__max_in_flight_tasks_per_job
+                    and len(job_queue.queued_tasks) > 0
+                ):
+                    # Continue the job's turn in the next dispatch
+                    break
+                job_queue.num_slots_used_in_turn = 0
+                self.__job_queues.move_to_end(job_id)
+
+        submitted_task_ids: List[int] = []
+        for job, tasks in tasks_to_submit.values():
+            if job.result_handle is None:
+                job.result_handle = self.__task_manager.submit(tasks)
+            else:
+                job.result_handle.add_tasks(tasks)
+            submitted_task_ids.extend(task["task_id"] for task in tasks)
+
+        return submitted_task_ids
@@ -6,23 +6,112 @@ import celery
 
 from job_orchestration.executor.compress.celery_compress import compress
 from job_orchestration.scheduler.compress.task_manager.task_manager import TaskManager
+from job_orchestration.scheduler.constants import CompressionTaskStatus
 from job_orchestration.scheduler.task_result import CompressionTaskResult
 
 
 class CeleryTaskManager(TaskManager):
 
     class ResultHandle(TaskManager.ResultHandle):
-        def __init__(self, celery_result: celery.result.GroupResult) -> None:
-            self._celery_result: celery.result.GroupResult = celery_result
+        def __init__(self, celery_result: celery.result.GroupResult, task_ids: list[int]) -> None:
+            # Each batch of tasks added to the job is submitted as its own group (along with the ID
+            # of each task in the group); groups whose results have been retrieved are removed from
+            # `_pending_celery_results`.
+            self._pending_celery_results: list[tuple[celery.result.GroupResult, list[int]]] = [
+                (celery_result, task_ids)
+            ]
+            self._backup_celery_results: dict[int, celery.result.AsyncResult] = {}
+            self._results: list[CompressionTaskResult] = []
+
+        def add_tasks(self, task_params: list[dict[str, Any]]) -> None:
+            self._pending_celery_results.append(
+                (_submit_group(task_params), [params["task_id"] for params in task_params])
+            )
+
+        def add_backup_task(self, task_params: dict[str, Any]) -> bool:
+            self._backup_celery_results[task_params["task_id"]] = compress.s(
+                **task_params
+            ).apply_async()
+            return True
+
+        def get_num_unfinished_tasks(self) -> int:
+            num_unfinished_tasks = sum(
+                1
+                for celery_result, _ in self._pending_celery_results
+                for task_result in celery_result.results
+                if not task_result.ready()
+            )
+            num_unfinished_tasks += sum(
+                1
+                for backup_result in self._backup_celery_results.values()
+                if not backup_result.ready()
+            )
+            return num_unfinished_tasks
 
         def get_result(self, timeout: float = 0.1) -> list[CompressionTaskResult] | None:
-            try:
-                results = self._celery_result.get(timeout=timeout)
-                return [CompressionTaskResult.model_validate(res) for res in results]
-            except celery.exceptions.TimeoutError:
-                return None
+            while len(self._pending_celery_results) > 0:
+                celery_result, task_ids = self._pending_celery_results[0]
+                if any(task_id in self._backup_celery_results for task_id in task_ids):
+                    results = self._get_group_result_with_backups(celery_result, task_ids)
+                    if results is None:
+                        return None
+                else:
+                    try:
+                        results = [
+                            CompressionTaskResult.model_validate(res)
+                            for res in celery_result.get(timeout=timeout)
+                        ]
+                    except celery.exceptions.TimeoutError:
+                        return None
+                self._results.extend(results)
+                self._pending_celery_results.pop(0)
+            return self._results
+
+        def _get_group_result_with_backups(
+            self, celery_result: celery.result.GroupResult, task_ids: list[int]
+        ) -> list[CompressionTaskResult] | None:
+            """
+            Gets the results of a group in which some tasks have backup attempts, without waiting.
+            :param celery_result:
+            :param task_ids:
+            :return: For each task, the result of its first successful attempt, or of its original
+                attempt if all attempts failed. None if any task hasn't finished.
+            :raises: Propagates `celery.result.AsyncResult.get`'s exceptions.
+            """
+            results: list[CompressionTaskResult] = []
+            for task_id, task_result in zip(task_ids, celery_result.results):
+                attempts = [task_result]
+                if task_id in self._backup_celery_results:
+                    attempts.append(self._backup_celery_results[task_id])
+
+                finished_attempt_results = [
+                    CompressionTaskResult.model_validate(attempt.get())
+                    for attempt in attempts
+                    if attempt.ready()
+                ]
+                succeeded_attempt_result = next(
+                    (
+                        attempt_result
+                        for attempt_result in finished_attempt_results
+                        if CompressionTaskStatus.SUCCEEDED == attempt_result.status
+                    ),
+                    None,
+                )
+                if succeeded_attempt_result is not None:
+                    results.append(succeeded_attempt_result)
+                elif len(finished_attempt_results) == len(attempts):
+                    results.append(finished_attempt_results[0])
+                else:
+                    return None
+            return results
 
     def submit(self, task_params: list[dict[str, Any]]) -> TaskManager.ResultHandle:
-        task_instances = [compress.s(**params) for params in task_params]
-        task_group = celery.group(task_instances)
-        return CeleryTaskManager.ResultHandle(task_group.apply_async())
+        return CeleryTaskManager.ResultHandle(
+            _submit_group(task_params), [params["task_id"] for params in task_params]
+        )
+
+
+def _submit_group(task_params: list[dict[str, Any]]) -> celery.result.GroupResult:
+    task_instances = [compress.s(**params) for params in task_params]
+    task_group = celery.group(task_instances)
+    return task_group.apply_async()
@@ -15,22 +15,51 @@ from job_orchestration.utils.spider_utils import int8_list_to_utf8_str, utf8_str
 class SpiderTaskManager(TaskManager):
 
     class ResultHandle(TaskManager.ResultHandle):
-        def __init__(self, spider_job: Job) -> None:
-            self._spider_job: Job = spider_job
+        def __init__(
+            self, task_manager: SpiderTaskManager, spider_job: Job, num_tasks: int
+        ) -> None:
+            self._task_manager: SpiderTaskManager = task_manager
+            # Each batch of tasks added to the job is submitted as its own Spider job; jobs whose
+            # results have been retrieved are removed from `_pending_spider_jobs`.
+            self._pending_spider_jobs: list[Job] = [spider_job]
+            self._pending_spider_job_sizes: list[int] = [num_tasks]
+            self._results: list[CompressionTaskResult] = []
+
+        def add_tasks(self, task_params: list[dict[str, Any]]) -> None:
+            self._pending_spider_jobs.append(self._task_manager._submit_job(task_params))
+            self._pending_spider_job_sizes.append(len(task_params))
+
+        def get_num_unfinished_tasks(self) -> int:
+            # Spider only reports the results of a job once all its tasks have finished, so every
+            # task in an unfinished job is counted as unfinished.
+            return sum(
+                num_tasks
+                for spider_job, num_tasks in zip(
+                    self._pending_spider_jobs, self._pending_spider_job_sizes
+                )
+                if spider_job.get_results() is None
+            )
 
         def get_result(self, timeout: float = 0.1) -> list[CompressionTaskResult] | None:
-            job_results = self._spider_job.get_results()
-            if job_results is None:
-                return None
-            return [
-                CompressionTaskResult.model_validate_json(int8_list_to_utf8_str(task_result))
-                for task_result in job_results
-            ]
+            while len(self._pending_spider_jobs) > 0:
+                job_results = self._pending_spider_jobs[0].get_results()
+                if job_results is None:
+                    return None
+                self._results.extend(
+                    CompressionTaskResult.model_validate_json(int8_list_to_utf8_str(task_result))
+                    for task_result in job_results
+                )
+                self._pending_spider_jobs.pop(0)
+                self._pending_spider_job_sizes.pop(0)
+            return self._results
 
     def __init__(self, storage_url: str) -> None:
         self._driver = spider_py.Driver(storage_url)
 
     def submit(self, task_params: list[dict[str, Any]]) -> TaskManager.ResultHandle:
+        return SpiderTaskManager.ResultHandle(self, self._submit_job(task_params), len(task_params))
+
+    def _submit_job(self, task_params: list[dict[str, Any]]) -> Job:
         job = spider_py.group(
             [compress for _ in range(len(task_params))],
         )
@@ -44,5 +73,4 @@ class SpiderTaskManager(TaskManager):
             job_args.append(
                 utf8_str_to_int8_list(json.dumps(task_param["clp_metadata_db_connection_config"]))
             )
-        submitted_job = self._driver.submit_jobs([job], [job_args])[0]
-        return SpiderTaskManager.ResultHandle(submitted_job)
+        return self._driver.submit_jobs([job], [job_args])[0]
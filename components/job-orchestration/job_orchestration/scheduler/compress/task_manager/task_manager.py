@@ -10,13 +10,44 @@ class TaskManager(ABC):
     """Abstract base class for a scheduler framework."""
 
     class ResultHandle(ABC):
+        @abstractmethod
+        def add_tasks(self, task_params: list[dict[str, Any]]) -> None:
+            """
+            Submits another batch of compression tasks as part of the job, so that a job's tasks can
+            be submitted as soon as they're planned.
+            :param task_params: A list of dictionaries containing parameters for each compression
+                task.
+            """
+            pass
+
+        def add_backup_task(self, task_params: dict[str, Any]) -> bool:
+            """
+            Submits a backup attempt of one of the job's (slow) tasks. Once a task has a backup
+            attempt, it's considered finished as soon as any of its attempts succeeds, or once all
+            of its attempts have failed.
+            :param task_params: The parameters the task was originally submitted with.
+            :return: Whether the backup attempt was submitted, since not every implementation
+                supports backup attempts.
+            """
+            return False
+
+        @abstractmethod
+        def get_num_unfinished_tasks(self) -> int:
+            """
+            :return: The number of tasks submitted so far that haven't finished. Depending on the
+                implementation, this may overestimate the number of unfinished tasks, but it never
+                underestimates it.
+            """
+            pass
+
         @abstractmethod
         def get_result(self, timeout: float = 0.1) -> list[CompressionTaskResult] | None:
             """
             Gets the result of a compression job.
             :param timeout: Maximum time (in seconds) to wait for retrieving the result. Depending
                 on the implementation, this parameter may be ignored.
-            :return: A list of task results.
+            :return: A list of task results for every task submitted so far, in submission order,
+                or None if any of those tasks hasn't finished.
             """
             pass
 
@@ -25,6 +56,7 @@ class TaskManager(ABC):
         """
         Submits a batch of compression tasks as a single compression job.
         :param task_params: A list of dictionaries containing parameters for each compression task.
-        :return: A handle through which to get the result of the job.
+        :return: A handle through which to add more tasks to the job and to get the result of the
+            job.
         """
         pass
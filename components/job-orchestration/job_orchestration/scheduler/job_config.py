@@ -1,10 +1,16 @@
 from __future__ import annotations
 
 from enum import auto
-from typing import List, Literal, Optional, Tuple, Union
-
-from clp_py_utils.clp_config import S3Config
-from pydantic import BaseModel, field_validator
+from typing import Dict, List, Literal, Optional, Tuple, Union
+
+from clp_py_utils.clp_config import (
+    FileGroupingStrategy,
+    FileGroupingStrategyStr,
+    PartitioningStrategy,
+    PartitioningStrategyStr,
+    S3Config,
+)
+from pydantic import BaseModel, field_validator, PositiveFloat, PositiveInt
 from strenum import LowercaseStrEnum
 
 
@@ -20,6 +26,21 @@ class PathsToCompress(BaseModel):
     empty_directories: Optional[List[str]] = None
 
 
+class ContinuousIngestionConfig(BaseModel):
+    # How often the input is scanned for new logs
+    scan_interval: PositiveFloat = 60  # seconds
+    # Max time that new logs wait to be compressed when there aren't enough of them to fill an
+    # archive
+    max_latency: PositiveFloat = 300  # seconds
+
+
+class S3ContinuousIngestionConfig(ContinuousIngestionConfig):
+    # Whether new objects' keys always sort after existing objects' keys (e.g., keys that start with
+    # a timestamp), so that only objects after the last ingested key need to be listed. Otherwise,
+    # the whole prefix is listed, and objects are identified as new by their key and ETag.
+    monotonic_keys: bool = True
+
+
 class FsInputConfig(BaseModel):
     type: Literal[InputType.FS.value] = InputType.FS.value
     dataset: Optional[str] = None
@@ -27,6 +48,12 @@ class FsInputConfig(BaseModel):
     path_prefix_to_remove: str = None
     timestamp_key: Optional[str] = None
     unstructured: bool = False
+    # If set, the input is watched and its new logs are compressed in child jobs until this job is
+    # killed
+    continuous_ingestion: Optional[ContinuousIngestionConfig] = None
+    # Maps each file that should only be partially compressed to the [begin, end) byte range to
+    # compress
+    file_ranges: Optional[Dict[str, Tuple[int, int]]] = None
 
 
 class S3InputConfig(S3Config):
@@ -35,6 +62,9 @@ class S3InputConfig(S3Config):
     dataset: Optional[str] = None
     timestamp_key: Optional[str] = None
     unstructured: bool = False
+    # If set, the key prefix is watched and its new objects are compressed in child jobs until this
+    # job is killed
+    continuous_ingestion: Optional[S3ContinuousIngestionConfig] = None
 
     @field_validator("keys")
     @classmethod
@@ -47,6 +77,8 @@ class S3InputConfig(S3Config):
 class OutputConfig(BaseModel):
     tags: Optional[List[str]] = None
     target_archive_size: int
+    partitioning_strategy: PartitioningStrategyStr = PartitioningStrategy.ROUND_ROBIN
+    file_grouping_strategy: FileGroupingStrategyStr = FileGroupingStrategy.FILENAME_SIMILARITY
     target_dictionaries_size: int
     target_segment_size: int
     target_encoded_file_size: int
@@ -56,6 +88,8 @@ class OutputConfig(BaseModel):
 class ClpIoConfig(BaseModel):
     input: Union[FsInputConfig, S3InputConfig]
     output: OutputConfig
+    # The job's weight when sharing the compression cluster with other jobs
+    priority: PositiveInt = 1
 
 
 class AggregationConfig(BaseModel):
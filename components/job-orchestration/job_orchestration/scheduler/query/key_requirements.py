@@ -0,0 +1,362 @@
+"""
+Derives, from a clp-s KQL query, the keys an archive must contain for any of its records to match
+the query, so that archives lacking them can be skipped without being searched.
+
+The derived requirements are conservative: any part of a query whose matches don't necessarily
+contain a key (e.g., a negation, a search for a value in any key, or a key with a wildcard) places
+no requirement on an archive's keys, and a query that can't be parsed places no requirement at all.
+"""
+
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Final, List, Optional, Set, Tuple
+
+# Characters that can't appear unescaped in an unquoted literal
+_NON_LITERAL_CHARS: Final[str] = '\\():<>"{} \r\n\t'
+
+_WHITESPACE_CHARS: Final[str] = " \r\n\t"
+
+# Characters that can be escaped in an unquoted literal (besides whitespace and unicode escapes)
+_SPECIAL_CHARS: Final[str] = '\\():<>"*?{}.@$!#'
+
+# Characters that start a namespaced key (e.g., an auto-generated key)
+_NAMESPACE_CHARS: Final[str] = "@$!#"
+
+# The characters that escape sequences in a key's name stand for
+_UNESCAPED_KEY_CHARS: Final[Dict[str, str]] = {
+    **{c: c for c in _SPECIAL_CHARS},
+    "t": "\t",
+    "r": "\r",
+    "n": "\n",
+    "b": "\b",
+    "f": "\f",
+}
+
+_AND: Final[str] = "AND"
+_OR: Final[str] = "OR"
+_NOT: Final[str] = "NOT"
+_LITERAL: Final[str] = "LITERAL"
+_RANGE_OPERATOR: Final[str] = "RANGE_OPERATOR"
+_KEYWORDS: Final[Tuple[str, ...]] = (_AND, _OR, _NOT)
+
+
+class KeyRequirement(ABC):
+    """A requirement on the keys an archive must contain to possibly match a query."""
+
+    @abstractmethod
+    def get_keys(self) -> Set[Tuple[str, ...]]:
+        """
+        :return: The keys the requirement refers to, each as the names of the keys along its path.
+        """
+        ...
+
+    @abstractmethod
+    def is_satisfied(self, has_key: Callable[[Tuple[str, ...]], bool]) -> bool:
+        """
+        :param has_key: Returns whether an archive contains the given key.
+        :return: Whether the archive satisfies the requirement.
+        """
+        ...
+
+    @abstractmethod
+    def prefix_keys(self, prefix: Tuple[str, ...]) -> KeyRequirement:
+        """
+        :param prefix:
+        :return: The requirement with the given key path prepended to every key's path.
+        """
+        ...
+
+
+class _KeyPresence(KeyRequirement):
+    def __init__(self, key: Tuple[str, ...]) -> None:
+        self.key = key
+
+    def get_keys(self) -> Set[Tuple[str, ...]]:
+        return {self.key}
+
+    def is_satisfied(self, has_key: Callable[[Tuple[str, ...]], bool]) -> bool:
+        return has_key(self.key)
+
+    def prefix_keys(self, prefix: Tuple[str, ...]) -> KeyRequirement:
+        return _KeyPresence(prefix + self.key)
+
+
+class _AllOf(KeyRequirement):
+    def __init__(self, requirements: List[KeyRequirement]) -> None:
+        self.requirements = requirements
+
+    def get_keys(self) -> Set[Tuple[str, ...]]:
+        return set().union(*(requirement.get_keys() for requirement in self.requirements))
+
+    def is_satisfied(self, has_key: Callable[[Tuple[str, ...]], bool]) -> bool:
+        return all(requirement.is_satisfied(has_key) for requirement in self.requirements)
+
+    def prefix_keys(self, prefix: Tuple[str, ...]) -> KeyRequirement:
+        return _AllOf([requirement.prefix_keys(prefix) for requirement in self.requirements])
+
+
+class _AnyOf(KeyRequirement):
+    def __init__(self, requirements: List[KeyRequirement]) -> None:
+        self.requirements = requirements
+
+    def get_keys(self) -> Set[Tuple[str, ...]]:
+        return set().union(*(requirement.get_keys() for requirement in self.requirements))
+
+    def is_satisfied(self, has_key: Callable[[Tuple[str, ...]], bool]) -> bool:
+        return any(requirement.is_satisfied(has_key) for requirement in self.requirements)
+
+    def prefix_keys(self, prefix: Tuple[str, ...]) -> KeyRequirement:
+        return _AnyOf([requirement.prefix_keys(prefix) for requirement in self.requirements])
+
+
+class _UnsupportedQueryError(Exception):
+    """Raised when a query can't be parsed (or could be parsed differently by clp-s)."""
+
+
+def get_key_requirement(query_string: str) -> Optional[KeyRequirement]:
+    """
+    :param query_string: A clp-s KQL query.
+    :return: The requirement on the keys an archive must contain to possibly match the query, or
+        None if the query places no requirement on an archive's keys.
+    """
+    try:
+        return _QueryParser(_tokenize_query(query_string)).parse()
+    except _UnsupportedQueryError:
+        return None
+
+
+def _tokenize_query(query_string: str) -> List[Tuple[str, str]]:
+    """
+    Splits a KQL query into tokens, following the lexer rules of clp-s's KQL grammar.
+    :param query_string:
+    :return: A list of (token type, text) pairs, where a quoted literal's text excludes its quotes.
+    :raises _UnsupportedQueryError: If the query can't be tokenized.
+    """
+    tokens: List[Tuple[str, str]] = []
+    query_len = len(query_string)
+    i = 0
+    while i < query_len:
+        c = query_string[i]
+        if c in _WHITESPACE_CHARS:
+            i += 1
+        elif query_string.startswith("date(", i):
+            # NOTE: The date literal rule matches as much of the query as it can, so it isn't
+            # mirrored here.
+            raise _UnsupportedQueryError()
+        elif c in "(){}:":
+            tokens.append((c, c))
+            i += 1
+        elif c in "<>":
+            operator_len = 2 if query_string.startswith("=", i + 1) else 1
+            tokens.append((_RANGE_OPERATOR, query_string[i : i + operator_len]))
+            i += operator_len
+        elif '"' == c:
+            end_ix = i + 1
+            while end_ix < query_len and '"' != query_string[end_ix]:
+                if "\\" == query_string[end_ix]:
+                    # NOTE: A quoted string containing an escaped backslash may be split
+                    # differently by clp-s's lexer.
+                    if query_string.startswith("\\", end_ix + 1):
+                        raise _UnsupportedQueryError()
+                    end_ix += 1
+                end_ix += 1
+            if end_ix >= query_len:
+                raise _UnsupportedQueryError()
+            tokens.append((_LITERAL, query_string[i + 1 : end_ix]))
+            i = end_ix + 1
+        else:
+            end_ix = i
+            while end_ix < query_len:
+                c = query_string[end_ix]
+                if "\\" == c:
+                    escaped_char = query_string[end_ix + 1 : end_ix + 2]
+                    if "" != escaped_char and escaped_char in "trn" + _SPECIAL_CHARS:
+                        end_ix += 2
+                    elif "u" == escaped_char and _is_hex(query_string[end_ix + 2 : end_ix + 6]):
+                        end_ix += 6
+                    else:
+                        raise _UnsupportedQueryError()
+                elif c in _NON_LITERAL_CHARS:
+                    break
+                else:
+                    end_ix += 1
+            literal = query_string[i:end_ix]
+            if literal.upper() in _KEYWORDS:
+                tokens.append((literal.upper(), literal))
+            else:
+                tokens.append((_LITERAL, literal))
+            i = end_ix
+    return tokens
+
+
+def _tokenize_column(column: str) -> Optional[Tuple[str, ...]]:
+    """
+    Splits a KQL column into the (unescaped) names of the keys along its path.
+    :param column: The column's text, excluding any quotes.
+    :return: The names of the keys along the column's path, or None if the column is namespaced,
+        contains a wildcard, or is malformed.
+    """
+    if "" == column or column[0] in _NAMESPACE_CHARS:
+        return None
+
+    tokens: List[str] = []
+    token: List[str] = []
+    column_len = len(column)
+    i = 0
+    while i < column_len:
+        c = column[i]
+        if "\\" == c:
+            escaped_char = column[i + 1 : i + 2]
+            if "u" == escaped_char:
+                hex_digits = column[i + 2 : i + 6]
+                if not _is_hex(hex_digits):
+                    return None
+                code_point = int(hex_digits, 16)
+                if 0xD800 <= code_point <= 0xDFFF:
+                    return None
+                token.append(chr(code_point))
+                i += 6
+                continue
+            if "" == escaped_char or escaped_char not in _UNESCAPED_KEY_CHARS:
+                return None
+            token.append(_UNESCAPED_KEY_CHARS[escaped_char])
+            i += 2
+            continue
+
+        if "." == c:
+            if 0 == len(token):
+                return None
+            tokens.append("".join(token))
+            token = []
+        elif "*" == c:
+            return None
+        else:
+            token.append(c)
+        i += 1
+    if 0 == len(token):
+        return None
+    tokens.append("".join(token))
+    return tuple(tokens)
+
+
+def _is_hex(text: str) -> bool:
+    return 4 == len(text) and all(c in "0123456789abcdefABCDEF" for c in text)
+
+
+class _QueryParser:
+    """
+    A recursive-descent parser for clp-s's KQL grammar, which derives each (sub)query's key
+    requirement rather than an expression. Like in the grammar, NOT binds more tightly than AND and
+    OR, which have the same precedence and are left-associative.
+    """
+
+    def __init__(self, tokens: List[Tuple[str, str]]) -> None:
+        self.__tokens = tokens
+        self.__next_token_ix = 0
+
+    def parse(self) -> Optional[KeyRequirement]:
+        """
+        :return: The query's key requirement, or None if it places no requirement.
+        :raises _UnsupportedQueryError: If the query can't be parsed.
+        """
+        requirement = self.__parse_query()
+        if self.__peek() is not None:
+            raise _UnsupportedQueryError()
+        return requirement
+
+    def __parse_query(self) -> Optional[KeyRequirement]:
+        requirement = self.__parse_unary_query()
+        while self.__peek() in (_AND, _OR):
+            operator = self.__consume()[0]
+            rhs = self.__parse_unary_query()
+            if _AND == operator:
+                requirement = _all_of(requirement, rhs)
+            else:
+                requirement = _any_of(requirement, rhs)
+        return requirement
+
+    def __parse_unary_query(self) -> Optional[KeyRequirement]:
+        if _NOT == self.__peek():
+            self.__consume()
+            # A negated query may match records without any of its keys
+            self.__parse_unary_query()
+            return None
+
+        if "(" == self.__peek():
+            self.__consume()
+            requirement = self.__parse_query()
+            self.__expect(")")
+            return requirement
+
+        literal = self.__expect(_LITERAL)
+        if ":" == self.__peek():
+            self.__consume()
+            column = _tokenize_column(literal)
+            if "{" == self.__peek():
+                self.__consume()
+                requirement = self.__parse_query()
+                self.__expect("}")
+                if column is None or requirement is None:
+                    return None
+                return requirement.prefix_keys(column)
+            if "(" == self.__peek():
+                self.__consume()
+                condition = None
+                if self.__peek() in _KEYWORDS:
+                    condition = self.__consume()[0]
+                num_values = 0
+                while _LITERAL == self.__peek():
+                    self.__consume()
+                    num_values += 1
+                self.__expect(")")
+                # An inverted list may match records without the key, and an empty list may match
+                # every record.
+                if _NOT == condition or 0 == num_values:
+                    return None
+            else:
+                self.__expect(_LITERAL)
+            return None if column is None else _KeyPresence(column)
+
+        if _RANGE_OPERATOR == self.__peek():
+            self.__consume()
+            self.__expect(_LITERAL)
+            column = _tokenize_column(literal)
+            return None if column is None else _KeyPresence(column)
+
+        # A value without a key may match any key
+        return None
+
+    def __peek(self) -> Optional[str]:
+        if self.__next_token_ix >= len(self.__tokens):
+            return None
+        return self.__tokens[self.__next_token_ix][0]
+
+    def __consume(self) -> Tuple[str, str]:
+        token = self.__tokens[self.__next_token_ix]
+        self.__next_token_ix += 1
+        return token
+
+    def __expect(self, token_type: str) -> str:
+        if token_type != self.__peek():
+            raise _UnsupportedQueryError()
+        return self.__consume()[1]
+
+
+def _all_of(
+    lhs: Optional[KeyRequirement], rhs: Optional[KeyRequirement]
+) -> Optional[KeyRequirement]:
+    if lhs is None:
+        return rhs
+    if rhs is None:
+        return lhs
+    return _AllOf([lhs, rhs])
+
+
+def _any_of(
+    lhs: Optional[KeyRequirement], rhs: Optional[KeyRequirement]
+) -> Optional[KeyRequirement]:
+    # A query that matches records without any key matches them regardless of the other query
+    if lhs is None or rhs is None:
+        return None
+    return _AnyOf([lhs, rhs])
@@ -39,9 +39,11 @@ from clp_py_utils.clp_config import (
 from clp_py_utils.clp_logging import get_logger, get_logging_formatter, set_logging_level
 from clp_py_utils.clp_metadata_db_utils import (
     fetch_existing_datasets,
+    get_archive_histograms_table_name,
     get_archive_tags_table_name,
     get_archives_table_name,
     get_files_table_name,
+    get_keys_table_name,
     get_tags_table_name,
 )
 from clp_py_utils.core import read_yaml_config_file
@@ -59,11 +61,13 @@ from job_orchestration.scheduler.constants import (
     SchedulerType,
 )
 from job_orchestration.scheduler.job_config import (
+    AggregationConfig,
     ExtractIrJobConfig,
     ExtractJsonJobConfig,
     QueryJobConfig,
     SearchJobConfig,
 )
+from job_orchestration.scheduler.query.key_requirements import get_key_requirement
 from job_orchestration.scheduler.query.reducer_handler import (
     handle_reducer_connection,
     ReducerHandlerMessage,
@@ -79,6 +83,12 @@ from job_orchestration.scheduler.scheduler_data import (
     SearchJob,
 )
 from job_orchestration.scheduler.utils import kill_hanging_jobs
+from job_orchestration.utils.archive_keys_utils import (
+    does_key_path_match,
+    get_archive_key_bitmasks,
+    get_key_id_bitmask,
+    split_key_name,
+)
 
 # Setup logging
 logger = get_logger("search-job-handler")
@@ -94,6 +104,10 @@ active_archive_json_extractions: Dict[str, List[str]] = {}
 
 reducer_connection_queue: Optional[asyncio.Queue] = None
 
+# Dictionary that maps each clp-s dataset to a dictionary that maps the IDs of the dataset's keys to
+# their paths (or None if a key's name couldn't be parsed)
+dataset_key_paths: Dict[str, Dict[int, Optional[Tuple[str, ...]]]] = {}
+
 
 class StreamExtractionHandle(ABC):
     def __init__(self, job_id: str):
@@ -222,6 +236,8 @@ def cancel_job_except_reducer(job: SearchJob):
     """
 
     if InternalJobState.RUNNING == job.state:
+        if job.current_sub_job_async_task_result is None:
+            return
         job.current_sub_job_async_task_result.revoke(terminate=True)
         try:
             job.current_sub_job_async_task_result.get()
@@ -402,7 +418,7 @@ def get_archives_for_search(
     archive_end_ts_lower_bound: Optional[int],
 ):
     dataset = search_config.dataset
-    query = f"""SELECT id as archive_id, end_timestamp
+    query = f"""SELECT id as archive_id, begin_timestamp, end_timestamp
             FROM {get_archives_table_name(table_prefix, dataset)}
             """
     filter_clauses = []
@@ -435,6 +451,171 @@ def get_archives_for_search(
     return archives_for_search
 
 
+def is_answerable_from_histograms(search_config: SearchJobConfig) -> bool:
+    """
+    :param search_config:
+    :return: Whether the search job is a count-by-time aggregation of every message in a clp-s
+        dataset, which can be answered from the histograms of the archives it covers.
+    """
+    aggregation_config = search_config.aggregation_config
+    return (
+        search_config.dataset is not None
+        and aggregation_config is not None
+        and aggregation_config.count_by_time_bucket_size is not None
+        and "*" == search_config.query_string.strip()
+        and search_config.path_filter is None
+    )
+
+
+@exception_default_value(default=({}, set()))
+def get_counts_by_time_from_histograms(
+    db_conn,
+    table_prefix: str,
+    search_config: SearchJobConfig,
+    archives_for_search: List[Dict[str, Any]],
+) -> Tuple[Dict[int, int], Set[str]]:
+    """
+    Merges the histograms of the archives that can be counted without being searched, i.e., the
+    archives that lie entirely within the search job's time range and whose histograms' bucket size
+    divides the job's.
+    :param db_conn:
+    :param table_prefix:
+    :param search_config:
+    :param archives_for_search:
+    :return: A tuple containing:
+        - A map from the beginning of each of the job's time buckets to the number of messages in
+          it, across the counted archives.
+        - The IDs of the counted archives.
+    """
+    begin_timestamp = search_config.begin_timestamp
+    end_timestamp = search_config.end_timestamp
+    candidate_archive_ids = [
+        archive["archive_id"]
+        for archive in archives_for_search
+        if (begin_timestamp is None or archive["begin_timestamp"] >= begin_timestamp)
+        and (end_timestamp is None or archive["end_timestamp"] <= end_timestamp)
+    ]
+    if 0 == len(candidate_archive_ids):
+        return {}, set()
+
+    histograms_table_name = get_archive_histograms_table_name(table_prefix, search_config.dataset)
+    bucket_size = search_config.aggregation_config.count_by_time_bucket_size
+    ids_list_string = ", ".join(["%s"] * len(candidate_archive_ids))
+    with contextlib.closing(db_conn.cursor(dictionary=True)) as cursor:
+        cursor.execute(
+            f"""
+            SELECT DISTINCT archive_id
+            FROM {histograms_table_name}
+            WHERE archive_id IN ({ids_list_string}) AND MOD(%s, bucket_size) = 0
+            """,
+            candidate_archive_ids + [bucket_size],
+        )
+        counted_archive_ids = [row["archive_id"] for row in cursor.fetchall()]
+        if 0 == len(counted_archive_ids):
+            return {}, set()
+
+        # NOTE: Since a histogram counts every message in its archive, including any without a
+        # timestamp, only the buckets that may contain messages within the job's time range are
+        # merged. Like clp-s, the buckets' boundaries are computed by division that truncates toward
+        # zero.
+        ids_list_string = ", ".join(["%s"] * len(counted_archive_ids))
+        filter_clauses = [f"archive_id IN ({ids_list_string})"]
+        params: List[Any] = [bucket_size, bucket_size, *counted_archive_ids]
+        if begin_timestamp is not None:
+            filter_clauses.append("bucket_begin > %s - bucket_size")
+            params.append(begin_timestamp)
+        if end_timestamp is not None:
+            filter_clauses.append("bucket_begin < %s + bucket_size")
+            params.append(end_timestamp)
+        cursor.execute(
+            f"""
+            SELECT (bucket_begin DIV %s) * %s AS job_bucket_begin,
+                SUM(num_messages) AS num_messages
+            FROM {histograms_table_name}
+            WHERE {" AND ".join(filter_clauses)}
+            GROUP BY job_bucket_begin
+            """,
+            params,
+        )
+        counts_by_time = {
+            int(row["job_bucket_begin"]): int(row["num_messages"]) for row in cursor.fetchall()
+        }
+    db_conn.commit()
+    return counts_by_time, set(counted_archive_ids)
+
+
+@exception_default_value(default=set())
+def get_archive_ids_lacking_required_keys(
+    db_conn,
+    table_prefix: str,
+    search_config: SearchJobConfig,
+    archives_for_search: List[Dict[str, Any]],
+) -> Set[str]:
+    """
+    Finds the archives that can't match the search job's query since they lack keys the query
+    requires (see `get_key_requirement`). An archive matches a key the query requires if it contains
+    the key, a key nested within it, or a key it's nested within (e.g., an array that may contain
+    it).
+    :param db_conn:
+    :param table_prefix:
+    :param search_config:
+    :param archives_for_search:
+    :return: The IDs of the archives that can be skipped.
+    """
+    dataset = search_config.dataset
+    if dataset is None or search_config.ignore_case:
+        return set()
+    key_requirement = get_key_requirement(search_config.query_string)
+    if key_requirement is None:
+        return set()
+
+    key_paths = dataset_key_paths.setdefault(dataset, {})
+    with contextlib.closing(db_conn.cursor(dictionary=True)) as cursor:
+        key_id_bitmasks = get_archive_key_bitmasks(
+            cursor,
+            table_prefix,
+            dataset,
+            [archive["archive_id"] for archive in archives_for_search],
+        )
+        known_key_ids_bitmask = get_key_id_bitmask(key_paths)
+        unknown_key_ids_bitmask = 0
+        for key_id_bitmask in key_id_bitmasks.values():
+            unknown_key_ids_bitmask |= key_id_bitmask & ~known_key_ids_bitmask
+        if 0 != unknown_key_ids_bitmask:
+            # NOTE: Since keys are registered concurrently, a key may be committed after keys with
+            # greater IDs, so all keys from the least unknown ID onwards are fetched.
+            least_unknown_key_id = (
+                unknown_key_ids_bitmask & -unknown_key_ids_bitmask
+            ).bit_length() - 1
+            cursor.execute(
+                f"SELECT id, name FROM {get_keys_table_name(table_prefix, dataset)} WHERE id >= %s",
+                [least_unknown_key_id],
+            )
+            for row in cursor.fetchall():
+                key_paths[row["id"]] = split_key_name(bytes(row["name"]).decode("utf-8"))
+            known_key_ids_bitmask = get_key_id_bitmask(key_paths)
+    db_conn.commit()
+
+    # A bitmask of the IDs of the keys that match each key the query requires
+    matching_key_ids_bitmasks: Dict[Tuple[str, ...], int] = {}
+    for required_key_path in key_requirement.get_keys():
+        matching_key_ids_bitmasks[required_key_path] = get_key_id_bitmask(
+            key_id
+            for key_id, key_path in key_paths.items()
+            if does_key_path_match(key_path, required_key_path)
+        )
+
+    archive_ids_to_skip: Set[str] = set()
+    for archive_id, key_id_bitmask in key_id_bitmasks.items():
+        if 0 != key_id_bitmask & ~known_key_ids_bitmask:
+            continue
+        if not key_requirement.is_satisfied(
+            lambda key_path: 0 != key_id_bitmask & matching_key_ids_bitmasks[key_path]
+        ):
+            archive_ids_to_skip.add(archive_id)
+    return archive_ids_to_skip
+
+
 def get_archive_and_file_split_ids_for_ir_extraction(
     db_conn,
     table_prefix: str,
@@ -561,7 +742,11 @@ def dispatch_query_job(
         clp_metadata_db_conn_params,
         results_cache_uri,
     )
-    job.current_sub_job_async_task_result = task_group.apply_async()
+    if 0 == len(archive_ids):
+        # Nothing needs to be searched (e.g., the job was answered from archive histograms)
+        job.current_sub_job_async_task_result = None
+    else:
+        job.current_sub_job_async_task_result = task_group.apply_async()
     job.state = InternalJobState.RUNNING
 
 
@@ -696,6 +881,19 @@ def handle_pending_query_jobs(
                 archives_for_search = get_archives_for_search(
                     db_conn, table_prefix, search_config, archive_end_ts_lower_bound
                 )
+                archive_ids_to_skip = get_archive_ids_lacking_required_keys(
+                    db_conn, table_prefix, search_config, archives_for_search
+                )
+                if len(archive_ids_to_skip) > 0:
+                    archives_for_search = [
+                        archive
+                        for archive in archives_for_search
+                        if archive["archive_id"] not in archive_ids_to_skip
+                    ]
+                    logger.info(
+                        f"Skipped {len(archive_ids_to_skip)} archive(s) lacking the keys required"
+                        f" by job {job_id}."
+                    )
                 if len(archives_for_search) == 0:
                     if set_job_or_task_status(
                         db_conn,
@@ -710,6 +908,26 @@ def handle_pending_query_jobs(
                         logger.info(f"No matching archives, skipping job {job_id}.")
                     continue
 
+                counts_by_time_from_histograms: Optional[Dict[int, int]] = None
+                if is_answerable_from_histograms(search_config):
+                    counts_by_time_from_histograms, counted_archive_ids = (
+                        get_counts_by_time_from_histograms(
+                            db_conn, table_prefix, search_config, archives_for_search
+                        )
+                    )
+                    if len(counted_archive_ids) > 0:
+                        archives_for_search = [
+                            archive
+                            for archive in archives_for_search
+                            if archive["archive_id"] not in counted_archive_ids
+                        ]
+                        logger.info(
+                            f"Counted {len(counted_archive_ids)} archive(s) from their histograms"
+                            f" for job {job_id}."
+                        )
+                    else:
+                        counts_by_time_from_histograms = None
+
                 new_search_job = SearchJob(
                     id=job_id,
                     search_config=search_config,
@@ -717,6 +935,7 @@ def handle_pending_query_jobs(
                     num_archives_to_search=len(archives_for_search),
                     num_archives_searched=0,
                     remaining_archives_for_search=archives_for_search,
+                    counts_by_time_from_histograms=counts_by_time_from_histograms,
                 )
 
                 if search_config.aggregation_config is not None:
@@ -863,6 +1082,9 @@ def handle_pending_query_jobs(
 
 
 def try_getting_task_result(async_task_result):
+    if async_task_result is None:
+        # No tasks were dispatched
+        return []
     if not async_task_result.ready():
         return None
     return async_task_result.get()
@@ -893,6 +1115,38 @@ def found_max_num_latest_results(
         return max_timestamp_in_remaining_archives <= min_timestamp_in_top_results
 
 
+async def send_counts_by_time_to_reducer(
+    aggregation_config: AggregationConfig, counts_by_time: Dict[int, int]
+) -> None:
+    """
+    Sends count-by-time aggregation results to a job's reducer, in the same way as a search task.
+    :param aggregation_config:
+    :param counts_by_time: A map from the beginning of each time bucket to the number of messages in
+        it.
+    :raises ValueError: If the reducer rejects the connection.
+    :raises: Propagates `asyncio.open_connection`'s and the stream's exceptions.
+    """
+    reader, writer = await asyncio.open_connection(
+        aggregation_config.reducer_host, aggregation_config.reducer_port
+    )
+    try:
+        writer.write(aggregation_config.job_id.to_bytes(8, byteorder="little", signed=True))
+        await writer.drain()
+        if b"y" != await reader.readexactly(1):
+            raise ValueError("Reducer rejected the connection.")
+
+        for bucket_begin, num_messages in counts_by_time.items():
+            record_group = msgpack.packb(
+                {"group_tags": [str(bucket_begin)], "records": [{"count": num_messages}]}
+            )
+            writer.write(len(record_group).to_bytes(8, byteorder="little"))
+            writer.write(record_group)
+        await writer.drain()
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
 async def handle_finished_search_job(
     db_conn, job: SearchJob, task_results: Optional[Any], results_cache_uri: str
 ) -> None:
@@ -946,6 +1200,18 @@ async def handle_finished_search_job(
         )
         return
 
+    if (
+        QueryJobStatus.SUCCEEDED == new_job_status
+        and job.counts_by_time_from_histograms is not None
+    ):
+        try:
+            await send_counts_by_time_to_reducer(
+                job.search_config.aggregation_config, job.counts_by_time_from_histograms
+            )
+        except Exception:
+            logger.exception(f"Failed to send counts from archive histograms for job {job_id}.")
+            new_job_status = QueryJobStatus.FAILED
+
     reducer_failed = False
     if is_reducer_job:
         # Notify reducer that it should have received all results
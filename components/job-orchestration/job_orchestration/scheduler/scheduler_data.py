@@ -2,7 +2,7 @@ import asyncio
 import datetime
 from abc import ABC, abstractmethod
 from enum import auto, Enum
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from pydantic import BaseModel, ConfigDict
 
@@ -26,7 +26,23 @@ class CompressionJob(BaseModel):
 
     id: int
     start_time: datetime.datetime
-    result_handle: TaskManager.ResultHandle
+    priority: int = 1
+    dataset: Optional[str] = None
+    # Created when the job's first batch of tasks is submitted
+    result_handle: Optional[TaskManager.ResultHandle] = None
+    # For the content-aware file grouping strategy, the number of files and original size of each
+    # (path template, content signature) group in each task
+    task_file_groups: Dict[int, Dict[Tuple[str, str], List[int]]] = {}
+    # The arguments shared by all the job's tasks, used to launch backup attempts of slow tasks and
+    # to retry failed tasks
+    task_arguments: Optional[Dict[str, Any]] = None
+    backup_task_ids: Set[int] = set()
+    # The number of attempts at each task that has been retried
+    num_task_attempts: Dict[int, int] = {}
+    last_straggler_check_time: Optional[datetime.datetime] = None
+    # Set if planning the job failed after some of its tasks were queued for dispatch, in which case
+    # the job fails (and its archives are discarded) once its dispatched tasks finish
+    planning_error: Optional[str] = None
 
 
 class InternalJobState(Enum):
@@ -76,6 +92,9 @@ class SearchJob(QueryJob):
     num_archives_to_search: int
     num_archives_searched: int
     remaining_archives_for_search: List[Dict[str, Any]]
+    # Count-by-time aggregation results merged from the histograms of the archives that don't need
+    # to be searched, which are sent to the reducer once the remaining archives have been searched
+    counts_by_time_from_histograms: Optional[Dict[int, int]] = None
     reducer_acquisition_task: Optional[asyncio.Task] = None
     reducer_handler_msg_queues: Optional[ReducerHandlerMessageQueues] = None
 
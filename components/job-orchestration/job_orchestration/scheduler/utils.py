@@ -26,6 +26,7 @@ def kill_hanging_jobs(sql_adapter: SQL_Adapter, scheduler_type: str) -> Optional
         job_status_running = CompressionJobStatus.RUNNING
         job_status_killed = CompressionJobStatus.KILLED
         tasks_table_name = COMPRESSION_TASKS_TABLE_NAME
+        task_status_pending = CompressionTaskStatus.PENDING
         task_status_running = CompressionTaskStatus.RUNNING
         task_status_killed = CompressionTaskStatus.KILLED
     elif SchedulerType.QUERY == scheduler_type:
@@ -33,6 +34,7 @@ def kill_hanging_jobs(sql_adapter: SQL_Adapter, scheduler_type: str) -> Optional
         job_status_running = QueryJobStatus.RUNNING
         job_status_killed = QueryJobStatus.KILLED
         tasks_table_name = QUERY_TASKS_TABLE_NAME
+        task_status_pending = QueryTaskStatus.PENDING
         task_status_running = QueryTaskStatus.RUNNING
         task_status_killed = QueryTaskStatus.KILLED
     else:
@@ -58,7 +60,7 @@ def kill_hanging_jobs(sql_adapter: SQL_Adapter, scheduler_type: str) -> Optional
             f"""
             UPDATE {tasks_table_name}
             SET status={task_status_killed}, duration=0
-            WHERE status={task_status_running}
+            WHERE status IN ({task_status_pending}, {task_status_running})
             AND job_id IN ({job_id_placeholders_str})
             """,
             hanging_job_ids,
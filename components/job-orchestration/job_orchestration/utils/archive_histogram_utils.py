@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import pathlib
+import socket
+import subprocess
+from typing import Dict, Final, Optional
+
+import msgpack
+from clp_py_utils.clp_metadata_db_utils import get_archive_histograms_table_name
+
+# Size (in milliseconds) of the time buckets in each archive's histogram. Histograms can be merged
+# into any bucket size that's a multiple of this.
+ARCHIVE_HISTOGRAM_BUCKET_SIZE: Final[int] = 1000
+
+# Interval (in seconds) at which to check whether clp-s exited before connecting to the listener
+_CONNECTION_POLL_INTERVAL: Final[float] = 1.0
+
+# The ID clp-s sends when connecting to the listener (any ID is accepted)
+_HISTOGRAM_JOB_ID: Final[int] = 0
+
+_SIZE_PREFIX_LEN: Final[int] = 8
+
+
+def compute_archive_histogram(
+    clp_home: pathlib.Path,
+    archives_dir: pathlib.Path,
+    archive_id: str,
+    stderr_log_file,
+) -> Dict[int, int]:
+    """
+    Counts a clp-s archive's messages by time bucket, by running an unfiltered count-by-time
+    aggregation on the archive and receiving its results in place of a reducer.
+    :param clp_home:
+    :param archives_dir:
+    :param archive_id:
+    :param stderr_log_file: File to which clp-s's stderr should be written.
+    :return: A map from the beginning of each non-empty bucket to the number of messages in it.
+    :raises RuntimeError: If clp-s fails.
+    :raises: Propagates `socket`'s and `subprocess.Popen`'s exceptions.
+    """
+    with socket.create_server(("127.0.0.1", 0)) as listener:
+        listener.settimeout(_CONNECTION_POLL_INTERVAL)
+        port = listener.getsockname()[1]
+
+        # fmt: off
+        search_cmd = [
+            str(clp_home / "bin" / "clp-s"),
+            "s", str(archives_dir),
+            "--archive-id", archive_id,
+            "*",
+            "--count-by-time", str(ARCHIVE_HISTOGRAM_BUCKET_SIZE),
+            "reducer",
+            "--host", "127.0.0.1",
+            "--port", str(port),
+            "--job-id", str(_HISTOGRAM_JOB_ID),
+        ]
+        # fmt: on
+        proc = subprocess.Popen(search_cmd, stdout=subprocess.DEVNULL, stderr=stderr_log_file)
+        try:
+            histogram: Optional[Dict[int, int]] = None
+            while histogram is None:
+                try:
+                    conn, _ = listener.accept()
+                except TimeoutError:
+                    if proc.poll() is not None:
+                        break
+                    continue
+                with conn:
+                    conn.settimeout(None)
+                    histogram = _receive_histogram(conn)
+        finally:
+            return_code = proc.wait()
+
+    if 0 != return_code or histogram is None:
+        raise RuntimeError(
+            f"Failed to count the messages in archive {archive_id} (return code {return_code})."
+        )
+    return histogram
+
+
+def insert_archive_histogram(
+    db_cursor, table_prefix: str, dataset: Optional[str], archive_id: str, histogram: Dict[int, int]
+) -> None:
+    """
+    Inserts an archive's histogram into the metadata database.
+
+    NOTE: The caller must commit the transaction.
+    :param db_cursor:
+    :param table_prefix:
+    :param dataset:
+    :param archive_id:
+    :param histogram:
+    """
+    if 0 == len(histogram):
+        return
+    db_cursor.executemany(
+        f"""
+        INSERT INTO {get_archive_histograms_table_name(table_prefix, dataset)}
+        (archive_id, bucket_size, bucket_begin, num_messages)
+        VALUES (%s, %s, %s, %s)
+        """,
+        [
+            (archive_id, ARCHIVE_HISTOGRAM_BUCKET_SIZE, bucket_begin, num_messages)
+            for bucket_begin, num_messages in histogram.items()
+        ],
+    )
+
+
+def _receive_histogram(conn: socket.socket) -> Dict[int, int]:
+    """
+    Receives the results of a count-by-time aggregation from a connected clp-s process, using the
+    protocol clp-s uses to send results to a reducer.
+    :param conn:
+    :return: A map from the beginning of each non-empty bucket to the number of messages in it.
+    :raises: Propagates `socket`'s and `msgpack.unpackb`'s exceptions.
+    """
+    with conn.makefile("rb") as reader:
+        # Accept the connection regardless of the job ID
+        reader.read(_SIZE_PREFIX_LEN)
+        conn.sendall(b"y")
+
+        histogram: Dict[int, int] = {}
+        while True:
+            size_bytes = reader.read(_SIZE_PREFIX_LEN)
+            if len(size_bytes) < _SIZE_PREFIX_LEN:
+                break
+            record_group = msgpack.unpackb(
+                reader.read(int.from_bytes(size_bytes, byteorder="little"))
+            )
+            bucket_begin = int(record_group["group_tags"][0])
+            for record in record_group["records"]:
+                histogram[bucket_begin] = histogram.get(bucket_begin, 0) + record["count"]
+    return histogram
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+from typing import Dict, Final, Iterable, List, Optional, Tuple
+
+from clp_py_utils.clp_metadata_db_utils import (
+    get_archive_keys_table_name,
+    get_keys_table_name,
+)
+
+# Max length (in bytes, when encoded as UTF-8) of a key's name in the keys table
+MAX_KEY_NAME_LEN: Final[int] = 512
+
+# Number of keys looked up (and registered) at a time
+_KEY_REGISTRATION_BATCH_SIZE: Final[int] = 1000
+
+# Characters escaped by the indexer with a single character after the backslash
+_UNESCAPED_KEY_NAME_CHARS: Final[Dict[str, str]] = {
+    '"': '"',
+    "\\": "\\",
+    "n": "\n",
+    "t": "\t",
+    "r": "\r",
+    "b": "\b",
+    "f": "\f",
+    ".": ".",
+}
+
+
+def get_key_id_bitmask(key_ids: Iterable[int]) -> int:
+    """
+    :param key_ids:
+    :return: A bitmask in which the bit at each of the given key IDs is set.
+    """
+    # NOTE: The bits are set in a byte array, since setting them in an int one at a time would take
+    # quadratic time.
+    bitset = bytearray()
+    for key_id in key_ids:
+        byte_ix = key_id // 8
+        if byte_ix >= len(bitset):
+            bitset.extend(bytes(byte_ix + 1 - len(bitset)))
+        bitset[byte_ix] |= 1 << (key_id % 8)
+    return int.from_bytes(bitset, byteorder="little")
+
+
+def split_key_name(name: str) -> Optional[Tuple[str, ...]]:
+    """
+    Splits a key's name, as escaped by the indexer, into the names of the keys along its path.
+    :param name:
+    :return: The unescaped names of the keys along the path, or None if the name is malformed.
+    """
+    tokens: List[str] = []
+    token = bytearray()
+    i = 0
+    while i < len(name):
+        c = name[i]
+        i += 1
+        if "." == c:
+            tokens.append(token.decode("utf-8", errors="surrogateescape"))
+            token = bytearray()
+        elif "\\" != c:
+            token.extend(c.encode("utf-8"))
+        elif i >= len(name):
+            return None
+        elif "u" == name[i]:
+            # Non-printable bytes are escaped as `\u00XX`
+            hex_digits = name[i + 1 : i + 5]
+            if not (
+                4 == len(hex_digits)
+                and hex_digits.startswith("00")
+                and all(c in "0123456789abcdefABCDEF" for c in hex_digits)
+            ):
+                return None
+            token.append(int(hex_digits, 16))
+            i += 5
+        elif name[i] in _UNESCAPED_KEY_NAME_CHARS:
+            token.extend(_UNESCAPED_KEY_NAME_CHARS[name[i]].encode("utf-8"))
+            i += 1
+        else:
+            return None
+    tokens.append(token.decode("utf-8", errors="surrogateescape"))
+    return tuple(tokens)
+
+
+def does_key_path_match(
+    key_path: Optional[Tuple[str, ...]], required_key_path: Tuple[str, ...]
+) -> bool:
+    """
+    :param key_path: The path of a key in an archive, or None if its name is malformed.
+    :param required_key_path: The path of a key a query requires.
+    :return: Whether an archive containing the key may contain the required key, i.e., whether the
+        key is the required key, a key nested within it, or a key it's nested within (e.g., an array
+        that may contain it). A key with a malformed name matches every required key.
+    """
+    return (
+        key_path is None
+        or key_path[: len(required_key_path)] == required_key_path
+        or required_key_path[: len(key_path)] == key_path
+    )
+
+
+def register_keys(
+    db_conn, db_cursor, table_prefix: str, dataset: Optional[str], names: Iterable[str]
+) -> Dict[str, int]:
+    """
+    Gets the IDs of the given keys, assigning IDs to the keys that don't have one yet.
+
+    NOTE: Since IDs are assigned in their own transactions (so that they're never held up by the
+    caller's), IDs may be assigned to keys that are never published.
+    :param db_conn:
+    :param db_cursor:
+    :param table_prefix:
+    :param dataset:
+    :param names: The names of the keys, as escaped by the indexer.
+    :return: A map from each key's name to its ID.
+    :raises: Propagates the DB cursor's exceptions.
+    """
+    keys_table_name = get_keys_table_name(table_prefix, dataset)
+    sorted_names = sorted(set(names))
+    key_ids: Dict[str, int] = {}
+    for batch_begin_ix in range(0, len(sorted_names), _KEY_REGISTRATION_BATCH_SIZE):
+        batch = sorted_names[batch_begin_ix : batch_begin_ix + _KEY_REGISTRATION_BATCH_SIZE]
+        key_ids.update(_get_key_ids(db_cursor, keys_table_name, batch))
+        db_conn.commit()
+
+        # NOTE: Existing keys are looked up before inserting the rest, since `INSERT IGNORE` may
+        # consume an ID for each ignored row, which would leave gaps in the bitsets.
+        new_names = [name for name in batch if name not in key_ids]
+        if 0 == len(new_names):
+            continue
+        db_cursor.executemany(
+            f"INSERT IGNORE INTO {keys_table_name} (name) VALUES (%s)",
+            [(name,) for name in new_names],
+        )
+        db_conn.commit()
+        key_ids.update(_get_key_ids(db_cursor, keys_table_name, new_names))
+        db_conn.commit()
+    return key_ids
+
+
+def insert_archive_keys(
+    db_cursor, table_prefix: str, dataset: Optional[str], archive_id: str, key_id_bitmask: int
+) -> None:
+    """
+    Inserts the IDs of the keys present in an archive into the metadata database, as a bitset.
+
+    NOTE: The caller must commit the transaction.
+    :param db_cursor:
+    :param table_prefix:
+    :param dataset:
+    :param archive_id:
+    :param key_id_bitmask: See `get_key_id_bitmask`.
+    """
+    db_cursor.execute(
+        f"""
+        INSERT INTO {get_archive_keys_table_name(table_prefix, dataset)} (archive_id, key_ids)
+        VALUES (%s, %s)
+        """,
+        (
+            archive_id,
+            key_id_bitmask.to_bytes((key_id_bitmask.bit_length() + 7) // 8, byteorder="little"),
+        ),
+    )
+
+
+def get_archive_key_bitmasks(
+    db_cursor, table_prefix: str, dataset: Optional[str], archive_ids: List[str]
+) -> Dict[str, int]:
+    """
+    :param db_cursor:
+    :param table_prefix:
+    :param dataset:
+    :param archive_ids:
+    :return: A map from each of the given archives whose keys were recorded to a bitmask of the IDs
+        of the keys present in it (see `get_key_id_bitmask`).
+    :raises: Propagates the DB cursor's exceptions.
+    """
+    if 0 == len(archive_ids):
+        return {}
+    db_cursor.execute(
+        f"""
+        SELECT archive_id, key_ids
+        FROM {get_archive_keys_table_name(table_prefix, dataset)}
+        WHERE archive_id IN ({", ".join(["%s"] * len(archive_ids))})
+        """,
+        archive_ids,
+    )
+    return {
+        row["archive_id"]: int.from_bytes(bytes(row["key_ids"]), byteorder="little")
+        for row in db_cursor.fetchall()
+    }
+
+
+def _get_key_ids(db_cursor, keys_table_name: str, names: List[str]) -> Dict[str, int]:
+    db_cursor.execute(
+        f"""
+        SELECT id, name FROM {keys_table_name}
+        WHERE name IN ({", ".join(["%s"] * len(names))})
+        """,
+        names,
+    )
+    return {bytes(row["name"]).decode("utf-8"): row["id"] for row in db_cursor.fetchall()}
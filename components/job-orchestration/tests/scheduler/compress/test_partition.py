@@ -0,0 +1,243 @@
+"""Tests for partitioning a compression job's input into tasks."""
+
+import pathlib
+import random
+import statistics
+from typing import Any, Dict, List
+
+import brotli
+import msgpack
+import pytest
+from clp_py_utils.clp_config import PartitioningStrategy
+from clp_py_utils.core import FileMetadata
+from job_orchestration.scheduler.compress.partition import PathsToCompressBuffer
+from job_orchestration.scheduler.job_config import (
+    ClpIoConfig,
+    FsInputConfig,
+    OutputConfig,
+    PathsToCompress,
+)
+
+TARGET_ARCHIVE_SIZE = 1000
+
+
+class _PartitionsCollector:
+    """Collects the partitions a `PathsToCompressBuffer` hands off."""
+
+    def __init__(self) -> None:
+        self.partitions: List[PathsToCompress] = []
+
+    def handle_partitions(
+        self, tasks: List[Dict[str, Any]], partition_info: List[Dict[str, Any]]
+    ) -> None:
+        assert len(tasks) == len(partition_info)
+        for task_partition_info in partition_info:
+            self.partitions.append(
+                PathsToCompress.model_validate(
+                    msgpack.unpackb(brotli.decompress(task_partition_info["clp_paths_to_compress"]))
+                )
+            )
+
+
+def _make_buffer(
+    partitioning_strategy: PartitioningStrategy, collector: _PartitionsCollector
+) -> PathsToCompressBuffer:
+    clp_io_config = ClpIoConfig(
+        input=FsInputConfig(paths_to_compress=["/logs"]),
+        output=OutputConfig(
+            target_archive_size=TARGET_ARCHIVE_SIZE,
+            partitioning_strategy=partitioning_strategy,
+            target_dictionaries_size=TARGET_ARCHIVE_SIZE,
+            target_segment_size=TARGET_ARCHIVE_SIZE,
+            target_encoded_file_size=TARGET_ARCHIVE_SIZE,
+            compression_level=3,
+        ),
+    )
+    return PathsToCompressBuffer(
+        maintain_file_ordering=False,
+        empty_directories_allowed=True,
+        scheduling_job_id=1,
+        clp_io_config=clp_io_config,
+        clp_metadata_db_connection_config={},
+        partitions_handler=collector.handle_partitions,
+    )
+
+
+def _make_random_files(seed: int, num_files: int) -> List[FileMetadata]:
+    rng = random.Random(seed)
+    files = []
+    for file_ix in range(num_files):
+        max_file_size = rng.choice([50, 400, 3 * TARGET_ARCHIVE_SIZE])
+        files.append(
+            FileMetadata(
+                pathlib.Path(f"/logs/service-{rng.randint(0, 5)}/{file_ix}.log"),
+                rng.randint(1, max_file_size),
+            )
+        )
+    return files
+
+
+class TestBalancedPartitioning:
+    """Tests for the balanced partitioning strategy."""
+
+    @pytest.mark.parametrize("seed", range(50))
+    def test_partition_sizes(self, seed: int) -> None:
+        """
+        Partitions produced before the flush are at least the target size, and those produced by
+        the flush are at most the target size, unless they contain a single huge file.
+        """
+        collector = _PartitionsCollector()
+        buffer = _make_buffer(PartitioningStrategy.BALANCED, collector)
+        files = _make_random_files(seed, 100)
+        for file in files:
+            buffer.add_file(file)
+        num_unflushed_partitions = len(collector.partitions)
+        buffer.flush()
+
+        partitions = collector.partitions
+        assert sorted(path for p in partitions for path in p.file_paths) == sorted(
+            str(file.path) for file in files
+        )
+        for partition in partitions[:num_unflushed_partitions]:
+            assert sum(partition.st_sizes) >= TARGET_ARCHIVE_SIZE
+        for partition in partitions[num_unflushed_partitions:]:
+            if sum(partition.st_sizes) > TARGET_ARCHIVE_SIZE:
+                assert 1 == len(partition.file_paths)
+
+        partition_sizes = [sum(partition.st_sizes) for partition in partitions]
+        assert buffer.get_partition_size_imbalance() == pytest.approx(
+            max(partition_sizes) / statistics.mean(partition_sizes)
+        )
+
+    def test_balanced_imbalance(self) -> None:
+        """Equal partitions are reported as perfectly balanced."""
+        collector = _PartitionsCollector()
+        buffer = _make_buffer(PartitioningStrategy.BALANCED, collector)
+        for file_ix in range(20):
+            buffer.add_file(FileMetadata(pathlib.Path(f"/logs/{file_ix}.log"), 100))
+        buffer.flush()
+
+        assert [sum(partition.st_sizes) for partition in collector.partitions] == [1000, 1000]
+        assert buffer.get_partition_size_imbalance() == pytest.approx(1.0)
+
+    def test_imbalance_without_files(self) -> None:
+        """The imbalance isn't reported if no partition contains files."""
+        collector = _PartitionsCollector()
+        buffer = _make_buffer(PartitioningStrategy.BALANCED, collector)
+        buffer.add_empty_directory(pathlib.Path("/logs/empty"))
+        buffer.flush()
+
+        assert 1 == len(collector.partitions)
+        assert [] == collector.partitions[0].file_paths
+        assert buffer.get_partition_size_imbalance() is None
+
+
+def _make_random_timed_files(seed: int, num_files: int) -> List[FileMetadata]:
+    """
+    :param seed:
+    :param num_files:
+    :return: Files with random sizes, most of which have a date in their path, while the rest have
+        no time range (since they don't exist).
+    """
+    rng = random.Random(seed)
+    files = []
+    for file_ix in range(num_files):
+        if rng.random() < 0.3:
+            path = pathlib.Path(f"/logs/untimed/{file_ix}.log")
+        else:
+            path = pathlib.Path(f"/logs/2024-01-{rng.randint(1, 28):02d}/{file_ix}.log")
+        max_file_size = rng.choice([50, 400, 3 * TARGET_ARCHIVE_SIZE])
+        files.append(FileMetadata(path, rng.randint(1, max_file_size)))
+    return files
+
+
+def _is_untimed(path: str) -> bool:
+    return path.startswith("/logs/untimed/")
+
+
+class TestTimeClusteredPartitioning:
+    """Tests for the time-clustered partitioning strategy."""
+
+    @pytest.mark.parametrize("seed", range(50))
+    def test_buffer_stays_consistent(self, seed: int) -> None:
+        """
+        The files carried over between partitioning passes (the trailing run of timed files and
+        files without a time range) are exactly the files that haven't been handed off, and the
+        buffer's total size matches them.
+        """
+        collector = _PartitionsCollector()
+        buffer = _make_buffer(PartitioningStrategy.TIME_CLUSTERED, collector)
+        files = _make_random_timed_files(seed, 100)
+        added_files_size = 0
+        for file in files:
+            buffer.add_file(file)
+            added_files_size += file.estimated_uncompressed_size
+
+            buffered_files = buffer._PathsToCompressBuffer__files
+            total_file_size = buffer._PathsToCompressBuffer__total_file_size
+            assert total_file_size == sum(f.estimated_uncompressed_size for f in buffered_files)
+            handed_off_size = sum(sum(p.st_sizes) for p in collector.partitions)
+            assert added_files_size == handed_off_size + total_file_size
+            file_time_ranges = buffer._PathsToCompressBuffer__file_time_ranges
+            assert set(map(id, file_time_ranges)) <= set(map(id, buffered_files))
+        assert len(collector.partitions) > 0
+
+        buffer.flush()
+
+        assert 0 == buffer._PathsToCompressBuffer__total_file_size
+        assert [] == buffer._PathsToCompressBuffer__files
+        assert sorted(path for p in collector.partitions for path in p.file_paths) == sorted(
+            str(file.path) for file in files
+        )
+
+    @pytest.mark.parametrize("seed", range(50))
+    def test_untimed_files_are_partitioned_separately(self, seed: int) -> None:
+        """Files without a time range never share a partition with files that have one."""
+        collector = _PartitionsCollector()
+        buffer = _make_buffer(PartitioningStrategy.TIME_CLUSTERED, collector)
+        for file in _make_random_timed_files(seed, 100):
+            buffer.add_file(file)
+        buffer.flush()
+
+        for partition in collector.partitions:
+            assert len({_is_untimed(path) for path in partition.file_paths}) <= 1
+
+    def test_partitions_are_time_ordered(self) -> None:
+        """Each partition covers a contiguous range of dates, filled before the flush."""
+        collector = _PartitionsCollector()
+        buffer = _make_buffer(PartitioningStrategy.TIME_CLUSTERED, collector)
+        days = list(range(1, 16))
+        random.Random(0).shuffle(days)
+        for day in days:
+            buffer.add_file(FileMetadata(pathlib.Path(f"/logs/2024-01-{day:02d}/app.log"), 550))
+        # The trailing run (the last day) is carried over
+        assert [2] * 7 == [len(p.file_paths) for p in collector.partitions]
+        assert ["/logs/2024-01-15/app.log"] == [
+            str(file.path) for file in buffer._PathsToCompressBuffer__files
+        ]
+        buffer.add_file(FileMetadata(pathlib.Path("/logs/2024-01-16/app.log"), 550))
+        buffer.flush()
+
+        partition_dates = [
+            sorted(path.split("/")[2] for path in p.file_paths) for p in collector.partitions
+        ]
+        assert partition_dates == [
+            [f"2024-01-{day:02d}", f"2024-01-{day + 1:02d}"] for day in range(1, 16, 2)
+        ]
+
+    def test_small_untimed_files_are_carried_over(self) -> None:
+        """Files without a time range are carried over until they can fill a partition."""
+        collector = _PartitionsCollector()
+        buffer = _make_buffer(PartitioningStrategy.TIME_CLUSTERED, collector)
+        buffer.add_file(FileMetadata(pathlib.Path("/logs/untimed/a.log"), 100))
+        for day in range(1, 9):
+            buffer.add_file(FileMetadata(pathlib.Path(f"/logs/2024-01-{day:02d}/app.log"), 1000))
+
+        assert 8 == len(collector.partitions)
+        assert ["/logs/untimed/a.log"] == [
+            str(file.path) for file in buffer._PathsToCompressBuffer__files
+        ]
+        assert 100 == buffer._PathsToCompressBuffer__total_file_size
+
+        buffer.flush()
+        assert [["/logs/untimed/a.log"]] == [p.file_paths for p in collector.partitions[8:]]
@@ -0,0 +1,226 @@
+"""Tests for sharing the in-flight task slots between compression jobs."""
+
+from __future__ import annotations
+
+import collections
+import datetime
+from typing import Any, Dict, List
+
+import pytest
+from job_orchestration.scheduler.compress.task_dispatcher import TaskDispatcher
+from job_orchestration.scheduler.compress.task_manager.task_manager import TaskManager
+from job_orchestration.scheduler.scheduler_data import CompressionJob
+from job_orchestration.scheduler.task_result import CompressionTaskResult
+
+
+class _ResultHandle(TaskManager.ResultHandle):
+    """Tracks a job's submitted tasks, which finish only when the test finishes them."""
+
+    def __init__(self, task_params: list[dict[str, Any]]) -> None:
+        self.unfinished_task_ids: collections.deque[int] = collections.deque()
+        self.add_tasks(task_params)
+
+    def add_tasks(self, task_params: list[dict[str, Any]]) -> None:
+        self.unfinished_task_ids.extend(task["task_id"] for task in task_params)
+
+    def get_num_unfinished_tasks(self) -> int:
+        return len(self.unfinished_task_ids)
+
+    def get_result(self, timeout: float = 0.1) -> list[CompressionTaskResult] | None:
+        return None
+
+    def finish_tasks(self, num_tasks: int) -> None:
+        """
+        Finishes the job's oldest unfinished tasks.
+        :param num_tasks:
+        """
+        for _ in range(num_tasks):
+            self.unfinished_task_ids.popleft()
+
+
+class _TaskManager(TaskManager):
+    def submit(self, task_params: list[dict[str, Any]]) -> TaskManager.ResultHandle:
+        return _ResultHandle(task_params)
+
+
+class _Jobs:
+    """Creates jobs whose task IDs encode the job's ID, so submitted tasks can be attributed."""
+
+    def __init__(self, dispatcher: TaskDispatcher) -> None:
+        self.__dispatcher = dispatcher
+        self.__jobs: Dict[int, CompressionJob] = {}
+        self.__num_tasks_per_job: Dict[int, int] = collections.defaultdict(int)
+
+    def add_tasks(self, job_id: int, weight: int, num_tasks: int) -> None:
+        job = self.__jobs.setdefault(
+            job_id, CompressionJob(id=job_id, start_time=datetime.datetime.now())
+        )
+        first_task_ix = self.__num_tasks_per_job[job_id]
+        self.__num_tasks_per_job[job_id] += num_tasks
+        tasks = [
+            {"task_id": job_id * 1_000_000 + task_ix}
+            for task_ix in range(first_task_ix, first_task_ix + num_tasks)
+        ]
+        self.__dispatcher.add_tasks(job, weight, tasks)
+
+    def get_result_handle(self, job_id: int) -> _ResultHandle:
+        result_handle = self.__jobs[job_id].result_handle
+        assert isinstance(result_handle, _ResultHandle)
+        return result_handle
+
+    def get_num_in_flight_tasks(self, job_id: int) -> int:
+        result_handle = self.__jobs[job_id].result_handle
+        return 0 if result_handle is None else result_handle.get_num_unfinished_tasks()
+
+    def finish_all_tasks(self) -> None:
+        for job in self.__jobs.values():
+            if job.result_handle is not None:
+                job.result_handle.finish_tasks(job.result_handle.get_num_unfinished_tasks())
+
+
+def _get_job_ids(task_ids: List[int]) -> List[int]:
+    return [task_id // 1_000_000 for task_id in task_ids]
+
+
+class TestLimits:
+    """Tests for the limits on the number of in-flight tasks."""
+
+    def test_total_limit(self) -> None:
+        """No more tasks are submitted once the total limit is reached."""
+        dispatcher = TaskDispatcher(_TaskManager(), 5, 100)
+        jobs = _Jobs(dispatcher)
+        for job_id in range(3):
+            jobs.add_tasks(job_id, 1, 10)
+
+        assert 5 == len(dispatcher.dispatch())
+        assert [] == dispatcher.dispatch()
+        assert 5 == sum(jobs.get_num_in_flight_tasks(job_id) for job_id in range(3))
+
+    @pytest.mark.parametrize("weight", [1, 2, 5])
+    def test_per_job_limit(self, weight: int) -> None:
+        """A job never has more tasks in flight than the per-job limit, whatever its weight."""
+        dispatcher = TaskDispatcher(_TaskManager(), 10, 3)
+        jobs = _Jobs(dispatcher)
+        jobs.add_tasks(1, weight, 20)
+        jobs.add_tasks(2, 1, 2)
+
+        num_job_tasks_submitted = 0
+        for _ in range(10):
+            num_job_tasks_submitted += _get_job_ids(dispatcher.dispatch()).count(1)
+            assert jobs.get_num_in_flight_tasks(1) <= 3
+            jobs.get_result_handle(1).finish_tasks(1)
+
+        # The job's first batch fills its limit, and each finished task frees a slot for the next
+        assert 3 + 9 == num_job_tasks_submitted
+        assert 2 == jobs.get_num_in_flight_tasks(2)
+
+    def test_completion_releases_slots(self) -> None:
+        """Each finished task frees a slot for the next queued task."""
+        dispatcher = TaskDispatcher(_TaskManager(), 2, 2)
+        jobs = _Jobs(dispatcher)
+        jobs.add_tasks(1, 1, 5)
+
+        assert [1_000_000, 1_000_001] == dispatcher.dispatch()
+        jobs.get_result_handle(1).finish_tasks(1)
+        assert [1_000_002] == dispatcher.dispatch()
+        assert [] == dispatcher.dispatch()
+        jobs.get_result_handle(1).finish_tasks(2)
+        assert [1_000_003, 1_000_004] == dispatcher.dispatch()
+        assert not dispatcher.has_queued_tasks(1)
+
+
+class TestWeightedSharing:
+    """Tests for sharing free slots between jobs in proportion to their weights."""
+
+    @pytest.mark.parametrize("max_in_flight_tasks", [1, 2, 3, 4, 7, 100])
+    def test_share_follows_weight(self, max_in_flight_tasks: int) -> None:
+        """
+        Jobs get slots in proportion to their weights, however many slots free up at a time.
+        """
+        dispatcher = TaskDispatcher(_TaskManager(), max_in_flight_tasks, 1000)
+        jobs = _Jobs(dispatcher)
+        weights = {1: 3, 2: 1, 3: 2}
+        for job_id, weight in weights.items():
+            jobs.add_tasks(job_id, weight, 10_000)
+
+        # Each dispatch fills every slot, so the dispatches span whole rounds of 6 slots
+        num_tasks_per_job: collections.Counter[int] = collections.Counter()
+        for _ in range(60):
+            num_tasks_per_job.update(_get_job_ids(dispatcher.dispatch()))
+            jobs.finish_all_tasks()
+
+        num_slots = 60 * max_in_flight_tasks
+        assert {
+            job_id: num_slots * weight // sum(weights.values())
+            for job_id, weight in weights.items()
+        } == num_tasks_per_job
+
+    def test_share_with_one_slot_at_a_time(self) -> None:
+        """A job's turn continues across dispatches until it has used its weight's worth of slots."""
+        dispatcher = TaskDispatcher(_TaskManager(), 1, 1000)
+        jobs = _Jobs(dispatcher)
+        jobs.add_tasks(1, 3, 100)
+        jobs.add_tasks(2, 1, 100)
+
+        job_ids: List[int] = []
+        for _ in range(8):
+            job_ids.extend(_get_job_ids(dispatcher.dispatch()))
+            jobs.finish_all_tasks()
+
+        assert [1, 1, 1, 2, 1, 1, 1, 2] == job_ids
+
+    def test_idle_jobs_dont_take_slots(self) -> None:
+        """Jobs without queued tasks, or at their limit, leave their share to other jobs."""
+        dispatcher = TaskDispatcher(_TaskManager(), 10, 2)
+        jobs = _Jobs(dispatcher)
+        jobs.add_tasks(1, 1, 0)
+        jobs.add_tasks(2, 5, 100)
+        jobs.add_tasks(3, 1, 100)
+
+        task_ids = dispatcher.dispatch()
+        assert {2: 2, 3: 2} == collections.Counter(_get_job_ids(task_ids))
+
+    def test_new_job_gets_slots(self) -> None:
+        """A job added behind a job with a large backlog is served in the next round."""
+        dispatcher = TaskDispatcher(_TaskManager(), 2, 1000)
+        jobs = _Jobs(dispatcher)
+        jobs.add_tasks(1, 1, 1000)
+        assert [1, 1] == _get_job_ids(dispatcher.dispatch())
+        jobs.finish_all_tasks()
+
+        jobs.add_tasks(2, 1, 1)
+        assert [1, 2] == sorted(_get_job_ids(dispatcher.dispatch()))
+
+
+class TestDroppingTasks:
+    """Tests for dropping and removing jobs' tasks."""
+
+    def test_drop_queued_tasks(self) -> None:
+        """Dropped tasks aren't submitted, but the job's in-flight tasks keep their slots."""
+        dispatcher = TaskDispatcher(_TaskManager(), 4, 100)
+        jobs = _Jobs(dispatcher)
+        jobs.add_tasks(1, 3, 10)
+        jobs.add_tasks(2, 1, 10)
+        assert {1: 3, 2: 1} == collections.Counter(_get_job_ids(dispatcher.dispatch()))
+
+        dispatcher.drop_queued_tasks(1)
+        assert not dispatcher.has_queued_tasks(1)
+        jobs.get_result_handle(2).finish_tasks(1)
+        assert [2] == _get_job_ids(dispatcher.dispatch())
+
+        # Once the job's in-flight tasks finish, their slots go to the other job
+        jobs.get_result_handle(1).finish_tasks(3)
+        assert [2, 2, 2] == _get_job_ids(dispatcher.dispatch())
+        assert 0 == jobs.get_num_in_flight_tasks(1)
+
+    def test_remove_job(self) -> None:
+        """A removed job's queued tasks are dropped, and its in-flight tasks no longer count."""
+        dispatcher = TaskDispatcher(_TaskManager(), 4, 100)
+        jobs = _Jobs(dispatcher)
+        jobs.add_tasks(1, 1, 10)
+        jobs.add_tasks(2, 1, 10)
+        dispatcher.dispatch()
+
+        dispatcher.remove_job(1)
+        assert not dispatcher.has_queued_tasks(1)
+        assert [2, 2] == _get_job_ids(dispatcher.dispatch())
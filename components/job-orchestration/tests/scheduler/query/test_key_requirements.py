@@ -0,0 +1,204 @@
+"""Tests for deriving the keys a KQL query requires an archive to contain."""
+
+from typing import Optional, Set, Tuple
+
+import pytest
+from job_orchestration.scheduler.query.key_requirements import get_key_requirement
+
+
+def _get_required_keys(query_string: str) -> Optional[Set[Tuple[str, ...]]]:
+    requirement = get_key_requirement(query_string)
+    return None if requirement is None else requirement.get_keys()
+
+
+def _is_satisfied_by(query_string: str, archive_keys: Set[Tuple[str, ...]]) -> bool:
+    requirement = get_key_requirement(query_string)
+    assert requirement is not None
+    return requirement.is_satisfied(lambda key: key in archive_keys)
+
+
+class TestBooleanOperators:
+    """Tests for how AND, OR, and NOT combine the requirements of subqueries."""
+
+    def test_single_key(self) -> None:
+        """A key-value pair requires its key."""
+        assert _get_required_keys("a: 1") == {("a",)}
+        assert _is_satisfied_by("a: 1", {("a",)})
+        assert not _is_satisfied_by("a: 1", {("b",)})
+
+    def test_and(self) -> None:
+        """AND requires the keys of both subqueries."""
+        assert _is_satisfied_by("a: 1 AND b: 2", {("a",), ("b",)})
+        assert not _is_satisfied_by("a: 1 AND b: 2", {("a",)})
+        assert not _is_satisfied_by("a: 1 AND b: 2", {("b",)})
+
+    def test_or(self) -> None:
+        """OR requires the keys of either subquery."""
+        assert _is_satisfied_by("a: 1 OR b: 2", {("a",)})
+        assert _is_satisfied_by("a: 1 OR b: 2", {("b",)})
+        assert not _is_satisfied_by("a: 1 OR b: 2", {("c",)})
+
+    def test_keywords_are_case_insensitive(self) -> None:
+        """Keywords are matched case-insensitively, so they can't be used as unquoted keys."""
+        assert not _is_satisfied_by("a: 1 and b: 2", {("a",)})
+        assert _is_satisfied_by("a: 1 or b: 2", {("a",)})
+        assert _get_required_keys("and: 1") is None
+
+    def test_and_or_are_left_associative_with_same_precedence(self) -> None:
+        """`x OR y AND z` is `(x OR y) AND z`, and `x AND y OR z` is `(x AND y) OR z`."""
+        query = "a: 1 OR b: 2 AND c: 3"
+        assert not _is_satisfied_by(query, {("a",)})
+        assert not _is_satisfied_by(query, {("c",)})
+        assert _is_satisfied_by(query, {("a",), ("c",)})
+        assert _is_satisfied_by(query, {("b",), ("c",)})
+
+        query = "a: 1 AND b: 2 OR c: 3"
+        assert _is_satisfied_by(query, {("c",)})
+        assert _is_satisfied_by(query, {("a",), ("b",)})
+        assert not _is_satisfied_by(query, {("a",)})
+
+    def test_parentheses(self) -> None:
+        """Parentheses override the default grouping."""
+        query = "a: 1 OR (b: 2 AND c: 3)"
+        assert _is_satisfied_by(query, {("a",)})
+        assert not _is_satisfied_by(query, {("c",)})
+        assert _is_satisfied_by(query, {("b",), ("c",)})
+
+    def test_not(self) -> None:
+        """A negated subquery may match records without its keys, so it requires nothing."""
+        assert _get_required_keys("NOT a: 1") is None
+        assert _get_required_keys("a: 1 AND NOT b: 2") == {("a",)}
+        assert _get_required_keys("NOT a: 1 OR b: 2") is None
+        assert _get_required_keys("NOT (a: 1 AND b: 2)") is None
+
+    def test_not_binds_more_tightly_than_and(self) -> None:
+        """`NOT x AND y` is `(NOT x) AND y`."""
+        assert _get_required_keys("NOT a: 1 AND b: 2") == {("b",)}
+
+    def test_value_without_key(self) -> None:
+        """A value without a key may match any key, so it requires nothing."""
+        assert _get_required_keys("1") is None
+        assert _get_required_keys("a: 1 AND 2") == {("a",)}
+        assert _get_required_keys("a: 1 OR 2") is None
+
+
+class TestKeys:
+    """Tests for how a query's keys are split into the names of the keys along their paths."""
+
+    def test_nested_key(self) -> None:
+        """`.` separates the keys along a path, whether or not the key is quoted."""
+        assert _get_required_keys("a.b: 1") == {("a", "b")}
+        assert _get_required_keys('"a.b": 1') == {("a", "b")}
+
+    def test_escaped_period(self) -> None:
+        """An escaped `.` is part of a key's name."""
+        assert _get_required_keys("a\\.b: 1") == {("a.b",)}
+        assert _get_required_keys("a\\.b.c: 1") == {("a.b", "c")}
+
+    def test_escaped_special_chars(self) -> None:
+        """Escaped special characters stand for themselves, and `\\t`, etc. for whitespace."""
+        assert _get_required_keys("a\\*b: 1") == {("a*b",)}
+        assert _get_required_keys("a\\:b: 1") == {("a:b",)}
+        assert _get_required_keys('"a\\tb": 1') == {("a\tb",)}
+
+    def test_unicode_escape(self) -> None:
+        """`\\uXXXX` stands for the code point, unless it's a surrogate."""
+        assert _get_required_keys("a\\u0041: 1") == {("aA",)}
+        assert _get_required_keys("\\u00e9t\\u00e9: 1") == {("été",)}
+        assert _get_required_keys("a\\ud800: 1") is None
+        assert _get_required_keys("a\\u00g1: 1") is None
+
+    def test_question_mark_in_key(self) -> None:
+        """Unlike in a value, `?` isn't a wildcard in a key."""
+        assert _get_required_keys("a?: 1") == {("a?",)}
+
+    def test_non_ascii_key(self) -> None:
+        """Unescaped non-ASCII characters are part of a key's name."""
+        assert _get_required_keys("été.日: 1") == {("été", "日")}
+
+    @pytest.mark.parametrize(
+        "query_string",
+        [
+            "a*: 1",
+            "a.*: 1",
+            "*: 1",
+        ],
+    )
+    def test_wildcard_key(self, query_string: str) -> None:
+        """A key with a wildcard may match any of several keys, so it requires nothing."""
+        assert _get_required_keys(query_string) is None
+
+    @pytest.mark.parametrize("query_string", ["@a: 1", "$a: 1", "!a: 1", "#a: 1"])
+    def test_namespaced_key(self, query_string: str) -> None:
+        """A namespaced key (e.g., an auto-generated key) isn't recorded, so it requires nothing."""
+        assert _get_required_keys(query_string) is None
+        assert _get_required_keys(f"b: 1 AND {query_string}") == {("b",)}
+
+    @pytest.mark.parametrize("query_string", ["a..b: 1", ".a: 1", "a.: 1"])
+    def test_empty_key_name(self, query_string: str) -> None:
+        """A path with an empty key name requires nothing."""
+        assert _get_required_keys(query_string) is None
+
+
+class TestQueryForms:
+    """Tests for the forms of (sub)queries besides boolean expressions."""
+
+    def test_nested_query(self) -> None:
+        """The keys of a nested query are nested within the key it's applied to."""
+        assert _get_required_keys("a: {b: 1}") == {("a", "b")}
+        assert _get_required_keys("a.b: {c.d: 1}") == {("a", "b", "c", "d")}
+
+        query = "a: {b: 1 AND c: 2}"
+        assert _is_satisfied_by(query, {("a", "b"), ("a", "c")})
+        assert not _is_satisfied_by(query, {("a", "b"), ("c",)})
+
+        query = "a: {b: 1 OR c: 2}"
+        assert _is_satisfied_by(query, {("a", "c")})
+        assert not _is_satisfied_by(query, {("b",)})
+
+    def test_nested_query_without_requirement(self) -> None:
+        """A nested query that requires nothing (or is applied to a wildcard) requires nothing."""
+        assert _get_required_keys("a: {NOT b: 1}") is None
+        assert _get_required_keys("a: {1}") is None
+        assert _get_required_keys("a*: {b: 1}") is None
+
+    def test_value_list(self) -> None:
+        """A list of values requires its key, unless the list is inverted or empty."""
+        assert _get_required_keys("a: (1 2)") == {("a",)}
+        assert _get_required_keys("a: (OR 1 2)") == {("a",)}
+        assert _get_required_keys("a: (AND 1 2)") == {("a",)}
+        assert _get_required_keys("a: (NOT 1 2)") is None
+        assert _get_required_keys("a: ()") is None
+
+    def test_range(self) -> None:
+        """A range comparison requires its key."""
+        assert _get_required_keys("a > 1") == {("a",)}
+        assert _get_required_keys("a >= 1") == {("a",)}
+        assert _get_required_keys("a < 1 AND b <= 2") == {("a",), ("b",)}
+
+    def test_quoted_value(self) -> None:
+        """A quoted value may contain whitespace and keywords."""
+        assert _get_required_keys('a: "x AND y"') == {("a",)}
+
+    def test_date(self) -> None:
+        """A query containing a date literal isn't supported, so it requires nothing."""
+        assert _get_required_keys("a: date(1)") is None
+        assert _get_required_keys("date(1) AND a: 1") is None
+
+    @pytest.mark.parametrize(
+        "query_string",
+        [
+            "",
+            "a:",
+            "(a: 1",
+            "a: 1)",
+            "a: {b: 1",
+            "a: 1 AND",
+            "a\\q: 1",
+            'a: "x',
+            '"a\\\\b": 1',
+        ],
+    )
+    def test_unsupported_query(self, query_string: str) -> None:
+        """A query that can't be parsed (or may be parsed differently by clp-s) requires nothing."""
+        assert _get_required_keys(query_string) is None
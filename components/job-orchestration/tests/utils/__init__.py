@@ -0,0 +1 @@
+"""Tests for job orchestration's utilities."""
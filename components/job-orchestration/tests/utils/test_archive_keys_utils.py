@@ -0,0 +1,120 @@
+"""Tests for the utilities that record and look up the keys in archives."""
+
+from typing import Tuple
+
+import pytest
+from job_orchestration.utils.archive_keys_utils import (
+    does_key_path_match,
+    get_key_id_bitmask,
+    split_key_name,
+)
+
+# The escape sequences `IndexManager::escape_key_name` (in clp-s's indexer) uses for each character
+_INDEXER_ESCAPE_SEQUENCES = {
+    ord('"'): '\\"',
+    ord("\\"): "\\\\",
+    ord("\n"): "\\n",
+    ord("\t"): "\\t",
+    ord("\r"): "\\r",
+    ord("\b"): "\\b",
+    ord("\f"): "\\f",
+    ord("."): "\\.",
+}
+
+
+def _escape_key_name(key_name: bytes) -> str:
+    """
+    Mirrors `IndexManager::escape_key_name`, which escapes each byte of a key's (UTF-8) name, so
+    every byte that isn't printable ASCII (including each byte of a multi-byte character) is escaped
+    as `\\u00XX`.
+    :param key_name:
+    :return: The escaped name.
+    """
+    escaped_chars = []
+    for byte in key_name:
+        if byte in _INDEXER_ESCAPE_SEQUENCES:
+            escaped_chars.append(_INDEXER_ESCAPE_SEQUENCES[byte])
+        elif 0x20 <= byte < 0x7F:
+            escaped_chars.append(chr(byte))
+        else:
+            escaped_chars.append(f"\\u00{byte:02x}")
+    return "".join(escaped_chars)
+
+
+def _escape_key_path(key_path: Tuple[str, ...]) -> str:
+    return ".".join(_escape_key_name(name.encode("utf-8")) for name in key_path)
+
+
+class TestSplitKeyName:
+    """Tests for splitting the names of keys, as escaped by the indexer."""
+
+    @pytest.mark.parametrize(
+        "key_path",
+        [
+            ("a",),
+            ("a", "b", "c"),
+            ("a.b", "c"),
+            ('quote"', "back\\slash"),
+            ("new\nline", "tab\t", "cr\r", "bs\b", "ff\f"),
+            ("\x00\x01\x7f",),
+            ("été", "日本語"),
+            ("emoji😀",),
+            ("",),
+            ("a", ""),
+        ],
+    )
+    def test_round_trip(self, key_path: Tuple[str, ...]) -> None:
+        """Splitting an escaped path returns the original names of the keys along it."""
+        assert split_key_name(_escape_key_path(key_path)) == key_path
+
+    def test_non_ascii_bytes_are_escaped(self) -> None:
+        """Each byte of a multi-byte character is escaped separately."""
+        escaped_name = _escape_key_name("é".encode("utf-8"))
+        assert escaped_name == "\\u00c3\\u00a9"
+        assert split_key_name(escaped_name) == ("é",)
+
+    def test_invalid_utf8_is_preserved(self) -> None:
+        """A name that isn't valid UTF-8 is still split, without losing its bytes."""
+        key_path = split_key_name(_escape_key_name(b"a\xffb"))
+        assert key_path is not None
+        assert key_path[0].encode("utf-8", errors="surrogateescape") == b"a\xffb"
+
+    @pytest.mark.parametrize("name", ["a\\", "a\\q", "a\\u00g1", "a\\u00", "a\\u+00f", "a\\u0100"])
+    def test_malformed_name(self, name: str) -> None:
+        """A name with an invalid escape sequence is malformed."""
+        assert split_key_name(name) is None
+
+
+class TestDoesKeyPathMatch:
+    """Tests for matching an archive's keys against the keys a query requires."""
+
+    def test_same_key(self) -> None:
+        assert does_key_path_match(("a", "b"), ("a", "b"))
+
+    def test_key_nested_within_required_key(self) -> None:
+        """An archive containing `a.b.c` contains `a.b` (e.g., as an object)."""
+        assert does_key_path_match(("a", "b", "c"), ("a", "b"))
+
+    def test_required_key_nested_within_key(self) -> None:
+        """An archive containing `a` may contain `a.b` (e.g., within an array at `a`)."""
+        assert does_key_path_match(("a",), ("a", "b"))
+
+    def test_unrelated_keys(self) -> None:
+        assert not does_key_path_match(("a", "c"), ("a", "b"))
+        assert not does_key_path_match(("b",), ("a", "b"))
+        assert not does_key_path_match(("ab",), ("a",))
+        assert not does_key_path_match(("a.b",), ("a", "b"))
+
+    def test_malformed_key(self) -> None:
+        """A key whose name is malformed matches every required key."""
+        assert does_key_path_match(None, ("a",))
+
+
+class TestGetKeyIdBitmask:
+    """Tests for building bitmasks of key IDs."""
+
+    def test_bitmask(self) -> None:
+        assert 0 == get_key_id_bitmask([])
+        assert 0b1 == get_key_id_bitmask([0])
+        assert 0b10100 == get_key_id_bitmask([2, 4])
+        assert 1 << 1000 | 1 == get_key_id_bitmask([1000, 0, 1000])